@@ -1418,36 +1418,14 @@ class BaseGUI(object):
         self.imgsel_window.drawingarea.queue_draw()
 
     def get_gamedir_filelist(self, directory, ext, keepext=True, matchprefixes=None):
-        if c.book == 1:
-            path = os.path.join(self.prefs.get_str(
-                'paths', 'gamedir'), directory)
-            files = os.listdir(path)
-        else:
-            files = []
-            for file in self.eschalondata.filelist():
-                (filedir, filename) = os.path.split(file)
-                if filedir == directory:
-                    files.append(filename)
-
-        filelist = []
-        ext = '.%s' % (ext)
-        extlen = -len(ext)
-        for file in files:
-            if matchprefixes is not None:
-                matched = False
-                for prefix in matchprefixes:
-                    if file[:len(prefix)] == prefix:
-                        matched = True
-                        break
-                if not matched:
-                    continue
-            if file[extlen:] == ext:
-                if (keepext):
-                    filelist.append(file)
-                else:
-                    filelist.append(file[:extlen])
-        filelist.sort()
-        return filelist
+        files = self.eschalondata.listdir(directory, ext)
+        if matchprefixes is not None:
+            matchprefixes = tuple(matchprefixes)
+            files = [file for file in files if file.startswith(matchprefixes)]
+        if not keepext:
+            extlen = len(ext) + 1
+            files = [file[:-extlen] for file in files]
+        return files
 
     def populate_comboboxentry(self, boxname, list, blank=True):
         widget = self.get_widget(boxname)
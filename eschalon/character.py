@@ -22,7 +22,7 @@ import struct
 from abc import ABC
 from typing import List
 
-from eschalon.constants import constants as c
+from eschalon.constants import book_constants
 from eschalon.item import Item
 from eschalon.savefile import LoadException, Savefile
 from eschalon.unknowns import B1Unknowns, B2Unknowns
@@ -75,25 +75,25 @@ class Character(ABC):
         for i in range(self.inv_rows):
             self.inventory.append([])
             for j in range(self.inv_cols):
-                self.inventory[i].append(Item.new(c.book))
+                self.inventory[i].append(Item.new(self.book))
         self.readyitems = []
         for i in range(self.ready_rows * self.ready_cols):
-            self.readyitems.append(Item.new(c.book))
+            self.readyitems.append(Item.new(self.book))
         self.curinvcol = 0
         self.curinvrow = 0
-        self.quiver = Item.new(c.book)
-        self.helm = Item.new(c.book)
-        self.cloak = Item.new(c.book)
-        self.amulet = Item.new(c.book)
-        self.torso = Item.new(c.book)
-        self.weap_prim = Item.new(c.book)
-        self.belt = Item.new(c.book)
-        self.gauntlet = Item.new(c.book)
-        self.legs = Item.new(c.book)
-        self.ring1 = Item.new(c.book)
-        self.ring2 = Item.new(c.book)
-        self.shield = Item.new(c.book)
-        self.feet = Item.new(c.book)
+        self.quiver = Item.new(self.book)
+        self.helm = Item.new(self.book)
+        self.cloak = Item.new(self.book)
+        self.amulet = Item.new(self.book)
+        self.torso = Item.new(self.book)
+        self.weap_prim = Item.new(self.book)
+        self.belt = Item.new(self.book)
+        self.gauntlet = Item.new(self.book)
+        self.legs = Item.new(self.book)
+        self.ring1 = Item.new(self.book)
+        self.ring2 = Item.new(self.book)
+        self.shield = Item.new(self.book)
+        self.feet = Item.new(self.book)
         self.spells = []
         self.orientation = -1
         self.xpos = -1
@@ -307,13 +307,10 @@ class Character(ABC):
 
         # Now actually return the object
         if book == 1:
-            c.switch_to_book(1)
             return B1Character(df)
         elif book == 2:
-            c.switch_to_book(2)
             return B2Character(df)
         else:
-            c.switch_to_book(3)
             return B3Character(df)
 
 
@@ -323,6 +320,7 @@ class B1Character(Character):
     """
 
     book = 1
+    constants = book_constants(1)
     form_elements = ['origin_label', 'origin_box',
                      'axiom_label', 'axiom_box',
                      'classname_label', 'classname_box',
@@ -375,7 +373,7 @@ class B1Character(Character):
             self.concentration = self.df.readint()
 
             # Skills
-            for key in list(c.skilltable.keys()):
+            for key in list(self.constants.skilltable.keys()):
                 self.addskill(key, self.df.readint())
 
             # More stats
@@ -673,6 +671,7 @@ class B2Character(Character):
     """
 
     book = 2
+    constants = book_constants(2)
     form_elements = ['gender_label', 'gender',
                      'b2origin_label', 'b2origin',
                      'b2axiom_label', 'b2axiom',
@@ -761,7 +760,7 @@ class B2Character(Character):
             self.concentration = self.df.readuchar()
 
             # Skills
-            for key in sorted(c.skilltable.keys()):
+            for key in sorted(self.constants.skilltable.keys()):
                 self.addskill(key, self.df.readuchar())
 
             # More stats
@@ -799,7 +798,7 @@ class B2Character(Character):
                 self.unknown.zero1))
 
             # Spells
-            for i in range(len(c.spelltable)):
+            for i in range(len(self.constants.spelltable)):
                 self.addspell()
 
             # Currently-readied spell
@@ -1115,6 +1114,7 @@ class B3Character(Character):
     """
 
     book = 3
+    constants = book_constants(3)
     form_elements = ['gender_label', 'gender',
                      'b2origin_label', 'b2origin',
                      'b2axiom_label', 'b2axiom',
@@ -1199,7 +1199,7 @@ class B3Character(Character):
             self.concentration = self.df.readuchar()
 
             # Skills
-            for key in sorted(c.skilltable.keys()):
+            for key in sorted(self.constants.skilltable.keys()):
                 self.addskill(key, self.df.readuchar())
 
             # More stats
@@ -1235,7 +1235,7 @@ class B3Character(Character):
             self.unknown.zero1 = self.df.readuchar()
 
             # Spells
-            for i in range(len(c.spelltable)):
+            for i in range(len(self.constants.spelltable)):
                 self.addspell()
 
             # Currently-readied spell
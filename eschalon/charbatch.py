@@ -0,0 +1,353 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import glob
+import json
+import logging
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional, Sequence
+
+from eschalon.character import Character
+from eschalon.maincli import apply_changes, format_change
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+EQUIP_SLOTS = [
+    ('quiver', 'Quiver'),
+    ('helm', 'Helm'),
+    ('cloak', 'Cloak'),
+    ('amulet', 'Amulet'),
+    ('torso', 'Torso'),
+    ('weap_prim', 'Primary Weapon'),
+    ('belt', 'Belt'),
+    ('gauntlet', 'Gauntlet'),
+    ('legs', 'Legs'),
+    ('ring1', 'Ring 1'),
+    ('ring2', 'Ring 2'),
+    ('shield', 'Shield'),
+    ('feet', 'Feet'),
+]
+
+# The options from MainCLI which change the character
+CHANGE_OPTIONS = ['set_gold', 'set_hp_max', 'set_hp_cur', 'set_mana_max',
+                  'set_mana_cur', 'rm_disease', 'reset_hunger']
+
+
+def lookup(table, key, unknown='(unknown %d)'):
+    if key in table:
+        return table[key]
+    return unknown % (key)
+
+
+def item_info(item):
+    """
+    Returns a dict of the given item's attributes, or None if the slot
+    is empty.
+    """
+    if item.category == 0:
+        return None
+    info = dict([(key, value) for (key, value) in vars(item).items()
+                 if isinstance(value, (int, float, str))])
+    info['category_name'] = lookup(item.constants.categorytable, item.category)
+    return info
+
+
+def header_info(char):
+    """ The same information as MainCLI.display_header(). """
+    info = {'name': char.name, 'level': char.level}
+    if char.book == 1:
+        info.update({'origin': char.origin, 'axiom': char.axiom, 'class': char.classname})
+    else:
+        info.update({'gender': lookup(char.constants.gendertable, char.gender),
+                     'origin': lookup(char.constants.origintable, char.origin),
+                     'axiom': lookup(char.constants.axiomtable, char.axiom),
+                     'class': lookup(char.constants.classtable, char.classname)})
+    return info
+
+
+def stats_info(char):
+    """ The same information as MainCLI.display_stats(). """
+    info = {'picid': char.picid}
+    for attr in ['strength', 'dexterity', 'endurance', 'speed', 'intelligence',
+                 'wisdom', 'perception', 'concentration', 'curhp', 'maxhp',
+                 'curmana', 'maxmana', 'experience', 'gold']:
+        info[attr] = getattr(char, attr)
+    statuses = []
+    for (idx, turns) in enumerate(char.statuses):
+        if turns > 0:
+            status = {'status': lookup(char.constants.statustable, idx, 'Status %d (unknown)'), 'turns': turns}
+            if char.book > 1:
+                status['extra'] = char.statuses_extra[idx]
+            statuses.append(status)
+    info['statuses'] = statuses
+    if char.book == 1:
+        info['diseases'] = [text for (mask, text) in char.constants.diseasetable.items()
+                            if char.disease & mask == mask]
+    else:
+        info['hunger'] = char.hunger
+        info['thirst'] = char.thirst
+        info['permstatuses'] = [text for (mask, text) in char.constants.permstatustable.items()
+                                if char.permstatuses & mask == mask]
+    info['skills'] = dict([(char.constants.skilltable[key], char.skills[key]) for key in char.constants.skilltable
+                           if char.skills.get(key, 0) != 0])
+    return info
+
+
+def avatar_info(char):
+    """ The same information as MainCLI.display_avatar_info(). """
+    return {'fxblock': list(char.fxblock),
+            'x': char.xpos,
+            'y': char.ypos,
+            'facing': lookup(char.constants.dirtable, char.orientation, '0x%08X')}
+
+
+def magic_info(char):
+    """ The same information as MainCLI.display_magic(). """
+    info = {'spells': ['%s - %s' % (char.constants.spelltype[idx], char.constants.spelltable[idx])
+                       for (idx, known) in enumerate(char.spells) if known == 1],
+            'readyslots': [{'spell': spell, 'level': level} if spell != '' else None
+                           for (spell, level) in char.readyslots]}
+    if char.book > 1:
+        info['readied_spell'] = {'spell': char.readied_spell, 'level': char.readied_spell_lvl}
+        info['portal_locs'] = [{'slot': slot + 1, 'map': portal_loc[1],
+                                'mapname': portal_loc[2], 'location': portal_loc[0]}
+                               for (slot, portal_loc) in enumerate(char.portal_locs)
+                               if portal_loc[1] != '']
+    return info
+
+
+def alchemy_info(char):
+    """ The same information as MainCLI.display_alchemy(). """
+    if char.book == 1:
+        return []
+    return [char.constants.alchemytable[idx] for (idx, recipe) in enumerate(char.alchemy_book) if recipe > 0]
+
+
+def equip_info(char):
+    """ The same information as MainCLI.display_equip(). """
+    slots = list(EQUIP_SLOTS)
+    if char.book == 1:
+        slots.append(('weap_alt', 'Alternate Weapon'))
+    info = {'equipped': dict([(attr, item_info(getattr(char, attr))) for (attr, label) in slots])}
+    if char.book > 1:
+        info['equip_slot_1'] = list(char.equip_slot_1)
+        info['equip_slot_2'] = list(char.equip_slot_2)
+    return info
+
+
+def inventory_info(char):
+    """ The same information as MainCLI.display_inventory(). """
+    inventory = []
+    for row in range(char.inv_rows):
+        for col in range(char.inv_cols):
+            # The last inventory slot is where the gold lives
+            if row == (char.inv_rows - 1) and col == (char.inv_cols - 1):
+                continue
+            item = item_info(char.inventory[row][col])
+            if item is not None:
+                item.update({'row': row + 1, 'col': col + 1})
+                inventory.append(item)
+    info = {'inventory': inventory,
+            'gold': char.gold,
+            'torches': char.torches,
+            'torchused': char.torchused,
+            'readyitems': [item_info(item) for item in char.readyitems]}
+    if char.book > 1:
+        info['keyring'] = [key for key in char.keyring if key != '']
+    return info
+
+
+SECTIONS = {
+    'stats': stats_info,
+    'avatar': avatar_info,
+    'magic': magic_info,
+    'alchemy': alchemy_info,
+    'equip': equip_info,
+    'inv': inventory_info,
+}
+
+
+def find_chars(paths):
+    """
+    Expands a list of files, directories and glob patterns into a list of
+    character files.  A directory can either hold a "char" file itself
+    (a single save slot), or be a whole savegame directory full of slots.
+    """
+    filenames = []
+    for path in paths:
+        matches = sorted(glob.glob(path))
+        if len(matches) == 0:
+            # Let the missing file report its own error later on
+            matches = [path]
+        for match in matches:
+            if not os.path.isdir(match):
+                filenames.append(match)
+            elif os.path.isfile(os.path.join(match, 'char')):
+                filenames.append(os.path.join(match, 'char'))
+            else:
+                filenames.extend(sorted(glob.glob(os.path.join(match, 'slot*', 'char'))))
+    return filenames
+
+
+def write_atomic(char, filename):
+    """
+    Writes the character out to a temporary file next to filename, and
+    then renames it into place, so an interrupted batch never leaves a
+    half-written character behind.
+    """
+    tmpname = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                           '.%s.%d' % (os.path.basename(filename), os.getpid()))
+    try:
+        char.df.set_filename(tmpname)
+        char.write()
+        os.replace(tmpname, filename)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+    finally:
+        char.df.set_filename(filename)
+
+
+def process_file(filename, book, changes, sections):
+    """
+    Loads a single character file, applies the given changes (a dict of
+    MainCLI options, see apply_changes()), and writes it back out if
+    anything was asked for.  Returns a dict report, suitable for passing
+    between processes, with the requested sections of character info
+    taken after the changes were made.
+    """
+    report = {'char': filename, 'changes': []}
+    try:
+        char = Character.load(filename, book)
+        char.read()
+        report['book'] = char.book
+        report.update(header_info(char))
+        if any([changes.get(option) for option in CHANGE_OPTIONS]):
+            report['changes'] = apply_changes(char, changes)
+            write_atomic(char, filename)
+        for section in sections:
+            report[section] = SECTIONS[section](char)
+    except (LoadException, IOError, ValueError, struct.error) as e:
+        # A corrupt file, or one from a different book, tends to blow up
+        # partway through read() rather than with a LoadException.
+        report['error'] = str(e)
+    return report
+
+
+def process_files(filenames, book, changes, sections=(), workers=None):
+    """
+    Processes a list of character files across a pool of worker processes.
+    Yields the reports (see process_file()) in file order, as they become
+    available, so callers can stream them out.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filenames) <= 1:
+        for filename in filenames:
+            yield process_file(filename, book, changes, sections)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as executor:
+        yield from executor.map(process_file, filenames, repeat(book), repeat(changes),
+                                repeat(sections), chunksize=8)
+
+
+def report_text(report):
+    if 'error' in report:
+        return ['%s: error: %s' % (report['char'], report['error'])]
+    lines = ['%s: %s - Lvl %d' % (report['char'], report['name'], report['level'])]
+    for change in report['changes']:
+        lines.append('  Old %s, New %s' % (format_change(change['field'], change['old']),
+                                           format_change(change['field'], change['new'])))
+    for section in SECTIONS:
+        if section in report:
+            lines.append('  %s: %s' % (section, json.dumps(report[section], sort_keys=True)))
+    return lines
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Apply the same changes to many character files (or save directories full of them)')
+    parser.add_argument("paths", type=str, nargs='+',
+                        help='Character files, save slot or savegame directories, or glob patterns')
+    parser.add_argument("--book", type=int, choices=[1, 2, 3], required=True)
+    parser.add_argument("-l", "--list", action="append", type=str,
+                        choices=['all'] + sorted(SECTIONS),
+                        help='Character info to include in the report')
+
+    char_manip_group = parser.add_argument_group(title="automated changes",
+                                                 description="Sets specific charater attributes")
+    char_manip_group.add_argument("--set-gold", type=int)
+    char_manip_group.add_argument("--set-mana-max", type=int)
+    char_manip_group.add_argument("--set-mana-cur", type=int)
+    char_manip_group.add_argument("--set-hp-max", type=int)
+    char_manip_group.add_argument("--set-hp-cur", type=int)
+    char_manip_group.add_argument("--rm-disease", action="store_true")
+    char_manip_group.add_argument("--reset-hunger", action="store_true")
+
+    parser.add_argument("--format", choices=['text', 'json', 'ndjson'], default='text')
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(input)
+
+    if args.book == 1 and args.reset_hunger:
+        parser.error("Resetting hunger/thirst only applies to book II and III")
+    return args
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Processes all the given characters and reports on them.  Returns 0 if
+    everything went fine, and 2 if any files couldn't be processed.
+    """
+    args = parse_args(input)
+    if args.list is None:
+        sections = []
+    elif 'all' in args.list:
+        sections = list(SECTIONS)
+    else:
+        sections = args.list
+    changes = dict([(option, getattr(args, option)) for option in CHANGE_OPTIONS])
+
+    reports = process_files(find_chars(args.paths), args.book, changes, sections, args.workers)
+    errors = False
+    if args.format == 'json':
+        reports = list(reports)
+        errors = any(['error' in report for report in reports])
+        print(json.dumps(reports, indent=2, sort_keys=True))
+    else:
+        for report in reports:
+            errors = errors or 'error' in report
+            if args.format == 'ndjson':
+                print(json.dumps(report, sort_keys=True), flush=True)
+            else:
+                print("\n".join(report_text(report)))
+
+    if errors:
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,75 @@
+import threading
+from types import MappingProxyType
+
 from eschalon.constantsb1 import B1Constants
 from eschalon.constantsb2 import B2Constants
 from eschalon.constantsb3 import B3Constants
 
 
+class BookConstants(object):
+    """
+    A read-only namespace holding the constants for a single book.  There's
+    only ever one of these per book (see book_constants()), and the
+    book-specific classes (B2Map, B3Item, etc) carry theirs around as
+    their "constants" attribute, so nothing needs to flip global state
+    to find out which tables apply to them.
+    """
+
+    def __init__(self, group):
+        values = dict([(key, val) for (key, val) in group.__dict__.items() if key[0] != '_'])
+        object.__setattr__(self, '_values', MappingProxyType(values))
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError('Book %d has no constant %s' % (self._values['book'], name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Book constants are read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('Book constants are read-only')
+
+    def __dir__(self):
+        return sorted(self._values)
+
+    def __repr__(self):
+        return 'BookConstants(%d)' % (self._values['book'])
+
+    def __reduce__(self):
+        # Unpickle to the shared instance, rather than a copy
+        return (book_constants, (self._values['book'],))
+
+
+_books = {
+    1: BookConstants(B1Constants),
+    2: BookConstants(B2Constants),
+    3: BookConstants(B3Constants),
+}
+
+
+def book_constants(book):
+    """ Returns the constants namespace for the given book. """
+    try:
+        return _books[book]
+    except KeyError:
+        raise ValueError('Unknown book version specified: %r' % (book))
+
+
 class Constants(object):
     """
-    A class to hold our constants, depending on what book we're
-    currently working in.  I suppose really this should just modify
-    a global var and set it to B1Constants or B2Constants, but
-    I'll just leave it this way for now.
+    The global "c" object, from back when everything worked on a single
+    book at a time.  Attribute lookups are passed through to the current
+    book's BookConstants.
+
+    The current book is kept per-thread, so a thread loading Book 3 files
+    doesn't pull the rug out from under one working on Book 2.  Threads
+    which haven't picked a book themselves see whatever the main thread
+    last switched to, which is what the GUIs expect.  Loading a map or
+    character doesn't switch books; the GUIs pick theirs once at startup.
+    New code should prefer the "constants" attribute on the object it's
+    working with, or book_constants().
     """
 
     def __init__(self, book=1):
@@ -18,31 +79,55 @@ class Constants(object):
             2: B2Constants,
             3: B3Constants,
         }
-        self.book = None
-        self.eschalondata = None
-        self.switch_to_book(book)
+        self._local = threading.local()
+        self._default = book_constants(book)
+        self._eschalondata = {}
+
+    def __getattr__(self, name):
+        # Only called for things which aren't our own attributes
+        if name[0] == '_':
+            raise AttributeError(name)
+        return getattr(self.current(), name)
 
-    def set_eschalondata(self, eschalondata):
+    def current(self):
+        """ Returns the BookConstants for the calling thread. """
+        return getattr(self._local, 'constants', self._default)
+
+    @property
+    def book(self):
+        return self.current().book
+
+    @property
+    def eschalondata(self):
+        return self._eschalondata.get(self.book)
+
+    def get_eschalondata(self, book):
+        """ Returns the EschalonData object registered for the given book, if any. """
+        return self._eschalondata.get(book)
+
+    def set_eschalondata(self, eschalondata, book=None):
         """
-        Sets our internal EschalonData object.  Mostly just a convenience
-        so that we don't have to pass that around to all the components
-        which might need access to the datapak/datadir.
+        Sets our EschalonData object for the given book (by default, the
+        one it was loaded for, or failing that the current one).  Mostly
+        just a convenience so that we don't have to pass that around to all
+        the components which might need access to the datapak/datadir.
         """
-        self.eschalondata = eschalondata
+        if book is None:
+            book = getattr(eschalondata, 'book', None)
+        if book is None:
+            book = self.book
+        self._eschalondata[book] = eschalondata
 
     def switch_to_book(self, book):
+        """
+        Switches the calling thread over to the given book.  This is just a
+        reference swap, so it's cheap to call as often as you like.
+        """
         assert book is not None
-        if book != self.book:
-            # First clear out the old constants
-            if self.book:
-                for (key, val) in list(self.groups[self.book].__dict__.items()):
-                    if key[0] != '_':
-                        del (self.__dict__[key])
-            # ... and now load in the new ones
-            for (key, val) in list(self.groups[book].__dict__.items()):
-                if key[0] != '_':
-                    self.__dict__[key] = val
-            self.book = book
+        constants = book_constants(book)
+        self._local.constants = constants
+        if threading.current_thread() is threading.main_thread():
+            self._default = constants
 
 
 constants = Constants()
@@ -18,9 +18,10 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import logging
-from typing import Any, List
+from typing import TYPE_CHECKING, Any, List
 
-from eschalon.eschalondata import EschalonData
+if TYPE_CHECKING:
+    from eschalon.eschalondata import EschalonData
 
 LOG = logging.getLogger(__name__)
 
@@ -316,7 +317,7 @@ class B1Constants(object):
         38: 'Sound Generator (Waterfall)',
     }
 
-    eschalondata: EschalonData = None
+    eschalondata: 'EschalonData' = None
 
     # Script Commands
     commands = {
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class DirtyRegion(object):
+    """
+    A rectangular block of dirty tiles, in map coordinates.  The bounds
+    are inclusive on both ends.  Note that because of the isometric
+    layout, redrawing a region means redrawing quite a bit more than
+    just the tiles inside it - see DirtyRegions for how we account for
+    that when deciding whether two regions are worth merging.
+    """
+
+    def __init__(self, x1, y1, x2, y2):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+
+    def width(self):
+        return self.x2 - self.x1 + 1
+
+    def height(self):
+        return self.y2 - self.y1 + 1
+
+    def union(self, other):
+        """ Returns a new region which covers both ourselves and the other. """
+        return DirtyRegion(min(self.x1, other.x1), min(self.y1, other.y1),
+                           max(self.x2, other.x2), max(self.y2, other.y2))
+
+    def contains(self, x, y):
+        return self.x1 <= x <= self.x2 and self.y1 <= y <= self.y2
+
+    def __eq__(self, other):
+        return (self.x1, self.y1, self.x2, self.y2) == (other.x1, other.y1, other.x2, other.y2)
+
+    def __repr__(self):
+        return 'DirtyRegion(%d, %d, %d, %d)' % (self.x1, self.y1, self.x2, self.y2)
+
+
+class DirtyRegions(object):
+    """
+    Keeps track of which map tiles need to be recomposited, and merges
+    them into as few rectangles as makes sense, so that an action which
+    touches a whole bunch of tiles at once (smart drawing, undo, copy
+    drags, large brushes) only redraws each bit of the map once.
+
+    margin_x and margin_y are how many tiles around a dirty tile have to
+    be redrawn along with it (walls, trees and wide entities overlap their
+    neighbors).  Two regions are merged whenever redrawing their combined
+    bounding box, margins included, is no more expensive than redrawing
+    them separately.
+    """
+
+    def __init__(self, margin_x=2, margin_y=9):
+        self.margin_x = margin_x
+        self.margin_y = margin_y
+        self.tiles = set()
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def add(self, x, y):
+        """ Marks a single tile as dirty. """
+        self.tiles.add((x, y))
+
+    def add_tiles(self, tiles):
+        """ Marks a list of (x, y) tuples as dirty. """
+        self.tiles.update(tiles)
+
+    def clear(self):
+        self.tiles = set()
+
+    def cost(self, region):
+        """ Number of tiles we'd actually end up compositing for the region. """
+        return ((region.width() + (2 * self.margin_x)) *
+                (region.height() + (2 * self.margin_y)))
+
+    def regions(self):
+        """
+        Returns a list of DirtyRegion objects covering all our dirty tiles,
+        sorted top to bottom.
+        """
+        regions = [DirtyRegion(x, y, x, y)
+                   for (x, y) in sorted(self.tiles, key=lambda t: (t[1], t[0]))]
+
+        # Just keep merging until nothing else is worth merging.  The lists
+        # we deal with here are tiny (brush-sized, generally), and they
+        # collapse quickly since the vertical margin is so large.
+        merged = True
+        while merged:
+            merged = False
+            i = 0
+            while i < len(regions):
+                j = i + 1
+                while j < len(regions):
+                    union = regions[i].union(regions[j])
+                    if self.cost(union) <= self.cost(regions[i]) + self.cost(regions[j]):
+                        regions[i] = union
+                        del regions[j]
+                        merged = True
+                    else:
+                        j += 1
+                i += 1
+
+        return sorted(regions, key=lambda r: (r.y1, r.x1))
+
+    def pop_regions(self):
+        """ Returns our merged regions and clears out the dirty list. """
+        regions = self.regions()
+        self.clear()
+        return regions
@@ -19,6 +19,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import logging
 
+from eschalon.constants import book_constants
 from eschalon.constants import constants as c
 from eschalon.savefile import FirstItemLoadException, LoadException
 
@@ -110,7 +111,7 @@ class Entity(object):
         self.direction = save_direction
         self.entscript = save_entscript
         if savegame:
-            entity = c.eschalondata.get_entity(self.entid)
+            entity = c.get_eschalondata(self.book).get_entity(self.entid)
             if entity:
                 self.friendly = entity.friendly
                 self.health = entity.health
@@ -152,14 +153,14 @@ class Entity(object):
 
         ret = []
 
-        entity = c.eschalondata.get_entity(self.entid)
+        entity = c.get_eschalondata(self.book).get_entity(self.entid)
         if entity:
             ret.append("\tEntity: %s" % entity.name)
         else:
             ret.append("\tEntity ID: %d" % self.entid)
         ret.append("\tMap Location: (%d, %d)" % (self.x, self.y))
-        if self.direction in c.dirtable:
-            ret.append("\tFacing %s" % (c.dirtable[self.direction]))
+        if self.direction in self.constants.dirtable:
+            ret.append("\tFacing %s" % (self.constants.dirtable[self.direction]))
         else:
             ret.append("\tDirection ID: %d" % self.direction)
         ret.append("\tScript: %s" % self.entscript)
@@ -171,8 +172,8 @@ class Entity(object):
             if self.book > 1:
                 for (i, status) in enumerate(self.statuses):
                     if status != 0:
-                        if i in c.statustable:
-                            statusstr = c.statustable[i]
+                        if i in self.constants.statustable:
+                            statusstr = self.constants.statustable[i]
                         else:
                             statusstr = 'Unknown Status "%d"' % i
                         ret.append("\t%s: %d" % (statusstr, status))
@@ -201,6 +202,7 @@ class B1Entity(Entity):
     """
 
     book = 1
+    constants = book_constants(1)
     form_elements = [
         'wall_01_label', 'wall_01',
         'wall_04_label', 'wall_04',
@@ -261,6 +263,7 @@ class B2Entity(Entity):
     """
 
     book = 2
+    constants = book_constants(2)
     num_statuses = 26
     form_elements = [
         'huge_gfx_button',
@@ -366,6 +369,7 @@ class B3Entity(B2Entity):
     """
 
     book = 3
+    constants = book_constants(3)
     num_statuses = 30
     form_elements = [
         'huge_gfx_button',
@@ -19,23 +19,50 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import base64
 import csv
-import glob
+import hashlib
 import io
 import logging
 import os
+import pickle
+import struct
+import sys
+import threading
 import zipfile
 from typing import Optional
 
 from Crypto.Cipher import AES
 
+from eschalon.constants import book_constants
 from eschalon.constants import constants as c
-from eschalon.savefile import LoadException
+from eschalon.map import Map
+from eschalon.savefile import LoadException, Savefile
+from eschalon.vfs import VFS, DatapakLayer, DirectoryLayer, stat_key
 
 LOG = logging.getLogger(__name__)
 
 
 fast_zipfile = True
 
+# Map headers we've already probed, keyed by where the map came from (see
+# EschalonData.get_mapinfo()).  This is module-wide so that it outlives any
+# one EschalonData object, which get recreated when the gamedir changes.
+_mapinfo_cache = {}
+
+
+def default_cache_dir():
+    """
+    Returns the directory we should use to cache data we've parsed out
+    of the game files, following the usual conventions for the platform.
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME',
+                              os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'eschalon_utils')
+
 
 class GoldRanges(object):
     """
@@ -48,13 +75,17 @@ class GoldRanges(object):
     Note that the Book III values haven't actually been experimentally verified.
     """
 
-    def __init__(self):
+    def __init__(self, book=None):
         """
         Initialize our empty fields.  "exact" is a dict used to match an
         exact amount of gold, of which a couple are valid.  "ranges" defines
         the ranges we know about, and "labels" are the labels which are
-        associated with those ranges.
+        associated with those ranges.  "book" defaults to the currently
+        selected book.
         """
+        if book is None:
+            book = c.book
+        self.book = book
         self.exact = {}
         self.ranges = []
         self.labels = []
@@ -78,7 +109,7 @@ class GoldRanges(object):
                     self.labels.append(parts[0])
                     if int(item_ranges[1]) > self.max_seen:
                         self.max_seen = int(item_ranges[1])
-        elif c.book == 2 and len(parts) == 2 and parts[1] == 'Gold':
+        elif self.book == 2 and len(parts) == 2 and parts[1] == 'Gold':
             # The ranges I observed experimentally turned out to be:
             #   Small: 16-35
             #   Medium: 76-125
@@ -108,7 +139,7 @@ class GoldRanges(object):
                     for (label, (begin, end)) in zip(self.labels, self.ranges):
                         if begin <= num_gold <= end:
                             # We found ourselves in a range we know about
-                            if c.book == 3:
+                            if self.book == 3:
                                 return '%s Gold (%d-%d)' % (label, begin, end)
                             else:
                                 return '%s Gold' % (label)
@@ -123,6 +154,103 @@ class GoldRanges(object):
         return item_name
 
 
+class SubstringMatcher(object):
+    """
+    Finds which of a set of keys appear as substrings in a given string,
+    using an Aho-Corasick automaton so that a lookup takes time
+    proportional to the length of the string, rather than to the number
+    of keys.  Used to map savegame weapon/armor names (which have a
+    material in front, like "Oak Longbow") back to their global names.
+
+    When more than one key matches, the value for whichever key was
+    added first wins, which is the same answer you'd get by looping
+    over a dict of the keys and returning the first substring match.
+    """
+
+    def __init__(self):
+        # Per-node: transitions, failure link, the (order, value) of the
+        # key ending at this node, and the earliest-added (order, value)
+        # of all the keys which end here once failure links are followed.
+        self.goto = [{}]
+        self.fail = [0]
+        self.own = [None]
+        self.out = [None]
+        self.num_keys = 0
+        self.built = True
+
+    def __len__(self):
+        return self.num_keys
+
+    def add(self, key, value):
+        """
+        Adds a key.  Re-adding an existing key replaces its value but
+        keeps its original position, like assigning to a dict.
+        """
+        node = 0
+        for char in key:
+            nextnode = self.goto[node].get(char)
+            if nextnode is None:
+                nextnode = len(self.goto)
+                self.goto[node][char] = nextnode
+                self.goto.append({})
+                self.fail.append(0)
+                self.own.append(None)
+                self.out.append(None)
+            node = nextnode
+        if self.own[node] is None:
+            self.own[node] = (self.num_keys, value)
+            self.num_keys += 1
+        else:
+            self.own[node] = (self.own[node][0], value)
+        self.built = False
+
+    def build(self):
+        """ Computes our failure links.  Called automatically by find(). """
+        if self.built:
+            return
+        self.out = list(self.own)
+        queue = list(self.goto[0].values())
+        for child in queue:
+            self.fail[child] = 0
+        idx = 0
+        while idx < len(queue):
+            node = queue[idx]
+            idx += 1
+            # Our failure node is shallower than we are, so it's already done
+            inherited = self.out[self.fail[node]]
+            if inherited is not None and (self.out[node] is None or inherited[0] < self.out[node][0]):
+                self.out[node] = inherited
+            for (char, child) in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                queue.append(child)
+        self.built = True
+
+    def find(self, text):
+        """
+        Returns the value of the earliest-added key which appears in text,
+        or None if there aren't any.
+        """
+        if not self.built:
+            self.build()
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        node = 0
+        best = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node] is not None and (best is None or out[node][0] < best[0]):
+                best = out[node]
+        if best is None:
+            return None
+        return best[1]
+
+
 class EntHelper(object):
     """
     Class to store data about our entities.  Basically just a glorified
@@ -148,6 +276,33 @@ class EntHelper(object):
         self.entscript = entscript
 
 
+class DatapakMember(object):
+    """
+    A file-like object for a single member of the datapak, as returned by
+    Datapak.open().  Hangs on to one of the datapak's pooled file handles
+    until it's closed.
+    """
+
+    def __init__(self, zipext, release):
+        self.zipext = zipext
+        self.release = release
+
+    def read(self, size=-1):
+        return self.zipext.read(size)
+
+    def close(self):
+        if self.release is not None:
+            self.zipext.close()
+            self.release()
+            self.release = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 class Datapak(object):
     """
     Class to handle the encrypted datapak file used in Books 2 and 3.
@@ -156,38 +311,152 @@ class Datapak(object):
     wouldn't actually prevent anyone from getting to the data, but I feel
     obligated to go through the motions regardless.  Hi there!  Note that I 
     *did* get BW's permission to access the graphics data this way.
+
+    The central directory is only parsed once, by our ZipFile object, but
+    members are read through a pool of our own file handles, so that
+    several threads can read from the datapak at once without stepping on
+    each other's file positions.  At most "pool_size" handles are ever
+    open; readers beyond that wait their turn.  "book" picks which book's
+    keys to use, defaulting to the currently selected book.
     """
 
-    def __init__(self, filename):
+    # Offsets into a zip local file header (see zipfile.structFileHeader)
+    FH_SIGNATURE = 0
+    FH_FILENAME_LENGTH = 10
+    FH_EXTRA_FIELD_LENGTH = 11
+
+    def __init__(self, filename, pool_size=None, book=None):
         self.filename = filename
+        if book is None:
+            constants = c.current()
+        else:
+            constants = book_constants(book)
 
         if not os.path.isfile(filename):
             raise LoadException('Datapak %s is not found' % (filename))
 
-        s = base64.urlsafe_b64decode(c.s)
-        d = base64.urlsafe_b64decode(c.d)
+        s = base64.urlsafe_b64decode(constants.s)
+        d = base64.urlsafe_b64decode(constants.d)
         iv = d[:16]
         self.aesenc = d[16:]
         self.aes = AES.new(s, AES.MODE_CBC, iv)
 
         plain = self.aes.decrypt(self.aesenc)
-        pad = ord(plain[-1])
+        pad = plain[-1]
         text = plain[:-pad]
 
         self.zipobj = zipfile.ZipFile(filename, 'r')
         self.zipobj.setpassword(text)
+        self.password = text
+
+        # Our pool of file handles
+        if pool_size is None:
+            pool_size = min(8, os.cpu_count() or 1)
+        self.pool_size = pool_size
+        self.pool_slots = threading.BoundedSemaphore(pool_size)
+        self.pool_lock = threading.Lock()
+        self.pool = []
+        self.pool_pid = os.getpid()
+        self.handles_opened = 0
+
+    def get_handle(self):
+        """
+        Returns a file handle on the datapak for our exclusive use, blocking
+        if the whole pool is already in use.  Give it back with
+        release_handle().
+        """
+        self.pool_slots.acquire()
+        try:
+            with self.pool_lock:
+                if self.pool_pid != os.getpid():
+                    # We've been forked, and file positions are shared
+                    # between processes, so start from scratch.
+                    for handle in self.pool:
+                        handle.close()
+                    self.pool = []
+                    self.pool_pid = os.getpid()
+                if len(self.pool) > 0:
+                    return self.pool.pop()
+                self.handles_opened += 1
+            return open(self.filename, 'rb')
+        except Exception:
+            self.pool_slots.release()
+            raise
+
+    def release_handle(self, handle):
+        with self.pool_lock:
+            self.pool.append(handle)
+        self.pool_slots.release()
+
+    def close(self):
+        """
+        Closes all our idle file handles.
+        """
+        with self.pool_lock:
+            for handle in self.pool:
+                handle.close()
+            self.pool = []
+        self.zipobj.close()
+
+    def getinfo(self, filename):
+        try:
+            return self.zipobj.getinfo(filename)
+        except KeyError:
+            raise LoadException(
+                'Filename %s not found in datapak' % (filename))
+
+    def open_member(self, handle, zinfo):
+        """
+        Opens the given member using the given file handle.  This is the
+        same thing ZipFile.open() does, but on a handle of our choosing
+        rather than the ZipFile's own.
+        """
+        handle.seek(zinfo.header_offset)
+        fheader = handle.read(zipfile.sizeFileHeader)
+        if len(fheader) != zipfile.sizeFileHeader:
+            raise LoadException('Truncated datapak entry %s' % (zinfo.filename))
+        fheader = struct.unpack(zipfile.structFileHeader, fheader)
+        if fheader[self.FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise LoadException('Bad datapak entry %s' % (zinfo.filename))
+        handle.seek(fheader[self.FH_FILENAME_LENGTH] + fheader[self.FH_EXTRA_FIELD_LENGTH], 1)
+        if zinfo.flag_bits & 0x1:
+            pwd = self.password
+        else:
+            pwd = None
+        return zipfile.ZipExtFile(handle, 'r', zinfo, pwd, False)
 
     def readfile(self, filename, directory='gfx'):
         """
         Reads a given filename from the given dir.  Can raise a LoadException
         if the file is not found
         """
-        filename = '%s/%s' % (directory, filename)
+        with self.open(filename, directory) as df:
+            return df.read()
+
+    def open(self, filename, directory='gfx'):
+        """
+        Opens a given filename from the given dir, returning a file-like
+        object which decrypts and inflates as it's read, rather than all
+        at once.  The object holds on to one of our pooled file handles,
+        so be sure to close it.  Can raise a LoadException if the file is
+        not found
+        """
+        zinfo = self.getinfo('%s/%s' % (directory, filename))
+        handle = self.get_handle()
         try:
-            return self.zipobj.read(filename)
-        except KeyError:
-            raise LoadException(
-                'Filename %s not found in datapak' % (filename))
+            zipext = self.open_member(handle, zinfo)
+        except Exception:
+            self.release_handle(handle)
+            raise
+        return DatapakMember(zipext, lambda: self.release_handle(handle))
+
+    def identity(self):
+        """
+        Returns something which identifies this particular datapak, which
+        will change if the datapak itself gets changed (by a game update,
+        say).  Suitable for use as a cache key.
+        """
+        return stat_key(self.filename)
 
     def filelist(self):
         """
@@ -209,6 +478,13 @@ class EschalonData(object):
 
     DATA_DIRS = ['data', 'gfx', 'maps', 'music', 'sound']
 
+    # Bump this whenever the structures saved by save_cache() change
+    CACHE_VERSION = 1
+
+    # Which book we hold data for; set by the book-specific subclasses
+    book: Optional[int] = None
+    constants = None
+
     empty_name: Optional[str] = None
     random_name: Optional[str] = None
 
@@ -223,19 +499,24 @@ class EschalonData(object):
         self.itemdict = None
         self.goldranges = None
         self.material_items = None
+        self.material_matcher = None
 
         # Entities
         self.entitytable = None
 
+        # Where to keep our parsed-data cache (see load_cache()).  Set to
+        # None to disable it.
+        self.cache_dir = default_cache_dir()
+
         # Our datapak object.  If this remains None, it means that we're
         # reading from the filesystem structure instead.
         self.datapak = None
 
         # Set our base gamedir.  This also does the work of actually
-        # finding out where our data is.
-        self.set_gamedir(gamedir)
-
+        # finding out where our data is, and setting up our VFS.
         self.modpath = modpath
+        self.vfs = None
+        self.set_gamedir(gamedir)
 
     def set_gamedir(self, gamedir: str):
         """
@@ -250,6 +531,10 @@ class EschalonData(object):
         we'll look for the datapak as usual, and complain if we can't
         use the AES module.
 
+        All our files are then read through a VFS, which layers the mod
+        (if we have one) over any loose data directories, over the
+        datapak.
+
         This can raise a LoadException if our necessary data isn't
         found.
         """
@@ -260,37 +545,47 @@ class EschalonData(object):
                 '"%s" is not a valid directory' % (self.gamedir))
 
         # Check to see if we have a local Eschalon data structure
-        found_dirs = True
-        for check_dir in self.DATA_DIRS:
-            if not os.path.isdir(os.path.join(self.gamedir, check_dir)):
-                found_dirs = False
+        found_dirs = [check_dir for check_dir in self.DATA_DIRS
+                      if os.path.isdir(os.path.join(self.gamedir, check_dir))]
 
-        if found_dirs:
+        if len(found_dirs) == len(self.DATA_DIRS):
             # We're using local directories
             self.datapak = None
         else:
             # We'll try loading the datapak
             datapak_file = os.path.join(self.gamedir, 'datapak')
             if os.path.isfile(datapak_file):
-                self.datapak = Datapak(datapak_file)
+                self.datapak = Datapak(datapak_file, book=self.book)
             else:
                 raise LoadException('Could not find datapak or gfx directory!')
 
+        layers = []
+        if self.modpath is not None:
+            # Mods keep their data files (just entities.csv, so far) at
+            # the top level
+            layers.append(DirectoryLayer(self.modpath, {'data': ''}))
+        if len(found_dirs) > 0:
+            layers.append(DirectoryLayer(self.gamedir,
+                                         dict([(found_dir, found_dir) for found_dir in found_dirs])))
+        if self.datapak is not None:
+            layers.append(DatapakLayer(self.datapak))
+        self.vfs = VFS(layers)
+
     def filelist(self):
         """
         Returns a list of all files available to us
         """
-        if self.datapak is None:
-            namelist = []
-            for directory in self.DATA_DIRS:
-                namelist = namelist + \
-                    glob.glob(os.path.join(self.gamedir, directory, '*'))
-            retlist = []
-            for filename in namelist:
-                retlist.append(os.path.relpath(filename, self.gamedir))
-            return retlist
-        else:
-            return self.datapak.filelist()
+        return self.vfs.filelist()
+
+    def listdir(self, directory, ext=None):
+        """
+        Returns a sorted list of the files available to us in the given
+        directory, optionally limited to those with the given extension.
+        Picks up any files which have been added or removed since we
+        last looked.
+        """
+        self.vfs.refresh()
+        return self.vfs.listdir(directory, ext)
 
     def readfile(self, filename, directory='gfx'):
         """
@@ -302,20 +597,45 @@ class EschalonData(object):
         This can raise a LoadException if the file is not found, or if other errors
         occur.
         """
-        if self.datapak is None:
-            to_open = os.path.join(self.gamedir, directory, filename)
-            if os.path.isfile(to_open):
-                try:
-                    with open(to_open, 'r') as df:
-                        return df.read()
-                except IOError as e:
-                    raise LoadException(
-                        'Filename %s could not be opened: %s' % (to_open, e))
-            else:
-                raise LoadException(
-                    'Filename %s could not be found' % (to_open))
-        else:
-            return self.datapak.readfile(filename, directory)
+        return self.vfs.readfile(filename, directory)
+
+    def open_file(self, filename, directory='gfx'):
+        """
+        Opens a given filename from the given dir and returns a binary
+        file-like object, which should be closed when done.  Unlike
+        readfile(), the data is only read in as-needed.
+
+        This can raise a LoadException if the file is not found.
+        """
+        return self.vfs.open(filename, directory)
+
+    def file_identity(self, filename, directory='gfx'):
+        """
+        Returns a key identifying the current contents of the given file,
+        for caching purposes.  Inside a datapak that's the datapak itself
+        plus the member name, otherwise it's the file's own path, size
+        and mtime.
+        """
+        return self.vfs.identity(filename, directory)
+
+    def get_mapinfo(self, filename):
+        """
+        Returns a tuple of the Eschalon Book and the internal map name of
+        the given map in our 'maps' dir, a la Map.get_mapinfo().  Only the
+        first few hundred bytes of the map are actually read, and the
+        results are cached, so this is cheap enough to call on every map
+        in the game.
+
+        This can raise a LoadException if the map can't be read.
+        """
+        key = self.file_identity(filename, 'maps')
+        if key not in _mapinfo_cache:
+            with self.open_file(filename, 'maps') as fh:
+                header = Map.read_header(fh)
+            (book, mapname, df) = Map.get_mapinfo(
+                map_df=Savefile(stringdata=header))
+            _mapinfo_cache[key] = (book, mapname)
+        return _mapinfo_cache[key]
 
     def get_filehandle(self, filename, directory='gfx'):
         """
@@ -323,7 +643,11 @@ class EschalonData(object):
         its data, using the cStringIO object.  Consequently, the returned filehandle
         will be read-only.  Calls self.readfile() to do most of our work.
         """
-        return io.StringIO(self.readfile(filename, directory))
+        data = self.readfile(filename, directory)
+        if isinstance(data, bytes):
+            # Datapak members come back as bytes
+            data = data.decode('UTF-8', 'replace')
+        return io.StringIO(data)
 
     def populate_datapak_info(self):
         """
@@ -335,10 +659,15 @@ class EschalonData(object):
             3) Savegame Weapon/Armor names which can be mapped back to
                base global item names.
         """
+        self.vfs.refresh()
+        if self.load_cache():
+            return
+
         self.itemlist = []
         self.itemdict = {}
-        self.goldranges = GoldRanges()
+        self.goldranges = GoldRanges(self.book)
         self.material_items = {}
+        self.material_matcher = SubstringMatcher()
         self.entitytable = {}
 
         # First load in all available information from general_items.csv
@@ -354,21 +683,27 @@ class EschalonData(object):
 
                 materialid = int(row['Material'])
                 if materialid == 1:
-                    for material in c.materials_wood:
+                    for material in self.constants.materials_wood:
                         self.material_items['%s %s' % (
                             material, row['DESCRIPTION'])] = row['DESCRIPTION']
                 elif materialid == 2:
-                    for material in c.materials_metal:
+                    for material in self.constants.materials_metal:
                         self.material_items['%s %s' % (
                             material, row['DESCRIPTION'])] = row['DESCRIPTION']
                 elif materialid == 3:
-                    for material in c.materials_fabric:
+                    for material in self.constants.materials_fabric:
                         self.material_items['%s %s' % (
                             material, row['DESCRIPTION'])] = row['DESCRIPTION']
             df.close()
         except:
             LOG.exception("Failed to load general_items.csv")
 
+        # Index the material names, so get_global_name() doesn't have to
+        # try every single one of them.
+        for (material_name, item_name) in self.material_items.items():
+            self.material_matcher.add(material_name, item_name)
+        self.material_matcher.build()
+
         # Add RANDOM/EMPTY to the list of valid names, if we actually
         # have data.
         if len(self.itemdict) > 0:
@@ -381,20 +716,77 @@ class EschalonData(object):
         self.itemlist = sorted(list(self.itemdict.keys()),
                                key=lambda s: s.lower())
 
-        # Now try to load in all available entity information
+        # Now try to load in all available entity information.  The game
+        # favors the first definition of any entity ID, so mod entities
+        # only add to the ones in the base game.
+        for layer in reversed(self.vfs.find_all('entities.csv', 'data')):
+            try:
+                df = io.StringIO(layer.readfile('data', 'entities.csv').decode('UTF-8', 'replace'))
+                self.read_entities(df)
+                df.close()
+            except:
+                LOG.exception('Failed to load entities.csv from %r' % (layer))
+
+        self.save_cache()
+
+    def get_cache_filename(self):
+        """
+        Returns the filename our parsed data should be cached in.  The name
+        is a fingerprint of everything the data depends on: the datapak (or
+        the CSV files, if we're reading from the filesystem), the mod's
+        entities.csv, and the book, since the material and gold handling
+        differ between books.
+        """
+        parts = [self.CACHE_VERSION, self.book, self.__class__.__name__]
+        for filename in ['general_items.csv', 'entities.csv']:
+            for layer in self.vfs.find_all(filename, 'data'):
+                parts.append(layer.identity('data', filename))
+        fingerprint = hashlib.sha1(repr(parts).encode('UTF-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'b%d-%s.cache' % (self.book, fingerprint))
+
+    def load_cache(self):
+        """
+        Loads the structures built by populate_datapak_info() from our
+        cache, if there's a cache matching our current data.  Returns True
+        if it was loaded, False otherwise.  A broken cache is just treated
+        as a missing one.
+        """
+        if self.cache_dir is None:
+            return False
         try:
-            df = self.get_filehandle('entities.csv', 'data')
-            self.read_entities(df)
-            df.close()
-        except:
-            pass
+            with open(self.get_cache_filename(), 'rb') as df:
+                (self.itemlist, self.itemdict, self.goldranges,
+                 self.material_items, self.material_matcher,
+                 self.entitytable) = pickle.load(df)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            LOG.exception('Could not read data cache, rebuilding')
+            return False
+        return True
+
+    def save_cache(self):
+        """
+        Saves the structures built by populate_datapak_info() to our cache.
+        The cache file is written under a temporary name and renamed into
+        place, so other processes never see a half-written one.  Failing to
+        write the cache isn't fatal.
+        """
+        if self.cache_dir is None or len(self.itemdict) == 0:
+            return
+        filename = self.get_cache_filename()
+        tmpname = '%s.%d' % (filename, os.getpid())
         try:
-            path = os.path.join(self.modpath, 'entities.csv')
-            df = open(path, 'r')
-            self.read_entities(df)
-            df.close()
-        except:
-            pass
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmpname, 'wb') as df:
+                pickle.dump((self.itemlist, self.itemdict, self.goldranges,
+                             self.material_items, self.material_matcher,
+                             self.entitytable), df, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, filename)
+        except (IOError, OSError) as e:
+            LOG.warning('Could not write data cache %s: %s' % (filename, e))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
 
     def read_entities(self, df):
         reader = csv.DictReader(df)
@@ -462,9 +854,9 @@ class EschalonData(object):
         elif item_name[:10] == 'Scroll of ':
             return item_name[10:]
         else:
-            for (key, val) in list(self.material_items.items()):
-                if key in item_name:
-                    return val
+            global_name = self.material_matcher.find(item_name)
+            if global_name is not None:
+                return global_name
             return item_name
 
     def get_entitytable(self):
@@ -510,6 +902,12 @@ class B1EschalonData(object):
     the main EschalonData class.
     """
 
+    book = 1
+    constants = book_constants(1)
+
+    # The directories we offer up through listdir()
+    DATA_DIRS = ['data', 'music', 'sound']
+
     def __init__(self, gamedir, modpath=None):
         """
         Initialization - just store our gamedir, primarily.
@@ -528,6 +926,17 @@ class B1EschalonData(object):
             raise LoadException(
                 '"%s" is not a valid directory' % (self.gamedir))
 
+        self.vfs = VFS([DirectoryLayer(self.gamedir,
+                                       dict([(data_dir, data_dir) for data_dir in self.DATA_DIRS]))])
+
+    def listdir(self, directory, ext=None):
+        """
+        Returns a sorted list of the files in the given directory,
+        optionally limited to those with the given extension.
+        """
+        self.vfs.refresh()
+        return self.vfs.listdir(directory, ext)
+
     def filelist(self):
         """
         Returns a list of all files available to us.  Not actually useful for Book 1,
@@ -677,6 +1086,8 @@ class B2EschalonData(EschalonData):
     """
     Book 2 specific Eschalon Data
     """
+    book = 2
+    constants = book_constants(2)
     empty_name = 'empty'
     random_name = 'random'
 
@@ -685,5 +1096,7 @@ class B3EschalonData(EschalonData):
     """
     Book 3 specific Eschalon Data
     """
+    book = 3
+    constants = book_constants(3)
     empty_name = 'EMPTY'
     random_name = 'RANDOM'
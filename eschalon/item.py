@@ -21,6 +21,7 @@
 import logging
 from typing import Any, List, Optional
 
+from eschalon.constants import book_constants
 from eschalon.constants import constants as c
 
 LOG = logging.getLogger(__name__)
@@ -116,8 +117,9 @@ class Item(object):
 
         if (not savegame and self.item_name != '' and
                 self.item_name.lower() != 'empty' and
-                self.item_name.lower() != 'random' and c.eschalondata):
-            self.item_name = c.eschalondata.get_global_name(self.item_name)
+                self.item_name.lower() != 'random' and
+                c.get_eschalondata(self.book)):
+            self.item_name = c.get_eschalondata(self.book).get_global_name(self.item_name)
 
     def equals(self, item):
         """
@@ -159,15 +161,15 @@ class Item(object):
             ret.append("\t(none)")
         else:
             ret.append("\t%s" % self.item_name)
-            if (self.category in c.categorytable):
-                #ret.append("\tCategory: %s (0x%04X)" % (c.categorytable[self.category], self.category))
-                ret.append("\tCategory: %s" % (c.categorytable[self.category]))
+            if (self.category in self.constants.categorytable):
+                #ret.append("\tCategory: %s (0x%04X)" % (self.constants.categorytable[self.category], self.category))
+                ret.append("\tCategory: %s" % (self.constants.categorytable[self.category]))
             else:
                 ret.append("\tCategory: 0x%08X" % (self.category))
             if (self.subcategory != 0):
-                if (self.subcategory in c.skilltable):
+                if (self.subcategory in self.constants.skilltable):
                     ret.append("\tSubcategory: %s" %
-                               (c.skilltable[self.subcategory]))
+                               (self.constants.skilltable[self.subcategory]))
                 else:
                     ret.append("\tSubcategory: 0x%08X" % (self.subcategory))
             if self.book == 1:
@@ -192,10 +194,10 @@ class Item(object):
             if self.book == 1:
                 if (self.attr_modified > 0):
                     ret.append("\tAttribute Modifier: +%d %s" %
-                               (self.attr_modifier, c.attrtable[self.attr_modified]))
+                               (self.attr_modifier, self.constants.attrtable[self.attr_modified]))
                 if (self.skill_modified > 0):
                     ret.append("\tSkill Modifier: +%d %s" %
-                               (self.skill_modifier, c.skilltable[self.skill_modified]))
+                               (self.skill_modifier, self.constants.skilltable[self.skill_modified]))
                 if (self.hitpoint > 0):
                     ret.append("\tSpecial: +%d Hit Points" % self.hitpoint)
                 if (self.mana > 0):
@@ -207,24 +209,24 @@ class Item(object):
                 if (self.armor > 0):
                     ret.append("\tSpecial: +%d Armor" % self.armor)
                 if (self.incr > 0):
-                    if (self.incr in c.itemincrtable):
+                    if (self.incr in self.constants.itemincrtable):
                         ret.append("\tSpecial: %s +20%%" %
-                                   c.itemincrtable[self.incr])
+                                   self.constants.itemincrtable[self.incr])
                     else:
                         ret.append("\tSpecial: 0x%08X" % self.incr)
                 if (self.flags > 0):
-                    if (self.flags in c.flagstable):
-                        ret.append("\tSpecial: %s" % c.flagstable[self.flags])
+                    if (self.flags in self.constants.flagstable):
+                        ret.append("\tSpecial: %s" % self.constants.flagstable[self.flags])
                     else:
                         ret.append("\tSpecial: 0x%08X" % self.flags)
             else:
-                if c.book == 1:
+                if self.book == 1:
                     for i in range(1, 4):
                         modified_var = self.__dict__['attr_modified_%d' % (i)]
                         modifier_var = self.__dict__['attr_modifier_%d' % (i)]
                         if modified_var > 0 or modifier_var > 0:
-                            if modified_var in c.itemeffecttable:
-                                modified_var = c.itemeffecttable[modified_var]
+                            if modified_var in self.constants.itemeffecttable:
+                                modified_var = self.constants.itemeffecttable[modified_var]
                             ret.append("\tSpecial (%d): +%d %s" %
                                        (i, modifier_var, modified_var))
                 else:
@@ -232,8 +234,8 @@ class Item(object):
                         modified_var = self.__dict__['bonus_value_%d' % (i)]
                         modifier_var = self.__dict__['bonus_%d' % (i)]
                         if modified_var != 0:
-                            if modifier_var in c.itemeffecttable:
-                                modifier_var = c.itemeffecttable[modifier_var]
+                            if modifier_var in self.constants.itemeffecttable:
+                                modifier_var = self.constants.itemeffecttable[modifier_var]
                             if modified_var > 0:
                                 operator = '+'
                             else:
@@ -282,6 +284,7 @@ class B1Item(Item):
     """
 
     book = 1
+    constants = book_constants(1)
     form_elements = ['item_b1_modifier_box',
                      'subcategory_label', 'subcategory',
                      'zero1_label', 'zero1',
@@ -452,6 +455,7 @@ class B2Item(Item):
     """
 
     book = 2
+    constants = book_constants(2)
     form_elements = ['item_b2_modifier_box',
                      'subcategory_label', 'subcategory',
                      'cur_hp_label', 'cur_hp',
@@ -612,3 +616,4 @@ class B3Item(B2Item):
     """
 
     book = 3
+    constants = book_constants(3)
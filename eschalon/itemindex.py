@@ -0,0 +1,414 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from eschalon.character import Character
+from eschalon.eschalondata import default_cache_dir
+from eschalon.map import Map
+from eschalon.merchant import Merchant
+from eschalon.savefile import LoadException, Savefile
+from eschalon.savename import Savename
+
+LOG = logging.getLogger(__name__)
+
+# The kinds of keys we index
+FIELDS = ['item', 'script', 'entity']
+
+SCRIPT_TOKEN = re.compile(r'\w+')
+
+
+def file_kind(filename):
+    """ Returns the kind of game file we think this is, or None. """
+    basename = os.path.basename(filename).lower()
+    if basename.endswith('.map'):
+        return 'map'
+    elif basename.endswith('.mer'):
+        return 'merchant'
+    elif basename == 'char':
+        return 'char'
+    return None
+
+
+def find_files(root):
+    """
+    Returns a sorted list of every map, merchant and character file
+    under root, as paths relative to root.
+    """
+    filenames = []
+    for (dirpath, dirnames, files) in os.walk(root):
+        dirnames.sort()
+        for filename in files:
+            if file_kind(filename) is not None:
+                filenames.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return sorted(filenames)
+
+
+def script_tokens(script):
+    """ The distinct (lowercased) words in a script, for indexing. """
+    return set([token.lower() for token in SCRIPT_TOKEN.findall(script)])
+
+
+def guess_book(filename, book=None):
+    """
+    Characters and merchants don't say which book they're from, but the
+    savename file in the same save slot does.  Falls back to "book",
+    which may be None.
+    """
+    savename = os.path.join(os.path.dirname(filename), 'savename')
+    if os.path.exists(savename):
+        try:
+            return Savename.load(savename).book
+        except LoadException:
+            pass
+    return book
+
+
+def item_postings(item, location):
+    """ Postings for a single item (which may be an empty slot). """
+    postings = []
+    if item.item_name != '':
+        postings.append(('item', item.item_name.lower(), location))
+    for token in script_tokens(item.script):
+        postings.append(('script', token, location))
+    return postings
+
+
+def map_postings(mapobj):
+    """
+    Postings for everything in a map: map scripts, the items and scripts
+    on tilecontents (with the tilecontent's description as the
+    container), and entity IDs and scripts.
+    """
+    postings = []
+    for attr in ['entrancescript', 'returnscript', 'exitscript']:
+        for token in script_tokens(getattr(mapobj, attr, '')):
+            postings.append(('script', token, {'what': attr}))
+    for tilecontent in mapobj.tilecontents:
+        location = {'x': tilecontent.x, 'y': tilecontent.y, 'container': tilecontent.description}
+        for token in script_tokens(tilecontent.script):
+            postings.append(('script', token, dict(location, what='tilecontent')))
+        for (idx, item) in enumerate(tilecontent.items):
+            postings.extend(item_postings(item, dict(location, what='item', index=idx)))
+    for entity in mapobj.entities:
+        location = {'x': entity.x, 'y': entity.y, 'what': 'entity'}
+        postings.append(('entity', str(entity.entid), location))
+        for token in script_tokens(entity.entscript):
+            postings.append(('script', token, location))
+    return postings
+
+
+def char_postings(char):
+    """ Postings for all of a character's equipped, inventory and ready items. """
+    postings = []
+    for (attr, value) in vars(char).items():
+        if attr == 'inventory':
+            for (row, items) in enumerate(value):
+                for (col, item) in enumerate(items):
+                    postings.extend(item_postings(item, {'what': attr, 'row': row, 'col': col}))
+        elif attr == 'readyitems':
+            for (idx, item) in enumerate(value):
+                postings.extend(item_postings(item, {'what': attr, 'index': idx}))
+        elif hasattr(value, 'item_name'):
+            postings.extend(item_postings(value, {'what': attr}))
+    return postings
+
+
+def merchant_postings(merchant):
+    postings = []
+    for (idx, item) in enumerate(merchant.items):
+        postings.extend(item_postings(item, {'what': 'merchant', 'index': idx}))
+    return postings
+
+
+def index_file(filename, book=None):
+    """
+    Reads a single game file and returns the list of (field, key,
+    location) postings found in it.  Maps are read without their tiles,
+    since there's nothing to index in there.  Raises LoadException if
+    the file can't be read.
+    """
+    kind = file_kind(filename)
+    if kind == 'map':
+        # Maps know which book they're from
+        mapobj = Map.load(filename)
+        mapobj.read(tiles=False)
+        return map_postings(mapobj)
+    book = guess_book(filename, book)
+    if kind == 'char':
+        char = Character.load(filename, book)
+        char.read()
+        return char_postings(char)
+    if book is None:
+        raise LoadException('Book version must be selected for merchant files')
+    merchant = Merchant(book)
+    merchant.read(Savefile(filename))
+    return merchant_postings(merchant)
+
+
+def index_job(root, relpath, book):
+    """ Worker wrapper around index_file(), which never raises. """
+    try:
+        return (relpath, index_file(os.path.join(root, relpath), book), None)
+    except (LoadException, IOError, ValueError, struct.error) as e:
+        return (relpath, [], str(e))
+
+
+class ItemIndex(object):
+    """
+    An on-disk inverted index of item names, script tokens and entity IDs,
+    across every map, character and merchant file under a root directory.
+
+    We keep the postings for each file alongside the size and mtime we
+    saw it at, so refresh() only has to re-read files which have changed.
+    The inverted index itself is rebuilt from those postings, which is
+    quick, and then everything gets pickled off to the index file so
+    queries don't need to touch the game files at all.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, root, index_file=None, book=None):
+        self.root = os.path.abspath(root)
+        if index_file is None:
+            index_file = self.default_index_file(self.root)
+        self.index_file = index_file
+        self.book = book
+        # relpath -> (size, mtime_ns, postings)
+        self.files = {}
+        # relpath -> error message, for files we couldn't read
+        self.errors = {}
+        # field -> key -> list of (relpath, location)
+        self.index = dict([(field, {}) for field in FIELDS])
+
+    @staticmethod
+    def default_index_file(root):
+        digest = hashlib.sha1(os.path.abspath(root).encode('UTF-8')).hexdigest()
+        return os.path.join(default_cache_dir(), 'itemindex-%s.index' % (digest))
+
+    def load(self):
+        """
+        Loads a previously-saved index, if there's a usable one.  Returns
+        True if it was loaded.
+        """
+        try:
+            with open(self.index_file, 'rb') as df:
+                (version, root, self.files, self.errors, self.index) = pickle.load(df)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            LOG.exception('Could not read item index, rebuilding')
+            return False
+        if version != self.INDEX_VERSION or root != self.root:
+            self.files = {}
+            self.errors = {}
+            self.index = dict([(field, {}) for field in FIELDS])
+            return False
+        return True
+
+    def save(self):
+        """ Writes out the index, by way of a temporary file. """
+        tmpname = '%s.%d' % (self.index_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+            with open(tmpname, 'wb') as df:
+                pickle.dump((self.INDEX_VERSION, self.root, self.files, self.errors, self.index),
+                            df, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, self.index_file)
+        except (IOError, OSError) as e:
+            LOG.warning('Could not write item index %s: %s' % (self.index_file, e))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def refresh(self, workers=None):
+        """
+        Brings the index up to date with what's on disk, re-reading only
+        the files which are new or whose size or mtime have changed, and
+        dropping files which have gone away.  Saves the index if anything
+        changed.  Returns a (changed, removed) tuple of relpath lists.
+        """
+        stats = {}
+        for relpath in find_files(self.root):
+            try:
+                stat = os.stat(os.path.join(self.root, relpath))
+            except OSError:
+                continue
+            stats[relpath] = (stat.st_size, stat.st_mtime_ns)
+        removed = sorted([relpath for relpath in self.files if relpath not in stats])
+        changed = sorted([relpath for (relpath, stat) in stats.items()
+                          if relpath not in self.files or self.files[relpath][:2] != stat])
+        if len(changed) == 0 and len(removed) == 0:
+            return (changed, removed)
+
+        for relpath in removed:
+            del self.files[relpath]
+            self.errors.pop(relpath, None)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(changed) <= 1:
+            results = [index_job(self.root, relpath, self.book) for relpath in changed]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(changed))) as executor:
+                futures = [executor.submit(index_job, self.root, relpath, self.book)
+                           for relpath in changed]
+                results = [future.result() for future in futures]
+        for (relpath, postings, error) in results:
+            self.files[relpath] = stats[relpath] + (postings,)
+            if error is None:
+                self.errors.pop(relpath, None)
+            else:
+                self.errors[relpath] = error
+
+        self.rebuild()
+        self.save()
+        return (changed, removed)
+
+    def rebuild(self):
+        """ Rebuilds the inverted index from our per-file postings. """
+        self.index = dict([(field, {}) for field in FIELDS])
+        for relpath in sorted(self.files):
+            for (field, key, location) in self.files[relpath][2]:
+                self.index[field].setdefault(key, []).append((relpath, location))
+
+    def query(self, field, key, contains=False, container=None):
+        """
+        Returns a list of hits for the given field ('item', 'script' or
+        'entity') and key, as dicts with the file and the location within
+        it.  Matching is case-insensitive; with "contains", any key which
+        contains the given text matches.  "container" limits hits to
+        those in a tilecontent whose description contains that text.
+        """
+        key = str(key).lower()
+        keys = self.index[field]
+        if contains:
+            matched = sorted([indexed for indexed in keys if key in indexed])
+        elif key in keys:
+            matched = [key]
+        else:
+            matched = []
+        if container is not None:
+            container = container.lower()
+        hits = []
+        for indexed in matched:
+            for (relpath, location) in keys[indexed]:
+                if container is not None and container not in location.get('container', '').lower():
+                    continue
+                hit = {'file': os.path.join(self.root, relpath), field: indexed}
+                hit.update(location)
+                hits.append(hit)
+        return hits
+
+    def files_matching(self, field, key, contains=False, container=None):
+        """ Like query(), but just returns the sorted list of matching files. """
+        return sorted(set([hit['file'] for hit in self.query(field, key, contains, container)]))
+
+
+def hit_text(field, hit):
+    parts = [hit['file']]
+    if 'x' in hit:
+        parts.append('(%d, %d)' % (hit['x'], hit['y']))
+    if hit.get('container'):
+        parts.append('in "%s"' % (hit['container']))
+    if 'row' in hit:
+        parts.append('%s row %d, col %d' % (hit['what'], hit['row'] + 1, hit['col'] + 1))
+    elif hit.get('what') not in [None, 'item', 'tilecontent', 'entity']:
+        parts.append(hit['what'])
+    parts.append('%s "%s"' % (field, hit[field]))
+    return ' '.join(parts)
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Search for items, script words and entity IDs across all the maps, characters and merchants under a directory')
+    parser.add_argument("root", type=str,
+                        help='Directory to index, such as a savegame or map directory')
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument("--item", type=str, help='Item name to look for')
+    query.add_argument("--script", type=str, help='Script word to look for')
+    query.add_argument("--entity", type=int, help='Entity ID to look for')
+    parser.add_argument("--contains", action="store_true",
+                        help='Match any item name or script word containing the text')
+    parser.add_argument("--in", dest="container", type=str,
+                        help='Only match items in containers with this text in their description')
+    parser.add_argument("--files", action="store_true",
+                        help='Only list the matching files')
+    parser.add_argument("--index", type=str, help='Index file to use')
+    parser.add_argument("--book", type=int, choices=[1, 2, 3],
+                        help='Book to assume for files which can\'t tell us')
+    parser.add_argument("--rebuild", action="store_true",
+                        help='Throw away the existing index first')
+    parser.add_argument("--format", choices=['text', 'json'], default='text')
+    parser.add_argument("--workers", type=int)
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Refreshes the index and runs the query, if any.  Returns 0 if there
+    were hits (or no query), 1 if there were none, and 2 if the root
+    doesn't exist.
+    """
+    args = parse_args(input)
+    if not os.path.isdir(args.root):
+        print('%s: error: not a directory' % (args.root), file=sys.stderr)
+        return 2
+    index = ItemIndex(args.root, args.index, args.book)
+    if not args.rebuild:
+        index.load()
+    (changed, removed) = index.refresh(args.workers)
+    LOG.info('Indexed %d changed files, dropped %d' % (len(changed), len(removed)))
+    for (relpath, error) in sorted(index.errors.items()):
+        LOG.warning('%s: %s' % (relpath, error))
+
+    for field in FIELDS:
+        key = getattr(args, field)
+        if key is not None:
+            break
+    else:
+        return 0
+
+    if args.files:
+        results = index.files_matching(field, key, args.contains, args.container)
+    else:
+        results = index.query(field, key, args.contains, args.container)
+    if args.format == 'json':
+        print(json.dumps(results, indent=2, sort_keys=True))
+    elif args.files:
+        for filename in results:
+            print(filename)
+    else:
+        for hit in results:
+            print(hit_text(field, hit))
+    if len(results) == 0:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
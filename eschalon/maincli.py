@@ -21,13 +21,72 @@ import logging
 from typing import Any, NoReturn
 
 from eschalon.character import Character
-from eschalon.constants import constants as c
 from eschalon.preferences import Prefs
 from eschalon.savefile import LoadException
 
 LOG = logging.getLogger(__name__)
 
 
+# How to describe each field which apply_changes() might touch
+CHANGE_FORMATS = {
+    'gold': 'Gold: %d',
+    'maxhp': 'Max HP: %d',
+    'curhp': 'Current HP: %d',
+    'maxmana': 'Max Mana: %d',
+    'curmana': 'Current Mana: %d',
+    'disease': 'Disease Flags: %04X',
+    'permstatuses': 'Permanent Status Flags: %08X',
+    'hunger': 'Hunger Level: %d%%',
+    'thirst': 'Thirst Level: %d%%',
+}
+
+
+def format_change(field, value):
+    if field in ['hunger', 'thirst']:
+        # These are stored in tenths of a percent
+        value = value / 10.0
+    return CHANGE_FORMATS[field] % (value)
+
+
+def apply_changes(char, options):
+    """
+    Applies the automated changes in "options" (a dict using the same
+    keys as our commandline args, so set_gold, rm_disease, etc) to the
+    given character.  Returns a list of the changes made, as dicts with
+    "field", "old" and "new" keys.  Resetting hunger is silently skipped
+    for Book 1 characters, which don't get hungry.
+    """
+    setters = [
+        ('set_gold', 'gold', char.setGold),
+        ('set_hp_max', 'maxhp', char.setMaxHp),
+        ('set_hp_cur', 'curhp', char.setCurHp),
+        ('set_mana_max', 'maxmana', char.setMaxMana),
+        ('set_mana_cur', 'curmana', char.setCurMana),
+    ]
+    changes = []
+
+    def track(fields, action):
+        old = [getattr(char, field) for field in fields]
+        action()
+        for (field, old_value) in zip(fields, old):
+            changes.append({'field': field, 'old': old_value, 'new': getattr(char, field)})
+
+    for (option, field, setter) in setters:
+        if options.get(option):
+            track([field], lambda: setter(options[option]))
+
+    if options.get('rm_disease'):
+        if char.book == 1:
+            track(['disease'], char.clearDiseases)
+        else:
+            track(['permstatuses'], char.clearDiseases)
+
+    if options.get('reset_hunger') and char.book > 1:
+        track(['hunger', 'thirst'], char.resetHunger)
+
+    return changes
+
+
 class MainCLI(object):
 
     def __init__(self, filename: str, prefs: object, req_book: int, args: Any) -> None:
@@ -53,51 +112,13 @@ class MainCLI(object):
         if self.args.list:
             return self.display(self.args.list, self.args.unknowns)
 
-        if self.args.set_gold:
-            print('Old Gold: %d' % char.gold)
-            char.setGold(self.args.set_gold)
-            print('New Gold: %d' % char.gold)
-
-        if self.args.set_hp_max:
-            print('Old Max HP: %d' % char.maxhp)
-            char.setMaxHp(self.args.set_hp_max)
-            print('New Max HP: %d' % char.maxhp)
-
-        if self.args.set_hp_cur:
-            print('Old Current HP: %d' % char.curhp)
-            char.setCurHp(self.args.set_hp_cur)
-            print('New Current HP: %d' % char.curhp)
-
-        if self.args.set_mana_max:
-            print('Old Max Mana: %d' % char.maxmana)
-            char.setMaxMana(self.args.set_mana_max)
-            print('New Max Mana: %d' % char.maxmana)
-
-        if self.args.set_mana_cur:
-            print('Old Current Mana: %d' % char.curmana)
-            char.setCurMana(self.args.set_mana_cur)
-            print('New Current Mana: %d' % char.curmana)
-
-        if self.args.rm_disease:
-            if char.book == 1:
-                print('Old Disease Flags: %04X' % char.disease)
-                char.clearDiseases()
-                print('New Disease Flags: %04X' % char.disease)
-            else:
-                print('Old Permanent Status Flags: %08X' % char.permstatuses)
-                char.clearDiseases()
-                print('New Permanent Status Flags: %08X' % char.permstatuses)
-
-        if self.args.reset_hunger:
-            if char.book == 1:
-                print(
-                    'Resetting hunger/thirst is only available for Book 2/3 characters')
-            else:
-                print('Old Hunger/Thirst Levels: %d%% / %d%%' %
-                      (char.hunger / 10.0, char.thirst / 10.0))
-                char.resetHunger()
-                print('New Hunger/Thirst Levels: %d%% / %d%%' %
-                      (char.hunger / 10.0, char.thirst / 10.0))
+        if self.args.reset_hunger and char.book == 1:
+            print(
+                'Resetting hunger/thirst is only available for Book 2/3 characters')
+
+        for change in apply_changes(char, vars(self.args)):
+            print('Old %s' % (format_change(change['field'], change['old'])))
+            print('New %s' % (format_change(change['field'], change['new'])))
 
         # If we've gotten here, write the file
         char.write()
@@ -111,20 +132,20 @@ class MainCLI(object):
                                             char.origin, char.axiom, char.classname))
         else:
             str = ['%s - Lvl %d' % (char.name, char.level)]
-            if char.gender in c.gendertable:
-                str.append(c.gendertable[char.gender])
+            if char.gender in char.constants.gendertable:
+                str.append(char.constants.gendertable[char.gender])
             else:
                 str.append('(gender %d)' % char.gender)
-            if char.origin in c.origintable:
-                str.append(c.origintable[char.origin])
+            if char.origin in char.constants.origintable:
+                str.append(char.constants.origintable[char.origin])
             else:
                 str.append('(origin %d)' % char.origin)
-            if char.axiom in c.axiomtable:
-                str.append(c.axiomtable[char.axiom])
+            if char.axiom in char.constants.axiomtable:
+                str.append(char.constants.axiomtable[char.axiom])
             else:
                 str.append('(axiom %d)' % char.axiom)
-            if char.classname in c.classtable:
-                str.append(c.classtable[char.classname])
+            if char.classname in char.constants.classtable:
+                str.append(char.constants.classtable[char.classname])
             else:
                 str.append('(class %d)' % char.classname)
             print(' '.join(str))
@@ -141,8 +162,8 @@ class MainCLI(object):
             else:
                 print("Profile Picture ID: %d" % char.picid)
         else:
-            if char.picid in c.picidtable:
-                print("Profile Picture: %s" % (c.picidtable[char.picid]))
+            if char.picid in char.constants.picidtable:
+                print("Profile Picture: %s" % (char.constants.picidtable[char.picid]))
             else:
                 print("Profile Picture ID: %d" % char.picid)
         print()
@@ -169,23 +190,23 @@ class MainCLI(object):
                     if char.statuses_extra[i] > 0:
                         extra = '  - extra (casting level): %d' % (
                             char.statuses_extra[i])
-                if i in c.statustable:
+                if i in char.constants.statustable:
                     print("\t* %s (Turns left: %d)%s" %
-                          (c.statustable[i], char.statuses[i], extra))
+                          (char.constants.statustable[i], char.statuses[i], extra))
                 else:
                     print("\t* Status %d (unknown) (Turns left: %d)%s" %
                           (i, char.statuses[i], extra))
         if char.book == 1:
-            for key in list(c.diseasetable.keys()):
+            for key in list(char.constants.diseasetable.keys()):
                 if char.disease & key == key:
-                    print("\t* Diseased: %s" % (c.diseasetable[key]))
+                    print("\t* Diseased: %s" % (char.constants.diseasetable[key]))
         print()
 
         if char.book > 1:
             print('"PERMANENT" CHARATER STATUS')
             print("---------------------------")
             print()
-            for (mask, text) in list(c.permstatustable.items()):
+            for (mask, text) in list(char.constants.permstatustable.items()):
                 if char.permstatuses & mask == mask:
                     print("\t* %s" % text)
             print()
@@ -193,9 +214,9 @@ class MainCLI(object):
         print("SKILLS")
         print("------")
         print()
-        for key in list(c.skilltable.keys()):
+        for key in list(char.constants.skilltable.keys()):
             if key in char.skills and char.skills[key] != 0:
-                print("\t%s: %d" % (c.skilltable[key], char.skills[key]))
+                print("\t%s: %d" % (char.constants.skilltable[key], char.skills[key]))
         print()
 
     def display_avatar_info(self, unknowns):
@@ -239,8 +260,8 @@ class MainCLI(object):
         print("-----------")
         print()
         print("X: %d  Y: %d" % (char.xpos, char.ypos))
-        if char.orientation in c.dirtable:
-            print("Facing: %s" % c.dirtable[char.orientation])
+        if char.orientation in char.constants.dirtable:
+            print("Facing: %s" % char.constants.dirtable[char.orientation])
         else:
             print("Facing: 0x%08X" % char.orientation)
         print()
@@ -254,7 +275,7 @@ class MainCLI(object):
         print()
         for i in range(len(char.spells)):
             if char.spells[i] == 1:
-                print("\t* %s - %s" % (c.spelltype[i], c.spelltable[i]))
+                print("\t* %s - %s" % (char.constants.spelltype[i], char.constants.spelltable[i]))
         print()
 
         print("READIED SPELLS")
@@ -299,7 +320,7 @@ class MainCLI(object):
             print()
             for (idx, recipe) in enumerate(char.alchemy_book):
                 if recipe > 0:
-                    print("\t* %s" % (c.alchemytable[idx]))
+                    print("\t* %s" % (char.constants.alchemytable[idx]))
             print()
 
     def display_equip(self, unknowns=False):
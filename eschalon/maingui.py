@@ -19,13 +19,15 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import bisect
 import glob
 import logging
 import os
+import threading
 from typing import Any, Dict, List
 
 import pygtkcompat
-from gi.repository import Gdk, GdkPixbuf, Gtk
+from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
 
 from eschalon import app_name, authors, url, version
 from eschalon.basegui import BaseGUI
@@ -36,7 +38,7 @@ from eschalon.eschalondata import EschalonData
 from eschalon.gfx import Gfx
 from eschalon.item import B1Item, B2Item, B3Item, Item
 from eschalon.savefile import LoadException
-from eschalon.saveslot import Saveslot
+from eschalon.saveslot import scan_slots
 
 LOG = logging.getLogger(__name__)
 
@@ -113,19 +115,11 @@ class CharLoaderDialog(Gtk.Dialog):
         notebook_align.add(self.open_notebook)
         self.vbox.pack_start(notebook_align, True, True)
 
-        # Loading from our save dir, first see if we have saves to load
+        # Loading from our save dir, first see if we have saves to load.  The
+        # slots themselves get loaded in the background (see add_slot()).
         slotdirs = glob.glob(os.path.join(savegame_dir, 'slot*'))
         self.slots = []
-        for slotdir in slotdirs:
-            try:
-                slot = Saveslot(slotdir, c.book)
-                slot.load_charname()
-                self.slots.append(slot)
-            except:
-                # If there's an error, just don't show the slot
-                pass
-        self.slots.sort()
-        if self.slots:
+        if slotdirs:
 
             # Savegame combobox/liststore
             self.save_dir_store = Gtk.ListStore(
@@ -152,14 +146,6 @@ class CharLoaderDialog(Gtk.Dialog):
             col.set_sort_column_id(self.COL_DATE_EPOCH)
             col.set_resizable(True)
             self.save_dir_tv.append_column(col)
-            for (idx, slot) in enumerate(self.slots):
-                self.save_dir_store.append((idx,
-                                            '<b>%s</b>' % (slot.slotname_short()),
-                                            slot.savename,
-                                            slot.charname,
-                                            slot.timestamp,
-                                            slot.timestamp_epoch,
-                                            slot.char_loc))
 
             save_dir_align = Gtk.Alignment.new(0, 0, 1, 1)
             save_dir_align.set_padding(5, 5, 5, 5)
@@ -225,6 +211,40 @@ class CharLoaderDialog(Gtk.Dialog):
             self.open_notebook.set_current_page(
                 self.source_index[self.SOURCE_SAVES])
 
+        # Now start loading in our save slots
+        if slotdirs:
+            self.scanning = True
+            self.connect('destroy', self.on_destroy_stop_scan)
+            threading.Thread(target=scan_slots, args=(savegame_dir,),
+                             kwargs={'book': c.book,
+                                     'charname': True,
+                                     'callback': lambda slot: GLib.idle_add(self.add_slot, slot)},
+                             daemon=True).start()
+
+    def on_destroy_stop_scan(self, widget):
+        self.scanning = False
+
+    def add_slot(self, slot):
+        """
+        Adds a newly-loaded save slot to our list, keeping the list in slot
+        order.  Called from the GTK main loop as our background scan comes
+        up with each slot.
+        """
+        if not self.scanning:
+            return False
+        pos = bisect.bisect(self.slots, slot)
+        self.slots.insert(pos, slot)
+        self.save_dir_store.insert(pos, (pos,
+                                         '<b>%s</b>' % (slot.slotname_short()),
+                                         slot.savename,
+                                         slot.charname,
+                                         slot.timestamp,
+                                         slot.timestamp_epoch,
+                                         slot.char_loc))
+        for (idx, row) in enumerate(self.save_dir_store):
+            row[self.COL_IDX] = idx
+        return False
+
     def register_page(self, source):
         """
         Sets up some dicts to map source-to-page, and vice-versa.
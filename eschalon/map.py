@@ -21,11 +21,16 @@ import logging
 import os
 import struct
 
+import numpy
+
+from eschalon.constants import book_constants
 from eschalon.constants import constants as c
 from eschalon.entity import Entity
+from eschalon.mapobjects import MapObjectList
 from eschalon.savefile import FirstItemLoadException, LoadException, Savefile
 from eschalon.tile import Tile
 from eschalon.tilecontent import Tilecontent
+from eschalon.undo import BulkUndoHistory
 
 LOG = logging.getLogger(__name__)
 
@@ -33,19 +38,27 @@ LOG = logging.getLogger(__name__)
 class BigGraphicMapping(object):
     """
     Class to hold some information about a Wall ID -> Big Graphic mapping.
-    Basically just an overglorified hash/tuple/whatever
+    Basically just an overglorified hash/tuple/whatever.  refcount is the
+    number of tiles on the map which currently use the mapping.
     """
 
-    def __init__(self, wallid, gfx, tile):
+    def __init__(self, wallid, gfx, tile, refcount=0):
         self.wallid = wallid
         self.gfx = gfx
         self.tile = tile
+        self.refcount = refcount
 
 
 class BigGraphicMappings(object):
     """
     Class to hold total information about Wall ID -> Big Graphic mappings,
     for a whole map.
+
+    After an initial load(), this is kept up to date one tile at a time
+    via update_tile(), which the map editor calls for every tile it
+    changes.  We keep an index of every tile which has anything to do with
+    Big Graphics, and which tiles use each Wall ID, so that a change only
+    requires re-checking the IDs involved in it, rather than the whole map.
     """
 
     def __init__(self, mapobj):
@@ -62,9 +75,23 @@ class BigGraphicMappings(object):
         """
         self.mappings = {}
         self.mappings_gfx = {}
-        self.last_error = ''
         self.cur_idx = 1000
 
+        # (x, y) -> (wallimg, gfx) for every tile which has anything to do
+        # with Big Graphics.  gfx is None unless the tile has a proper
+        # Big Graphic object.
+        self.tiles = {}
+
+        # Wall ID -> {(x, y): gfx}, for the tiles with proper objects
+        self.id_tiles = {}
+
+        # Big Graphic filename -> set of Wall IDs mapped to it
+        self.gfx_ids = {}
+
+        # Validation messages, as lists of ((x, y), message) tuples
+        self.tile_messages = {}
+        self.id_messages = {}
+
     def next_index(self):
         """
         Updates our cur_idx counter to the next-available ID.  This might
@@ -83,22 +110,25 @@ class BigGraphicMappings(object):
         notified.
         """
         self.reset()
+        affected = set()
+        for row in self.mapobj.tiles:
+            for tile in row:
+                if tile.wallimg >= 1000 or tile.tilecontentid == 21:
+                    affected.update(self.update_tile(tile, validate=False))
+        for wallid in affected:
+            self.validate_id(wallid)
+        return self.get_messages()
+
+    def get_messages(self):
+        """
+        Returns our current list of messages to the user, in map order.
+        """
         messages = []
-        for (y, row) in enumerate(self.mapobj.tiles):
-            for (x, tile) in enumerate(row):
-                if tile.wallimg >= 1000 and tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
-                    if tile.wallimg > 1003:
-                        messages.append('Tile (%d, %d) is using a Big Graphic Wall ID of %d, but the maximum is 1003' % (
-                            x, y, tile.wallimg))
-                    if not self.update(tile):
-                        messages.append(self.last_error)
-                elif tile.wallimg >= 1000 and (tile.tilecontentid != 21 or len(tile.tilecontents) == 0):
-                    messages.append(
-                        'Tile (%d, %d) is using a Big Graphic Wall ID without a proper Big Graphic object' % (x, y))
-                elif tile.wallimg < 1000 and tile.tilecontentid == 21:
-                    messages.append(
-                        'Tile (%d, %d) is using a Big Graphic Object, but its Wall ID is not a Big Graphic ID' % (x, y))
-        return messages
+        for (order, msglists) in enumerate([self.tile_messages.values(), self.id_messages.values()]):
+            for msglist in msglists:
+                for ((x, y), message) in msglist:
+                    messages.append((y, x, order, message))
+        return [message[3] for message in sorted(messages)]
 
     def get_id(self, gfx, x, y):
         """
@@ -112,45 +142,119 @@ class BigGraphicMappings(object):
             mapping = BigGraphicMapping(self.next_index(), gfx, (x, y))
             self.mappings[mapping.wallid] = mapping
             self.mappings_gfx[gfx] = mapping
+            self.gfx_ids.setdefault(gfx, set()).add(mapping.wallid)
             return mapping.wallid
 
-    def update(self, tile):
+    def update_tile(self, tile, validate=True):
         """
-        Given a tile, add or update our mapping information. Returns False if
-        there has been a mismatch of some sort, or True otherwise.  Sets the
-        internal var last_error as a message to the user if there's been an error.
+        Given a tile which may have changed, update our index and messages
+        for it.  Unless told otherwise, the mappings for any Wall IDs which
+        the tile used to use (or uses now) are re-validated.  Returns the
+        set of those IDs.
         """
-        new_gfx = tile.tilecontents[0].extratext
-        if tile.wallimg in self.mappings:
-            cur_mapping = self.mappings[tile.wallimg]
-            if cur_mapping.gfx != new_gfx:
-                self.last_error = 'Big Graphic ID %d is used by more than one graphic - at (%d, %d) it is %s, and at (%d, %d) it is %s' % (
-                    tile.wallimg, cur_mapping.tile[0], cur_mapping.tile[1], cur_mapping.gfx, tile.x, tile.y, new_gfx)
-                return False
+        coords = (tile.x, tile.y)
+        affected = set()
+
+        # Forget about whatever was here before
+        old = self.tiles.pop(coords, None)
+        self.tile_messages.pop(coords, None)
+        if old is not None and old[1] is not None:
+            del self.id_tiles[old[0]][coords]
+            affected.add(old[0])
+
+        # ... and figure out what's here now
+        messages = []
+        if tile.wallimg >= 1000 and tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
+            gfx = tile.tilecontents[0].extratext
+            if tile.wallimg > 1003:
+                messages.append('Tile (%d, %d) is using a Big Graphic Wall ID of %d, but the maximum is 1003' % (
+                    tile.x, tile.y, tile.wallimg))
+            self.tiles[coords] = (tile.wallimg, gfx)
+            self.id_tiles.setdefault(tile.wallimg, {})[coords] = gfx
+            affected.add(tile.wallimg)
+        elif tile.wallimg >= 1000:
+            messages.append(
+                'Tile (%d, %d) is using a Big Graphic Wall ID without a proper Big Graphic object' % (tile.x, tile.y))
+            self.tiles[coords] = (tile.wallimg, None)
+        elif tile.tilecontentid == 21:
+            messages.append(
+                'Tile (%d, %d) is using a Big Graphic Object, but its Wall ID is not a Big Graphic ID' % (tile.x, tile.y))
+            self.tiles[coords] = (tile.wallimg, None)
+        if len(messages) > 0:
+            self.tile_messages[coords] = [(coords, message) for message in messages]
+
+        if validate:
+            for wallid in affected:
+                self.validate_id(wallid)
+        return affected
+
+    def validate_id(self, wallid):
+        """
+        Rebuilds the mapping for a single Wall ID from the tiles which use
+        it.  As with a full scan of the map, the first tile using the ID
+        (top to bottom, left to right) determines which graphic it's mapped
+        to, and any other tiles using it with a different graphic are errors.
+        """
+        old_mapping = self.mappings.pop(wallid, None)
+        self.id_messages.pop(wallid, None)
+        if old_mapping is not None:
+            self.gfx_ids[old_mapping.gfx].discard(wallid)
+            self.update_gfx(old_mapping.gfx)
+
+        tiles = self.id_tiles.get(wallid)
+        if not tiles:
+            self.id_tiles.pop(wallid, None)
+            return
+
+        ordered = sorted(tiles, key=lambda coords: (coords[1], coords[0]))
+        first = ordered[0]
+        gfx = tiles[first]
+        self.mappings[wallid] = BigGraphicMapping(wallid, gfx, first, len(tiles))
+        self.gfx_ids.setdefault(gfx, set()).add(wallid)
+        self.update_gfx(gfx)
+
+        messages = []
+        for coords in ordered[1:]:
+            if tiles[coords] != gfx:
+                messages.append((coords, 'Big Graphic ID %d is used by more than one graphic - at (%d, %d) it is %s, and at (%d, %d) it is %s' % (
+                    wallid, first[0], first[1], gfx, coords[0], coords[1], tiles[coords])))
+        if len(messages) > 0:
+            self.id_messages[wallid] = messages
+
+    def update_gfx(self, gfx):
+        """
+        Updates which mapping we report for the given graphic.  Note that we're not
+        complaining if there are collisions in mappings_gfx.  The engine doesn't care
+        if the same Big Graphic gets used by more than one ID, so we won't care either;
+        we just use the lowest ID.
+        """
+        wallids = self.gfx_ids.get(gfx)
+        if wallids:
+            self.mappings_gfx[gfx] = self.mappings[min(wallids)]
         else:
-            self.mappings[tile.wallimg] = BigGraphicMapping(
-                tile.wallimg, new_gfx, (tile.x, tile.y))
-            # Note that we're not checking to see if there are collisions in mappings_gfx.  The engine
-            # doesn't care if the same Big Graphic gets used by more than one ID, so we won't care
-            # either.
-            self.mappings_gfx[new_gfx] = self.mappings[tile.wallimg]
-        return True
+            self.gfx_ids.pop(gfx, None)
+            self.mappings_gfx.pop(gfx, None)
 
     def fix(self):
         """
-        Loops through our map object and fixes/normalizes the Big Graphics ID mismatches
+        Loops through our Big Graphic tiles and fixes/normalizes the ID mismatches
         we can find.  Note that this will renumber all the objects.  This will be based
         on the Big Graphic object filenames, not the wall IDs on the map currently.
         """
+        coords_list = sorted(self.tiles, key=lambda coords: (coords[1], coords[0]))
         self.reset()
-        for (y, row) in enumerate(self.mapobj.tiles):
-            for (x, tile) in enumerate(row):
-                if tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
-                    gfx = tile.tilecontents[0].extratext
-                    wallimg = self.get_id(gfx, x, y)
-                    tile.wallimg = wallimg
-                    tile.tilecontents[0].description = 'Big Graphic Object #%04d' % (
-                        wallimg)
+        affected = set()
+        for (x, y) in coords_list:
+            tile = self.mapobj.tiles[y][x]
+            if tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
+                gfx = tile.tilecontents[0].extratext
+                wallimg = self.get_id(gfx, x, y)
+                tile.wallimg = wallimg
+                tile.tilecontents[0].description = 'Big Graphic Object #%04d' % (
+                    wallimg)
+            affected.update(self.update_tile(tile, validate=False))
+        for wallid in affected:
+            self.validate_id(wallid)
 
     def get_gfx_mappings(self):
         """
@@ -195,6 +299,23 @@ class Map(object):
         DIR_NW: (0, -1), DIR_NE: (1, -1),
         DIR_SE: (1, 1), DIR_SW: (0, 1)}
 
+    # The above, merged and indexed by row parity (y % 2)
+    DELTA_TO_DIRECTIONS_PARITY = [
+        dict(list(DELTA_TO_DIRECTIONS.items()) +
+             list(DELTA_TO_DIRECTIONS_EVEN.items())),
+        dict(list(DELTA_TO_DIRECTIONS.items()) +
+             list(DELTA_TO_DIRECTIONS_ODD.items()))]
+    DIRECTIONS_TO_DELTA_PARITY = [
+        dict(list(DIRECTIONS_TO_DELTA.items()) +
+             list(DIRECTIONS_TO_DELTA_EVEN.items())),
+        dict(list(DIRECTIONS_TO_DELTA.items()) +
+             list(DIRECTIONS_TO_DELTA_ODD.items()))]
+
+    # Lookup tables for coords_relative() and directions_between_coords(),
+    # built on demand.  See neighbor_tables() and find_route().
+    _neighbor_tables = None
+    _routes = {}
+
     def __init__(self, df, ent_df):
         """
         A fresh object.
@@ -229,14 +350,20 @@ class Map(object):
         self.cursqcol = 0
         self.cursqrow = 0
 
+        # Where the tile data starts in our file, once we've been read
+        self.tiles_offset = None
+
         self.tiles = []
         for i in range(200):
             self.tiles.append([])
             for j in range(100):
-                self.tiles[i].append(Tile.new(c.book, j, i))
+                self.tiles[i].append(Tile.new(self.book, j, i))
 
-        self.tilecontents = []
-        self.entities = []
+        self.tilecontents = MapObjectList()
+        self.entities = MapObjectList()
+
+        # Entities discarded while loading because their tile already had one
+        self.duplicate_entities = []
 
         self.df = df
         if ent_df is None:
@@ -376,6 +503,20 @@ class Map(object):
             for tile in row:
                 tile.savegame = savegame
 
+    def read_tiles(self, tiles=True):
+        """
+        Reads in all our tiles, or if "tiles" is False, just seeks past
+        them.  Tiles are all the same size (given the book and savegame
+        state), so that's cheap.
+        """
+        self.set_tile_savegame()
+        self.tiles_offset = self.df.tell()
+        if tiles:
+            for i in range(200 * 100):
+                self.addtile()
+        else:
+            self.df.seek(200 * 100 * self.tiles[0][0].record_size(), 1)
+
     def addtile(self):
         """ Add a new tile, assuming that the tiles are stored in a
             left-to-right, top-to-bottom format in the map. """
@@ -388,7 +529,7 @@ class Map(object):
     def addtilecontent(self):
         """ Add a tilecontent. """
         try:
-            tilecontent = Tilecontent.new(c.book, self.is_savegame())
+            tilecontent = Tilecontent.new(self.book, self.is_savegame())
             tilecontent.read(self.df)
             # Note that once we start deleting tilecontents, you'll have to update both constructs here.
             # Something along the lines of this should do:
@@ -415,12 +556,14 @@ class Map(object):
     def addentity(self):
         """ Add an entity. """
         try:
-            entity = Entity.new(c.book, self.is_savegame())
+            entity = Entity.new(self.book, self.is_savegame())
             entity.read(self.df_ent)
-            if self.tiles[entity.y][entity.x].entity is not None:
+            if (0 <= entity.x < 100 and 0 <= entity.y < 200 and
+                    self.tiles[entity.y][entity.x].entity is not None):
                 # TODO: Support this better, perhaps?
                 LOG.warn(
                     'Two entities on a single tile, discarding all but the original')
+                self.duplicate_entities.append(entity)
             else:
                 self.entities.append(entity)
                 if 0 <= entity.x < 100 and 0 <= entity.y < 200:
@@ -440,67 +583,41 @@ class Map(object):
     def rgb_color(self):
         return (self.color_r << 24) + (self.color_g << 16) + (self.color_b << 8) + 0xFF
 
+    @staticmethod
+    def neighbor_tables():
+        """
+        Returns a dict of neighbor tables, keyed by direction.  Each table
+        is a flat list indexed by (y * 100) + x, holding the coordinates of
+        the tile in that direction, or None if that would be off the map.
+        These are only built once, the first time anything asks for them.
+        """
+        if Map._neighbor_tables is None:
+            coords = [(x, y) for y in range(200) for x in range(100)]
+            tables = {}
+            for dir in Map.DIRECTIONS_TO_DELTA_PARITY[0]:
+                if dir == Map.DIR_NO_CHANGE:
+                    continue
+                table = []
+                for (x, y) in coords:
+                    (xdiff, ydiff) = Map.DIRECTIONS_TO_DELTA_PARITY[y % 2][dir]
+                    (newx, newy) = (x + xdiff, y + ydiff)
+                    if 0 <= newx < 100 and 0 <= newy < 200:
+                        table.append(coords[newy * 100 + newx])
+                    else:
+                        table.append(None)
+                tables[dir] = table
+            Map._neighbor_tables = tables
+        return Map._neighbor_tables
+
     def coords_relative(self, x, y, dir):
         """
         Static method to return coordinates for the tile
         relative to the given coords.  1 = N, 2 = NE, etc
         """
-        if dir == self.DIR_N:
-            if y < 2:
-                return None
-            else:
-                return x, y - 2
-        elif dir == self.DIR_NE:
-            if (y % 2) == 0:
-                if y > 0:
-                    return x, y - 1
-                else:
-                    return None
-            elif x < 99:
-                return x + 1, y - 1
-            else:
-                return None
-        elif dir == self.DIR_E:
-            if x < 99:
-                return x + 1, y
-            else:
-                return None
-        elif dir == self.DIR_SE:
-            if (y % 2) == 0:
-                return x, y + 1
-            elif x < 99 and y < 199:
-                return x + 1, y + 1
-            else:
-                return None
-        elif dir == self.DIR_S:
-            if y < 198:
-                return x, y + 2
-            else:
-                return None
-        elif dir == self.DIR_SW:
-            if (y % 2) == 1:
-                if y < 199:
-                    return x, y + 1
-                else:
-                    return None
-            elif x > 0:
-                return x - 1, y + 1
-            else:
-                return None
-        elif dir == self.DIR_W:
-            if x > 0:
-                return x - 1, y
-            else:
-                return None
-        elif dir == self.DIR_NW:
-            if (y % 2) == 1:
-                return x, y - 1
-            elif y > 0 and x > 0:
-                return x - 1, y - 1
-            else:
-                return None
-        else:
+        table = self.neighbor_tables().get(dir)
+        if table is None or not (0 <= x < 100 and 0 <= y < 200):
             return None
+        return table[y * 100 + x]
 
     def tile_relative(self, x, y, dir):
         """ Returns a tile object relative to the given coords. """
@@ -510,6 +627,118 @@ class Map(object):
         else:
             return None
 
+    def get_tile_array(self, attr):
+        """
+        Returns a numpy array (indexed [y, x]) of the given attribute
+        across all our tiles.
+        """
+        return numpy.array([[getattr(tile, attr) for tile in row] for row in self.tiles],
+                           dtype=numpy.int32)
+
+    def region_rect(self, x1, y1, x2, y2):
+        """
+        Returns a boolean mask of the tiles inside the given rectangle of
+        map coordinates (inclusive on both ends).
+        """
+        mask = numpy.zeros((len(self.tiles), len(self.tiles[0])), dtype=bool)
+        mask[max(0, min(y1, y2)):max(y1, y2) + 1,
+             max(0, min(x1, x2)):max(x1, x2) + 1] = True
+        return mask
+
+    def region_polygon(self, points):
+        """
+        Returns a boolean mask of the tiles whose centers fall inside the
+        polygon described by the given list of (x, y) tile coordinates.
+        Since odd rows are shifted over by half a tile, and rows are only
+        half a tile apart, we test everything in "onscreen" proportions
+        rather than raw map coordinates, so that polygons look like they
+        should on the map.
+        """
+        (ys, xs) = numpy.indices((len(self.tiles), len(self.tiles[0])))
+        px = xs + (ys % 2) * 0.5
+        py = ys * 0.5
+        mask = numpy.zeros(px.shape, dtype=bool)
+        verts = [(x + (y % 2) * 0.5, y * 0.5) for (x, y) in points]
+        for (i, (vx1, vy1)) in enumerate(verts):
+            (vx2, vy2) = verts[i - 1]
+            if vy1 == vy2:
+                continue
+            # Standard even-odd ray casting, for all tiles at once
+            crosses = ((vy1 > py) != (vy2 > py))
+            xcross = (vx2 - vx1) * (py - vy1) / (vy2 - vy1) + vx1
+            mask ^= crosses & (px < xcross)
+        for (x, y) in points:
+            if 0 <= y < len(self.tiles) and 0 <= x < len(self.tiles[0]):
+                mask[y, x] = True
+        return mask
+
+    def region_flood(self, x, y, attr='floorimg', values=None):
+        """
+        Returns a boolean mask of the connected area around the given tile
+        which has the same value of attr (from the optional values array,
+        as returned by get_tile_array(), if we already have it).  Tiles are
+        connected when they share an edge, which on our isometric grid means
+        the NE/SE/SW/NW neighbors.  The area is grown one step at a time
+        across the whole map at once, rather than tile-by-tile.
+        """
+        if values is None:
+            values = self.get_tile_array(attr)
+        candidate = (values == values[y, x])
+        even = (numpy.arange(values.shape[0]) % 2 == 0)[:, numpy.newaxis]
+        mask = numpy.zeros(values.shape, dtype=bool)
+        mask[y, x] = True
+        while True:
+            # Same column in the rows above and below...
+            vert = numpy.zeros(mask.shape, dtype=bool)
+            vert[1:] |= mask[:-1]
+            vert[:-1] |= mask[1:]
+            # ... and then one column over, depending on which way
+            # the row is shifted.
+            left = numpy.zeros(mask.shape, dtype=bool)
+            left[:, 1:] = vert[:, :-1]
+            right = numpy.zeros(mask.shape, dtype=bool)
+            right[:, :-1] = vert[:, 1:]
+            grown = (mask | vert | numpy.where(even, left, right)) & candidate
+            if numpy.array_equal(grown, mask):
+                return mask
+            mask = grown
+
+    def fill(self, attr, value, mask=None, pool=None, overwrite=True, rng=None, text='Fill'):
+        """
+        Sets attr on every tile in mask (a boolean array, as returned by the
+        region_*() methods; defaults to the whole map) to value.  If pool is
+        a sequence with more than one entry, values are picked at random from
+        it instead (see SmartDraw.get_random_terrain_pool()).  If overwrite
+        is False, only tiles whose current value is zero are touched.
+
+        Returns an undo.BulkUndoHistory describing the change, or None if
+        nothing actually changed.
+        """
+        current = self.get_tile_array(attr)
+        if mask is None:
+            mask = numpy.ones(current.shape, dtype=bool)
+        else:
+            mask = mask.copy()
+        if not overwrite:
+            mask &= (current == 0)
+        (ys, xs) = numpy.nonzero(mask)
+        if pool is not None and len(pool) > 1:
+            if rng is None:
+                rng = numpy.random.default_rng()
+            new = rng.choice(numpy.array(pool, dtype=numpy.int32), size=len(ys))
+        else:
+            new = numpy.full(len(ys), value, dtype=numpy.int32)
+
+        # Only keep the tiles which are actually changing
+        old = current[ys, xs]
+        changed = (old != new)
+        if not changed.any():
+            return None
+        history = BulkUndoHistory(attr, xs[changed], ys[changed],
+                                  old[changed], new[changed], text)
+        history.redo(self)
+        return history
+
     def _convert_savegame(self, savegame):
         """
         Does the grunt work of converting ourself to a savegame or global
@@ -565,7 +794,7 @@ class Map(object):
             2) Tile Y
             3) Item Name
         """
-        itemdict = c.eschalondata.get_itemdict()
+        itemdict = c.get_eschalondata(self.book).get_itemdict()
         invalid_items = []
         for itemtuple in self.get_item_names():
             itemname = itemtuple[2]
@@ -587,13 +816,10 @@ class Map(object):
         else:
             df = map_df
         if book == 1:
-            c.switch_to_book(1)
             return B1Map(df, ent_df)
         elif book == 2:
-            c.switch_to_book(2)
             return B2Map(df, ent_df)
         elif book == 3:
-            c.switch_to_book(3)
             return B3Map(df, ent_df)
         else:
             raise LoadException('Unknown book version specified: %d' % book)
@@ -632,7 +858,7 @@ class Map(object):
         try:
             df.open_r()
             for i in range(9):
-                stringlist.append(df.readstr())
+                stringlist.append(df.readstr().decode('UTF-8', 'replace'))
             nextbyte = df.readuchar()
             df.close()
         except (IOError, struct.error) as e:
@@ -654,6 +880,33 @@ class Map(object):
 
         return detected_book, detected_mapname, df
 
+    @staticmethod
+    def read_header(fh, chunksize=256):
+        """
+        Reads just enough from the start of the given binary file-like
+        object for get_mapinfo() to work with (nine strings and a byte), and
+        returns those bytes.  That way we can identify maps inside the
+        datapak without having to decrypt and inflate the whole thing.  If
+        we run out of data first, we return what we've got, and
+        get_mapinfo() will complain about it.
+        """
+        data = b''
+        start = 0
+        found = 0
+        while True:
+            chunk = fh.read(chunksize)
+            if not chunk:
+                return data
+            data += chunk
+            while found < 9:
+                idx = data.find(b"\r\n", start)
+                if idx == -1:
+                    break
+                found += 1
+                start = idx + 2
+            if found == 9 and len(data) > start:
+                return data[:start + 1]
+
     @staticmethod
     def load(filename, req_book=None):
         """
@@ -681,13 +934,10 @@ class Map(object):
 
         # Now actually return the object
         if detected_book == 1:
-            c.switch_to_book(1)
             return B1Map(df)
         elif detected_book == 2:
-            c.switch_to_book(2)
             return B2Map(df)
         elif detected_book == 3:
-            c.switch_to_book(3)
             return B3Map(df)
         else:
             raise LoadException(
@@ -696,54 +946,72 @@ class Map(object):
     # Find directions from one coordinate set to another
     @staticmethod
     def directions_between_coords(x1, y1, x2, y2):
-        if y1 % 2 == 0:
-            map = dict(list(Map.DELTA_TO_DIRECTIONS.items()) +
-                       list(Map.DELTA_TO_DIRECTIONS_EVEN.items()))
-        else:
-            map = dict(list(Map.DELTA_TO_DIRECTIONS.items()) +
-                       list(Map.DELTA_TO_DIRECTIONS_ODD.items()))
-
-        xdiff = x2 - x1
-        ydiff = y2 - y1
+        """
+        Returns a list of directions which lead from (x1, y1) to (x2, y2).
+        The route only depends on the parity of the starting row and the
+        distance to travel, so routes are cached on that basis (copy drags
+        ask for the same short routes over and over).
+        """
+        key = (y1 % 2, x2 - x1, y2 - y1)
+        if key not in Map._routes:
+            Map._routes[key] = Map.find_route(*key)
+        return list(Map._routes[key])
 
-        # Base case - adjacent tile
-        if (xdiff, ydiff) in map:
-            if map[(xdiff, ydiff)] == 0:
-                return []
+    @staticmethod
+    def find_route(parity, xdiff, ydiff, strict=False):
+        """
+        Figures out the directions needed to travel by (xdiff, ydiff) from a
+        row of the given parity.  At each step we just take the first direction
+        which doesn't take us further away on either axis.  Looping through
+        cardinal directions first produces shorter lists of directions.
+
+        That rule can bounce between N and S forever when we're one row away
+        but not yet adjacent, so if we notice that happening we start over,
+        only taking directions which actually get us closer.
+        """
+        directions = []
+        seen = set()
+        orig = (parity, xdiff, ydiff)
+        while True:
+            deltas = Map.DELTA_TO_DIRECTIONS_PARITY[parity]
+
+            # Base case - adjacent tile
+            if (xdiff, ydiff) in deltas:
+                if deltas[(xdiff, ydiff)] != Map.DIR_NO_CHANGE:
+                    directions.append(deltas[(xdiff, ydiff)])
+                return tuple(directions)
+
+            if (parity, xdiff, ydiff) in seen:
+                return Map.find_route(*orig, strict=True)
+            seen.add((parity, xdiff, ydiff))
+
+            for ((dx, dy), direction) in deltas.items():
+                # Don't allow direction 0, DIR_NO_CHANGE
+                if direction == Map.DIR_NO_CHANGE:
+                    continue
+                # Does this direction get us closer?
+                newxdiff = xdiff - dx
+                newydiff = ydiff - dy
+                if abs(newxdiff) <= abs(xdiff) and abs(newydiff) <= abs(ydiff):
+                    if strict and abs(newxdiff) + abs(newydiff) == abs(xdiff) + abs(ydiff):
+                        continue
+                    directions.append(direction)
+                    (xdiff, ydiff) = (newxdiff, newydiff)
+                    parity = (parity + dy) % 2
+                    break
             else:
-                return [map[(xdiff, ydiff)]]
-
-        # Not adjacent - recur
-        # Looping through cardinal directions first would produce
-        # shorter lists of directions, but it's probably not worth the
-        # extra code complexity
-        for coords in map:
-            # Don't allow direction 0, DIR_NO_CHANGE
-            if map[coords] == 0:
-                continue
-            # Does this direction get us closer?
-            newx = x1 + coords[0]
-            newy = y1 + coords[1]
-            if abs(x2 - newx) <= abs(xdiff) and abs(y2 - newy) <= abs(ydiff):
-                return [map[coords]] + Map.directions_between_coords(newx, newy, x2, y2)
-
-        # Should never happen
-        raise Exception("Couldn't find a direction from " + str(x1) +
-                        "," + str(y1) + " to " + str(x2) + "," + str(y2))
+                # Should never happen
+                raise Exception("Couldn't find a direction to travel (%d, %d) from a row of parity %d" % (
+                    orig[1], orig[2], orig[0]))
 
     # Follow a set of directions from a coordinate set
     @staticmethod
     def follow_directions_from_coord(x, y, directions):
         for direction in directions:
-            if direction in Map.DIRECTIONS_TO_DELTA:
-                x += Map.DIRECTIONS_TO_DELTA[direction][0]
-                y += Map.DIRECTIONS_TO_DELTA[direction][1]
-            elif y % 2 == 0 and direction in Map.DIRECTIONS_TO_DELTA_EVEN:
-                x += Map.DIRECTIONS_TO_DELTA_EVEN[direction][0]
-                y += Map.DIRECTIONS_TO_DELTA_EVEN[direction][1]
-            elif y % 2 == 1 and direction in Map.DIRECTIONS_TO_DELTA_ODD:
-                x += Map.DIRECTIONS_TO_DELTA_ODD[direction][0]
-                y += Map.DIRECTIONS_TO_DELTA_ODD[direction][1]
+            deltas = Map.DIRECTIONS_TO_DELTA_PARITY[y % 2]
+            if direction in deltas:
+                x += deltas[direction][0]
+                y += deltas[direction][1]
             else:
                 raise Exception("Unknown direction " + hex(direction))
         return x, y
@@ -755,6 +1023,7 @@ class B1Map(Map):
     """
 
     book = 1
+    constants = book_constants(1)
 
     def __init__(self, df, ent_df=None):
 
@@ -776,8 +1045,12 @@ class B1Map(Map):
         # Base class attributes
         super(B1Map, self).__init__(df, ent_df)
 
-    def read(self):
-        """ Read in the whole map from a file descriptor. """
+    def read(self, tiles=True):
+        """
+        Read in the whole map from a file descriptor.  Pass tiles=False to
+        skip over the tile data, if you're only interested in the header,
+        tilecontents and entities.
+        """
 
         try:
 
@@ -813,9 +1086,7 @@ class B1Map(Map):
             self.savegame_3 = self.df.readint()
 
             # Tiles
-            self.set_tile_savegame()
-            for i in range(200 * 100):
-                self.addtile()
+            self.read_tiles(tiles)
 
             # Tilecontents...  Just keep going until EOF
             try:
@@ -962,6 +1233,7 @@ class B2Map(Map):
     """
 
     book = 2
+    constants = book_constants(2)
 
     def __init__(self, df, ent_df=None):
 
@@ -985,8 +1257,12 @@ class B2Map(Map):
         # Now the base attributes
         super(B2Map, self).__init__(df, ent_df)
 
-    def read(self):
-        """ Read in the whole map from a file descriptor. """
+    def read(self, tiles=True):
+        """
+        Read in the whole map from a file descriptor.  Pass tiles=False to
+        skip over the tile data, if you're only interested in the header,
+        tilecontents and entities.
+        """
 
         try:
 
@@ -1024,9 +1300,7 @@ class B2Map(Map):
             self.unusedstr3 = self.df.readstr().decode('UTF-8')
 
             # Tiles
-            self.set_tile_savegame()
-            for i in range(200 * 100):
-                self.addtile()
+            self.read_tiles(tiles)
 
             # Tilecontents...  Just keep going until EOF
             try:
@@ -1163,6 +1437,7 @@ class B3Map(B2Map):
     """
 
     book = 3
+    constants = book_constants(3)
 
     def __init__(self, df, ent_df=None):
 
@@ -1179,8 +1454,12 @@ class B3Map(B2Map):
         # Override the parent class - without this B3 maps won't load
         self.loadhook = 2
 
-    def read(self):
-        """ Read in the whole map from a file descriptor. """
+    def read(self, tiles=True):
+        """
+        Read in the whole map from a file descriptor.  Pass tiles=False to
+        skip over the tile data, if you're only interested in the header,
+        tilecontents and entities.
+        """
 
         try:
 
@@ -1223,9 +1502,7 @@ class B3Map(B2Map):
             self.unusedstr3 = self.df.readstr().decode('UTF-8')
 
             # Tiles
-            self.set_tile_savegame()
-            for i in range(200 * 100):
-                self.addtile()
+            self.read_tiles(tiles)
 
             # Tilecontents...  Just keep going until EOF
             try:
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import json
+import logging
+import os
+import shutil
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from eschalon.map import Map
+from eschalon.maplint import find_maps, get_gamedata
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+DATADIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+
+def map_type(savegame):
+    if savegame:
+        return 'savegame'
+    else:
+        return 'global'
+
+
+def write_atomic(mapobj, filename):
+    """
+    Writes the map out to the given filename, by way of a temporary file
+    in the same directory which then gets renamed into place.  That way
+    an interrupted conversion never leaves a half-written map behind.
+    The entities live in a separate .ent file, which gets the same
+    treatment.
+    """
+    if filename[-4:].lower() != '.map':
+        filename = '%s.map' % (filename)
+    # Named after our PID, so that workers writing into the same directory
+    # don't trip over each other.
+    tmpname = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                           '.%s.%d.map' % (os.path.basename(filename)[:-4], os.getpid()))
+    renames = [(tmpname, filename),
+               ('%s.ent' % (tmpname[:-4]), '%s.ent' % (filename[:-4]))]
+    try:
+        mapobj.df.set_filename(tmpname)
+        mapobj.write()
+        for (src, dst) in renames:
+            os.replace(src, dst)
+    except Exception:
+        for (src, dst) in renames:
+            if os.path.exists(src):
+                os.remove(src)
+        raise
+    mapobj.df.set_filename(filename)
+    mapobj.set_df_ent()
+
+
+def write_opq(mapobj):
+    """
+    Savegame maps need a minimap graphic alongside them, or the in-game
+    minimap gets corrupted.  Copies in our blank template if there isn't
+    one already, same as the map editor does when saving.
+    """
+    if mapobj.has_opq_file():
+        return
+    if mapobj.book == 1:
+        template = os.path.join(DATADIR, 'minimap-book1.png')
+    else:
+        template = os.path.join(DATADIR, 'minimap-book23.png')
+    shutil.copyfile(template, mapobj.get_opq_path())
+
+
+def convert_file(filename, output, savegame, book=None, gamedir=None):
+    """
+    Loads a single map file, converts it to a savegame or global map, and
+    writes it out to output.  Returns a dict report, suitable for passing
+    between processes, which includes all the items which were renamed by
+    the conversion.  Maps which are already the right type are skipped.
+    """
+    report = {'map': filename, 'output': output, 'to': map_type(savegame),
+              'renamed': [], 'invalid': []}
+    try:
+        mapobj = Map.load(filename, book)
+        mapobj.read()
+        report['from'] = map_type(mapobj.is_savegame())
+        if mapobj.is_savegame() == savegame:
+            report['skipped'] = True
+            return report
+        # Savegame maps need entity stats, and global maps need the item
+        # list to normalize names with get_global_name()
+        if get_gamedata(mapobj.book, gamedir) is None:
+            raise LoadException('Converting to a %s map requires the game data directory' % (
+                map_type(savegame)))
+
+        before = mapobj.get_item_names()
+        mapobj.convert_savegame(savegame)
+        for ((x, y, old_name), (_, _, new_name)) in zip(before, mapobj.get_item_names()):
+            if old_name != new_name:
+                report['renamed'].append({'x': x, 'y': y, 'old': old_name, 'new': new_name})
+        if not savegame:
+            report['invalid'] = [{'x': x, 'y': y, 'name': name}
+                                 for (x, y, name) in mapobj.get_invalid_global_items()]
+
+        write_atomic(mapobj, output)
+        report['output'] = mapobj.df.filename
+        if savegame:
+            write_opq(mapobj)
+    except (LoadException, IOError, ValueError, struct.error) as e:
+        report['error'] = str(e)
+    return report
+
+
+def convert_files(jobs, savegame, book=None, gamedir=None, workers=None):
+    """
+    Converts a list of (filename, output) pairs across a pool of worker
+    processes.  Each worker only reads in the maps it's been handed.
+    Returns a list of reports (see convert_file()), in job order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        return [convert_file(filename, output, savegame, book, gamedir)
+                for (filename, output) in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = [executor.submit(convert_file, filename, output, savegame, book, gamedir)
+                   for (filename, output) in jobs]
+        return [future.result() for future in futures]
+
+
+def report_text(report):
+    if 'error' in report:
+        return ['%s: error: %s' % (report['map'], report['error'])]
+    if report.get('skipped'):
+        return ['%s: already a %s map' % (report['map'], report['to'])]
+    lines = ['%s: converted to %s map %s' % (report['map'], report['to'], report['output'])]
+    for item in report['renamed']:
+        lines.append('  (%d, %d) renamed "%s" to "%s"' % (item['x'], item['y'], item['old'], item['new']))
+    for item in report['invalid']:
+        lines.append('  (%d, %d) "%s" is not a valid global item name' % (item['x'], item['y'], item['name']))
+    return lines
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Convert map files (or directories full of them) between savegame and global maps')
+    parser.add_argument("paths", type=str, nargs='+',
+                        help='Map files, or directories full of them')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--to-global", dest="savegame", action="store_false")
+    target.add_argument("--to-savegame", dest="savegame", action="store_true")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-o", "--output", type=str,
+                        help='Directory to write the converted maps to')
+    output.add_argument("--in-place", action="store_true",
+                        help='Overwrite the original maps')
+    parser.add_argument("--book", type=int, choices=[1, 2, 3])
+    parser.add_argument("--gamedir", type=str, required=True,
+                        help='Game directory, for item names and entity stats')
+    parser.add_argument("--format", choices=['text', 'json'], default='text')
+    parser.add_argument("--workers", type=int)
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Converts maps and reports on how it went.  Returns 0 if everything
+    converted with valid item names, 1 if some item names still look
+    invalid for a global map, and 2 on errors.
+    """
+    args = parse_args(input)
+    if args.output is not None and not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    jobs = []
+    for filename in find_maps(args.paths):
+        if args.in_place:
+            jobs.append((filename, filename))
+        else:
+            jobs.append((filename, os.path.join(args.output, os.path.basename(filename))))
+    reports = convert_files(jobs, args.savegame, args.book, args.gamedir, args.workers)
+
+    if args.format == 'json':
+        print(json.dumps(reports, indent=2, sort_keys=True))
+    else:
+        for report in reports:
+            print("\n".join(report_text(report)))
+
+    if any(['error' in report for report in reports]):
+        return 2
+    if any([len(report['invalid']) > 0 for report in reports]):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,467 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import json
+import logging
+import operator
+import sys
+from typing import Optional, Sequence
+
+import numpy
+
+from eschalon.map import Map
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+# Attributes which aren't actually data, or which we handle separately
+SKIP_MAP = set(['df', 'df_ent', 'filename_ent', 'cursqcol', 'cursqrow', 'tiles',
+                'tilecontents', 'entities', 'duplicate_entities', 'big_gfx_mappings',
+                'extradata', 'tiles_offset'])
+SKIP_TILE = set(['x', 'y', 'savegame', 'tilecontents', 'entity'])
+SKIP_OBJECT = set(['x', 'y', 'savegame', 'items'])
+
+# Fields which only exist in savegames.  Unless both maps are savegames
+# these are left out, since they're never read in for global maps (and
+# otherwise every single tile and entity would show up as changed).
+# Global maps only store item names.
+SAVEGAME_TILE = set(['tile_flag', 'cartography'])
+SAVEGAME_ENTITY = set(['friendly', 'movement', 'health', 'frame', 'initial_loc', 'statuses'])
+
+
+def data_fields(obj, skip):
+    """
+    Returns a sorted list of the attribute names on obj which hold plain
+    data (numbers, strings, and lists of those).
+    """
+    fields = []
+    for (name, value) in vars(obj).items():
+        if name in skip or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float, str, bytes)):
+            fields.append(name)
+        elif isinstance(value, list) and all(isinstance(v, (int, str)) for v in value):
+            fields.append(name)
+    return sorted(fields)
+
+
+def json_value(value):
+    """ Makes sure a field value can be serialized to JSON """
+    if isinstance(value, bytes):
+        return value.decode('UTF-8', 'replace')
+    if isinstance(value, list):
+        return [json_value(v) for v in value]
+    return value
+
+
+def field_changes(fields, old, new):
+    """
+    Returns a dict of name -> (old, new) for every field which differs
+    between the two objects.
+    """
+    changes = {}
+    for field in fields:
+        oldval = getattr(old, field, None)
+        newval = getattr(new, field, None)
+        if oldval != newval:
+            changes[field] = (oldval, newval)
+    return changes
+
+
+class ObjectDiff(object):
+    """
+    Differences in a single tilecontent or entity.  status is one of
+    'added', 'removed' or 'changed'.  For changed objects, fields is a dict
+    of name -> (old, new), and items is a dict of item slot -> such a dict.
+    For added or removed objects, values holds the data of whichever
+    object actually exists.
+    """
+
+    ADDED = 'added'
+    REMOVED = 'removed'
+    CHANGED = 'changed'
+
+    def __init__(self, kind, idx, status):
+        self.kind = kind
+        self.idx = idx
+        self.status = status
+        self.fields = {}
+        self.items = {}
+        self.values = {}
+
+    def label(self):
+        if self.kind == 'entity':
+            if self.idx > 0:
+                # Only possible off the map, where entities can pile up
+                return 'entity #%d' % (self.idx)
+            return 'entity'
+        return 'tilecontent #%d' % (self.idx)
+
+    def to_dict(self):
+        ret = {'type': self.kind, 'status': self.status}
+        if self.kind != 'entity' or self.idx > 0:
+            ret['index'] = self.idx
+        if self.status == self.CHANGED:
+            ret['fields'] = dict([(name, [json_value(old), json_value(new)])
+                                  for (name, (old, new)) in self.fields.items()])
+            ret['items'] = dict([(str(slot), dict([(name, [json_value(old), json_value(new)])
+                                                   for (name, (old, new)) in changes.items()]))
+                                 for (slot, changes) in self.items.items()])
+        else:
+            ret['values'] = dict([(name, json_value(value)) for (name, value) in self.values.items()])
+        return ret
+
+    def to_text(self, indent='  '):
+        ret = []
+        if self.status == self.CHANGED:
+            ret.append('%s%s changed:' % (indent, self.label()))
+            for name in sorted(self.fields):
+                (old, new) = self.fields[name]
+                ret.append('%s  %s: %r -> %r' % (indent, name, old, new))
+            for slot in sorted(self.items):
+                for name in sorted(self.items[slot]):
+                    (old, new) = self.items[slot][name]
+                    ret.append('%s  item %d %s: %r -> %r' % (indent, slot, name, old, new))
+        else:
+            ret.append('%s%s %s:' % (indent, self.label(), self.status))
+            for name in sorted(self.values):
+                if name == 'items':
+                    for (slot, item_name) in enumerate(self.values[name]):
+                        if item_name != '':
+                            ret.append('%s  item %d: %r' % (indent, slot, item_name))
+                else:
+                    ret.append('%s  %s: %r' % (indent, name, self.values[name]))
+        return ret
+
+
+class TileDiff(object):
+    """
+    All the differences at a single map coordinate: the tile's own fields
+    (name -> (old, new)), plus ObjectDiffs for its tilecontents and entity.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.fields = {}
+        self.tilecontents = []
+        self.entity = None
+
+    def __bool__(self):
+        return bool(self.fields or self.tilecontents or self.entity)
+
+    def to_dict(self):
+        ret = {'x': self.x, 'y': self.y,
+               'fields': dict([(name, [json_value(old), json_value(new)])
+                               for (name, (old, new)) in self.fields.items()]),
+               'tilecontents': [tc.to_dict() for tc in self.tilecontents]}
+        if self.entity is not None:
+            ret['entity'] = self.entity.to_dict()
+        return ret
+
+    def to_text(self):
+        ret = ['(%d, %d):' % (self.x, self.y)]
+        for name in sorted(self.fields):
+            (old, new) = self.fields[name]
+            ret.append('  %s: %r -> %r' % (name, old, new))
+        for tcdiff in self.tilecontents:
+            ret.extend(tcdiff.to_text())
+        if self.entity is not None:
+            ret.extend(self.entity.to_text())
+        return ret
+
+
+class OffmapDiff(object):
+    """
+    The differences in tilecontents and entities at a single coordinate
+    which is outside the map.  There's no tile there to hang them off of
+    (and so nothing stopping more than one entity sharing the spot), so
+    these are found straight from the map's object lists, and get kept
+    apart from the regular TileDiffs.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.tilecontents = []
+        self.entities = []
+
+    def __bool__(self):
+        return bool(self.tilecontents or self.entities)
+
+    def to_dict(self):
+        return {'x': self.x, 'y': self.y,
+                'tilecontents': [tc.to_dict() for tc in self.tilecontents],
+                'entities': [ent.to_dict() for ent in self.entities]}
+
+    def to_text(self):
+        ret = ['(%d, %d) (off map):' % (self.x, self.y)]
+        for objdiff in self.tilecontents + self.entities:
+            ret.extend(objdiff.to_text())
+        return ret
+
+
+class ObjectComparer(object):
+    """
+    Compares individual tilecontents and entities.  savegame says whether
+    the fields which only exist in savegames should be compared as well.
+    """
+
+    def __init__(self, savegame):
+        self.savegame = savegame
+
+    def object_fields(self, kind, obj):
+        skip = SKIP_OBJECT
+        if not self.savegame and kind == 'entity':
+            skip = skip | SAVEGAME_ENTITY
+        return data_fields(obj, skip)
+
+    def item_fields(self, item):
+        if not self.savegame:
+            return ['item_name']
+        return data_fields(item, SKIP_OBJECT)
+
+    def record(self, kind, obj):
+        """
+        Returns a single hashable record of all the data in the object
+        (including its items), for a quick first comparison.
+        """
+        fields = self.object_fields(kind, obj)
+        values = [getattr(obj, field) for field in fields]
+        values = [tuple(v) if isinstance(v, list) else v for v in values]
+        if kind == 'tilecontent':
+            for item in obj.items:
+                values.append(tuple([getattr(item, field) for field in self.item_fields(item)]))
+        return (tuple(fields), tuple(values))
+
+    def compare_object(self, kind, idx, old, new):
+        """
+        Compares two tilecontents or entities, either of which may be None.
+        Returns an ObjectDiff, or None if they're the same.
+        """
+        if old is None and new is None:
+            return None
+        if old is None or new is None:
+            obj = new if old is None else old
+            objdiff = ObjectDiff(kind, idx, ObjectDiff.ADDED if old is None else ObjectDiff.REMOVED)
+            for field in self.object_fields(kind, obj):
+                objdiff.values[field] = getattr(obj, field)
+            if kind == 'tilecontent':
+                objdiff.values['items'] = [item.item_name for item in obj.items]
+            return objdiff
+        if self.record(kind, old) == self.record(kind, new):
+            return None
+
+        objdiff = ObjectDiff(kind, idx, ObjectDiff.CHANGED)
+        fields = sorted(set(self.object_fields(kind, old)) | set(self.object_fields(kind, new)))
+        objdiff.fields = field_changes(fields, old, new)
+        if kind == 'tilecontent':
+            for (slot, (olditem, newitem)) in enumerate(zip(old.items, new.items)):
+                changes = field_changes(self.item_fields(olditem), olditem, newitem)
+                if changes:
+                    objdiff.items[slot] = changes
+        return objdiff
+
+    def compare_objects(self, kind, olds, news):
+        """
+        Compares two lists of tilecontents or entities, position by
+        position.  Returns a list of ObjectDiffs.
+        """
+        objdiffs = []
+        for idx in range(max(len(olds), len(news))):
+            old = olds[idx] if idx < len(olds) else None
+            new = news[idx] if idx < len(news) else None
+            objdiff = self.compare_object(kind, idx, old, new)
+            if objdiff is not None:
+                objdiffs.append(objdiff)
+        return objdiffs
+
+
+def on_map(x, y):
+    return 0 <= x < 100 and 0 <= y < 200
+
+
+class MapDiff(ObjectComparer):
+    """
+    A structural diff between two maps from the same book.
+
+    The tiles are compared all at once: each map's tile fields get packed
+    into a numpy array of records, so finding the tiles which changed is a
+    single vectorized comparison rather than 20,000 calls to Tile.equals().
+    Tilecontents and entities only get looked at on tiles which actually
+    have some, and are compared as whole records first, so we only drill
+    down into individual fields (and items) for the ones which differ.
+
+    Unless both maps are savegames, fields which only exist in savegames
+    are ignored, and items are compared by name only.  That's what you
+    want when checking what a player has done to a global map.
+
+    Objects whose coordinates fall outside the map end up in offmap (a
+    list of OffmapDiffs) rather than tiles.
+    """
+
+    def __init__(self, old, new):
+        if old.book != new.book:
+            raise LoadException('Cannot diff a Book %d map against a Book %d map' % (old.book, new.book))
+        self.old = old
+        self.new = new
+        super(MapDiff, self).__init__(old.is_savegame() and new.is_savegame())
+        self.header = {}
+        self.tiles = []
+        self.offmap = []
+        self.compare()
+
+    def __len__(self):
+        return len(self.header) + len(self.tiles) + len(self.offmap)
+
+    def compare(self):
+        """ Does the actual comparison. """
+        self.header = field_changes(self.header_fields(), self.old, self.new)
+
+        tile_fields = self.tile_fields()
+        old_records = self.tile_records(self.old, tile_fields)
+        new_records = self.tile_records(self.new, tile_fields)
+        changed = (old_records != new_records).any(axis=2)
+
+        # Tiles whose records differ, plus anywhere that has objects in
+        # either map.
+        coords = set([(int(x), int(y)) for (y, x) in zip(*numpy.nonzero(changed))])
+        for mapobj in (self.old, self.new):
+            coords.update(mapobj.tilecontents.coords.keys())
+            coords.update(mapobj.entities.coords.keys())
+
+        self.tiles = []
+        self.offmap = []
+        for (x, y) in sorted(coords, key=lambda c: (c[1], c[0])):
+            if on_map(x, y):
+                tilediff = self.compare_tile(x, y, tile_fields, changed[y, x])
+                if tilediff:
+                    self.tiles.append(tilediff)
+            else:
+                offmapdiff = self.compare_offmap(x, y)
+                if offmapdiff:
+                    self.offmap.append(offmapdiff)
+
+    def header_fields(self):
+        return sorted(set(data_fields(self.old, SKIP_MAP)) | set(data_fields(self.new, SKIP_MAP)))
+
+    def tile_fields(self):
+        skip = SKIP_TILE
+        if not self.savegame:
+            skip = skip | SAVEGAME_TILE
+        return data_fields(self.old.tiles[0][0], skip)
+
+    @staticmethod
+    def tile_records(mapobj, fields):
+        """
+        Packs the given tile fields for the whole map into a single
+        array, indexed [y, x, field].
+        """
+        getter = operator.attrgetter(*fields)
+        if len(fields) == 1:
+            return numpy.array([[[getter(tile)] for tile in row] for row in mapobj.tiles],
+                               dtype=numpy.int64)
+        return numpy.array([[getter(tile) for tile in row] for row in mapobj.tiles],
+                           dtype=numpy.int64)
+
+    def compare_tile(self, x, y, tile_fields, changed):
+        oldtile = self.old.tiles[y][x]
+        newtile = self.new.tiles[y][x]
+        tilediff = TileDiff(x, y)
+        if changed:
+            tilediff.fields = field_changes(tile_fields, oldtile, newtile)
+
+        tilediff.tilecontents = self.compare_objects('tilecontent', oldtile.tilecontents,
+                                                     newtile.tilecontents)
+        tilediff.entity = self.compare_object('entity', 0, oldtile.entity, newtile.entity)
+        return tilediff
+
+    def compare_offmap(self, x, y):
+        offmapdiff = OffmapDiff(x, y)
+        offmapdiff.tilecontents = self.compare_objects('tilecontent', self.old.tilecontents.at(x, y),
+                                                       self.new.tilecontents.at(x, y))
+        offmapdiff.entities = self.compare_objects('entity', self.old.entities.at(x, y),
+                                                   self.new.entities.at(x, y))
+        return offmapdiff
+
+    def to_dict(self):
+        return {'book': self.old.book,
+                'header': dict([(name, [json_value(old), json_value(new)])
+                                for (name, (old, new)) in self.header.items()]),
+                'tiles': [tilediff.to_dict() for tilediff in self.tiles],
+                'offmap': [offmapdiff.to_dict() for offmapdiff in self.offmap]}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent, sort_keys=True)
+
+    def to_text(self):
+        ret = []
+        if self.header:
+            ret.append('Header:')
+            for name in sorted(self.header):
+                (old, new) = self.header[name]
+                ret.append('  %s: %r -> %r' % (name, old, new))
+        for tilediff in self.tiles + self.offmap:
+            ret.extend(tilediff.to_text())
+        return "\n".join(ret)
+
+    @staticmethod
+    def load_map(filename, book=None):
+        """ Loads and reads in a map file, for diffing. """
+        mapobj = Map.load(filename, book)
+        mapobj.read()
+        return mapobj
+
+    @staticmethod
+    def from_files(old_filename, new_filename, book=None):
+        return MapDiff(MapDiff.load_map(old_filename, book), MapDiff.load_map(new_filename, book))
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(description='Show the differences between two map files')
+    parser.add_argument("old", type=str)
+    parser.add_argument("new", type=str)
+    parser.add_argument("--book", type=int, choices=[1, 2, 3])
+    parser.add_argument("--format", choices=['text', 'json'], default='text')
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Prints the diff between two maps.  Like diff(1), returns 0 if the maps
+    are the same, 1 if they differ, and 2 on errors.
+    """
+    args = parse_args(input)
+    try:
+        mapdiff = MapDiff.from_files(args.old, args.new, args.book)
+    except LoadException as e:
+        print('Error: %s' % (e), file=sys.stderr)
+        return 2
+    if args.format == 'json':
+        print(mapdiff.to_json(indent=2))
+    elif len(mapdiff) > 0:
+        print(mapdiff.to_text())
+    if len(mapdiff) > 0:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,32 +17,37 @@
 # You should have received a copy of the GNU General Public License along
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import bisect
 import glob
 import logging
 import os
-import random
 import sys
+import threading
 import time
 import traceback
 from typing import Any, Dict, List, Optional, Tuple
 
 import cairo
 import pygtkcompat
-from gi.repository import Gdk, GdkPixbuf, Gtk
+from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
 
 from eschalon import app_name, authors, url, version
 from eschalon.basegui import BaseGUI, ImageSelWindow, WrapLabel
 from eschalon.constants import constants as c
+from eschalon.dirtyregion import DirtyRegion, DirtyRegions
 from eschalon.entity import B1Entity, B2Entity, B3Entity, Entity
 from eschalon.eschalondata import EschalonData
 from eschalon.gfx import Gfx
 from eschalon.item import B1Item, B2Item, B3Item, Item
 from eschalon.map import Map
+from eschalon.overlaymask import OverlayMasks
+from eschalon.renderjob import RenderJob
 from eschalon.savefile import LoadException, Savefile
 from eschalon.savename import Savename
-from eschalon.saveslot import Saveslot
+from eschalon.saveslot import scan_slots
 from eschalon.smartdraw import SmartDraw
 from eschalon.tile import Tile
+from eschalon.tilearrays import TileArrays
 from eschalon.tilecontent import Tilecontent
 from eschalon.undo import Undo
 
@@ -219,7 +224,6 @@ class MapLoaderDialog(Gtk.Dialog):
         if transient:
             self.set_transient_for(transient)
             self.set_position(Gtk.WindowPosition.CENTER_ON_PARENT)
-        active_slot = None
 
         # Page-to-source mapping
         self.page_index = {}
@@ -267,18 +271,12 @@ class MapLoaderDialog(Gtk.Dialog):
         notebook_align.add(self.open_notebook)
         self.vbox.pack_start(notebook_align, True, True)
 
-        # Loading from our save dir, first see if we have saves to load
+        # Loading from our save dir, first see if we have saves to load.  The
+        # slots themselves get loaded in the background (see add_slot()).
         slotdirs = glob.glob(os.path.join(savegame_dir, 'slot*'))
         self.slots = []
-        for slotdir in slotdirs:
-            try:
-                self.slots.append(Saveslot(slotdir, c.book))
-            except LoadException as e:
-                LOG.error(f'error loading slot {slotdir}', exc_info=True)
-                # If there's an error, just don't show the slot
-                pass
-        self.slots.sort()
-        if self.slots:
+        self.starting_path = starting_path
+        if slotdirs:
 
             # Slot-choosing combobox/liststore
             self.slot_store = Gtk.ListStore(int, str, str, str, int, object)
@@ -299,17 +297,6 @@ class MapLoaderDialog(Gtk.Dialog):
             col.set_sort_column_id(self.SLOT_COL_DATE_EPOCH)
             col.set_resizable(True)
             self.slot_tv.append_column(col)
-            for (idx, slot) in enumerate(self.slots):
-                self.slot_store.append((idx,
-                                        '<b>%s</b>' % (slot.slotname_short()),
-                                        slot.savename,
-                                        slot.timestamp,
-                                        slot.timestamp_epoch,
-                                        slot))
-                if (starting_path and
-                        os.path.normcase(os.path.abspath(slot.directory)) ==
-                        os.path.normcase(os.path.abspath(starting_path))):
-                    active_slot = idx
 
             # Map-choosing combobox/liststore
             self.map_store = Gtk.ListStore(int, str, str, str)
@@ -436,9 +423,42 @@ class MapLoaderDialog(Gtk.Dialog):
             self.open_notebook.set_current_page(
                 self.source_index[self.SOURCE_SAVES])
 
-        # Default to the last-used slot if we have one.
-        if active_slot:
-            self.slot_tv.set_cursor(active_slot)
+        # Now start loading in our save slots
+        if slotdirs:
+            self.scanning = True
+            self.connect('destroy', self.on_destroy_stop_scan)
+            threading.Thread(target=scan_slots, args=(savegame_dir,),
+                             kwargs={'maps': True,
+                                     'callback': lambda slot: GLib.idle_add(self.add_slot, slot)},
+                             daemon=True).start()
+
+    def on_destroy_stop_scan(self, widget):
+        self.scanning = False
+
+    def add_slot(self, slot):
+        """
+        Adds a newly-loaded save slot to our list, keeping the list in slot
+        order.  Called from the GTK main loop as our background scan comes
+        up with each slot.  If this is the slot we were last using, select
+        it.
+        """
+        if not self.scanning:
+            return False
+        pos = bisect.bisect(self.slots, slot)
+        self.slots.insert(pos, slot)
+        self.slot_store.insert(pos, (pos,
+                                     '<b>%s</b>' % (slot.slotname_short()),
+                                     slot.savename,
+                                     slot.timestamp,
+                                     slot.timestamp_epoch,
+                                     slot))
+        for (idx, row) in enumerate(self.slot_store):
+            row[self.SLOT_COL_IDX] = idx
+        if (self.starting_path and
+                os.path.normcase(os.path.abspath(slot.directory)) ==
+                os.path.normcase(os.path.abspath(self.starting_path))):
+            self.slot_tv.set_cursor(pos)
+        return False
 
     def register_page(self, source):
         """
@@ -470,13 +490,14 @@ class MapLoaderDialog(Gtk.Dialog):
                     except Exception as e:
                         pass
         elif b23maplist is not None and eschalondata is not None:
+            # We only need the headers here; the map itself gets read in by
+            # load_from_datapak() once it's actually chosen, so the Savefile
+            # is just there to carry the filename.
             for map_file in sorted(b23maplist):
                 try:
-                    map_data = eschalondata.readfile(map_file, 'maps')
-                    if map_data:
-                        map_df = Savefile(filename=map_file,
-                                          stringdata=map_data)
-                        map_list.append(Map.get_mapinfo(map_df=map_df))
+                    (map_book, map_mapname) = eschalondata.get_mapinfo(map_file)
+                    map_df = Savefile(filename=map_file)
+                    map_list.append((map_book, map_mapname, map_df))
                 except Exception as e:
                     print('Exception: %s' % (e))
                     pass
@@ -698,7 +719,7 @@ class BigGraphicDialog(Gtk.Dialog):
 
         # Scan for problems if we don't have any
         if messages is None:
-            messages = mappingobj.load()
+            messages = mappingobj.get_messages()
 
         # Figure out if we even have any Big Graphics at the moment
         mappings = mappingobj.get_gfx_mappings()
@@ -1016,6 +1037,24 @@ class ObjectSelWindow(ImageSelWindow):
         self.book.append_page(sw, self.label_d)
 
 
+class TileBuffer(object):
+    """
+    Scratch surface which draw_tile() composites a single tile onto.
+    Each render thread gets its own, since they can't share.  draw_tile()
+    also leaves behind whether it drew anything, and the highlight colors
+    which apply to the tile (regardless of whether those highlights are
+    currently turned on).
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.ctx = cairo.Context(self.surf)
+        self.drawn = False
+        self.overlays = {}
+
+
 class MapGUI(BaseGUI):
 
     # Editing modes that we can be in
@@ -1038,6 +1077,16 @@ class MapGUI(BaseGUI):
     ACTION_COPY = 7
     ACTION_COPY_SELECT = 8
 
+    # Past this many changed tiles, redraw_tiles() just redraws the map
+    BULK_REDRAW_TILES = 2000
+
+    # Tile attributes which make up the composite image in the tile
+    # editing window, from the bottom up
+    COMPOSITE_LAYERS = ['floorimg', 'decalimg', 'wallimg', 'walldecalimg']
+
+    # Highlight layers, in the order they're composited onto the map
+    OVERLAY_LAYERS = OverlayMasks.LAYERS
+
     # Mouse button constants
     MOUSE_LEFT = 1
     MOUSE_MIDDLE = 2
@@ -1110,11 +1159,17 @@ class MapGUI(BaseGUI):
         self.copy_source_drag_y = -1
         self.copy_source_drag_x = -1
         self.cleantiles: List[Tuple[Any, Any]] = []
+        self.dirty_regions = DirtyRegions()
         self.highlight_tiles: Dict[Any, Any] = {}
         self.brush_pattern = [[None]]
         self.brush_pattern_prev = [[None]]
 
         self.mapinit = False
+        self.render_job = None
+        self.render_local = threading.local()
+        self.layer_toggles: Dict[str, bool] = {}
+        self.huge_gfx_pad = 0
+        self.overlay_masks = None
         self.undo = None
         self.smartdraw = SmartDraw.new(c.book)
         self.decal_edge_pref_map: Dict[Any, Any] = {}
@@ -1343,6 +1398,7 @@ class MapGUI(BaseGUI):
         # Some more vars to make sure exist
         self.guicache = None
         self.tilebuf = None
+        self.basecache = None
         self.blanktile = None
         self.basictile = None
         self.updating_map_checkboxes = False
@@ -1351,6 +1407,7 @@ class MapGUI(BaseGUI):
         # Blank pixbuf to use in the tile editing window
         self.comp_pixbuf = GdkPixbuf.Pixbuf(
             GdkPixbuf.Colorspace.RGB, True, 8, self.gfx.tile_width, self.gfx.tile_height * 5)
+        self.reset_composite_cache()
 
         # Load in our mouse map (to determine which tile we're pointing at)
         self.mousemap: Dict[Any, Any] = {}
@@ -2022,10 +2079,7 @@ class MapGUI(BaseGUI):
                           'overwrite every single tile on the map.  Without the checkbox, '
                           'any tiles with existing floor images will be left alone.  '
                           'If you have the necessary SmartDraw options enabled, this '
-                          'will randomize the terrain somewhat, if possible.  Note '
-                          'that this operation is <b>not</b> Undoable at the moment, and '
-                          'will erase your Undo stack, so save your map first if you\'re '
-                          'not sure.')
+                          'will randomize the terrain somewhat, if possible.')
         # set_alignment doesn't seem to work with our WrapLabel
         # label.set_alignment(Gtk.Justification.CENTER)
         adjust.add(label)
@@ -2382,6 +2436,7 @@ class MapGUI(BaseGUI):
 
         # Basic vars
         self.mapobj: Map = mapobj
+        self.reset_composite_cache()
 
         # Update our status bar
         self.putstatus('Editing ' + self.mapobj.df.filename)
@@ -2400,12 +2455,13 @@ class MapGUI(BaseGUI):
 
     def on_abort_render(self, widget=None):
         """
-        A hard quit.  Not terribly friendly, but the way we're
-        processing loading doesn't lend itself to graceful failbacks.
-        This is mostly going to just be called if something goes
-        catastrophically wrong, anyway.
+        Cancels the map render currently in progress.  Whatever has been
+        drawn so far stays onscreen; the map will get drawn in full the
+        next time it's redrawn (on a zoom change, for instance).
         """
-        sys.exit(0)
+        if self.render_job is not None:
+            self.cancel_render()
+            self.drawstatuswindow.hide()
 
     def gtk_main_quit(self, widget=None, event=None):
         """ Main quit function. """
@@ -2434,7 +2490,7 @@ class MapGUI(BaseGUI):
         if response == Gtk.ResponseType.APPLY:
             request_redraw = True
             self.mapobj.big_gfx_mappings.fix()
-            messages = self.mapobj.big_gfx_mappings.load()
+            messages = self.mapobj.big_gfx_mappings.get_messages()
             if len(messages) > 0:
                 md = Gtk.MessageDialog(
                     flags=Gtk.DialogFlags.MODAL | Gtk.DialogFlags.DESTROY_WITH_PARENT,
@@ -2547,8 +2603,7 @@ class MapGUI(BaseGUI):
         if self.undo.have_undo():
             history = self.undo.get_undo()
             self.store_hugegfx_state(self.mapobj.tiles[history.y][history.x])
-            for (x, y) in self.undo.undo():
-                self.redraw_tile(x, y)
+            self.redraw_tiles(self.undo.undo())
             self.update_undo_gui()
             if self.check_hugegfx_state(self.mapobj.tiles[history.y][history.x]):
                 self.draw_map()
@@ -2559,8 +2614,7 @@ class MapGUI(BaseGUI):
         if self.undo.have_redo():
             history = self.undo.get_redo()
             self.store_hugegfx_state(self.mapobj.tiles[history.y][history.x])
-            for (x, y) in self.undo.redo():
-                self.redraw_tile(x, y)
+            self.redraw_tiles(self.undo.redo())
             self.update_undo_gui()
             if self.check_hugegfx_state(self.mapobj.tiles[history.y][history.x]):
                 self.draw_map()
@@ -2575,36 +2629,16 @@ class MapGUI(BaseGUI):
         dialog.hide()
         if resp == Gtk.ResponseType.OK:
             val = int(self.get_widget('fill_map_spin').get_value())
-            pool = []
+            pool = None
             if self.smartdraw_check.get_active() and self.smart_randomize.get_active():
                 pool = self.smartdraw.get_random_terrain_pool(val)
-            # Split these out to avoid doing more checks than needed
-            # inside the loop itself
-            if self.get_widget('fill_map_overwrite').get_active():
-                if len(pool) < 2:
-                    for row in self.mapobj.tiles:
-                        for tile in row:
-                            tile.floorimg = val
-                else:
-                    for row in self.mapobj.tiles:
-                        for tile in row:
-                            tile.floorimg = random.choice(pool)
-            else:
-                if len(pool) < 2:
-                    for row in self.mapobj.tiles:
-                        for tile in row:
-                            if tile.floorimg == 0:
-                                tile.floorimg = val
-                else:
-                    for row in self.mapobj.tiles:
-                        for tile in row:
-                            if tile.floorimg == 0:
-                                tile.floorimg = random.choice(pool)
-            self.draw_map()
-
-            # Clear out "Undo" - we're not hooking into this yet.
-            self.undo = Undo(self.mapobj)
-            self.update_undo_gui()
+            history = self.mapobj.fill('floorimg', val, pool=pool,
+                                       overwrite=self.get_widget('fill_map_overwrite').get_active(),
+                                       text='Fill')
+            if history is not None:
+                self.undo.store_bulk(history)
+                self.redraw_tiles(history.coords())
+                self.update_undo_gui()
 
     def update_objectplace(self, widget=None):
         """
@@ -2702,6 +2736,7 @@ class MapGUI(BaseGUI):
         self.update_main_map_name()
         self.propswindow.hide()
         if (c.book > 1 and self.cur_tree_set != self.mapobj.tree_set):
+            self.reset_composite_cache()
             self.draw_map()
             self.update_wall_selection_image()
         return True
@@ -2990,120 +3025,167 @@ class MapGUI(BaseGUI):
 
     def redraw_tile(self, x, y):
         """
-        Redraw a single tile, and any dependant tiles nearby as well.
-
-        Because we don't really keep composite caches
-        around (should we?) this entails drawing all the tiles behind the tile we
-        just edited, the tile itself, and then four more "levels" of tiles below, as
-        well, because objects may be obscuring the one we just edited.  Because of the
-        isometric presentation, this means that we'd be redrawing 29 total tiles,
-        assuming that everything fits exactly into our tile width.
-
-        Unfortunately, now that we support entities, some of those are wider than the
-        tile width, so we're going to redraw even more than that, for a total of 67
-        tiles.
-
-        Note that we could cut down on that number by doing some logic - ie: we really
-        would only have to draw the bottom-most tile if it contained the tallest tree
-        graphic, and there's no need to draw the floor or floor decals on any tile below
-        the one we just edited.  Still, because this is a user-initiated action, I don't
-        think it's really worth it to optimize that out.  I don't think the extra processing
-        will be noticeable.
-
-        Note that the we-don't-have-to-draw-everything angle becomes even bigger now that
-        we're widening the field to support entities.  The outermost 20 tiles that we're
-        drawing only have to be drawn if there's an entity in there which is wider than
-        the ordinary tile, and even then we'd *only* have to draw the entity (to say nothing
-        of the fact that very few of those larger entities actually draw to the full edge of
-        the entity graphic for all cases).  Additionally, if the tile we just edited didn't
-        contain an entity at any point, we'd be able to lop off a bunch tiles in the first
-        place.  Still, I'm guessing that it doesn't really matter much.  Perhaps it'll become
-        necessary to do this more intelligently once I've got some actual drawing-type
-        functionality in place.
-
-        Also note that absolutely none of this is necessary if the user didn't actually change
-        anything.  Whatever.
-        """
-
-        # Figure out our dimensions
-        tier_1_x = []
-        tier_1_y = y - 1 - 8
-        tier_2_x = list(range(x - 1, x + 2))
-        tier_2_y = y - 8
-        global_x = (x * self.z_width) - self.z_halfwidth
-        if ((y % 2) == 0):
-            tier_1_x = list(range(x - 2, x + 2))
+        Mark a single tile as needing a redraw.
+
+        Because we don't really keep composite caches around (should we?)
+        redrawing a tile entails drawing all the tiles behind the tile we
+        just edited, the tile itself, and then four more "levels" of tiles
+        below, as well, because objects may be obscuring the one we just
+        edited.  Now that we support entities (some of which are wider than
+        the tile width), that's 67 tiles for each edited tile.
+
+        Many actions (smart drawing, copy drags, undo, large brushes) touch
+        a whole bunch of neighboring tiles at once, so rather than doing
+        that work once per tile we just note the tile here and invalidate
+        the area of the window it affects.  The actual compositing happens
+        in flush_dirty_regions(), at expose time, where the dirty tiles get
+        merged into rectangles and each rectangle is drawn only once.
+        """
+        self.overlay_masks.update_tile(self.mapobj.tiles[y][x])
+        self.mapobj.big_gfx_mappings.update_tile(self.mapobj.tiles[y][x])
+        self.dirty_regions.add(x, y)
+        self.maparea.queue_draw_area(
+            *self.region_pixel_rect(DirtyRegion(x, y, x, y)))
+        return True
+
+    def redraw_tiles(self, coords):
+        """
+        Marks a list of (x, y) tiles as needing a redraw.  Bulk edits can
+        touch most of the map, at which point it's quicker to just draw the
+        whole thing again.
+        """
+        if len(coords) > self.BULK_REDRAW_TILES:
+            self.draw_map()
+        else:
+            for (x, y) in coords:
+                self.redraw_tile(x, y)
+
+    def region_pixel_rect(self, region):
+        """
+        Returns the (x, y, width, height) pixel rectangle which needs to
+        be recomposited when the given DirtyRegion is redrawn.  For a single
+        tile this is two tile-widths across, and reaches four tile-heights
+        above the tile, for tall walls and trees.  We don't bother to check
+        the row parity of the region's edges, so multi-row regions are
+        slightly wider than strictly needed.
+        """
+        if region.y1 == region.y2 and (region.y1 % 2) == 1:
+            left = (region.x1 * self.z_width) + 1
         else:
-            tier_1_x = list(range(x - 1, x + 3))
-            global_x += self.z_halfwidth
+            left = (region.x1 * self.z_width) - self.z_halfwidth + 1
+        if region.y1 == region.y2 and (region.y1 % 2) == 0:
+            right = (region.x2 * self.z_width) + \
+                self.z_width + self.z_halfwidth + 1
+        else:
+            right = (region.x2 * self.z_width) + (self.z_width * 2) + 1
+        top = self.z_halfheight * (region.y1 - 8) + 1
+        height = (self.z_halfheight * (region.y2 - region.y1)) + \
+            self.z_5xheight
+        return (left, top, right - left, height)
+
+    def flush_dirty_regions(self):
+        """
+        Composites any tiles which have been marked dirty by redraw_tile()
+        since the last time we were called.  Returns True if we drew
+        anything.
+        """
+        if len(self.dirty_regions) == 0:
+            return False
+        for region in self.dirty_regions.pop_regions():
+            self.redraw_region(region)
+
+        # Compositing wipes out the pointer highlight on our main context,
+        # so make sure any highlighted tiles get drawn over again.
+        for coord in sorted(list(self.highlight_tiles.keys()),
+                            key=lambda c: c[1] * 100 + c[0]):
+            self.cleantiles.append(coord)
+        return True
+
+    def redraw_region(self, region):
+        """
+        Recomposite the given DirtyRegion, plus everything around it which
+        might overlap it, onto our map layers and then the main map image.
+        Tiles are drawn a row at a time from the top down, so overlapping
+        graphics end up in the right order.
+        """
 
-        # Set up a surface to use
-        over_surf = cairo.ImageSurface(
-            cairo.FORMAT_ARGB32, self.z_width * 2, self.z_5xheight)
+        rect = self.region_pixel_rect(region)
+        (global_offset_x, global_offset_y, width, height) = rect
+
+        # Set up surfaces to use
+        over_surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
         over_ctx = cairo.Context(over_surf)
         over_ctx.set_source_rgba(0, 0, 0, 1)
         over_ctx.paint()
+        overlay_surfs = {}
+        overlay_ctxs = []
+        for name in self.OVERLAY_LAYERS:
+            overlay_surfs[name] = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32, width, height)
+            overlay_ctxs.append((name, cairo.Context(overlay_surfs[name])))
 
         # Grab some local vars
         tiles = self.mapobj.tiles
         huge_gfx_rows = self.huge_gfx_rows
-        global_offset_x = global_x + 1
-        global_offset_y = self.z_halfheight * (y - 8) + 1
+        min_x = max(0, region.x1 - 2)
+        max_x = min(99, region.x2 + 2)
+        min_y = max(0, region.y1 - 9)
+        max_y = min(199, region.y2 + 9)
 
         # Loop through and composite the new image area
-        for i in range(10):
-            # Draw tier 1 tiles first, then tier 2
-            if (-1 < tier_1_y < 200):
-                for (tier_i, tier_x) in enumerate(tier_1_x):
-                    yval = self.z_halfheight + ((i - 5) * self.z_height)
-                    if (-1 < tier_x < 100):
-                        (op_buf, offset) = self.draw_tile(
-                            tier_x, tier_1_y, False, False)
-                        over_ctx.set_source_surface(
-                            op_buf, ((-3 + (2 * tier_i)) * self.z_halfwidth) - offset + self.z_halfwidth, yval)
-                        over_ctx.paint()
-                # Redraw any "huge" graphics in this row
-                if c.book > 1:
-                    for gfx_x in huge_gfx_rows[tier_1_y]:
-                        self.draw_huge_gfx(
-                            tiles[tier_1_y][gfx_x], over_ctx, global_offset_x, global_offset_y)
-            if (i < 9):
-                if (-1 < tier_2_y < 200):
-                    for (tier_i, tier_x) in enumerate(tier_2_x):
-                        if (-1 < tier_x < 100):
-                            (op_buf, offset) = self.draw_tile(
-                                tier_x, tier_2_y, False, False)
-                            over_ctx.set_source_surface(
-                                op_buf, ((-1 + tier_i) * self.z_width) - offset + self.z_halfwidth, (i - 4) * self.z_height)
-                            over_ctx.paint()
-                # Redraw any "huge" graphics in this row
-                if c.book > 1:
-                    if tier_2_y < 200:
-                        for gfx_x in huge_gfx_rows[tier_2_y]:
-                            self.draw_huge_gfx(
-                                tiles[tier_2_y][gfx_x], over_ctx, global_offset_x, global_offset_y)
-            tier_1_y += 2
-            tier_2_y += 2
+        for tile_y in range(min_y, max_y + 1):
+            for tile_x in range(min_x, max_x + 1):
+                self.paint_tile_layers(tile_x, tile_y, self.tilebuf, over_ctx,
+                                       overlay_ctxs, global_offset_x, global_offset_y)
+            # Redraw any "huge" graphics in this row
+            if c.book > 1:
+                for gfx_x in huge_gfx_rows[tile_y]:
+                    self.paint_huge_gfx_layers(tiles[tile_y][gfx_x], over_ctx,
+                                               overlay_ctxs, global_offset_x, global_offset_y)
 
         # This is a bit overkill, but easier than trying to figure out how far up any
         # big graphics go.
-        for yval in range(tier_1_y - 1, 200):
-            for gfx_x in huge_gfx_rows[yval]:
-                self.draw_huge_gfx(
-                    tiles[yval][gfx_x], over_ctx, global_offset_x, global_offset_y)
+        if c.book > 1:
+            for yval in range(max_y + 1, 200):
+                for gfx_x in huge_gfx_rows[yval]:
+                    self.paint_huge_gfx_layers(tiles[yval][gfx_x], over_ctx,
+                                               overlay_ctxs, global_offset_x, global_offset_y)
 
-        # Now superimpose that onto our main map image
-        self.guicache_ctx.set_source_surface(
-            over_surf, global_offset_x, global_offset_y)
-        self.guicache_ctx.paint()
-        self.ctx.set_source_surface(
+        # Now replace that area of our map layers, and recomposite
+        self.basecache_ctx.set_source_surface(
             over_surf, global_offset_x, global_offset_y)
-        self.ctx.paint()
-        self.cleantiles.append((x, y))
-        self.maparea.queue_draw()
+        self.basecache_ctx.paint()
+        for name in self.OVERLAY_LAYERS:
+            ctx = self.overlay_ctxs[name]
+            ctx.save()
+            ctx.rectangle(*rect)
+            ctx.clip()
+            ctx.set_operator(cairo.OPERATOR_SOURCE)
+            ctx.set_source_surface(
+                overlay_surfs[name], global_offset_x, global_offset_y)
+            ctx.paint()
+            ctx.restore()
+        self.recomposite_map(rect)
 
         return True
 
+    def queue_draw_tile(self, x, y):
+        """
+        Invalidates the window area a single tile (and its graphics) can
+        occupy, so that expose_map will blit it.  We pad either side by
+        a tile width to account for wide entities.
+        """
+        if (y % 2 == 1):
+            xpad = self.z_halfwidth
+        else:
+            xpad = 0
+        self.maparea.queue_draw_area(
+            (x * self.z_width) + xpad + 1 -
+            self.z_tilebuf_offset - self.z_width,
+            (y * self.z_halfheight) + 1 - self.z_4xheight,
+            self.z_tilebuf_w + (self.z_width * 2),
+            self.z_5xheight)
+
     def format_zoomlevel(self, widget, value):
         """ Formats the zoom slider scale. """
         return 'Lvl %d' % (value + 1)
@@ -3293,11 +3375,9 @@ class MapGUI(BaseGUI):
             # already sent a queue_draw to the main maparea, so we don't have
             # to do it again here.
             if (self.drawing):
-                for (x, y) in list(self.highlight_tiles.keys()):
-                    self.action_draw_tile(x, y)
+                self.action_draw_tiles(list(self.highlight_tiles.keys()))
             elif (self.erasing):
-                for (x, y) in list(self.highlight_tiles.keys()):
-                    self.action_erase_tile(x, y)
+                self.action_erase_tiles(list(self.highlight_tiles.keys()))
             elif (self.copying):
                 self.action_copy_tiles(
                     self.tile_x, self.tile_y, list(self.highlight_tiles.keys()))
@@ -3370,8 +3450,9 @@ class MapGUI(BaseGUI):
             if local_cleantiles[coord]:
                 self.cleantiles.append(coord)
 
-        # Now queue up a draw
-        self.maparea.queue_draw()
+        # Now queue up a draw, but only of the areas we've touched
+        for coord in tiles_sorted:
+            self.queue_draw_tile(*coord)
 
     def set_entity_toggle_button(self, show_add):
         if (show_add):
@@ -4598,6 +4679,11 @@ class MapGUI(BaseGUI):
             return
 
         action = self.mouse_action_maps[self.edit_mode][event.button]
+
+        # Don't allow any editing while the map is still being drawn
+        if (self.render_job is not None and action != self.ACTION_DRAG):
+            return
+
         if (action == self.ACTION_DRAG):
             adjust = self.mainscroll.get_hadjustment()
             self.dragging = True
@@ -4621,12 +4707,10 @@ class MapGUI(BaseGUI):
                     self.tilewindow.show()
         elif (action == self.ACTION_DRAW):
             self.drawing = True
-            for (x, y) in list(self.highlight_tiles.keys()):
-                self.action_draw_tile(x, y)
+            self.action_draw_tiles(list(self.highlight_tiles.keys()))
         elif (action == self.ACTION_ERASE):
             self.erasing = True
-            for (x, y) in list(self.highlight_tiles.keys()):
-                self.action_erase_tile(x, y)
+            self.action_erase_tiles(list(self.highlight_tiles.keys()))
         elif (action == self.ACTION_OBJECT):
             self.action_place_object_tile(self.tile_x, self.tile_y)
         elif (action == self.ACTION_COPY):
@@ -4682,203 +4766,274 @@ class MapGUI(BaseGUI):
         # we arrested the mouse with the new window)
         self.on_released()
 
-    def action_draw_tile(self, x, y):
-        """ What to do when we're drawing on a tile on the map. """
-        # First store our undo state
+    # Neighbors which smart wall and floor drawing may touch
+    SMART_WALL_DIRS = [Map.DIR_NE, Map.DIR_SE, Map.DIR_SW, Map.DIR_NW]
+    SMART_FLOOR_DIRS = [Map.DIR_NE, Map.DIR_E, Map.DIR_SE, Map.DIR_S,
+                        Map.DIR_SW, Map.DIR_W, Map.DIR_NW, Map.DIR_N]
+
+    def start_tiles_undo(self, coords, text):
+        """
+        Starts a single undo step covering every tile in coords (the whole
+        area under the brush), and returns the tile objects.
+        """
+        (x, y) = coords[0]
         self.undo.store(x, y)
-        self.undo.set_text('Draw')
+        self.undo.set_text(text)
+        tiles = [self.mapobj.tiles[y][x] for (x, y) in coords]
+        for tile in tiles[1:]:
+            self.undo.add_additional(tile)
+        return tiles
+
+    def store_hugegfx_states(self, tiles):
+        """ store_hugegfx_state() for a list of tiles; returns the states. """
+        states = []
+        for tile in tiles:
+            self.store_hugegfx_state(tile)
+            states.append(self.cur_hugegfx_state)
+        return states
+
+    def check_hugegfx_states(self, tiles, states):
+        """
+        check_hugegfx_state() for a list of tiles, against the states from
+        store_hugegfx_states().  Returns True if a redraw of the map is
+        needed.
+        """
+        redraw = False
+        for (tile, state) in zip(tiles, states):
+            self.cur_hugegfx_state = state
+            if self.check_hugegfx_state(tile):
+                redraw = True
+        return redraw
+
+    def add_neighbors_to_undo(self, tiles, dirs):
+        """
+        Adds the neighbors of the given tiles to our current undo step, for
+        smart drawing.  Tiles already in the step are skipped.
+        """
+        seen = set([(tile.x, tile.y) for tile in tiles])
+        for tile in tiles:
+            for dir in dirs:
+                adjtile = self.mapobj.tile_relative(tile.x, tile.y, dir)
+                if adjtile is not None and (adjtile.x, adjtile.y) not in seen:
+                    seen.add((adjtile.x, adjtile.y))
+                    self.undo.add_additional(adjtile)
+
+    def smart_draw_walls(self, tiles, text):
+        """
+        Runs smart wall drawing over all the given tiles at once, and
+        returns the coordinates of the other tiles it changed.
+        """
+        self.add_neighbors_to_undo(tiles, self.SMART_WALL_DIRS)
+        if any([self.smartdraw.get_wall_group(tile) is not None for tile in tiles]):
+            self.undo.set_text(text)
+        return [(adjtile.x, adjtile.y) for adjtile in self.smartdraw.draw_walls(tiles)]
+
+    def smart_draw_floors(self, tiles, text):
+        """
+        Runs smart floor drawing over all the given tiles at once, and
+        returns the coordinates of the other tiles it changed.
+        """
+        self.add_neighbors_to_undo(tiles, self.SMART_FLOOR_DIRS)
+        self.undo.set_text(text)
+        affected = self.smartdraw.draw_floors(tiles, self.draw_straight_paths.get_active())
+        return [(adjtile.x, adjtile.y) for adjtile in affected]
+
+    def paint_tile(self, tile):
+        """ Sets the tile attributes the user has asked us to draw. """
+        if (self.draw_floor_checkbox.get_active()):
+            tile.floorimg = int(self.draw_floor_spin.get_value())
+        if (self.draw_decal_checkbox.get_active()):
+            tile.decalimg = int(self.draw_decal_spin.get_value())
+        if (self.draw_wall_checkbox.get_active()):
+            tile.wallimg = int(self.draw_wall_spin.get_value())
+        if (self.draw_walldecal_checkbox.get_active()):
+            tile.walldecalimg = int(self.draw_walldecal_spin.get_value())
+
+        # Check to see if we should change the "wall" flag
+        if (self.draw_barrier.get_active()):
+            if (self.draw_barrier_seethrough.get_active()):
+                tile.wall = 5
+            else:
+                tile.wall = 1
+        elif (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
+            # TODO: it would be nice to check to see if we really should be updating
+            # barriers here...  as it is, if you leave all the "drawing" checkboxes off
+            # but draw around, this function will update barrier information as it goes.
+            # Ah well.  For now I'm just going to let it do that.
+            # if (self.draw_wall_checkbox.get_active() or self.draw_floor_checkbox.get_active() or
+            #        self.draw_decal_checkbox.get_active()):
+            if (tile.walldecalimg in self.smartdraw.wall_list['walldecal_seethrough']):
+                tile.wall = 5
+            elif (c.book > 1 and tile.wallimg in self.smartdraw.wall_list['wall_restrict']):
+                tile.wall = 2
+            elif (tile.wallimg in self.smartdraw.wall_list['wall_blocked']):
+                tile.wall = 1
+            elif (tile.wallimg in self.smartdraw.wall_list['wall_seethrough']):
+                tile.wall = 5
+            elif (tile.decalimg in self.smartdraw.wall_list['decal_blocked']):
+                tile.wall = 1
+            elif (tile.decalimg in self.smartdraw.wall_list['decal_seethrough']):
+                tile.wall = 5
+            elif (tile.floorimg in self.smartdraw.wall_list['floor_seethrough']):
+                tile.wall = 5
+            else:
+                tile.wall = 0
+
+    def action_draw_tiles(self, coords):
+        """
+        What to do when we're drawing on the map.  coords holds every tile
+        under the brush, which all go into a single undo step.  Smart walls
+        and floors are worked out for the whole lot at once (see
+        SmartDraw.draw_walls() and draw_floors()), rather than having each
+        tile fix up its neighbors only for the next tile to redo them, and
+        everything which changed is handed to redraw_tiles() in one go.
+        """
+        if len(coords) == 0:
+            return
+        tiles = self.start_tiles_undo(coords, 'Draw')
+        redraw = list(coords)
 
         try:
-            # Grab our tile object
-            tile = self.mapobj.tiles[y][x]
             if c.book > 1:
-                self.store_hugegfx_state(tile)
+                hugegfx_states = self.store_hugegfx_states(tiles)
 
             # Now draw anything that the user's requesed
-            if (self.draw_floor_checkbox.get_active()):
-                tile.floorimg = int(self.draw_floor_spin.get_value())
-            if (self.draw_decal_checkbox.get_active()):
-                tile.decalimg = int(self.draw_decal_spin.get_value())
-            if (self.draw_wall_checkbox.get_active()):
-                tile.wallimg = int(self.draw_wall_spin.get_value())
-            if (self.draw_walldecal_checkbox.get_active()):
-                tile.walldecalimg = int(self.draw_walldecal_spin.get_value())
-
-            # Check to see if we should change the "wall" flag
-            if (self.draw_barrier.get_active()):
-                if (self.draw_barrier_seethrough.get_active()):
-                    tile.wall = 5
-                else:
-                    tile.wall = 1
-            elif (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
-                # TODO: it would be nice to check to see if we really should be updating
-                # barriers here...  as it is, if you leave all the "drawing" checkboxes off
-                # but draw around, this function will update barrier information as it goes.
-                # Ah well.  For now I'm just going to let it do that.
-                # if (self.draw_wall_checkbox.get_active() or self.draw_floor_checkbox.get_active() or
-                #        self.draw_decal_checkbox.get_active()):
-                if (tile.walldecalimg in self.smartdraw.wall_list['walldecal_seethrough']):
-                    tile.wall = 5
-                elif (c.book > 1 and tile.wallimg in self.smartdraw.wall_list['wall_restrict']):
-                    tile.wall = 2
-                elif (tile.wallimg in self.smartdraw.wall_list['wall_blocked']):
-                    tile.wall = 1
-                elif (tile.wallimg in self.smartdraw.wall_list['wall_seethrough']):
-                    tile.wall = 5
-                elif (tile.decalimg in self.smartdraw.wall_list['decal_blocked']):
-                    tile.wall = 1
-                elif (tile.decalimg in self.smartdraw.wall_list['decal_seethrough']):
-                    tile.wall = 5
-                elif (tile.floorimg in self.smartdraw.wall_list['floor_seethrough']):
-                    tile.wall = 5
-                else:
-                    tile.wall = 0
+            for tile in tiles:
+                self.paint_tile(tile)
 
             # Handle "smart" walls if requested
             if (self.draw_wall_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_wall.get_active()):
-                for dir in [Map.DIR_NE, Map.DIR_SE, Map.DIR_SW, Map.DIR_NW]:
-                    self.undo.add_additional(
-                        self.mapobj.tile_relative(x, y, dir))
-                affected_tiles = self.smartdraw.draw_wall(tile)
-                if (affected_tiles is not None):
-                    self.undo.set_text('Smart Wall Draw')
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                redraw.extend(self.smart_draw_walls(tiles, 'Smart Wall Draw'))
             if (self.draw_wall_checkbox.get_active() and self.smartdraw_check.get_active() and self.smart_complex_objects.get_active()):
-                (text, affected_tiles) = self.smartdraw.draw_smart_complex_wall(
-                    tile, self.undo)
-                if (text is not None):
-                    self.undo.set_text('Smart Wall Draw (%s)' % (text))
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                for tile in tiles:
+                    (text, affected_tiles) = self.smartdraw.draw_smart_complex_wall(
+                        tile, self.undo)
+                    if (text is not None):
+                        self.undo.set_text('Smart Wall Draw (%s)' % (text))
+                        redraw.extend([(adjtile.x, adjtile.y) for adjtile in affected_tiles])
 
             # Handle "smart" floors if needed
             if (self.draw_floor_checkbox.get_active() and
                     not self.draw_decal_checkbox.get_active() and
                     self.smartdraw_check.get_active() and
                     self.draw_smart_floor.get_active()):
-                for dir in [Map.DIR_NE, Map.DIR_E, Map.DIR_SE, Map.DIR_S, Map.DIR_SW, Map.DIR_W, Map.DIR_NW, Map.DIR_N]:
-                    self.undo.add_additional(
-                        self.mapobj.tile_relative(x, y, dir))
-                affected_tiles = self.smartdraw.draw_floor(
-                    tile, self.draw_straight_paths.get_active())
-                if (affected_tiles is not None):
-                    self.undo.set_text('Smart Draw')
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                redraw.extend(self.smart_draw_floors(tiles, 'Smart Draw'))
             if (self.draw_floor_checkbox.get_active() and self.smartdraw_check.get_active() and self.smart_complex_objects.get_active()):
-                (text, affected_tiles) = self.smartdraw.draw_smart_complex_floor(
-                    tile, self.undo)
-                if (text is not None):
-                    self.undo.set_text('Smart Draw (%s)' % (text))
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
-
-            # Handles "smart" decals if needed
-            if (self.draw_decal_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_floor.get_active()):
-                self.smartdraw.draw_decal(tile)
-            if (self.draw_walldecal_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_walldecal.get_active()):
-                self.smartdraw.draw_walldecal(tile)
-
-            # Smart decals (triggered by the floor checkbox for now)
-            if (self.draw_decal_checkbox.get_active() and self.smartdraw_check.get_active() and self.smart_complex_objects.get_active()):
-                (text, affected_tiles) = self.smartdraw.draw_smart_complex_decal(
-                    tile, self.undo)
-                if (text is not None):
-                    self.undo.set_text('Smart Draw (%s)' % (text))
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                for tile in tiles:
+                    (text, affected_tiles) = self.smartdraw.draw_smart_complex_floor(
+                        tile, self.undo)
+                    if (text is not None):
+                        self.undo.set_text('Smart Draw (%s)' % (text))
+                        redraw.extend([(adjtile.x, adjtile.y) for adjtile in affected_tiles])
+
+            for tile in tiles:
+                # Handles "smart" decals if needed
+                if (self.draw_decal_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_floor.get_active()):
+                    self.smartdraw.draw_decal(tile)
+                if (self.draw_walldecal_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_walldecal.get_active()):
+                    self.smartdraw.draw_walldecal(tile)
+
+                # Smart decals (triggered by the floor checkbox for now)
+                if (self.draw_decal_checkbox.get_active() and self.smartdraw_check.get_active() and self.smart_complex_objects.get_active()):
+                    (text, affected_tiles) = self.smartdraw.draw_smart_complex_decal(
+                        tile, self.undo)
+                    if (text is not None):
+                        self.undo.set_text('Smart Draw (%s)' % (text))
+                        redraw.extend([(adjtile.x, adjtile.y) for adjtile in affected_tiles])
 
             # And then close off our undo and redraw if needed
             if (self.undo.finish()):
-                self.redraw_tile(x, y)
+                self.redraw_tiles(list(dict.fromkeys(redraw)))
                 self.update_undo_gui()
 
             # Check for hugegfx changes
             if c.book > 1:
-                if self.check_hugegfx_state(tile):
+                if self.check_hugegfx_states(tiles, hugegfx_states):
                     self.draw_map()
 
         except Exception:
 
-            self.handle_editing_exception(x, y, sys.exc_info())
+            self.handle_editing_exception(coords[0][0], coords[0][1], sys.exc_info())
 
-    def action_erase_tile(self, x, y):
-        """ What to do when we're erasing on a tile on the map."""
+    def erase_tile(self, tile):
+        """ Erases the tile attributes (and objects) the user has asked for. """
+        (x, y) = (tile.x, tile.y)
+        if (self.erase_barrier.get_active()):
+            tile.wall = 0
+        if (self.erase_floor_checkbox.get_active()):
+            if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
+                if (tile.floorimg in self.smartdraw.wall_list['floor_seethrough']):
+                    tile.wall = 0
+            tile.floorimg = 0
+        if (self.erase_decal_checkbox.get_active()):
+            if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
+                if (tile.decalimg in self.smartdraw.wall_list['decal_blocked'] + self.smartdraw.wall_list['decal_seethrough']):
+                    tile.wall = 0
+            tile.decalimg = 0
+        if (self.erase_wall_checkbox.get_active()):
+            if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
+                tile.wall = 0
+            tile.wallimg = 0
+        if (self.erase_walldecal_checkbox.get_active()):
+            tile.walldecalimg = 0
+        if (self.erase_entity_checkbox.get_active()):
+            self.mapobj.delentity(x, y)
+        if (self.erase_object_checkbox.get_active()):
+            # If we erase a tilecontent which happens to be a Big Graphic, let's also
+            # clear out the wall ID, even if we haven't been told to
+            if c.book != 1 and tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
+                tile.wallimg = 0
+
+            # Now delete the actual tilecontent
+            num = len(tile.tilecontents)
+            for i in range(num):
+                self.mapobj.deltilecontent(x, y, 0)
+            tile.tilecontentid = 0
+
+    def action_erase_tiles(self, coords):
+        """
+        What to do when we're erasing on the map.  As with
+        action_draw_tiles(), every tile under the brush goes into a single
+        undo step, and gets smart-drawn as a batch.
+        """
 
         # TODO: Figure out if we really should do any of the smartdraw
         # stuff here.  I'm not so sure.  And anyway, I suspect that
         # it may be not processing that stuff anyway right now.
 
-        # First store our undo state
-        self.undo.store(x, y)
-        self.undo.set_text('Erase')
+        if len(coords) == 0:
+            return
 
-        try:
+        # Erasing entities and objects touches more than the undo code
+        # keeps track of for additional tiles, so those have to go one
+        # tile at a time.
+        if (len(coords) > 1 and (self.erase_entity_checkbox.get_active() or
+                                 self.erase_object_checkbox.get_active())):
+            for coord in coords:
+                self.action_erase_tiles([coord])
+            return
 
-            # Grab our tile object
-            tile = self.mapobj.tiles[y][x]
+        tiles = self.start_tiles_undo(coords, 'Erase')
+        redraw = list(coords)
+
+        try:
             if c.book > 1:
-                self.store_hugegfx_state(tile)
+                hugegfx_states = self.store_hugegfx_states(tiles)
 
             # Now erase anything that the user's requesed
-            if (self.erase_barrier.get_active()):
-                tile.wall = 0
-            if (self.erase_floor_checkbox.get_active()):
-                if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
-                    if (tile.floorimg in self.smartdraw.wall_list['floor_seethrough']):
-                        tile.wall = 0
-                tile.floorimg = 0
-            if (self.erase_decal_checkbox.get_active()):
-                if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
-                    if (tile.decalimg in self.smartdraw.wall_list['decal_blocked'] + self.smartdraw.wall_list['decal_seethrough']):
-                        tile.wall = 0
-                tile.decalimg = 0
-            if (self.erase_wall_checkbox.get_active()):
-                if (self.smartdraw_check.get_active() and self.draw_smart_barrier.get_active()):
-                    tile.wall = 0
-                tile.wallimg = 0
-            if (self.erase_walldecal_checkbox.get_active()):
-                tile.walldecalimg = 0
-            if (self.erase_entity_checkbox.get_active()):
-                self.mapobj.delentity(x, y)
-            if (self.erase_object_checkbox.get_active()):
-                # If we erase a tilecontent which happens to be a Big Graphic, let's also
-                # clear out the wall ID, even if we haven't been told to
-                if c.book != 1 and tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
-                    tile.wallimg = 0
-
-                # Now delete the actual tilecontent
-                num = len(tile.tilecontents)
-                for i in range(num):
-                    self.mapobj.deltilecontent(x, y, 0)
-                tile.tilecontentid = 0
+            for tile in tiles:
+                self.erase_tile(tile)
 
             # Handle "smart" walls if requested
             if (self.draw_wall_checkbox.get_active() and self.smartdraw_check.get_active() and self.draw_smart_wall.get_active()):
-                for dir in [Map.DIR_NE, Map.DIR_SE, Map.DIR_SW, Map.DIR_NW]:
-                    self.undo.add_additional(
-                        self.mapobj.tile_relative(x, y, dir))
-                affected_tiles = self.smartdraw.draw_wall(tile)
-                if (affected_tiles is not None):
-                    self.undo.set_text('Smart Wall Erase')
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                redraw.extend(self.smart_draw_walls(tiles, 'Smart Wall Erase'))
 
             # Handle "smart" floors if needed
             if (self.erase_floor_checkbox.get_active() and
                     not self.erase_decal_checkbox.get_active() and
                     self.smartdraw_check.get_active() and
                     self.draw_smart_floor.get_active()):
-                for dir in [Map.DIR_NE, Map.DIR_E, Map.DIR_SE, Map.DIR_S, Map.DIR_SW, Map.DIR_W, Map.DIR_NW, Map.DIR_N]:
-                    self.undo.add_additional(
-                        self.mapobj.tile_relative(x, y, dir))
-                affected_tiles = self.smartdraw.draw_floor(
-                    tile, self.draw_straight_paths.get_active())
-                if (affected_tiles is not None):
-                    self.undo.set_text('Smart Erase')
-                    for adjtile in affected_tiles:
-                        self.redraw_tile(adjtile.x, adjtile.y)
+                redraw.extend(self.smart_draw_floors(tiles, 'Smart Erase'))
 
             # Handles "smart" wall decals if needed
             # This just randomizes, so don't bother here.
@@ -4887,19 +5042,19 @@ class MapGUI(BaseGUI):
 
             # And then close off our undo and redraw if needed
             if (self.undo.finish()):
-                self.redraw_tile(x, y)
+                self.redraw_tiles(list(dict.fromkeys(redraw)))
                 self.update_undo_gui()
 
             # Check for hugegfx changes
             if c.book > 1:
-                if self.check_hugegfx_state(tile):
+                if self.check_hugegfx_states(tiles, hugegfx_states):
                     self.draw_map()
                     # The map-rendering status window can leave us in a clicked state, let's clear that out
                     self.on_released()
 
         except Exception:
 
-            self.handle_editing_exception(x, y, sys.exc_info())
+            self.handle_editing_exception(coords[0][0], coords[0][1], sys.exc_info())
 
     def action_copy_tiles(self, x, y, coords):
         """ What to do when we're copying tile(s) on the map."""
@@ -5028,7 +5183,7 @@ class MapGUI(BaseGUI):
 
     def map_toggle(self, widget):
         if not self.updating_map_checkboxes:
-            self.draw_map()
+            self.redraw_for_toggles([widget])
 
     def mass_update_checkboxes(self, status, checkboxes):
         self.updating_map_checkboxes = True
@@ -5039,6 +5194,22 @@ class MapGUI(BaseGUI):
                 elem.set_active(status)
         self.updating_map_checkboxes = False
         if changed:
+            self.redraw_for_toggles(checkboxes)
+
+    def redraw_for_toggles(self, toggles):
+        """
+        Updates the map after the given toggles have changed.  Highlights
+        live in their own layers, so if only those have changed we can just
+        recomposite; anything else needs the map to be redrawn.
+        """
+        highlight_toggles = [self.barrier_hi_toggle,
+                             self.tilecontent_hi_toggle, self.entity_hi_toggle]
+        if (self.mapinit and self.render_job is None and
+                all(toggle in highlight_toggles for toggle in toggles)):
+            self.update_layer_toggles()
+            self.update_highlight_sensitivity()
+            self.recomposite_map()
+        else:
             self.draw_map()
 
     def draw_check_set_to(self, status):
@@ -5061,7 +5232,7 @@ class MapGUI(BaseGUI):
         self.highlight_check_set_to(False)
 
     # Assumes that the context is tilebuf_ctx, hence the hardcoded width/height
-    # We're passing it in so we're not constantly referencing self.tilebuf_ctx
+    # We're passing it in so we're not constantly referencing self.tilebuf.ctx
     def composite_simple(self, context, surface, color):
         context.save()
         context.set_operator(cairo.OPERATOR_ATOP)
@@ -5070,72 +5241,35 @@ class MapGUI(BaseGUI):
         context.fill()
         context.restore()
 
-    def draw_tile(self, x, y, usecache=False, do_main_paint=True):
-        """ Draw a single tile of the map. """
+    def draw_tile(self, x, y, usecache=False, do_main_paint=True, tilebuf=None, highlights=True):
+        """
+        Draw a single tile of the map.  Render threads pass in their own
+        TileBuffer to draw on; otherwise we use the main thread's.  If
+        highlights is False, the highlight colors aren't composited onto
+        the tile, since the map keeps those in separate layers (see
+        paint_tile_layers()).
+        """
 
         # TODO: Layers are pretty inefficient and slow here, IMO
-        barrier = False
-        tilecontent = False
         pointer = False
-        entity = False
 
         # Use local vars instead of continually calling out
         tile = self.mapobj.tiles[y][x]
-        tile_ctx = self.tilebuf_ctx
+        if tilebuf is None:
+            tilebuf = self.tilebuf
+        tile_surf = tilebuf.surf
+        tile_ctx = tilebuf.ctx
         main_ctx = self.ctx
+        toggles = self.layer_toggles
 
         if (do_main_paint and (x, y) in self.highlight_tiles):
             pointer = (1, 1, 1, 0.5)
 
-        if (tile.entity is not None):
-            if self.mapobj.is_savegame():
-                if (tile.entity.friendly == 1):
-                    entity = (0, 1, 0, 0.5)
-                else:
-                    entity = (1, 0, 0, 0.5)
-            else:
-                if tile.entity.entid in self.entitytable:
-                    if self.entitytable[tile.entity.entid].friendly == 1:
-                        entity = (0, 1, 0, 0.5)
-                    else:
-                        entity = (1, 0, 0, 0.5)
-                else:
-                    entity = (1, 0, 0, 0.5)
-
-        if c.book == 1:
-            if (tile.tilecontentid != 0 and len(tile.tilecontents) > 0):
-                tilecontent = (1, 1, 0, 0.5)
-            elif (tile.tilecontentid != 0 and len(tile.tilecontents) == 0):
-                tilecontent = (0, .784, .784, 0.5)
-            elif (tile.tilecontentid == 0 and len(tile.tilecontents) > 0):
-                # afaik, this doesn't happen.  should use something other than red here, though
-                tilecontent = (1, 0, 0, 0.5)
-        else:
-            if (tile.tilecontentid == 0 and len(tile.tilecontents) > 0):
-                # afaik, this doesn't happen.  should use something other than red here, though
-                tilecontent = (1, 0, 0, 0.5)
-            elif (25 <= tile.tilecontentid < 50):
-                tilecontent = (0, .784, .784, 0.5)
-            elif (tile.tilecontentid > 0 and len(tile.tilecontents) == 0):
-                # This shouldn't happen either
-                tilecontent = (1, 0, 0, 0.5)
-            elif (tile.wallimg >= 1000 and tile.tilecontentid == 0):
-                # Big Graphics which don't have associated objects
-                tilecontent = (1, 0, 0, 0.5)
-            elif (tile.wallimg > 1003):
-                # Maximum Big Graphic ID is 1003
-                tilecontent = (1, 0, 0, 0.5)
-            elif tile.tilecontentid > 0:
-                tilecontent = (1, 1, 0, 0.5)
-
-        if (tile.wall == 1):
-            barrier = (.784, .784, .784, 0.5)
-        elif (tile.wall == 2):
-            barrier = (.41, .75, .83, 0.5)
-        elif (tile.wall == 5):
-            barrier = (.684, .684, .950, 0.5)
-        elif (tile.floorimg == 126 and not self.floor_toggle.get_active()):
-            barrier = (0, 0, .784, 0.5)
+        # Our highlight colors have all been figured out ahead of time
+        overlays = self.overlay_masks.colors(x, y)
+        barrier = overlays['barrier']
+        tilecontent = overlays['tilecontent']
+        entity = overlays['entity']
 
         # TODO: xpad processing should be abstracted somehow when we're drawing whole rows
         # (for instance, when initially loading the map)
@@ -5195,7 +5329,7 @@ class MapGUI(BaseGUI):
         drawn = False
 
         # Draw the floor tile
-        if (tile.floorimg > 0 and self.floor_toggle.get_active()):
+        if (tile.floorimg > 0 and toggles['floor']):
             pixbuf = self.gfx.get_floor(tile.floorimg, self.curzoom)
             if (pixbuf is not None):
                 tile_ctx.set_source_surface(
@@ -5204,7 +5338,7 @@ class MapGUI(BaseGUI):
                 drawn = True
 
         # Draw the floor decal
-        if (tile.decalimg > 0 and self.decal_toggle.get_active()):
+        if (tile.decalimg > 0 and toggles['decal']):
             pixbuf = self.gfx.get_decal(tile.decalimg, self.curzoom)
             if (pixbuf is not None):
                 tile_ctx.set_source_surface(
@@ -5236,7 +5370,7 @@ class MapGUI(BaseGUI):
                 walltype = self.gfx.TYPE_NONE
 
             # Draw the object
-            if (walltype == self.gfx.TYPE_OBJ and self.object_toggle.get_active()):
+            if (walltype == self.gfx.TYPE_OBJ and toggles['object']):
                 (pixbuf, pixheight, offset) = self.gfx.get_object(
                     wallid, self.curzoom)
                 if (pixbuf is not None):
@@ -5256,7 +5390,7 @@ class MapGUI(BaseGUI):
                             tile_ctx.paint()
 
             # Draw walls
-            elif (walltype == self.gfx.TYPE_WALL and self.wall_toggle.get_active()):
+            elif (walltype == self.gfx.TYPE_WALL and toggles['wall']):
                 (pixbuf, pixheight, offset) = self.gfx.get_object(
                     wallid, self.curzoom)
                 if (pixbuf is not None):
@@ -5266,7 +5400,7 @@ class MapGUI(BaseGUI):
                     drawn = True
 
             # Draw trees
-            elif (walltype == self.gfx.TYPE_TREE and self.tree_toggle.get_active()):
+            elif (walltype == self.gfx.TYPE_TREE and toggles['tree']):
                 (pixbuf, pixheight, offset) = self.gfx.get_object(
                     wallid, self.curzoom, False, self.mapobj.tree_set)
                 if (pixbuf is not None):
@@ -5276,7 +5410,7 @@ class MapGUI(BaseGUI):
                     drawn = True
 
         # Draw a zapper
-        if (self.req_book > 1 and tile.tilecontentid == 19 and self.object_toggle.get_active()):
+        if (self.req_book > 1 and tile.tilecontentid == 19 and toggles['object']):
             pixbuf = self.gfx.get_zapper(self.curzoom)
             if pixbuf is not None:
                 xoffset = self.z_tilebuf_offset
@@ -5286,7 +5420,7 @@ class MapGUI(BaseGUI):
                 tile_ctx.paint()
 
         # Draw the object decal
-        if (tile.walldecalimg > 0 and self.objectdecal_toggle.get_active()):
+        if (tile.walldecalimg > 0 and toggles['objectdecal']):
             pixbuf = self.gfx.get_object_decal(tile.walldecalimg, self.curzoom)
             if (pixbuf is not None):
                 tile_ctx.set_source_surface(
@@ -5313,25 +5447,25 @@ class MapGUI(BaseGUI):
         # Draw the entity if needed
         # We switch to using op_ctx and op_surf because we may not be drawing on tile_ctx
         # from this point on, depending on entity width
-        op_surf = self.tilebuf
+        op_surf = tile_surf
         op_ctx = tile_ctx
         op_xoffset = 0
-        if (tile.entity is not None and self.entity_toggle.get_active()):
+        if (tile.entity is not None and toggles['entity']):
             ent_img = self.gfx.get_entity(
                 tile.entity.entid, tile.entity.direction, self.curzoom)
             if (ent_img is not None):
                 if (ent_img.get_width() > self.z_tilebuf_w):
                     # This whole bit here will copy our tilebuf into a larger surface, centered
                     # (so, transparent on the side)
-                    self.ent_surf = cairo.ImageSurface(
+                    ent_surf = cairo.ImageSurface(
                         cairo.FORMAT_ARGB32, ent_img.get_width(), self.z_5xheight)
-                    self.ent_ctx = cairo.Context(self.ent_surf)
+                    ent_ctx = cairo.Context(ent_surf)
                     op_xoffset = int(
                         (ent_img.get_width() - self.z_tilebuf_w) / 2)
-                    self.ent_ctx.set_source_surface(op_surf, op_xoffset, 0)
-                    self.ent_ctx.paint()
-                    op_surf = self.ent_surf
-                    op_ctx = self.ent_ctx
+                    ent_ctx.set_source_surface(op_surf, op_xoffset, 0)
+                    ent_ctx.paint()
+                    op_surf = ent_surf
+                    op_ctx = ent_ctx
                 if (op_surf.get_width() > ent_img.get_width()):
                     offset = int(
                         (op_surf.get_width() - ent_img.get_width()) / 2)
@@ -5348,10 +5482,12 @@ class MapGUI(BaseGUI):
         # primarily to avoid graphical glitches on cliff-face graphics, where
         # having the black tile overlay makes things look bad.)  Additionally
         # only do it if we would have done some highlighting.
-        drawbarrier = (barrier and self.barrier_hi_toggle.get_active())
-        drawtilecontent = (
-            tilecontent and self.tilecontent_hi_toggle.get_active())
-        drawentity = (entity and self.entity_hi_toggle.get_active())
+        tilebuf.drawn = drawn
+        tilebuf.overlays = overlays
+        drawbarrier = (highlights and barrier and toggles['barrier_hi'])
+        drawtilecontent = (highlights and
+                           tilecontent and toggles['tilecontent_hi'])
+        drawentity = (highlights and entity and toggles['entity_hi'])
         if (not drawn and (drawbarrier or drawtilecontent or drawentity)):
             tile_ctx.set_source_surface(self.basictile)
             tile_ctx.paint()
@@ -5422,12 +5558,91 @@ class MapGUI(BaseGUI):
         I'd rather not have to deal with in there (ie: we're always fully-zoomed-in
         here, we don't want to do any highlighting, entities won't actually get
         drawn, etc, etc).
+
+        Since this gets called every time one of the image spinners changes,
+        we keep the composite around one layer at a time (see COMPOSITE_LAYERS):
+        composite_prefixes[i] is the image with every layer below i already
+        drawn.  When a layer's value changes, we only have to start from the
+        image below it.  The pixbufs and placement for each layer value are
+        cached as well, by get_composite_layer_ops().
         """
 
-        # Grab our variables and clear out the pixbuf
         tile = self.mapobj.tiles[self.tile_y][self.tile_x]
-        comp_pixbuf = self.comp_pixbuf
-        comp_pixbuf.fill(0)
+        values = [getattr(tile, layer) for layer in self.COMPOSITE_LAYERS]
+
+        # Find the lowest layer which has changed since last time
+        if self.composite_prefixes[0] is None:
+            self.composite_prefixes[0] = self.comp_pixbuf.copy()
+            self.composite_prefixes[0].fill(0)
+        start = len(values)
+        for (idx, value) in enumerate(values):
+            if (value != self.composite_values[idx] or
+                    self.composite_prefixes[idx + 1] is None):
+                start = idx
+                break
+
+        # ... and rebuild from there on up
+        for idx in range(start, len(values)):
+            comp_pixbuf = self.composite_prefixes[idx].copy()
+            for (pixbuf, args) in self.get_composite_layer_ops(self.COMPOSITE_LAYERS[idx], values[idx]):
+                pixbuf.composite(comp_pixbuf, *args)
+            self.composite_prefixes[idx + 1] = comp_pixbuf
+            self.composite_values[idx] = values[idx]
+
+        # ... and update the main image
+        self.get_widget('composite_area').set_from_pixbuf(
+            self.composite_prefixes[-1])
+
+    def reset_composite_cache(self):
+        """
+        Clears out our tile-window composite caches.  Wall graphics depend on
+        the map's tree set, so this needs to happen whenever a map is loaded,
+        or its tree set gets changed in the properties window.
+        """
+        self.composite_ops = {}
+        self.composite_torch = None
+        self.composite_values = [None] * len(self.COMPOSITE_LAYERS)
+        self.composite_prefixes = [None] * (len(self.COMPOSITE_LAYERS) + 1)
+
+    def get_composite_torch(self):
+        """
+        Returns a tuple of the torch pixbuf, and a dict of its magic offsets,
+        for our tile composite image.
+
+        These torch numbers are rather Magic.  They come from
+        when we still had everything hardcoded (from Book 1, since it
+        wasn't a problem then) and would just nudge things pixel-by-pixel.
+        Here we're just computing the ratio based on if height_x4 was 104,
+        and then scaling to the *actual* height_x4.  It's dumb, yeah.
+        """
+        if self.composite_torch is None:
+            width = self.gfx.tile_width
+            height_x4 = width * 2
+            torchbuf = self.gfx.get_flame(width, True)
+            offsets = {}
+            if torchbuf is not None:
+                offsets['width'] = torchbuf.get_property('width')
+                offsets['height'] = torchbuf.get_property('height')
+            offsets['decalyoff'] = int((88 / 104.0) * height_x4)
+            offsets['wallyoff'] = int((35 / 104.0) * height_x4)
+            offsets['wallyoff2'] = int((30 / 104.0) * height_x4)
+            offsets['sconceyoff'] = int((58 / 104.0) * height_x4)
+            offsets['sconceyoff2'] = int((30 / 104.0) * height_x4)
+            offsets['sconcexoff'] = int((29 / 52.0) * width)
+            offsets['sconcexoff2'] = int((5 / 52.0) * width)
+            self.composite_torch = (torchbuf, offsets)
+        return self.composite_torch
+
+    def get_composite_layer_ops(self, layer, value):
+        """
+        Returns a list of (pixbuf, args) tuples which draw the given layer
+        value onto our tile composite image, where args are the arguments
+        to pixbuf.composite() following the destination pixbuf.  Results
+        are cached.
+        """
+        key = (layer, value)
+        if key in self.composite_ops:
+            return self.composite_ops[key]
 
         # Sizing vars
         width = self.gfx.tile_width
@@ -5436,91 +5651,68 @@ class MapGUI(BaseGUI):
         height = self.gfx.tile_height
         height_x2 = width
         height_x3 = height * 3
+        nearest = GdkPixbuf.InterpType.NEAREST
 
-        # These torch numbers are rather Magic.  They come from
-        # when we still had everything hardcoded (from Book 1, since it
-        # wasn't a problem then) and would just nudge things pixel-by-pixel.
-        # Here we're just computing the ratio based on if height_x4 was 104,
-        # and then scaling to the *actual* height_x4.  It's dumb, yeah.
-        torchbuf = self.gfx.get_flame(width, True)
-        torchwidth = torchbuf.get_property('width')
-        torchheight = torchbuf.get_property('height')
-        torchdecalyoff = int((88 / 104.0) * height_x4)
-        torchwallyoff = int((35 / 104.0) * height_x4)
-        torchwallyoff2 = int((30 / 104.0) * height_x4)
-        torchsconceyoff = int((58 / 104.0) * height_x4)
-        torchsconceyoff2 = int((30 / 104.0) * height_x4)
-        torchsconcexoff = int((29 / 52.0) * width)
-        torchsconcexoff2 = int((5 / 52.0) * width)
-
-        # Now do all the actual compositing
-        if (tile.floorimg > 0):
-            pixbuf = self.gfx.get_floor(tile.floorimg, width, True)
-            if (pixbuf is not None):
-                pixbuf.composite(comp_pixbuf,
-                                 0, height_x4,
-                                 width, height,
-                                 0, height_x4,
-                                 1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-        if (tile.decalimg > 0):
-            pixbuf = self.gfx.get_decal(tile.decalimg, width, True)
-            if (pixbuf is not None):
-                pixbuf.composite(comp_pixbuf,
-                                 0, height_x4,
-                                 width, height,
-                                 0, height_x4,
-                                 1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-            if ((self.req_book == 1 and tile.decalimg == 52) or
-                (self.req_book == 2 and tile.decalimg == 101) or
-                    (self.req_book == 3 and tile.decalimg == 101)):
-                if (torchbuf is not None):
-                    torchbuf.composite(comp_pixbuf,
-                                       torchwidth - 1, torchdecalyoff,
-                                       torchwidth, torchheight,
-                                       torchwidth - 1, torchdecalyoff,
-                                       1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-        if (tile.wallimg > 0):
-            (pixbuf, pixheight, offset) = self.gfx.get_object(
-                tile.wallimg, width, True, self.mapobj.tree_set)
-            if (pixbuf is not None):
-                pixbuf.composite(comp_pixbuf,
-                                 0, height * (4 - pixheight),
-                                 width, height * (pixheight + 1),
-                                 offset, height * (4 - pixheight),
-                                 1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-            if (self.req_book == 2 and (tile.wallimg == 349 or tile.wallimg == 350)):
-                if (torchbuf is not None):
-                    torchbuf.composite(comp_pixbuf,
-                                       torchwidth - 1, torchwallyoff,
-                                       torchwidth, torchwallyoff2,
-                                       torchwidth - 1, torchwallyoff,
-                                       1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-        if (tile.walldecalimg > 0):
-            pixbuf = self.gfx.get_object_decal(tile.walldecalimg, width, True)
-            if (pixbuf is not None):
-                pixbuf.composite(comp_pixbuf,
-                                 0, height_x2,
-                                 width, height_x3,
-                                 0, height_x2,
-                                 1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-            if ((self.req_book == 1 and (tile.walldecalimg == 17 or tile.walldecalimg == 18)) or
-                    (self.req_book == 2 and (tile.walldecalimg == 2 or tile.walldecalimg == 4))):
-                if (torchbuf is not None):
-                    if (tile.walldecalimg == 17 or tile.walldecalimg == 2):
-                        torchbuf.composite(comp_pixbuf,
-                                           torchsconcexoff, torchsconceyoff,
-                                           torchwidth, torchsconceyoff2,
-                                           torchsconcexoff, torchsconceyoff,
-                                           1, 1, GdkPixbuf.InterpType.NEAREST, 255)
-                    elif (tile.walldecalimg == 18 or tile.walldecalimg == 4):
-                        torchbuf.composite(comp_pixbuf,
-                                           torchsconcexoff2, torchsconceyoff,
-                                           torchwidth, torchsconceyoff2,
-                                           torchsconcexoff2, torchsconceyoff,
-                                           1, 1, GdkPixbuf.InterpType.NEAREST, 255)
+        (torchbuf, torch) = self.get_composite_torch()
+        ops = []
+        if value > 0:
+            if layer == 'floorimg':
+                pixbuf = self.gfx.get_floor(value, width, True)
+                if (pixbuf is not None):
+                    ops.append((pixbuf, (0, height_x4,
+                                         width, height,
+                                         0, height_x4,
+                                         1, 1, nearest, 255)))
+            elif layer == 'decalimg':
+                pixbuf = self.gfx.get_decal(value, width, True)
+                if (pixbuf is not None):
+                    ops.append((pixbuf, (0, height_x4,
+                                         width, height,
+                                         0, height_x4,
+                                         1, 1, nearest, 255)))
+                if ((self.req_book == 1 and value == 52) or
+                    (self.req_book == 2 and value == 101) or
+                        (self.req_book == 3 and value == 101)):
+                    if (torchbuf is not None):
+                        ops.append((torchbuf, (torch['width'] - 1, torch['decalyoff'],
+                                               torch['width'], torch['height'],
+                                               torch['width'] - 1, torch['decalyoff'],
+                                               1, 1, nearest, 255)))
+            elif layer == 'wallimg':
+                (pixbuf, pixheight, offset) = self.gfx.get_object(
+                    value, width, True, self.mapobj.tree_set)
+                if (pixbuf is not None):
+                    ops.append((pixbuf, (0, height * (4 - pixheight),
+                                         width, height * (pixheight + 1),
+                                         offset, height * (4 - pixheight),
+                                         1, 1, nearest, 255)))
+                if (self.req_book == 2 and (value == 349 or value == 350)):
+                    if (torchbuf is not None):
+                        ops.append((torchbuf, (torch['width'] - 1, torch['wallyoff'],
+                                               torch['width'], torch['wallyoff2'],
+                                               torch['width'] - 1, torch['wallyoff'],
+                                               1, 1, nearest, 255)))
+            elif layer == 'walldecalimg':
+                pixbuf = self.gfx.get_object_decal(value, width, True)
+                if (pixbuf is not None):
+                    ops.append((pixbuf, (0, height_x2,
+                                         width, height_x3,
+                                         0, height_x2,
+                                         1, 1, nearest, 255)))
+                if ((self.req_book == 1 and (value == 17 or value == 18)) or
+                        (self.req_book == 2 and (value == 2 or value == 4))):
+                    if (torchbuf is not None):
+                        if (value == 17 or value == 2):
+                            xoff = torch['sconcexoff']
+                        else:
+                            xoff = torch['sconcexoff2']
+                        ops.append((torchbuf, (xoff, torch['sconceyoff'],
+                                               torch['width'], torch['sconceyoff2'],
+                                               xoff, torch['sconceyoff'],
+                                               1, 1, nearest, 255)))
 
-        # ... and update the main image
-        self.get_widget('composite_area').set_from_pixbuf(comp_pixbuf)
+        self.composite_ops[key] = ops
+        return ops
 
     def export_map_pngs(self):
         """
@@ -5534,6 +5726,7 @@ class MapGUI(BaseGUI):
         for file in self.filename:
             self.load_from_file(file)
             # self.draw_map()
+            self.wait_for_render()
             (pngfile, junk) = file.split('.')
             pngfile = '%s.png' % (pngfile)
             self.guicache.write_to_png(pngfile)
@@ -5570,11 +5763,6 @@ class MapGUI(BaseGUI):
                     self.huge_gfx_rows[tile.y].append(tile.x)
                     self.huge_gfx_rows[tile.y].sort()
 
-            # Rather than try and be clever by maintaining our Big Graphic
-            # mapping information, we'll just totally regenerate the list
-            # whenever the GUI feels the need to redraw the map.
-            self.mapobj.big_gfx_mappings.load()
-
             return True
         else:
             return False
@@ -5585,15 +5773,27 @@ class MapGUI(BaseGUI):
         a part of expose_map, but this way we can throw up a progress dialog
         so the user's not wondering what's going on.
 
-        Note that we're drawing to the main window HERE instead of in the
-        setup areas of expose_map, so that the old map image stays onscreen
-        for as long as possible.
+        The actual tile compositing happens in a pool of render threads
+        (see render_chunk()), each of which draws a band of rows onto its
+        own surfaces.  poll_render() picks those up as they finish and pastes
+        them onto the map, so the GUI stays responsive while we draw, and
+        a render which gets superseded (by another zoom change, say) is
+        cancelled rather than run to completion.
+
+        The map itself is kept in a few layers: basecache holds the plain
+        map graphics, and each class of highlight (see OVERLAY_LAYERS) has
+        its own layer.  Those get combined into guicache, which is what's
+        actually shown, by recomposite_map().  That way toggling highlights
+        on and off doesn't require a redraw.
 
         One further note: this is kicked off from maparea's 'realize' signal
         """
 
+        # If we're already in the middle of drawing, stop that.
+        self.cancel_render()
+
         # Timing, and statusbar
-        time_a = time.time()
+        self.render_start = time.time()
         self.drawstatusbar.set_fraction(0)
         self.drawstatuswindow.show()
 
@@ -5608,9 +5808,7 @@ class MapGUI(BaseGUI):
         self.ctx.set_source_rgba(0, 0, 0, 1)
         self.ctx.paint()
 
-        self.tilebuf = cairo.ImageSurface(
-            cairo.FORMAT_ARGB32, self.z_tilebuf_w, self.z_5xheight)
-        self.tilebuf_ctx = cairo.Context(self.tilebuf)
+        self.tilebuf = TileBuffer(self.z_tilebuf_w, self.z_5xheight)
         self.guicache = cairo.ImageSurface(
             cairo.FORMAT_ARGB32, self.z_mapsize_x, self.z_mapsize_y)
         self.guicache_ctx = cairo.Context(self.guicache)
@@ -5618,29 +5816,20 @@ class MapGUI(BaseGUI):
         self.guicache_ctx.set_source_rgba(0, 0, 0, 1)
         self.guicache_ctx.paint()
 
-        self.ent_surf = None
-        self.ent_ctx = None
-
-        # Activate (or deactivate) our "draw barrier" checkboxes depending on if we're highlighting
-        # barriers or not
-        if (self.barrier_hi_toggle.get_active()):
-            self.draw_barrier.set_sensitive(True)
-            self.draw_barrier_seethrough.set_sensitive(True)
-            self.erase_barrier.set_sensitive(True)
-        else:
-            self.draw_barrier.set_sensitive(False)
-            self.draw_barrier.set_active(False)
-            self.draw_barrier_seethrough.set_sensitive(False)
-            self.draw_barrier_seethrough.set_active(False)
-            self.erase_barrier.set_sensitive(False)
-            self.erase_barrier.set_active(False)
-
-        # ... and also for objects
-        if (self.tilecontent_hi_toggle.get_active()):
-            self.erase_object_checkbox.set_sensitive(True)
-        else:
-            self.erase_object_checkbox.set_sensitive(False)
-            self.erase_object_checkbox.set_active(False)
+        # The layers which get combined into guicache
+        self.basecache = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32, self.z_mapsize_x, self.z_mapsize_y)
+        self.basecache_ctx = cairo.Context(self.basecache)
+        self.basecache_ctx.set_source_rgba(0, 0, 0, 1)
+        self.basecache_ctx.paint()
+        self.overlay_layers = {}
+        self.overlay_ctxs = {}
+        for name in self.OVERLAY_LAYERS:
+            self.overlay_layers[name] = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32, self.z_mapsize_x, self.z_mapsize_y)
+            self.overlay_ctxs[name] = cairo.Context(self.overlay_layers[name])
+
+        self.update_highlight_sensitivity()
 
         # Set up a "blank" tile to draw everything else on top of
         self.blanktile = cairo.ImageSurface(
@@ -5667,71 +5856,397 @@ class MapGUI(BaseGUI):
         basic_ctx.close_path()
         basic_ctx.fill()
 
-        # Draw the tiles
-        self.huge_gfx_rows = []
+        # The render threads can't go poking at GTK widgets, so grab the
+        # state of all our toggles now, and make sure every graphic we're
+        # going to need is already loaded.
+        self.update_layer_toggles()
+        self.update_overlay_masks()
+        self.prime_gfx_cache()
+
+        # Anything which was waiting on a partial redraw is about to get
+        # drawn anyway.
+        self.dirty_regions.clear()
         # TODO: for editing's sake, we may want to abstract this huge_gfx_rows maintenance
         # to a helper func (with an _add and _remove or whatever)
-        #time_c = time.time()
+        self.huge_gfx_rows = []
         for i in range(200):
             self.huge_gfx_rows.append([])
-        for y in range(len(self.mapobj.tiles)):
-            huge_gfxes = []
-            for x in range(len(self.mapobj.tiles[y])):
-                self.draw_tile(x, y)
-                if self.mapobj.tiles[y][x].tilecontentid == 21:
-                    huge_gfxes.append(self.mapobj.tiles[y][x])
-            if self.req_book > 1 and self.huge_gfx_toggle.get_active():
-                for tile in huge_gfxes:
-                    self.draw_huge_gfx(tile)
-                    self.huge_gfx_rows[y].append(tile.x)
-            if (y % 10 == 0):
-                self.drawstatusbar.set_fraction(
-                    y / float(len(self.mapobj.tiles)))
-                while Gtk.events_pending():
-                    Gtk.main_iteration()
-        #time_d = time.time()
-        # print 'Inner loop: %0.2f' % (time_d-time_c)
-
-        # Finish drawing
+
+        # From now on, our map's considered initialized.  The window will
+        # fill in as render chunks come back.
+        self.mapinit = True
+
+        # Start drawing
+        self.render_job = RenderJob(self.render_chunk,
+                                    rows=len(self.mapobj.tiles))
+        self.render_job.start()
+        GLib.timeout_add(20, self.poll_render, self.render_job)
+
+    def update_highlight_sensitivity(self):
+        """
+        Activate (or deactivate) our "draw barrier" checkboxes depending on
+        if we're highlighting barriers or not, and likewise for objects.
+        """
+        if (self.barrier_hi_toggle.get_active()):
+            self.draw_barrier.set_sensitive(True)
+            self.draw_barrier_seethrough.set_sensitive(True)
+            self.erase_barrier.set_sensitive(True)
+        else:
+            self.draw_barrier.set_sensitive(False)
+            self.draw_barrier.set_active(False)
+            self.draw_barrier_seethrough.set_sensitive(False)
+            self.draw_barrier_seethrough.set_active(False)
+            self.erase_barrier.set_sensitive(False)
+            self.erase_barrier.set_active(False)
+
+        # ... and also for objects
+        if (self.tilecontent_hi_toggle.get_active()):
+            self.erase_object_checkbox.set_sensitive(True)
+        else:
+            self.erase_object_checkbox.set_sensitive(False)
+            self.erase_object_checkbox.set_active(False)
+
+    def update_layer_toggles(self):
+        """
+        Takes a snapshot of our layer and highlight toggles, for draw_tile()
+        to use.  This gets called whenever the map is redrawn or recomposited,
+        which is also what happens whenever one of these toggles changes.
+        """
+        self.layer_toggles = {
+            'floor': self.floor_toggle.get_active(),
+            'decal': self.decal_toggle.get_active(),
+            'object': self.object_toggle.get_active(),
+            'wall': self.wall_toggle.get_active(),
+            'tree': self.tree_toggle.get_active(),
+            'objectdecal': self.objectdecal_toggle.get_active(),
+            'entity': self.entity_toggle.get_active(),
+            'huge_gfx': self.huge_gfx_toggle.get_active(),
+            'barrier_hi': self.barrier_hi_toggle.get_active(),
+            'tilecontent_hi': self.tilecontent_hi_toggle.get_active(),
+            'entity_hi': self.entity_hi_toggle.get_active(),
+        }
+
+    def update_overlay_masks(self):
+        """
+        Classifies every tile on the map into our highlight overlays.  This
+        is done for the whole map at once whenever the map gets drawn;
+        redraw_tile() keeps it up to date for individual edits.
+        """
+        self.overlay_masks = OverlayMasks.new(c.book,
+                                              TileArrays(self.mapobj.tiles),
+                                              self.mapobj.is_savegame(),
+                                              self.entitytable,
+                                              self.layer_toggles['floor'])
+
+    def recomposite_map(self, rect=None):
+        """
+        Rebuilds guicache (and the onscreen map) from basecache and whichever
+        highlight layers are turned on.  If rect is given, as an (x, y,
+        width, height) tuple, only that area is recomposited.
+        """
+        ctx = self.guicache_ctx
+        ctx.save()
+        if rect is not None:
+            ctx.rectangle(*rect)
+            ctx.clip()
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_surface(self.basecache, 0, 0)
+        ctx.paint()
+        ctx.set_operator(cairo.OPERATOR_OVER)
+        for name in self.OVERLAY_LAYERS:
+            if self.layer_toggles['%s_hi' % (name)]:
+                ctx.set_source_surface(self.overlay_layers[name], 0, 0)
+                ctx.paint()
+        ctx.restore()
+
+        self.ctx.save()
+        if rect is not None:
+            self.ctx.rectangle(*rect)
+            self.ctx.clip()
+        self.ctx.set_operator(cairo.OPERATOR_SOURCE)
         self.ctx.set_source_surface(self.guicache, 0, 0)
         self.ctx.paint()
+        self.ctx.restore()
+
+        if rect is None:
+            # Re-apply the pointer highlight, which lives only on the main
+            # context, and then make sure the whole thing gets shown.
+            for coord in sorted(list(self.highlight_tiles.keys()),
+                                key=lambda c: c[1] * 100 + c[0]):
+                self.cleantiles.append(coord)
+            self.maparea.queue_draw()
+
+    def paint_tile_layers(self, x, y, tilebuf, base_ctx, overlay_ctxs, xoff, yoff):
+        """
+        Draws a single tile onto a set of layers: the plain graphics go onto
+        base_ctx, and the tile's silhouette gets painted onto each of the
+        highlight layers in overlay_ctxs (a list of (name, context) tuples).
+        Tiles which have that highlight get the highlight color; other tiles
+        just erase whatever highlight is underneath them, so that highlights
+        don't show through things drawn in front of them.  xoff and yoff are
+        the map coordinates at which the contexts start.
+
+        Combining the layers afterwards gives the same result as draw_tile()
+        compositing the highlights directly, except where an empty but
+        highlighted tile is overlapped from behind: draw_tile() paints a
+        black tile there first, and this doesn't.
+        """
+        (op_surf, offset) = self.draw_tile(x, y, False, False, tilebuf, False)
+        if (y % 2 == 1):
+            xpad = self.z_halfwidth
+        else:
+            xpad = 0
+        xpos = (x * self.z_width) + xpad + 1 - offset - xoff
+        ypos = (y * self.z_halfheight) + 1 - self.z_4xheight - yoff
+        base_ctx.set_source_surface(op_surf, xpos, ypos)
+        base_ctx.paint()
+        for (name, ctx) in overlay_ctxs:
+            color = tilebuf.overlays[name]
+            if color:
+                ctx.save()
+                ctx.set_operator(cairo.OPERATOR_SOURCE)
+                ctx.set_source_rgba(*color)
+                if tilebuf.drawn:
+                    ctx.mask_surface(op_surf, xpos, ypos)
+                else:
+                    ctx.mask_surface(self.basictile, xpos, ypos)
+                ctx.restore()
+            elif tilebuf.drawn:
+                ctx.save()
+                ctx.set_operator(cairo.OPERATOR_DEST_OUT)
+                ctx.set_source_rgba(0, 0, 0, 1)
+                ctx.mask_surface(op_surf, xpos, ypos)
+                ctx.restore()
+
+    def paint_huge_gfx_layers(self, tile, base_ctx, overlay_ctxs, xoff, yoff):
+        """
+        Draws a "huge" graphic onto the base layer, and erases the highlight
+        layers underneath it.
+        """
+        self.draw_huge_gfx(tile, base_ctx, xoff, yoff)
+        for (name, ctx) in overlay_ctxs:
+            ctx.save()
+            ctx.set_operator(cairo.OPERATOR_DEST_OUT)
+            self.draw_huge_gfx(tile, ctx, xoff, yoff)
+            ctx.restore()
+
+    def prime_gfx_cache(self):
+        """
+        Loads every graphic that the current map needs at our current zoom
+        level, so that the render threads only ever have to read from the
+        Gfx caches, rather than reading from the datapak and populating the
+        caches themselves.  Also figures out how tall our tallest "huge"
+        graphic is, since render chunks need to leave room for those.
+        """
+        toggles = self.layer_toggles
+        zoom = self.curzoom
+        floors = set()
+        decals = set()
+        walls = set()
+        walldecals = set()
+        entities = set()
+        huge_gfx = set()
+        for row in self.mapobj.tiles:
+            for tile in row:
+                floors.add(tile.floorimg)
+                decals.add(tile.decalimg)
+                walls.add(tile.wallimg)
+                walldecals.add(tile.walldecalimg)
+                if tile.entity is not None:
+                    entities.add((tile.entity.entid, tile.entity.direction))
+                if tile.tilecontentid == 21 and len(tile.tilecontents) > 0:
+                    huge_gfx.add(tile.tilecontents[0].extratext)
+
+        if toggles['floor']:
+            for floorimg in floors:
+                if floorimg > 0:
+                    self.gfx.get_floor(floorimg, zoom)
+        if toggles['decal']:
+            for decalimg in decals:
+                if decalimg > 0:
+                    self.gfx.get_decal(decalimg, zoom)
+        for wallid in walls:
+            if wallid > 0:
+                walltype = self.gfx.wall_types.get(wallid, self.gfx.TYPE_NONE)
+                if walltype == self.gfx.TYPE_TREE:
+                    if toggles['tree']:
+                        self.gfx.get_object(
+                            wallid, zoom, False, self.mapobj.tree_set)
+                elif ((walltype == self.gfx.TYPE_OBJ and toggles['object']) or
+                      (walltype == self.gfx.TYPE_WALL and toggles['wall'])):
+                    self.gfx.get_object(wallid, zoom)
+        if toggles['objectdecal']:
+            for walldecalimg in walldecals:
+                if walldecalimg > 0:
+                    self.gfx.get_object_decal(walldecalimg, zoom)
+        if toggles['entity']:
+            for (entid, direction) in entities:
+                self.gfx.get_entity(entid, direction, zoom)
+        self.gfx.get_flame(zoom)
+
+        self.huge_gfx_pad = 0
+        if self.req_book > 1:
+            self.gfx.get_zapper(zoom)
+            if toggles['huge_gfx']:
+                for name in huge_gfx:
+                    img = self.gfx.get_huge_gfx(name, zoom)
+                    if img:
+                        self.huge_gfx_pad = max(self.huge_gfx_pad,
+                                                img.get_height() - self.z_5xheight)
+
+    def get_thread_tilebuf(self):
+        """ Returns the TileBuffer belonging to the current render thread. """
+        tilebuf = getattr(self.render_local, 'tilebuf', None)
+        if (tilebuf is None or tilebuf.width != self.z_tilebuf_w or
+                tilebuf.height != self.z_5xheight):
+            tilebuf = TileBuffer(self.z_tilebuf_w, self.z_5xheight)
+            self.render_local.tilebuf = tilebuf
+        return tilebuf
+
+    def render_chunk(self, chunk, token):
+        """
+        Called from a render thread.  Draws the rows in the given RenderChunk
+        onto a fresh map-width base surface plus one surface per highlight
+        layer, and returns a tuple of the base surface, a dict of highlight
+        surfaces, the Y coordinate at which they should be pasted onto the
+        map, and a list of (y, [x, ...]) "huge" graphic positions for the
+        rows.  This should only ever touch thread-safe things: the map data,
+        our Gfx caches (which were primed beforehand) and its own surfaces.
+        """
+        tilebuf = self.get_thread_tilebuf()
+        tiles = self.mapobj.tiles
+        draw_huge = self.req_book > 1 and self.layer_toggles['huge_gfx']
+        top = (chunk.y1 * self.z_halfheight) + 1 - \
+            self.z_4xheight - self.huge_gfx_pad
+        height = ((chunk.y2 - chunk.y1) * self.z_halfheight) + \
+            self.z_5xheight + self.huge_gfx_pad
+        surf = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32, self.z_mapsize_x, height)
+        ctx = cairo.Context(surf)
+        overlay_surfs = {}
+        overlay_ctxs = []
+        for name in self.OVERLAY_LAYERS:
+            overlay_surfs[name] = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32, self.z_mapsize_x, height)
+            overlay_ctxs.append((name, cairo.Context(overlay_surfs[name])))
+        huge_gfx_rows = []
+        for y in chunk.rows():
+            token.check()
+            huge_gfxes = []
+            for x in range(len(tiles[y])):
+                self.paint_tile_layers(
+                    x, y, tilebuf, ctx, overlay_ctxs, 0, top)
+                if tiles[y][x].tilecontentid == 21:
+                    huge_gfxes.append(x)
+            if draw_huge:
+                for x in huge_gfxes:
+                    self.paint_huge_gfx_layers(
+                        tiles[y][x], ctx, overlay_ctxs, 0, top)
+                huge_gfx_rows.append((y, huge_gfxes))
+        return (surf, overlay_surfs, top, huge_gfx_rows)
+
+    def blit_render_chunks(self, chunks):
+        """
+        Pastes finished RenderChunks onto our map layers.  Only called from
+        the main thread, in order.
+
+        A chunk's highlight surfaces only know about the chunk's own tiles,
+        so anything which the chunk draws over has its highlights erased from
+        the layer first, before the chunk's highlights are added in.
+        """
+        for chunk in chunks:
+            (surf, overlay_surfs, top, huge_gfx_rows) = chunk.result
+            self.basecache_ctx.set_source_surface(surf, 0, top)
+            self.basecache_ctx.paint()
+            for name in self.OVERLAY_LAYERS:
+                ctx = self.overlay_ctxs[name]
+                ctx.save()
+                ctx.set_operator(cairo.OPERATOR_DEST_OUT)
+                ctx.set_source_surface(surf, 0, top)
+                ctx.paint()
+                ctx.set_operator(cairo.OPERATOR_ADD)
+                ctx.set_source_surface(overlay_surfs[name], 0, top)
+                ctx.paint()
+                ctx.restore()
+            for (y, huge_gfxes) in huge_gfx_rows:
+                self.huge_gfx_rows[y] = huge_gfxes
+            rect = (0, top, surf.get_width(), surf.get_height())
+            self.recomposite_map(rect)
+            self.maparea.queue_draw_area(*rect)
+            chunk.result = None
+
+    def poll_render(self, job):
+        """
+        Timeout callback which checks on our render threads.  Returns False
+        (which removes the timeout) once the job is finished, or if it's not
+        our current job anymore.
+        """
+        if job is not self.render_job:
+            return False
+        try:
+            self.blit_render_chunks(job.poll())
+        except Exception:
+            LOG.exception('Map render failed')
+            self.render_job = None
+            self.drawstatuswindow.hide()
+            self.errordialog('Error Drawing Map',
+                             'The map could not be drawn.  See the log for details.',
+                             self.window)
+            return False
+        self.drawstatusbar.set_fraction(job.progress())
+        if job.done():
+            self.finish_render()
+            return False
+        return True
 
-        # ... and draw onto our main area (this is duplicated below, in expose_map)
-        self.maparea.window.draw_drawable(self.maparea.get_style().fg_gc[Gtk.StateType.NORMAL],
-                                          self.pixmap,
-                                          0, 0,
-                                          0, 0,
-                                          self.z_mapsize_x, self.z_mapsize_y)
+    def wait_for_render(self):
+        """
+        Blocks until the current render has finished.  Used when we need
+        the whole map image right away, like when exporting PNGs.
+        """
+        if self.render_job is not None:
+            self.blit_render_chunks(self.render_job.wait())
+            self.finish_render()
+
+    def finish_render(self):
+        """ Cleans up after a render job has completed. """
+        self.render_job = None
 
         # Clean up our statusbar
         self.drawstatuswindow.hide()
 
         # Report timing
-        time_b = time.time()
-        print("Map rendered in %0.2f seconds" % (time_b - time_a))
+        print("Map rendered in %0.2f seconds" %
+              (time.time() - self.render_start))
 
-        # From now on, our map's considered initialized
-        self.mapinit = True
-
-        # Make sure we only do this once, when called from idle_add initially
-        return False
+    def cancel_render(self):
+        """ Stops any render which is currently in progress. """
+        if self.render_job is not None:
+            self.render_job.cancel()
+            self.render_job = None
 
     def expose_map(self, widget, event):
 
         # Don't bother to do anything unless we've been initialized
         if (self.mapinit):
 
+            # Composite any regions which have been edited since our last
+            # expose
+            self.flush_dirty_regions()
+
             # Redraw what tiles need to be redrawn
             for (x, y) in self.cleantiles:
                 self.draw_tile(x, y, True)
 
-            # Render to the window (this is duplicated above, in draw_map)
+            # Render to the window (this is duplicated above, in draw_map),
+            # though only the area which was actually damaged.
+            area = event.area
             self.maparea.window.draw_drawable(
                 self.maparea.get_style().fg_gc[Gtk.StateType.NORMAL],
                 self.pixmap,
-                0, 0,
-                0, 0,
-                self.z_mapsize_x, self.z_mapsize_y)
+                area.x, area.y,
+                area.x, area.y,
+                area.width, area.height)
 
             # Make sure our to-clean list is empty
             self.cleantiles = []
@@ -0,0 +1,430 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from eschalon.constants import constants as c
+from eschalon.map import BigGraphicMappings, Map
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# All known rules, in the order they were registered.  See register_rule()
+RULES = []
+
+
+def register_rule(cls):
+    """ Class decorator which adds a LintRule to our list of known rules. """
+    RULES.append(cls)
+    return cls
+
+
+class LintFinding(object):
+    """
+    A single problem found on a map.  x and y are None for problems which
+    aren't tied to a particular tile.
+    """
+
+    def __init__(self, rule, severity, x, y, message, filename=None):
+        self.rule = rule
+        self.severity = severity
+        self.x = x
+        self.y = y
+        self.message = message
+        self.filename = filename
+
+    def to_dict(self):
+        return {'file': self.filename, 'rule': self.rule, 'severity': self.severity,
+                'x': self.x, 'y': self.y, 'message': self.message}
+
+    def to_text(self):
+        location = ''
+        if self.x is not None:
+            location = ' (%d, %d)' % (self.x, self.y)
+        return '%s:%s %s [%s] %s' % (self.filename or '-', location, self.severity,
+                                     self.rule, self.message)
+
+
+class LintContext(object):
+    """
+    Everything a rule might want to know about the map being linted, plus
+    somewhere to put its findings.  eschalondata is None if we don't have
+    any game data, in which case rules which need it just don't run.
+    """
+
+    def __init__(self, mapobj, eschalondata=None, filename=None):
+        self.mapobj = mapobj
+        self.eschalondata = eschalondata
+        self.filename = filename
+        self.findings = []
+
+    def report(self, rule, x, y, message, severity=None):
+        if severity is None:
+            severity = rule.severity
+        self.findings.append(LintFinding(rule.name, severity, x, y, message, self.filename))
+
+
+class LintRule(object):
+    """
+    Base class for lint rules.  Rules override whichever visit_* methods
+    they care about, and MapLinter calls all of them during a single
+    pass over the map: visit_map() once up front, then visit_tile() for
+    every tile, with visit_tilecontent(), visit_item() and visit_entity()
+    for the objects on that tile, and finally finish() once at the end.
+    Rules which keep state between calls should set it up in visit_map(),
+    since a single rule object can be used on more than one map.
+    """
+
+    name = None
+    severity = ERROR
+    needs_gamedata = False
+
+    def visit_map(self, mapobj, ctx):
+        pass
+
+    def visit_tile(self, tile, ctx):
+        pass
+
+    def visit_tilecontent(self, tile, idx, tilecontent, ctx):
+        pass
+
+    def visit_item(self, tile, tilecontent, slot, item, ctx):
+        pass
+
+    def visit_entity(self, tile, entity, ctx):
+        pass
+
+    def finish(self, mapobj, ctx):
+        pass
+
+
+@register_rule
+class OffMapObjectsRule(LintRule):
+    """ Tilecontents and entities whose coordinates aren't on the map """
+
+    name = 'off-map-object'
+
+    def visit_map(self, mapobj, ctx):
+        for (kind, objlist) in [('Object', mapobj.tilecontents), ('Entity', mapobj.entities)]:
+            for (x, y) in objlist.coords:
+                if not (0 <= x < 100 and 0 <= y < 200):
+                    ctx.report(self, None, None, '%s found at invalid coordinates (%d, %d)' % (kind, x, y))
+
+
+@register_rule
+class DuplicateEntityRule(LintRule):
+    """ More than one entity on a tile (the game only uses the first) """
+
+    name = 'duplicate-entity'
+    severity = WARNING
+
+    def visit_map(self, mapobj, ctx):
+        for entity in mapobj.duplicate_entities:
+            ctx.report(self, entity.x, entity.y,
+                       'Two entities on a single tile; all but the first are discarded')
+
+
+@register_rule
+class TilecontentTypeRule(LintRule):
+    """ Tilecontent (object) types which the game doesn't know about """
+
+    name = 'tilecontent-type'
+
+    def visit_tile(self, tile, ctx):
+        if tile.tilecontentid not in tile.constants.tilecontenttypetable:
+            ctx.report(self, tile.x, tile.y, 'Unknown object type %d' % (tile.tilecontentid))
+
+
+@register_rule
+class TilecontentMismatchRule(LintRule):
+    """
+    Tiles whose object type doesn't agree with whether there are actually
+    any objects on them.  These are the same cases which get the red
+    highlight in the map editor.
+    """
+
+    name = 'tilecontent-mismatch'
+
+    def visit_tile(self, tile, ctx):
+        num = len(tile.tilecontents)
+        if tile.tilecontentid == 0 and num > 0:
+            ctx.report(self, tile.x, tile.y, 'Tile has %d object(s) but no object type' % (num))
+        elif (tile.book > 1 and tile.tilecontentid > 0 and num == 0 and
+              not (25 <= tile.tilecontentid < 50)):
+            ctx.report(self, tile.x, tile.y,
+                       'Tile has object type %d but no object' % (tile.tilecontentid))
+
+
+@register_rule
+class BigGraphicRule(LintRule):
+    """
+    Big Graphic problems, as found by BigGraphicMappings: mismatched Wall
+    IDs and objects, and IDs which are shared by different graphics.
+    """
+
+    name = 'big-graphic'
+
+    def visit_map(self, mapobj, ctx):
+        self.mappings = BigGraphicMappings(mapobj)
+        self.affected = set()
+
+    def visit_tile(self, tile, ctx):
+        if tile.wallimg >= 1000 or tile.tilecontentid == 21:
+            self.affected.update(self.mappings.update_tile(tile, validate=False))
+
+    def finish(self, mapobj, ctx):
+        for wallid in self.affected:
+            self.mappings.validate_id(wallid)
+        messages = []
+        for msglists in [self.mappings.tile_messages.values(), self.mappings.id_messages.values()]:
+            for msglist in msglists:
+                messages.extend(msglist)
+        for ((x, y), message) in sorted(messages, key=lambda m: (m[0][1], m[0][0])):
+            ctx.report(self, x, y, message)
+
+
+@register_rule
+class EntityLocationRule(LintRule):
+    """ Entities whose own coordinates don't match the tile they're on """
+
+    name = 'entity-location'
+
+    def visit_entity(self, tile, entity, ctx):
+        if (entity.x, entity.y) != (tile.x, tile.y):
+            ctx.report(self, tile.x, tile.y, 'Entity claims to be at (%d, %d)' % (entity.x, entity.y))
+
+
+@register_rule
+class UnknownEntityRule(LintRule):
+    """ Entity IDs which aren't in the game's entity table """
+
+    name = 'unknown-entity'
+    needs_gamedata = True
+
+    def visit_map(self, mapobj, ctx):
+        self.entitytable = ctx.eschalondata.get_entitytable()
+
+    def visit_entity(self, tile, entity, ctx):
+        if entity.entid not in self.entitytable:
+            ctx.report(self, tile.x, tile.y, 'Unknown entity ID %d' % (entity.entid))
+
+
+@register_rule
+class GlobalItemNameRule(LintRule):
+    """
+    Item names in global maps which aren't valid global item names (see
+    Map.get_invalid_global_items())
+    """
+
+    name = 'invalid-item'
+    severity = WARNING
+    needs_gamedata = True
+
+    def visit_map(self, mapobj, ctx):
+        self.itemdict = None
+        if mapobj.is_global():
+            self.itemdict = ctx.eschalondata.get_itemdict()
+
+    def visit_item(self, tile, tilecontent, slot, item, ctx):
+        if self.itemdict is None or item.item_name == '':
+            return
+        if item.item_name.lower() not in ('empty', 'random') and item.item_name not in self.itemdict:
+            ctx.report(self, tile.x, tile.y, 'Invalid global item name "%s"' % (item.item_name))
+
+
+class MapLinter(object):
+    """
+    Runs a set of lint rules over maps.  Rather than each rule walking the
+    map itself, we walk it once and hand each tile and object to every rule
+    which has a visitor for it.  rules is a list of rule names (defaulting
+    to all of them); rules which need game data are skipped if we don't
+    have any.
+    """
+
+    VISITORS = ['visit_map', 'visit_tile', 'visit_tilecontent',
+                'visit_item', 'visit_entity', 'finish']
+
+    def __init__(self, rules=None, eschalondata=None):
+        self.eschalondata = eschalondata
+        self.rules = []
+        for cls in RULES:
+            if rules is not None and cls.name not in rules:
+                continue
+            if cls.needs_gamedata and eschalondata is None:
+                LOG.debug('Skipping lint rule %s, which needs game data' % (cls.name))
+                continue
+            self.rules.append(cls())
+
+        # Only bother calling the visitors which are actually implemented
+        self.visitors = {}
+        for visitor in self.VISITORS:
+            self.visitors[visitor] = [getattr(rule, visitor) for rule in self.rules
+                                      if getattr(type(rule), visitor) is not getattr(LintRule, visitor)]
+
+    @staticmethod
+    def rule_names():
+        return [cls.name for cls in RULES]
+
+    def lint(self, mapobj, filename=None):
+        """ Lints a single map, and returns a list of LintFindings """
+        ctx = LintContext(mapobj, self.eschalondata, filename)
+        for visit in self.visitors['visit_map']:
+            visit(mapobj, ctx)
+
+        visit_tile = self.visitors['visit_tile']
+        visit_tilecontent = self.visitors['visit_tilecontent']
+        visit_item = self.visitors['visit_item']
+        visit_entity = self.visitors['visit_entity']
+        for row in mapobj.tiles:
+            for tile in row:
+                for visit in visit_tile:
+                    visit(tile, ctx)
+                if tile.tilecontents and (visit_tilecontent or visit_item):
+                    for (idx, tilecontent) in enumerate(tile.tilecontents):
+                        for visit in visit_tilecontent:
+                            visit(tile, idx, tilecontent, ctx)
+                        if visit_item:
+                            for (slot, item) in enumerate(tilecontent.items):
+                                for visit in visit_item:
+                                    visit(tile, tilecontent, slot, item, ctx)
+                if tile.entity is not None:
+                    for visit in visit_entity:
+                        visit(tile, tile.entity, ctx)
+
+        for visit in self.visitors['finish']:
+            visit(mapobj, ctx)
+        return ctx.findings
+
+
+# Game data, per book, for our worker processes.  Loading this is slow
+# enough that we only want to do it once per process.
+_gamedata = {}
+
+
+def get_gamedata(book, gamedir):
+    if gamedir is None:
+        return None
+    if book not in _gamedata:
+        from eschalon.eschalondata import EschalonData
+        _gamedata[book] = EschalonData.new(book, gamedir)
+    c.set_eschalondata(_gamedata[book])
+    return _gamedata[book]
+
+
+def lint_file(filename, book=None, gamedir=None, rules=None):
+    """
+    Loads and lints a single map file.  Returns a list of finding dicts,
+    suitable for passing between processes.  Maps which can't be loaded
+    at all get a single 'load' finding.
+    """
+    try:
+        mapobj = Map.load(filename, book)
+        mapobj.read()
+        linter = MapLinter(rules, get_gamedata(mapobj.book, gamedir))
+        findings = linter.lint(mapobj, filename)
+    except (LoadException, IOError, ValueError, struct.error) as e:
+        findings = [LintFinding('load', ERROR, None, None, str(e), filename)]
+    return [finding.to_dict() for finding in findings]
+
+
+def find_maps(paths):
+    """ Expands a list of files and directories into a sorted list of map files """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted([os.path.join(path, filename) for filename in os.listdir(path)
+                                     if filename.lower().endswith('.map')]))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def lint_files(filenames, book=None, gamedir=None, rules=None, workers=None):
+    """
+    Lints a list of map files across a pool of worker processes, and
+    returns all the findings (as dicts), in file order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filenames) <= 1:
+        results = [lint_file(filename, book, gamedir, rules) for filename in filenames]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as executor:
+            futures = [executor.submit(lint_file, filename, book, gamedir, rules)
+                       for filename in filenames]
+            results = [future.result() for future in futures]
+    findings = []
+    for result in results:
+        findings.extend(result)
+    return findings
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(description='Check map files for problems')
+    parser.add_argument("paths", type=str, nargs='+',
+                        help='Map files, or directories full of them')
+    parser.add_argument("--book", type=int, choices=[1, 2, 3])
+    parser.add_argument("--gamedir", type=str,
+                        help='Game directory, for checks against the game data')
+    parser.add_argument("--rule", action="append", dest="rules",
+                        choices=MapLinter.rule_names(),
+                        help='Only run the given rule (may be repeated)')
+    parser.add_argument("--format", choices=['text', 'json', 'ndjson'], default='text')
+    parser.add_argument("--workers", type=int)
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Lints maps and prints the findings.  Returns 0 if there weren't any
+    errors, 1 if there were, and 2 if any maps couldn't be loaded.
+    """
+    args = parse_args(input)
+    findings = lint_files(find_maps(args.paths), args.book, args.gamedir,
+                          args.rules, args.workers)
+
+    if args.format == 'json':
+        print(json.dumps(findings, indent=2, sort_keys=True))
+    elif args.format == 'ndjson':
+        for finding in findings:
+            print(json.dumps(finding, sort_keys=True))
+    else:
+        for finding in findings:
+            print(LintFinding(finding['rule'], finding['severity'], finding['x'], finding['y'],
+                              finding['message'], finding['file']).to_text())
+
+    if any([finding['rule'] == 'load' for finding in findings]):
+        return 2
+    if any([finding['severity'] == ERROR for finding in findings]):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from eschalon.mapdiff import (SAVEGAME_ENTITY, SAVEGAME_TILE, MapDiff,
+                              ObjectComparer, ObjectDiff, json_value)
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+# Header fields which just say whether the map is a savegame
+SAVEGAME_MAP = set(['savegame_1', 'savegame_2', 'savegame_3', 'last_turn'])
+
+
+def copy_value(value):
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class MergeConflict(object):
+    """
+    A change which couldn't be merged, because both sides changed the same
+    thing in different ways.  x and y are None for map header conflicts.
+    what describes the thing which conflicted ('floorimg', 'tilecontent #0
+    lock', 'entity', etc).  For conflicts on whole objects (one side deleted
+    an entity which the other edited, say) the values are all None.
+    """
+
+    def __init__(self, x, y, what, base=None, ours=None, theirs=None):
+        self.x = x
+        self.y = y
+        self.what = what
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+
+    def to_dict(self):
+        return {'x': self.x, 'y': self.y, 'what': self.what,
+                'base': json_value(self.base),
+                'ours': json_value(self.ours),
+                'theirs': json_value(self.theirs)}
+
+    def to_text(self):
+        if self.x is None:
+            location = 'header'
+        else:
+            location = '(%d, %d)' % (self.x, self.y)
+        if self.base is None and self.ours is None and self.theirs is None:
+            return '%s %s: changed on both sides' % (location, self.what)
+        return '%s %s: base %r, ours %r, theirs %r' % (
+            location, self.what, self.base, self.ours, self.theirs)
+
+
+class MapMerge(object):
+    """
+    A three-way merge of two maps (ours and theirs) which both started out
+    from the same base map: typically a player's savegame map and an
+    updated global map.
+
+    The result starts out as a copy of ours, and every change made in
+    theirs (relative to the base) gets applied to it, as long as ours
+    didn't change the same thing.  Changes are tracked per-field for tiles,
+    and per-field (and per-item-slot) for tilecontents and entities which
+    were edited on both sides.  Anything else that both sides changed
+    differently is recorded in conflicts, and the result keeps our version.
+    Objects sitting at coordinates off the edge of the map get merged the
+    same way, straight from the map's object lists.
+
+    The change detection is all done by MapDiff, so the bulk of the map
+    gets skipped with a couple of numpy comparisons.
+    """
+
+    def __init__(self, base, ours, theirs):
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+        self.ours_diff = MapDiff(base, ours)
+        self.theirs_diff = MapDiff(base, theirs)
+        self.comparer = ObjectComparer(ours.is_savegame() and theirs.is_savegame())
+        self.result = ours.replicate()
+        self.savegame = self.result.is_savegame()
+        self.conflicts = []
+        self.applied = 0
+        self.merge()
+
+    def merge(self):
+        """ Does the actual merging. """
+        self.merge_header()
+        ours_tiles = dict([((t.x, t.y), t) for t in self.ours_diff.tiles])
+        for theirs_tile in self.theirs_diff.tiles:
+            (x, y) = (theirs_tile.x, theirs_tile.y)
+            ours_tile = ours_tiles.get((x, y))
+            self.merge_fields(self.result.tiles[y][x], x, y, '',
+                              theirs_tile.fields,
+                              {} if ours_tile is None else ours_tile.fields,
+                              self.skip_fields(SAVEGAME_TILE))
+            self.merge_tilecontents(x, y, theirs_tile.tilecontents,
+                                    [] if ours_tile is None else ours_tile.tilecontents)
+            self.merge_entity(x, y, theirs_tile.entity,
+                              None if ours_tile is None else ours_tile.entity)
+        ours_offmap = dict([((o.x, o.y), o) for o in self.ours_diff.offmap])
+        for theirs_offmap in self.theirs_diff.offmap:
+            (x, y) = (theirs_offmap.x, theirs_offmap.y)
+            ours_offmap_diff = ours_offmap.get((x, y))
+            self.merge_offmap(x, y, 'tilecontent', theirs_offmap.tilecontents,
+                              [] if ours_offmap_diff is None else ours_offmap_diff.tilecontents)
+            self.merge_offmap(x, y, 'entity', theirs_offmap.entities,
+                              [] if ours_offmap_diff is None else ours_offmap_diff.entities)
+
+    def skip_fields(self, savegame_fields):
+        """ Savegame-only fields can't be carried over into a global map. """
+        if self.savegame:
+            return set()
+        return savegame_fields
+
+    def conflict(self, x, y, what, base=None, ours=None, theirs=None):
+        self.conflicts.append(MergeConflict(x, y, what, base, ours, theirs))
+
+    def merge_fields(self, target, x, y, prefix, theirs_changes, ours_changes, skip=frozenset()):
+        """
+        Applies their field changes to the target object, except where
+        ours changed the same field to something else.
+        """
+        for name in sorted(theirs_changes):
+            if name in skip:
+                continue
+            (base, theirs) = theirs_changes[name]
+            if name in ours_changes:
+                ours = ours_changes[name][1]
+                if ours != theirs:
+                    self.conflict(x, y, prefix + name, base, ours, theirs)
+                continue
+            setattr(target, name, copy_value(theirs))
+            self.applied += 1
+
+    def merge_header(self):
+        skip = set()
+        if self.ours.is_savegame() != self.theirs.is_savegame():
+            skip = SAVEGAME_MAP
+        self.merge_fields(self.result, None, None, '',
+                          self.theirs_diff.header, self.ours_diff.header, skip)
+
+    def import_object(self, obj):
+        """ Copies one of their objects, converting it to our format if need be. """
+        newobj = obj.replicate()
+        if newobj.savegame != self.savegame:
+            newobj._convert_savegame(self.savegame)
+        return newobj
+
+    def merge_object_fields(self, target, x, y, theirs, ours):
+        """ Merges two ObjectDiffs which both changed the same object. """
+        prefix = '%s ' % (theirs.label())
+        skip = set()
+        if theirs.kind == 'entity':
+            skip = self.skip_fields(SAVEGAME_ENTITY)
+        self.merge_fields(target, x, y, prefix, theirs.fields, ours.fields, skip)
+        for slot in sorted(theirs.items):
+            changes = theirs.items[slot]
+            if not self.savegame:
+                changes = dict([(name, change) for (name, change) in changes.items()
+                                if name == 'item_name'])
+            self.merge_fields(target.items[slot], x, y, '%sitem %d ' % (prefix, slot),
+                              changes, ours.items.get(slot, {}))
+
+    def merge_tilecontents(self, x, y, theirs, ours):
+        if len(theirs) == 0:
+            return
+        tile = self.result.tiles[y][x]
+
+        if len(ours) == 0:
+            # We didn't touch this tile's tilecontents, so just take theirs
+            for idx in reversed(range(len(tile.tilecontents))):
+                self.result.deltilecontent(x, y, idx)
+            for tilecontent in self.theirs.tiles[y][x].tilecontents:
+                newtc = self.import_object(tilecontent)
+                self.result.tilecontents.append(newtc)
+                tile.addtilecontent(newtc)
+            self.applied += len(theirs)
+            return
+
+        if all([objdiff.status == ObjectDiff.CHANGED for objdiff in theirs + ours]):
+            # Both sides edited objects in place, so merge them field by field
+            ours_by_idx = dict([(objdiff.idx, objdiff) for objdiff in ours])
+            for objdiff in theirs:
+                target = tile.tilecontents[objdiff.idx]
+                if objdiff.idx in ours_by_idx:
+                    self.merge_object_fields(target, x, y, objdiff, ours_by_idx[objdiff.idx])
+                else:
+                    self.merge_object_fields(target, x, y, objdiff, ObjectDiff('tilecontent', objdiff.idx,
+                                                                               ObjectDiff.CHANGED))
+            return
+
+        # Otherwise, it's only okay if both sides ended up in the same place
+        theirs_tcs = self.theirs.tiles[y][x].tilecontents
+        ours_tcs = self.ours.tiles[y][x].tilecontents
+        if len(theirs_tcs) != len(ours_tcs) or any(
+                [self.comparer.compare_object('tilecontent', idx, ourtc, theirtc) is not None
+                 for (idx, (ourtc, theirtc)) in enumerate(zip(ours_tcs, theirs_tcs))]):
+            self.conflict(x, y, 'tilecontents')
+
+    def merge_entity(self, x, y, theirs, ours):
+        if theirs is None:
+            return
+
+        if ours is None:
+            if theirs.status == ObjectDiff.CHANGED:
+                self.merge_object_fields(self.result.tiles[y][x].entity, x, y, theirs,
+                                         ObjectDiff('entity', 0, ObjectDiff.CHANGED))
+            else:
+                self.result.delentity(x, y)
+                if theirs.status == ObjectDiff.ADDED:
+                    newent = self.import_object(self.theirs.tiles[y][x].entity)
+                    self.result.entities.append(newent)
+                    self.result.tiles[y][x].addentity(newent)
+                self.applied += 1
+            return
+
+        if theirs.status == ObjectDiff.CHANGED and ours.status == ObjectDiff.CHANGED:
+            self.merge_object_fields(self.result.tiles[y][x].entity, x, y, theirs, ours)
+        elif self.comparer.compare_object('entity', 0, self.ours.tiles[y][x].entity,
+                                          self.theirs.tiles[y][x].entity) is not None:
+            self.conflict(x, y, 'entity')
+
+    def merge_offmap(self, x, y, kind, theirs, ours):
+        """
+        Merges the tilecontents or entities (according to kind) sitting
+        at a coordinate outside the map.  These have no tile, so we work
+        on the map's object lists directly, but otherwise it's the same
+        deal as merge_tilecontents().
+        """
+        if len(theirs) == 0:
+            return
+        if kind == 'entity':
+            (result_list, theirs_list, ours_list) = (self.result.entities, self.theirs.entities,
+                                                     self.ours.entities)
+        else:
+            (result_list, theirs_list, ours_list) = (self.result.tilecontents, self.theirs.tilecontents,
+                                                     self.ours.tilecontents)
+
+        if len(ours) == 0:
+            # We didn't touch anything here, so just take theirs
+            for obj in result_list.at(x, y):
+                result_list.remove(obj)
+            for obj in theirs_list.at(x, y):
+                result_list.append(self.import_object(obj))
+            self.applied += len(theirs)
+            return
+
+        if all([objdiff.status == ObjectDiff.CHANGED for objdiff in theirs + ours]):
+            ours_by_idx = dict([(objdiff.idx, objdiff) for objdiff in ours])
+            targets = result_list.at(x, y)
+            for objdiff in theirs:
+                self.merge_object_fields(targets[objdiff.idx], x, y, objdiff,
+                                         ours_by_idx.get(objdiff.idx,
+                                                         ObjectDiff(kind, objdiff.idx, ObjectDiff.CHANGED)))
+            return
+
+        theirs_objs = theirs_list.at(x, y)
+        ours_objs = ours_list.at(x, y)
+        if len(theirs_objs) != len(ours_objs) or any(
+                [self.comparer.compare_object(kind, idx, ourobj, theirobj) is not None
+                 for (idx, (ourobj, theirobj)) in enumerate(zip(ours_objs, theirs_objs))]):
+            if kind == 'entity':
+                self.conflict(x, y, 'entities')
+            else:
+                self.conflict(x, y, 'tilecontents')
+
+    def to_dict(self):
+        return {'applied': self.applied,
+                'conflicts': [conflict.to_dict() for conflict in self.conflicts]}
+
+    def to_text(self):
+        ret = ['%d change(s) merged, %d conflict(s)' % (self.applied, len(self.conflicts))]
+        for conflict in self.conflicts:
+            ret.append('  %s' % (conflict.to_text()))
+        return "\n".join(ret)
+
+    @staticmethod
+    def from_files(base_filename, ours_filename, theirs_filename, book=None):
+        return MapMerge(MapDiff.load_map(base_filename, book),
+                        MapDiff.load_map(ours_filename, book),
+                        MapDiff.load_map(theirs_filename, book))
+
+
+def merge_files(base_filename, ours_filename, theirs_filename, output=None, book=None):
+    """
+    Merges three map files, writing the result to output (if given).
+    Returns a dict report, suitable for passing between processes.
+    """
+    report = {'map': os.path.basename(ours_filename), 'output': output}
+    try:
+        merge = MapMerge.from_files(base_filename, ours_filename, theirs_filename, book)
+        if output is not None:
+            merge.result.df.set_filename(output)
+            merge.result.write()
+        report.update(merge.to_dict())
+        report['text'] = merge.to_text()
+    except (LoadException, IOError, ValueError, struct.error) as e:
+        report['error'] = str(e)
+    return report
+
+
+def merge_directories(base_dir, ours_dir, theirs_dir, output_dir=None, book=None, workers=None):
+    """
+    Merges every map in ours_dir which also exists in base_dir and
+    theirs_dir, writing the results into output_dir (if given).  Maps are
+    independent of each other, so they're spread across a pool of worker
+    processes.  Returns a list of reports (see merge_files()), sorted by
+    map filename.
+    """
+    jobs = []
+    for filename in sorted(os.listdir(ours_dir)):
+        if not filename.lower().endswith('.map'):
+            continue
+        base_filename = os.path.join(base_dir, filename)
+        theirs_filename = os.path.join(theirs_dir, filename)
+        if not (os.path.exists(base_filename) and os.path.exists(theirs_filename)):
+            LOG.info('Skipping %s, which is not in all three directories' % (filename))
+            continue
+        output = None
+        if output_dir is not None:
+            output = os.path.join(output_dir, filename)
+        jobs.append((base_filename, os.path.join(ours_dir, filename), theirs_filename, output, book))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        return [merge_files(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = [executor.submit(merge_files, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Three-way merge of map files, or of directories full of them')
+    parser.add_argument("base", type=str)
+    parser.add_argument("ours", type=str)
+    parser.add_argument("theirs", type=str)
+    parser.add_argument("-o", "--output", type=str,
+                        help='File (or directory) to write the merged map(s) to')
+    parser.add_argument("--book", type=int, choices=[1, 2, 3])
+    parser.add_argument("--format", choices=['text', 'json'], default='text')
+    parser.add_argument("--workers", type=int)
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Merges maps and reports on how it went.  Returns 0 if everything
+    merged cleanly, 1 if there were conflicts, and 2 on errors.
+    """
+    args = parse_args(input)
+    if os.path.isdir(args.base):
+        if args.output is not None and not os.path.isdir(args.output):
+            os.makedirs(args.output)
+        reports = merge_directories(args.base, args.ours, args.theirs, args.output,
+                                    args.book, args.workers)
+    else:
+        reports = [merge_files(args.base, args.ours, args.theirs, args.output, args.book)]
+
+    if args.format == 'json':
+        print(json.dumps([dict([(k, v) for (k, v) in report.items() if k != 'text'])
+                          for report in reports], indent=2, sort_keys=True))
+    else:
+        for report in reports:
+            if 'error' in report:
+                print('%s: error: %s' % (report['map'], report['error']))
+            else:
+                print('%s: %s' % (report['map'], report['text']))
+
+    if any(['error' in report for report in reports]):
+        return 2
+    if any([len(report['conflicts']) > 0 for report in reports]):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class MapObjectList(object):
+    """
+    The master list of tilecontents or entities on a map.  This behaves
+    like a plain list as far as iteration, len() and append() go (so that
+    Map.write() and friends don't have to care), but every object is also
+    indexed by identity and by its (x, y) coordinates, so that removing or
+    finding one doesn't require walking the whole list.
+
+    Each object gets an integer key when it's added.  Keys only ever go
+    up, so iterating in key order gives the original file order.  The
+    Undo code uses these keys rather than list positions: putting an object
+    back with insert() using its old key puts it right back where it was.
+
+    The (x, y) index uses the object's coordinates at the time it was
+    added.  If you change an object's coordinates afterwards, call
+    relocate() so that at() keeps up.
+    """
+
+    def __init__(self, objects=None):
+        self.objects = {}
+        self.keys = {}
+        self.coords = {}
+        self.locations = {}
+        self.next_key = 0
+        self.ordered = []
+        if objects is not None:
+            for obj in objects:
+                self.append(obj)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter([self.objects[key] for key in self.ordered_keys()])
+
+    def __getitem__(self, idx):
+        return self.objects[self.ordered_keys()[idx]]
+
+    def __contains__(self, obj):
+        return id(obj) in self.keys
+
+    def ordered_keys(self):
+        """
+        Returns all our keys, in order.  This is cached, and only needs
+        re-sorting after a removal or an insert() into the middle.
+        """
+        if self.ordered is None:
+            self.ordered = sorted(self.objects)
+        return self.ordered
+
+    def _add(self, key, obj):
+        self.objects[key] = obj
+        if obj is not None:
+            self.keys[id(obj)] = key
+            self._index_coords(key, obj)
+
+    def _index_coords(self, key, obj):
+        coords = (obj.x, obj.y)
+        self.locations[key] = coords
+        if coords not in self.coords:
+            self.coords[coords] = []
+        self.coords[coords].append(key)
+
+    def _unindex_coords(self, key):
+        coords = self.locations.pop(key, None)
+        if coords is not None:
+            self.coords[coords].remove(key)
+            if len(self.coords[coords]) == 0:
+                del self.coords[coords]
+
+    def append(self, obj):
+        """ Adds an object to the end of the list, and returns its key. """
+        key = self.next_key
+        self.next_key += 1
+        self._add(key, obj)
+        if self.ordered is not None:
+            self.ordered.append(key)
+        return key
+
+    def insert(self, key, obj):
+        """
+        Puts an object back in at the given key (as returned by key_of()
+        before it was removed).
+        """
+        if key in self.objects:
+            raise Exception('Key %d is already in use' % (key))
+        self._add(key, obj)
+        if key >= self.next_key:
+            self.next_key = key + 1
+            if self.ordered is not None:
+                self.ordered.append(key)
+        else:
+            self.ordered = None
+
+    def key_of(self, obj):
+        """ Returns the key of the given object, or None. """
+        return self.keys.get(id(obj))
+
+    def remove(self, obj):
+        """ Removes the given object.  Raises ValueError if it's not here. """
+        key = self.key_of(obj)
+        if key is None:
+            raise ValueError('Object not found in map list')
+        self.pop_key(key)
+
+    def pop_key(self, key):
+        """ Removes and returns the object with the given key. """
+        obj = self.objects.pop(key)
+        if obj is not None:
+            del self.keys[id(obj)]
+            self._unindex_coords(key)
+        self.ordered = None
+        return obj
+
+    def relocate(self, obj):
+        """ Re-indexes an object after its coordinates have changed. """
+        key = self.key_of(obj)
+        if key is not None:
+            self._unindex_coords(key)
+            self._index_coords(key, obj)
+
+    def at(self, x, y):
+        """ Returns a list of the objects at the given coordinates, in order. """
+        return [self.objects[key] for key in sorted(self.coords.get((x, y), []))]
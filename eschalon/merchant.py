@@ -38,8 +38,14 @@ class Merchant(object):
     YMMV.
     """
 
-    def __init__(self):
-        """ Create a new object """
+    def __init__(self, book=None):
+        """
+        Create a new object.  Merchant files don't say which book they're
+        from, so that's up to the caller (by default, the current book).
+        """
+        if book is None:
+            book = c.book
+        self.book = book
 
         # Known fields
         self.items = []
@@ -59,7 +65,7 @@ class Merchant(object):
         self.gold = df.readint()
 
         for i in range(item_count):
-            item = Item.new(c.book)
+            item = Item.new(self.book)
             item.read(df)
             self.items.append(item)
 
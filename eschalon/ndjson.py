@@ -0,0 +1,373 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import base64
+import json
+import logging
+import sys
+from typing import Optional, Sequence
+
+from eschalon.character import B1Character, B2Character, B3Character, Character
+from eschalon.entity import Entity
+from eschalon.item import Item
+from eschalon.map import Map
+from eschalon.merchant import Merchant
+from eschalon.savefile import LoadException, Savefile
+from eschalon.tilecontent import Tilecontent
+
+LOG = logging.getLogger(__name__)
+
+# Attributes which are either file handles, or which get their own
+# records (or are rebuilt by the importer), so aren't exported as fields
+SKIP_ATTRS = {
+    'map': {'df', 'df_ent', 'tiles', 'tilecontents', 'entities',
+            'duplicate_entities', 'big_gfx_mappings', 'cursqcol', 'cursqrow',
+            'tiles_offset'},
+    'tile': {'tilecontents', 'entity', 'savegame'},
+    'tilecontent': {'savegame'},
+    'entity': {'savegame'},
+    'character': {'df', 'curinvcol', 'curinvrow'},
+    'merchant': {'book'},
+    'item': set(),
+}
+
+CHARACTER_CLASSES = {1: B1Character, 2: B2Character, 3: B3Character}
+
+
+def encode_value(value):
+    """
+    Converts an attribute value into something JSON can hold without
+    losing anything: bytes get base64-encoded, dicts (which often have
+    integer keys) become lists of pairs, and helper objects like the
+    character "unknowns" become dicts of their own attributes.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(val) for val in value]
+    if isinstance(value, dict):
+        return {'__dict__': [[encode_value(key), encode_value(val)] for (key, val) in value.items()]}
+    return {'__object__': dict([(attr, encode_value(val)) for (attr, val) in vars(value).items()])}
+
+
+def decode_value(value):
+    """
+    The reverse of encode_value(), for everything but objects, which
+    need somewhere to go - see set_fields().
+    """
+    if isinstance(value, list):
+        return [decode_value(val) for val in value]
+    if isinstance(value, dict):
+        if '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        if '__dict__' in value:
+            return dict([(decode_value(key), decode_value(val)) for (key, val) in value['__dict__']])
+        raise LoadException('Unknown encoded value: %r' % (value))
+    return value
+
+
+def set_fields(obj, record, skip=()):
+    """
+    Sets the attributes of obj from the given record, skipping over any
+    keys in "skip".  Encoded objects are loaded into whatever object is
+    already in that attribute.
+    """
+    for (attr, value) in record.items():
+        if attr in skip:
+            continue
+        if isinstance(value, dict) and '__object__' in value:
+            target = getattr(obj, attr, None)
+            if target is None:
+                raise LoadException('No object to load %s into' % (attr))
+            set_fields(target, value['__object__'])
+        else:
+            setattr(obj, attr, decode_value(value))
+
+
+def is_item_list(value):
+    return (isinstance(value, list) and len(value) > 0 and
+            all([isinstance(val, Item) for val in value]))
+
+
+def is_item_grid(value):
+    return (isinstance(value, list) and len(value) > 0 and
+            all([is_item_list(val) for val in value]))
+
+
+def object_records(obj, rtype, extra=None):
+    """
+    Yields a record for the given object, followed by a record for each
+    item it holds.  Items are recognized generically, so this works for
+    tilecontents (a list of items), merchants (same) and characters
+    (single equipped items, the ready items list and the inventory
+    grid).  Each item record has a "slot" naming the attribute it lives
+    in, plus "index" or "row"/"col" where needed.
+    """
+    record = {'type': rtype}
+    if extra is not None:
+        record.update(extra)
+    items = []
+    for (attr, value) in vars(obj).items():
+        if attr in SKIP_ATTRS[rtype]:
+            continue
+        if isinstance(value, Item):
+            items.append(({'slot': attr}, value))
+        elif is_item_list(value):
+            items.extend([({'slot': attr, 'index': idx}, item) for (idx, item) in enumerate(value)])
+        elif is_item_grid(value):
+            for (row, items_row) in enumerate(value):
+                items.extend([({'slot': attr, 'row': row, 'col': col}, item)
+                              for (col, item) in enumerate(items_row)])
+        else:
+            record[attr] = encode_value(value)
+    yield record
+    for (location, item) in items:
+        for item_record in object_records(item, 'item', location):
+            yield item_record
+
+
+def map_records(mapobj):
+    """
+    Yields records for the whole map: the map itself, each tile which has
+    any data, then each tilecontent (followed by its items), and finally
+    the entities.  Blank tiles are left out, since that's what the
+    importer starts with anyway.
+    """
+    for record in object_records(mapobj, 'map', {'book': mapobj.book}):
+        yield record
+    for row in mapobj.tiles:
+        for tile in row:
+            if tile.hasdata():
+                for record in object_records(tile, 'tile'):
+                    yield record
+    for tilecontent in mapobj.tilecontents:
+        for record in object_records(tilecontent, 'tilecontent'):
+            yield record
+    for entity in mapobj.entities:
+        for record in object_records(entity, 'entity'):
+            yield record
+
+
+def character_records(char):
+    """ Yields records for the character, followed by all their items. """
+    return object_records(char, 'character', {'book': char.book})
+
+
+def merchant_records(merchant, book=None):
+    """
+    Yields records for the merchant and their stock, using the merchant's
+    own book unless told otherwise.
+    """
+    if book is None:
+        book = merchant.book
+    return object_records(merchant, 'merchant', {'book': book})
+
+
+def export_records(obj):
+    """ Yields records for a map, character or merchant. """
+    if isinstance(obj, Map):
+        return map_records(obj)
+    elif isinstance(obj, Character):
+        return character_records(obj)
+    elif isinstance(obj, Merchant):
+        return merchant_records(obj)
+    raise LoadException('Unable to export %s objects' % (type(obj).__name__))
+
+
+def export_ndjson(obj, fh):
+    """
+    Writes a map, character or merchant out to the given text file
+    handle, one JSON record per line, without building up the whole
+    document first.  Returns the number of records written.
+    """
+    count = 0
+    for record in export_records(obj):
+        fh.write(json.dumps(record, sort_keys=True))
+        fh.write("\n")
+        count += 1
+    return count
+
+
+def read_records(fh):
+    """ Yields the records from an NDJSON file handle, skipping blank lines. """
+    for (lineno, line) in enumerate(fh):
+        line = line.strip()
+        if line == '':
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise LoadException('Invalid record on line %d: %s' % (lineno + 1, e))
+
+
+def new_container(record, filename):
+    """ Builds the top-level object described by the first record. """
+    book = record.get('book')
+    if book not in [1, 2, 3]:
+        raise LoadException('Unknown book version specified: %r' % (book))
+    skip = ('type', 'book')
+    if record['type'] == 'map':
+        obj = Map.new(filename, book)
+        set_fields(obj, record, skip)
+        obj.set_tile_savegame()
+    elif record['type'] == 'character':
+        obj = CHARACTER_CLASSES[book](Savefile(filename))
+        set_fields(obj, record, skip)
+    elif record['type'] == 'merchant':
+        obj = Merchant(book)
+        set_fields(obj, record, skip)
+    else:
+        raise LoadException('Records must start with a map, character or merchant, not %s' % (record['type']))
+    return (obj, book)
+
+
+def place_item(parent, item, record):
+    """ Puts an imported item where its record says it lives. """
+    slot = record['slot']
+    if 'row' in record:
+        getattr(parent, slot)[record['row']][record['col']] = item
+    elif 'index' in record:
+        items = getattr(parent, slot)
+        if record['index'] < len(items):
+            items[record['index']] = item
+        else:
+            items.append(item)
+    else:
+        setattr(parent, slot, item)
+
+
+def import_records(records, filename=''):
+    """
+    Builds a map, character or merchant from a stream of records, as
+    produced by export_records().  Records are consumed one at a time,
+    so this is happy to be fed straight from read_records().  The new
+    object's file will be "filename", ready for a write().
+    """
+    records = iter(records)
+    try:
+        first = next(records)
+    except StopIteration:
+        raise LoadException('No records to import')
+    (obj, book) = new_container(first, filename)
+    is_map = isinstance(obj, Map)
+    if is_map:
+        savegame = obj.is_savegame()
+    item_parent = obj
+
+    for record in records:
+        rtype = record.get('type')
+        if rtype == 'item':
+            item = Item.new(book)
+            set_fields(item, record, ('type', 'slot', 'index', 'row', 'col'))
+            place_item(item_parent, item, record)
+        elif is_map and rtype == 'tile':
+            tile = obj.tiles[record['y']][record['x']]
+            set_fields(tile, record, ('type',))
+        elif is_map and rtype == 'tilecontent':
+            tilecontent = Tilecontent.new(book, savegame)
+            set_fields(tilecontent, record, ('type',))
+            obj.tilecontents.append(tilecontent)
+            if 0 <= tilecontent.x < 100 and 0 <= tilecontent.y < 200:
+                obj.tiles[tilecontent.y][tilecontent.x].addtilecontent(tilecontent)
+            item_parent = tilecontent
+        elif is_map and rtype == 'entity':
+            entity = Entity.new(book, savegame)
+            set_fields(entity, record, ('type',))
+            obj.entities.append(entity)
+            if 0 <= entity.x < 100 and 0 <= entity.y < 200:
+                obj.tiles[entity.y][entity.x].addentity(entity)
+        else:
+            raise LoadException('Unexpected %s record in a %s' % (rtype, first['type']))
+    return obj
+
+
+def import_ndjson(fh, filename=''):
+    """ Builds a map, character or merchant from an NDJSON file handle. """
+    return import_records(read_records(fh), filename)
+
+
+def load_file(filename, book=None):
+    """
+    Loads a map (*.map), merchant (*.mer) or character file, for export.
+    Merchants and Book 3 characters need their book specified.
+    """
+    lower = filename.lower()
+    if lower.endswith('.map'):
+        obj = Map.load(filename, book)
+        obj.read()
+    elif lower.endswith('.mer'):
+        if book is None:
+            raise LoadException('Book version must be selected for merchant files')
+        obj = Merchant(book)
+        obj.read(Savefile(filename))
+    else:
+        obj = Character.load(filename, book)
+        obj.read()
+    return obj
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Export maps, characters and merchants to NDJSON, or build them back from it')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    export_parser = subparsers.add_parser('export', help='Write a game file out as NDJSON')
+    export_parser.add_argument("filename", type=str)
+    export_parser.add_argument("-o", "--output", type=str,
+                               help='File to write to, rather than stdout')
+    export_parser.add_argument("--book", type=int, choices=[1, 2, 3])
+    import_parser = subparsers.add_parser('import', help='Build a game file from NDJSON')
+    import_parser.add_argument("input", type=str,
+                               help='NDJSON file to read, or - for stdin')
+    import_parser.add_argument("filename", type=str,
+                               help='Game file to write')
+    return parser.parse_args(input)
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(input)
+    try:
+        if args.command == 'export':
+            obj = load_file(args.filename, args.book)
+            if args.output is None:
+                export_ndjson(obj, sys.stdout)
+            else:
+                with open(args.output, 'w') as df:
+                    export_ndjson(obj, df)
+        else:
+            if args.input == '-':
+                obj = import_ndjson(sys.stdin, args.filename)
+            else:
+                with open(args.input) as df:
+                    obj = import_ndjson(df, args.filename)
+            if isinstance(obj, Merchant):
+                obj.write(Savefile(args.filename))
+            else:
+                obj.write()
+    except (LoadException, IOError) as e:
+        print('%s: error: %s' % (args.filename, e), file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+from abc import ABC, abstractmethod
+
+import numpy
+
+LOG = logging.getLogger(__name__)
+
+
+class OverlayMasks(ABC):
+    """
+    Classifies every tile on a map into the highlight overlays the map
+    editor draws: barriers, tilecontents (objects) and entities.  Each
+    class is a label array (indexed [y, x]) where 0 means "no highlight"
+    and anything else is an index into the matching *_COLORS list.
+
+    Everything is computed from a TileArrays object in one go, and
+    update_tile() recomputes just the one tile after an edit.
+    """
+
+    LAYERS = ['barrier', 'tilecontent', 'entity']
+
+    # Labels
+    NONE = 0
+
+    BARRIER_WALL = 1
+    BARRIER_SEETHROUGH = 2
+    BARRIER_5 = 3
+    BARRIER_WATER = 4
+
+    TILECONTENT_OK = 1
+    TILECONTENT_NOCONTENTS = 2
+    TILECONTENT_ERROR = 3
+
+    ENTITY_FRIENDLY = 1
+    ENTITY_HOSTILE = 2
+
+    # Colors, indexed by label
+    BARRIER_COLORS = [False,
+                      (.784, .784, .784, 0.5),
+                      (.41, .75, .83, 0.5),
+                      (.684, .684, .950, 0.5),
+                      (0, 0, .784, 0.5)]
+    TILECONTENT_COLORS = [False,
+                          (1, 1, 0, 0.5),
+                          (0, .784, .784, 0.5),
+                          (1, 0, 0, 0.5)]
+    ENTITY_COLORS = [False,
+                     (0, 1, 0, 0.5),
+                     (1, 0, 0, 0.5)]
+
+    def __init__(self, arrays, savegame=False, entitytable=None, show_floor=True):
+        """
+        arrays is a TileArrays object.  For global maps, entity friendliness
+        comes from entitytable (as returned by EschalonData.get_entitytable());
+        savegames store it on the entity itself.  When show_floor is False,
+        water tiles are highlighted as barriers.
+        """
+        self.arrays = arrays
+        self.savegame = savegame
+        self.show_floor = show_floor
+        self.friendly_ids = []
+        if entitytable is not None:
+            self.friendly_ids = sorted([entid for (entid, ent) in entitytable.items()
+                                        if ent.friendly == 1])
+        self.barrier = numpy.zeros(arrays.shape, dtype=numpy.uint8)
+        self.tilecontent = numpy.zeros(arrays.shape, dtype=numpy.uint8)
+        self.entity = numpy.zeros(arrays.shape, dtype=numpy.uint8)
+        self.compute()
+
+    def compute(self, index=numpy.s_[:, :]):
+        """
+        Computes our labels for the given area (a numpy index expression),
+        which defaults to the whole map.
+        """
+        a = self.arrays
+
+        wall = a.wall[index]
+        self.barrier[index] = numpy.select(
+            [wall == 1,
+             wall == 2,
+             wall == 5,
+             (a.floorimg[index] == 126) & (not self.show_floor)],
+            [self.BARRIER_WALL,
+             self.BARRIER_SEETHROUGH,
+             self.BARRIER_5,
+             self.BARRIER_WATER],
+            self.NONE)
+
+        self.tilecontent[index] = self.classify_tilecontents(
+            a.tilecontentid[index], a.num_tilecontents[index], a.wallimg[index])
+
+        entid = a.entid[index]
+        if self.savegame:
+            friendly = (a.entity_friendly[index] == 1)
+        else:
+            friendly = numpy.isin(entid, self.friendly_ids)
+        self.entity[index] = numpy.where(
+            entid >= 0,
+            numpy.where(friendly, self.ENTITY_FRIENDLY, self.ENTITY_HOSTILE),
+            self.NONE)
+
+    @abstractmethod
+    def classify_tilecontents(self, tilecontentid, num_tilecontents, wallimg):
+        """ Book-specific; implemented by our subclasses. """
+
+    def update_tile(self, tile):
+        """ Re-syncs our arrays and labels for a single edited tile. """
+        self.arrays.update_tile(tile)
+        self.compute(numpy.s_[tile.y:tile.y + 1, tile.x:tile.x + 1])
+
+    def colors(self, x, y):
+        """
+        Returns a dict of the highlight colors for the given tile, keyed
+        by layer name.  Layers which don't apply are False.
+        """
+        return {'barrier': self.BARRIER_COLORS[self.barrier[y, x]],
+                'tilecontent': self.TILECONTENT_COLORS[self.tilecontent[y, x]],
+                'entity': self.ENTITY_COLORS[self.entity[y, x]]}
+
+    def mask(self, layer):
+        """ Boolean array of the tiles which get the given highlight. """
+        return getattr(self, layer) != self.NONE
+
+    def counts(self):
+        """ Returns a dict of how many tiles get each highlight. """
+        return dict([(layer, int(numpy.count_nonzero(self.mask(layer))))
+                     for layer in self.LAYERS])
+
+    @staticmethod
+    def new(book, arrays, savegame=False, entitytable=None, show_floor=True):
+        """
+        Static method to initialize the correct object
+        """
+        if book == 1:
+            return B1OverlayMasks(arrays, savegame, entitytable, show_floor)
+        elif book == 2:
+            return B2OverlayMasks(arrays, savegame, entitytable, show_floor)
+        elif book == 3:
+            return B3OverlayMasks(arrays, savegame, entitytable, show_floor)
+
+
+class B1OverlayMasks(OverlayMasks):
+    """
+    Overlay classification for Book 1
+    """
+
+    def classify_tilecontents(self, tilecontentid, num_tilecontents, wallimg):
+        # The last case here, afaik, doesn't happen.
+        return numpy.select(
+            [(tilecontentid != 0) & (num_tilecontents > 0),
+             (tilecontentid != 0) & (num_tilecontents == 0),
+             (tilecontentid == 0) & (num_tilecontents > 0)],
+            [self.TILECONTENT_OK,
+             self.TILECONTENT_NOCONTENTS,
+             self.TILECONTENT_ERROR],
+            self.NONE)
+
+
+class B2OverlayMasks(OverlayMasks):
+    """
+    Overlay classification for Book 2
+    """
+
+    def classify_tilecontents(self, tilecontentid, num_tilecontents, wallimg):
+        # In order: tilecontents with no ID, "nocontents" IDs, IDs missing
+        # their tilecontents, Big Graphics which don't have associated objects,
+        # and Big Graphic IDs past the maximum (1003).  None of the error cases
+        # should really happen.
+        return numpy.select(
+            [(tilecontentid == 0) & (num_tilecontents > 0),
+             (tilecontentid >= 25) & (tilecontentid < 50),
+             (tilecontentid > 0) & (num_tilecontents == 0),
+             (wallimg >= 1000) & (tilecontentid == 0),
+             wallimg > 1003,
+             tilecontentid > 0],
+            [self.TILECONTENT_ERROR,
+             self.TILECONTENT_NOCONTENTS,
+             self.TILECONTENT_ERROR,
+             self.TILECONTENT_ERROR,
+             self.TILECONTENT_ERROR,
+             self.TILECONTENT_OK],
+            self.NONE)
+
+
+class B3OverlayMasks(B2OverlayMasks):
+    """
+    Overlay classification for Book 3
+    """
+    pass
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LOG = logging.getLogger(__name__)
+
+
+class RenderCancelled(Exception):
+    """ Raised from inside a render function when its job has been cancelled. """
+    pass
+
+
+class CancelToken(object):
+    """
+    A flag shared between the thread which started a render and the
+    worker threads doing the actual work.  Workers are expected to call
+    check() every so often (once per row, say) so that a cancellation
+    actually stops them, rather than just discarding their output.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise RenderCancelled()
+
+
+class RenderChunk(object):
+    """
+    A contiguous band of map rows (y1 through y2, inclusive) to be
+    rendered by a single worker.  The worker's return value ends up
+    in result.
+    """
+
+    def __init__(self, idx, y1, y2):
+        self.idx = idx
+        self.y1 = y1
+        self.y2 = y2
+        self.result = None
+
+    def rows(self):
+        return range(self.y1, self.y2 + 1)
+
+
+class RenderJob(object):
+    """
+    Runs render_func(chunk, token) over bands of map rows in a pool of
+    worker threads.  The owning (GUI) thread is expected to call poll()
+    periodically, which hands back finished chunks strictly in order,
+    top to bottom, since later rows have to be composited on top of
+    earlier ones.  Nothing here touches GTK, so render_func is
+    responsible for only doing thread-safe things (drawing onto its own
+    private Cairo surfaces, for instance).
+    """
+
+    def __init__(self, render_func, rows=200, chunk_rows=10, workers=None):
+        self.render_func = render_func
+        self.token = CancelToken()
+        self.chunks = []
+        for (idx, y1) in enumerate(range(0, rows, chunk_rows)):
+            self.chunks.append(
+                RenderChunk(idx, y1, min(rows, y1 + chunk_rows) - 1))
+        if workers is None:
+            workers = min(4, os.cpu_count() or 1)
+        self.workers = workers
+        self.executor = None
+        self.futures = []
+        self.finished = queue.Queue()
+        self.pending = {}
+        self.next_idx = 0
+        self.error = None
+
+    def start(self):
+        """ Kicks off all our chunks. """
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = [self.executor.submit(self._run_chunk, chunk)
+                        for chunk in self.chunks]
+
+    def _run_chunk(self, chunk):
+        """ Worker-thread wrapper around our render function. """
+        if self.token.is_cancelled():
+            return
+        try:
+            chunk.result = self.render_func(chunk, self.token)
+            self.finished.put((chunk, None))
+        except RenderCancelled:
+            pass
+        except Exception as e:
+            LOG.exception('Error rendering rows %d-%d' % (chunk.y1, chunk.y2))
+            self.finished.put((chunk, e))
+
+    def poll(self):
+        """
+        Returns a list of any chunks which have finished since our last
+        call and which are next in line to be composited.  If a worker
+        died with an exception, that's re-raised here.
+        """
+        while True:
+            try:
+                (chunk, error) = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None and self.error is None:
+                self.error = error
+            self.pending[chunk.idx] = chunk
+        if self.error is not None:
+            self.cancel()
+            raise self.error
+        ready = []
+        while self.next_idx in self.pending:
+            ready.append(self.pending.pop(self.next_idx))
+            self.next_idx += 1
+        if self.done():
+            self._shutdown()
+        return ready
+
+    def progress(self):
+        """ Fraction of chunks which have been handed back by poll() """
+        return self.next_idx / float(len(self.chunks))
+
+    def done(self):
+        return self.next_idx == len(self.chunks)
+
+    def is_cancelled(self):
+        return self.token.is_cancelled()
+
+    def cancel(self):
+        """
+        Stops the job.  Chunks which haven't started yet are dropped, and
+        running ones will bail out the next time they check the token.
+        """
+        self.token.cancel()
+        self._shutdown()
+
+    def _shutdown(self):
+        if self.executor is not None:
+            # Drop anything which hasn't started yet.  (shutdown() can do
+            # this itself, but only from Python 3.9 on.)
+            for future in self.futures:
+                future.cancel()
+            self.futures = []
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def wait(self):
+        """
+        Blocks until every chunk has finished, and returns them all in
+        order.  Mostly useful for non-interactive rendering.
+        """
+        executor = self.executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+        return self.poll()
@@ -220,4 +220,6 @@ class Savefile(object):
         """ Write a string (delimited by \r\n) to the savefile. """
         if not self.opened_w:
             raise IOError('File is not open for writing')
+        if isinstance(strval, str):
+            strval = strval.encode('UTF-8')
         self.df.write(strval + b"\r\n")
@@ -21,7 +21,7 @@ import logging
 import struct
 from typing import Optional
 
-from eschalon.constants import constants as c
+from eschalon.constants import book_constants
 from eschalon.constantsb1 import B1Constants
 from eschalon.savefile import LoadException, Savefile
 
@@ -122,7 +122,7 @@ class Savename(object):
                 LOG.error("Failed to load book", exc_info=True)
                 raise LoadException(e) from e
 
-            if map_or_version.startswith(b'book3'):
+            if map_or_version.startswith('book3'):
                 book = 3
             elif map_or_version in B1Constants.maps:
                 book = 1
@@ -136,13 +136,10 @@ class Savename(object):
 
         # Now actually return the object
         if book == 1:
-            c.switch_to_book(1)
             return B1Savename(df)
         elif book == 2:
-            c.switch_to_book(2)
             return B2Savename(df)
         else:
-            c.switch_to_book(3)
             return B3Savename(df)
 
 
@@ -152,6 +149,7 @@ class B1Savename(Savename):
     """
 
     book = 1
+    constants = book_constants(1)
 
     def __init__(self, df):
         super(B1Savename, self).__init__(df)
@@ -203,6 +201,7 @@ class B2Savename(Savename):
     """
 
     book = 2
+    constants = book_constants(2)
 
     def __init__(self, df):
         super(B2Savename, self).__init__(df)
@@ -299,6 +298,7 @@ class B3Savename(B2Savename):
     """
 
     book = 3
+    constants = book_constants(3)
 
     def __init__(self, df):
         super(B3Savename, self).__init__(df)
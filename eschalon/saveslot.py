@@ -21,8 +21,10 @@ import functools
 import glob
 import logging
 import os
+import threading
 import time
-from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 
 from eschalon import util
 from eschalon.map import Map
@@ -31,6 +33,12 @@ from eschalon.savename import Savename
 
 LOG = logging.getLogger(__name__)
 
+# What we've already read out of each save slot, keyed by slot directory.
+# Each entry remembers the fingerprint it was read with (see
+# Saveslot.fingerprint()), and is thrown away once that changes.
+_slot_cache: Dict[str, Dict[str, Any]] = {}
+_slot_cache_lock = threading.Lock()
+
 
 class SaveslotMap(object):
     """
@@ -78,13 +86,25 @@ class Saveslot(object):
         self.timestamp = time.strftime(
             '%a %b %d, %Y, %I:%M %p', time.gmtime(self.timestamp_epoch))
 
+        # Pick up whatever we've already read from this slot, provided
+        # nothing in it has changed since.
+        fingerprint = Saveslot.fingerprint(directory)
+        with _slot_cache_lock:
+            self.cache = _slot_cache.get(directory)
+            if self.cache is None or self.cache['fingerprint'] != fingerprint:
+                self.cache = {'fingerprint': fingerprint, 'charnames': {}}
+                _slot_cache[directory] = self.cache
+
         # Find the save name
         self.savename_loc = os.path.join(directory, 'savename')
-        if not os.path.exists(self.savename_loc):
-            raise LoadException(
-                '"savename" file not found in %s' % (directory))
-        self.savenameobj = Savename.load(self.savename_loc)
-        self.savenameobj.read()
+        if 'savenameobj' not in self.cache:
+            if not os.path.exists(self.savename_loc):
+                raise LoadException(
+                    '"savename" file not found in %s' % (directory))
+            savenameobj = Savename.load(self.savename_loc)
+            savenameobj.read()
+            self.cache['savenameobj'] = savenameobj
+        self.savenameobj = self.cache['savenameobj']
         self.savename = self.savenameobj.savename
 
         # Set up our charname values
@@ -110,12 +130,31 @@ class Saveslot(object):
                 # book
                 self.load_charname(book)
 
+    @staticmethod
+    def fingerprint(directory: str) -> tuple:
+        """
+        Returns a tuple describing the current state of the given slot
+        directory: its own mtime, plus the name, size and mtime of every
+        file we'd read from it.  If any of those change, our cached
+        information about the slot is stale.
+        """
+        files = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name in ('savename', 'char') or entry.name.endswith('.map'):
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        return (os.stat(directory).st_mtime_ns, tuple(sorted(files)))
+
     def load_maps(self) -> None:
         """
         Read our collection of maps from the dir
         """
-        self.maps: List[Any] = []
         self.maps_loaded = True
+        if 'maps' in self.cache:
+            self.maps: List[Any] = list(self.cache['maps'])
+            return
+        self.maps: List[Any] = []
         map_filenames = sorted(
             glob.glob(os.path.join(self.directory, '*.map')))
         for map_filename in map_filenames:
@@ -126,6 +165,7 @@ class Saveslot(object):
                 # Don't bother reporting, don't think it's worth it for our
                 # typical use cases
                 pass
+        self.cache['maps'] = list(self.maps)
 
     def load_charname(self, book=None) -> None:
         """
@@ -147,6 +187,10 @@ class Saveslot(object):
                     'Could not auto-detect which book version to use for charname')
 
         # Now do the actual loading
+        if book in self.cache['charnames']:
+            self.charname = self.cache['charnames'][book]
+            self.char_loaded = True
+            return
         if not os.path.exists(self.char_loc):
             raise LoadException(f'"char" file not found in {self.char_loc}')
         df = Savefile(self.char_loc)
@@ -158,6 +202,7 @@ class Saveslot(object):
         self.charname = df.readstr().decode('UTF-8')
         self.char_loaded = True
         df.close()
+        self.cache['charnames'][book] = self.charname
 
     def print_info(self) -> None:
         """
@@ -205,3 +250,42 @@ class Saveslot(object):
             pass
 
         return util.cmp(a_short, b_short)
+
+
+def scan_slots(savegame_dir: str, book: Optional[int] = None, maps: bool = False,
+               charname: bool = False, workers: Optional[int] = None,
+               callback: Optional[Callable[[Saveslot], Any]] = None) -> List[Saveslot]:
+    """
+    Loads every "slot*" directory inside savegame_dir, using a pool of
+    threads.  Pass maps=True to also load each slot's map list, and
+    charname=True to load the character name (using "book", if given).
+    Slots which can't be loaded are left out.  If "callback" is given,
+    it'll be called with each slot as soon as it's loaded, from whichever
+    thread loaded it, so the caller can show slots as they come in.
+    Nothing in here switches the current book (the loaders work it out
+    per-file), so this is safe to run alongside the GUI.  Returns the
+    sorted list of slots.
+    """
+    slotdirs = sorted(glob.glob(os.path.join(savegame_dir, 'slot*')))
+
+    def load_slot(slotdir):
+        try:
+            slot = Saveslot(slotdir)
+            if maps:
+                slot.load_maps()
+            if charname:
+                slot.load_charname(book)
+        except Exception as e:
+            LOG.info('Skipping slot %s: %s' % (slotdir, e))
+            return None
+        if callback is not None:
+            callback(slot)
+        return slot
+
+    if len(slotdirs) == 0:
+        return []
+    if workers is None:
+        workers = min(8, len(slotdirs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        slots = list(executor.map(load_slot, slotdirs))
+    return sorted([slot for slot in slots if slot is not None])
@@ -197,10 +197,11 @@ class PremadeObject(object):
             for i in range(len(tile.tilecontents)):
                 map.deltilecontent(tile.x, tile.y, 0)
             if self.tilecontent is not None:
-                tile.addtilecontent(self.tilecontent.replicate())
-                map.tilecontents.append(tile.tilecontents[0])
-                tile.tilecontents[0].x = tile.x
-                tile.tilecontents[0].y = tile.y
+                tilecontent = self.tilecontent.replicate()
+                tilecontent.x = tile.x
+                tilecontent.y = tile.y
+                tile.addtilecontent(tilecontent)
+                map.tilecontents.append(tilecontent)
                 if self.do_lock:
                     tile.tilecontents[0].lock = int(
                         gui.get_widget('objectplace_lock_spin').get_value())
@@ -225,13 +226,13 @@ class PremadeObject(object):
                 if tile.entity is not None:
                     map.delentity(tile.x, tile.y)
                 tile.entity = self.entity.replicate()
-                map.entities.append(tile.entity)
                 # Global entities don't usually have a script explicitly defined
                 if not tile.entity.savegame:
                     tile.entity.entscript = ''
                 tile.entity.x = tile.x
                 tile.entity.y = tile.y
                 tile.entity.set_initial(tile.x, tile.y)
+                map.entities.append(tile.entity)
         for (dir, rel_obj) in list(self.rel_tiles.items()):
             adjtile = map.tile_relative(tile.x, tile.y, dir)
             if adjtile:
@@ -285,6 +286,34 @@ class PremadeObjectCollection(object):
                     obj.entity.savegame = savegame
 
 
+class NeighborCache(object):
+    """
+    Shared storage for the "known" dicts which draw_floor() and draw_beach()
+    use to keep track of a tile's neighbors, so that a batch of smart drawing
+    (see SmartDraw.draw_walls() and friends) only looks up each neighbor once,
+    no matter how many of the tiles in the batch end up touching it.  Only
+    valid for as long as the map's tile objects aren't replaced.
+    """
+
+    def __init__(self, mapobj):
+        self.mapobj = mapobj
+        self.known = {}
+
+    def known_for(self, tile):
+        """ Returns the (shared) dict of known neighbors for the given tile """
+        coords = (tile.x, tile.y)
+        if coords not in self.known:
+            self.known[coords] = {}
+        return self.known[coords]
+
+    def get(self, tile, dir):
+        """ Returns the tile in the given direction, or None """
+        known = self.known_for(tile)
+        if dir not in known:
+            known[dir] = self.mapobj.tile_relative(tile.x, tile.y, dir)
+        return known[dir]
+
+
 class SmartDraw(object):
     """
     A class to deal with "smart" drawing functions.
@@ -367,6 +396,7 @@ class SmartDraw(object):
 
         # Now populate all the actual constants
         self.init_vars()
+        self.build_wall_groups()
 
     def init_vars(self):
         """
@@ -393,6 +423,24 @@ class SmartDraw(object):
     def set_special(self, wallid):
         self.special = wallid
 
+    def build_wall_groups(self):
+        """
+        Builds our wall ID -> group lookup table (see get_wall_group()) from
+        the hardcoded graphics info set up in init_vars().  If any ranges
+        happen to overlap, walls win over fences, and fences over big fences.
+        """
+        self.wall_groups = {}
+        for start in self.wallstarts:
+            for wallid in range(start, start + 10):
+                self.wall_groups.setdefault(wallid, start)
+        for wallid in self.fenceids:
+            self.wall_groups.setdefault(wallid, self.fenceids[0])
+        for val in (self.bigfencestarts + self.bigfence2starts):
+            self.wall_groups.setdefault(val, val)
+            self.wall_groups.setdefault(val + 1, val)
+        self.fence_groups = set(
+            [self.fenceids[0]] + self.bigfencestarts + self.bigfence2starts)
+
     def get_wall_group(self, tile, wallgroup=None):
         """
         Returns the base group ID of the given wall ID.
@@ -400,18 +448,9 @@ class SmartDraw(object):
         the wallgroup you're working with, and this will return that group if
         the "special" 4-connection object is found.
         """
-        wallstart = -1
         if (wallgroup is not None and tile.wallimg == self.special):
             return wallgroup
-        for start in self.wallstarts:
-            if (start <= tile.wallimg < start + 10):
-                return start
-        if (tile.wallimg in self.fenceids):
-            return self.fenceids[0]
-        for val in (self.bigfencestarts + self.bigfence2starts):
-            if (tile.wallimg == val or tile.wallimg == val + 1):
-                return val
-        return None
+        return self.wall_groups.get(tile.wallimg)
 
     def draw_wall(self, tile):
         """
@@ -436,7 +475,7 @@ class SmartDraw(object):
         # Fences act similarly, but different enough that I think things would
         # be problematic if I were to try to handle everything in one function
         # here.
-        if (wallgroup in ([self.fenceids[0]] + self.bigfencestarts + self.bigfence2starts)):
+        if (wallgroup in self.fence_groups):
             return self.draw_fence(tile, wallgroup)
 
         # Now loop through our directions and see where we should link to.
@@ -472,7 +511,7 @@ class SmartDraw(object):
 
         if (self.revindexes[self.IDX_WALL][connflags] == -1):
             tile.wallimg = self.special
-            if c.book > 1:
+            if self.mapobj.book > 1:
                 tile.wall = 2
         else:
             tile.wallimg = wallgroup + \
@@ -533,7 +572,7 @@ class SmartDraw(object):
         else:
             if (self.revindexes[self.IDX_WALL][newflags] == -1):
                 tile.wallimg = self.special
-                if c.book > 1:
+                if self.mapobj.book > 1:
                     tile.wall = 2
             else:
                 tile.wallimg = group + self.revindexes[self.IDX_WALL][newflags]
@@ -690,6 +729,17 @@ class SmartDraw(object):
             known[dir] = self.mapobj.tile_relative(tile.x, tile.y, dir)
         return known[dir]
 
+    def adj_known(self, cache, adjtile, dir, tile):
+        """
+        Returns the "known" dict to pass along when recursing from tile into
+        adjtile, which is in direction dir from it.
+        """
+        if cache is None:
+            return {self.REV_DIR[dir]: tile}
+        known = cache.known_for(adjtile)
+        known[self.REV_DIR[dir]] = tile
+        return known
+
     def get_random_terrain_pool(self, floorimg):
         """
         Given a floor image, return the set of random tiles that we'll choose
@@ -701,7 +751,7 @@ class SmartDraw(object):
                 return tileset
         return (floorimg,)
 
-    def draw_floor(self, tile, straight_path=True, recurse=True, known=None):
+    def draw_floor(self, tile, straight_path=True, recurse=True, known=None, cache=None):
         """
         Given a tile, figure out what kind of grass decals it should have,
         if any.  Will actually set the decal image, as well.  If 'recurse'
@@ -712,7 +762,9 @@ class SmartDraw(object):
 
         Returns a list of modified tiles if we're recursing, or just
         true/false otherwise.  (Note that the list does not include the
-        original tile, which is just assumed.)
+        original tile, which is just assumed.)  If 'cache' is passed in
+        (a NeighborCache), it's used in place of 'known', for ourselves
+        and for any tiles we recurse into.
 
         It should be noted that I stumbled across the "straight_path" stuff
         purely by accident; that wasn't actually my goal when I first
@@ -721,7 +773,9 @@ class SmartDraw(object):
         """
 
         # Get our edge preference type
-        if known is None:
+        if cache is not None:
+            known = cache.known_for(tile)
+        elif known is None:
             known = {}
         idxtype = None
         for (element, index) in list(self.gui.decal_edge_pref_map.items()):
@@ -733,7 +787,7 @@ class SmartDraw(object):
 
         # Go elsewhere if we're drawing beach stuffs
         if (idxtype == self.IDX_BEACH):
-            return self.draw_beach(tile)
+            return self.draw_beach(tile, cache=cache)
 
         connflags = 0
         connflags_not = 0
@@ -746,7 +800,7 @@ class SmartDraw(object):
         if (recurse):
             for dir in [self.DIR_NE, self.DIR_E, self.DIR_SE, self.DIR_S,
                         self.DIR_SW, self.DIR_W, self.DIR_NW, self.DIR_N]:
-                known[dir] = self.mapobj.tile_relative(tile.x, tile.y, dir)
+                self.get_rel(tile, known, dir)
 
             # Also randomize the floor tile if we're supposed to (we only do
             # this to the tile actually being drawn, not any adjacent tiles)
@@ -779,7 +833,7 @@ class SmartDraw(object):
 
             # Process adjacent tiles if we're supposed to
             if (recurse):
-                if (self.draw_floor(adjtile, straight_path, False, {self.REV_DIR[testdir]: tile})):
+                if (self.draw_floor(adjtile, straight_path, False, self.adj_known(cache, adjtile, testdir, tile))):
                     affected.append(adjtile)
 
         # If we're recursing, we'll need to check the cardinal directions as
@@ -789,7 +843,7 @@ class SmartDraw(object):
                 adjtile = self.get_rel(tile, known, testdir)
                 if (not adjtile):
                     continue
-                if (self.draw_floor(adjtile, straight_path, False, {self.REV_DIR[testdir]: tile})):
+                if (self.draw_floor(adjtile, straight_path, False, self.adj_known(cache, adjtile, testdir, tile))):
                     affected.append(adjtile)
 
         if (tile.floorimg in self.tilesets[idxtype]):
@@ -955,11 +1009,11 @@ class SmartDraw(object):
                     break
         return None
 
-    def draw_beach(self, tile, recurse=True, known=None, parent_water=False):
+    def draw_beach(self, tile, recurse=True, known=None, parent_water=False, cache=None):
         """
         Drawing beach tiles is handled differently from the usual decal
         stuff.  The overall flow is similar, but we're touching different
-        vars, etc...
+        vars, etc...  'known' and 'cache' work as in draw_floor().
         """
 
         # TODO would be kind of nice to consider ANYTHING non-water to
@@ -967,7 +1021,9 @@ class SmartDraw(object):
 
         # TODO: Gets touchy around the edge of the map
 
-        if known is None:
+        if cache is not None:
+            known = cache.known_for(tile)
+        elif known is None:
             known = {}
         connflags = 0
         connflags_not = 0
@@ -988,7 +1044,7 @@ class SmartDraw(object):
         if (recurse):
             for dir in [self.DIR_NE, self.DIR_E, self.DIR_SE, self.DIR_S,
                         self.DIR_SW, self.DIR_W, self.DIR_NW, self.DIR_N]:
-                known[dir] = self.mapobj.tile_relative(tile.x, tile.y, dir)
+                self.get_rel(tile, known, dir)
 
             # Additionally, set our tile to full-sand so that the recursion
             # stuff can link in properly
@@ -1000,7 +1056,7 @@ class SmartDraw(object):
                             self.DIR_N, self.DIR_E, self.DIR_S, self.DIR_W]:
                 adjtile = self.get_rel(tile, known, testdir)
                 if (adjtile):
-                    if (self.draw_beach(adjtile, False, {self.REV_DIR[testdir]: tile}, drawing_water)):
+                    if (self.draw_beach(adjtile, False, self.adj_known(cache, adjtile, testdir, tile), drawing_water)):
                         affected.append(adjtile)
 
         # First find out more-typical adjacent tiles
@@ -1104,6 +1160,121 @@ class SmartDraw(object):
         else:
             return (curdecal != tile.decalimg or curfloor != tile.floorimg)
 
+    def wall_connections(self, tile, group, cache):
+        """
+        Returns a tuple of the connection flags for the given tile (in the
+        given wall group), and how many connections there are.
+        """
+        connflags = 0
+        flagcount = 0
+        for testdir in [self.DIR_NE, self.DIR_SE, self.DIR_SW, self.DIR_NW]:
+            adjtile = cache.get(tile, testdir)
+            if adjtile is None:
+                continue
+            if (self.get_wall_group(adjtile, group) == group):
+                connflags = connflags | testdir
+                flagcount += 1
+        return (connflags, flagcount)
+
+    def draw_walls(self, tiles):
+        """
+        Batch version of draw_wall(), for a whole bunch of tiles at once (a
+        dragged path or a region, say) whose wall images have already been
+        set.  Returns a list of the other tiles which have been updated by
+        this action (not including the given tiles, which are assumed).
+
+        Rather than having each tile fix up its neighbors, only to have
+        the next tile fix them up again, we figure out every tile whose
+        connections might have changed, and then work out each of those
+        exactly once.  Fences can only hold a couple of connections, so the
+        order they're drawn in matters; those just go through draw_fence()
+        one at a time.
+        """
+        cache = NeighborCache(self.mapobj)
+        batch = set([(tile.x, tile.y) for tile in tiles])
+        affected = []
+
+        # Sort out what we're drawing
+        todo = {}
+        for tile in tiles:
+            wallgroup = self.get_wall_group(tile)
+            if wallgroup is None:
+                self.draw_wall(tile)
+            elif wallgroup in self.fence_groups:
+                affected.extend(self.draw_fence(tile, wallgroup))
+            else:
+                todo[(tile.x, tile.y)] = (tile, wallgroup)
+
+        # Pull in any neighboring walls which will need to connect to us
+        for (tile, wallgroup) in list(todo.values()):
+            for testdir in [self.DIR_NE, self.DIR_SE, self.DIR_SW, self.DIR_NW]:
+                adjtile = cache.get(tile, testdir)
+                if adjtile is None or (adjtile.x, adjtile.y) in todo:
+                    continue
+                if (self.get_wall_group(adjtile, wallgroup) == wallgroup):
+                    todo[(adjtile.x, adjtile.y)] = (adjtile, wallgroup)
+
+        # ... and now resolve everything.  This is the same logic as in
+        # draw_wall() and add_wall_connection().
+        for (coords, (tile, wallgroup)) in todo.items():
+            (connflags, flagcount) = self.wall_connections(tile, wallgroup, cache)
+            if (connflags not in self.revindexes[self.IDX_WALL]):
+                if (flagcount == 0):
+                    connflags = self.indexes[self.IDX_WALL][0]
+                elif (flagcount == 1):
+                    if ((connflags & self.DIR_NE) == self.DIR_NE or
+                            (connflags & self.DIR_SW) == self.DIR_SW):
+                        connflags = self.indexes[self.IDX_WALL][0]
+                    else:
+                        connflags = self.indexes[self.IDX_WALL][1]
+                else:
+                    raise Exception(
+                        "flagcount isn't 1 or 0 - should figure out why")
+            if (self.revindexes[self.IDX_WALL][connflags] == -1):
+                wallimg = self.special
+                wall = 2 if self.mapobj.book > 1 else tile.wall
+            else:
+                wallimg = wallgroup + self.revindexes[self.IDX_WALL][connflags]
+                wall = 1
+            if coords in batch:
+                tile.wallimg = wallimg
+                tile.wall = wall
+            elif tile.wallimg != wallimg:
+                tile.wallimg = wallimg
+                tile.wall = wall
+                affected.append(tile)
+
+        return self.unique_affected(affected, batch)
+
+    def draw_floors(self, tiles, straight_path=True):
+        """
+        Batch version of draw_floor() (and draw_beach(), which it hands off
+        to).  The connections here depend on the order the tiles get drawn in,
+        so we still process them one at a time, but the tiles all share a
+        single NeighborCache.  Returns a list of the other tiles which have
+        been updated (not including the given tiles, which are assumed).
+        """
+        cache = NeighborCache(self.mapobj)
+        batch = set([(tile.x, tile.y) for tile in tiles])
+        affected = []
+        for tile in tiles:
+            affected.extend(self.draw_floor(tile, straight_path, cache=cache))
+        return self.unique_affected(affected, batch)
+
+    def unique_affected(self, affected, batch):
+        """
+        Given a list of affected tiles and a set of coordinates drawn by a
+        batch, returns the affected tiles with the drawn ones and duplicates
+        removed.
+        """
+        seen = set(batch)
+        retarr = []
+        for tile in affected:
+            if (tile.x, tile.y) not in seen:
+                seen.add((tile.x, tile.y))
+                retarr.append(tile)
+        return retarr
+
     def draw_smart_complex_obj(self, collection, tile, undo):
         """
         Sees if we can draw a complex wall object.
@@ -19,7 +19,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import logging
 
-from eschalon.constants import constants as c
+from eschalon.constants import book_constants
 
 LOG = logging.getLogger(__name__)
 
@@ -180,9 +180,9 @@ class Tile(object):
         ret.append("    Decal Image: %d" % self.decalimg)
         ret.append("    Wall Image: %d" % self.wallimg)
         ret.append("    Wall Decal Image: %d" % self.walldecalimg)
-        if (self.tilecontentid in c.tilecontenttypetable):
+        if (self.tilecontentid in self.constants.tilecontenttypetable):
             ret.append("    Object Type: %s" %
-                       c.tilecontenttypetable[self.tilecontentid])
+                       self.constants.tilecontenttypetable[self.tilecontentid])
         else:
             ret.append("    Object Type: %d" % self.tilecontentid)
         if (unknowns):
@@ -229,6 +229,7 @@ class B1Tile(Tile):
     """
 
     book = 1
+    constants = book_constants(1)
 
     def __init__(self, x, y):
         super(B1Tile, self).__init__(x, y)
@@ -237,6 +238,18 @@ class B1Tile(Tile):
         self.unknown5 = 0
         # This var is *probably* actually part of the wall ID, like in book 2
 
+    def record_size(self):
+        """ How many bytes we take up in the map file. """
+        return 7
+
+    def record_fields(self):
+        """
+        Our on-disk layout, as (attribute, numpy type) pairs, for reading
+        a whole map's worth of tiles in one go.
+        """
+        return [('wall', 'u1'), ('floorimg', 'u1'), ('decalimg', 'u1'), ('wallimg', 'u1'),
+                ('unknown5', 'u1'), ('walldecalimg', 'u1'), ('tilecontentid', 'u1')]
+
     def read(self, df):
         """ Given a file descriptor, read in the tile. """
 
@@ -284,6 +297,7 @@ class B2Tile(Tile):
     """
 
     book = 2
+    constants = book_constants(2)
 
     def __init__(self, x, y):
         super(B2Tile, self).__init__(x, y)
@@ -291,6 +305,21 @@ class B2Tile(Tile):
         # Book 2 specific vars
         self.tile_flag = 0
 
+    def record_size(self):
+        """ How many bytes we take up in the map file. """
+        return 7 + (4 if self.savegame else 0)
+
+    def record_fields(self):
+        """
+        Our on-disk layout, as (attribute, numpy type) pairs, for reading
+        a whole map's worth of tiles in one go.
+        """
+        fields = [('wall', 'u1'), ('floorimg', 'u1'), ('decalimg', 'u1'), ('wallimg', '<u2'),
+                  ('walldecalimg', 'u1'), ('tilecontentid', 'u1')]
+        if self.savegame:
+            fields.append(('tile_flag', '<u4'))
+        return fields
+
     def read(self, df):
         """ Given a file descriptor, read in the tile. """
 
@@ -347,6 +376,7 @@ class B3Tile(B2Tile):
     """
 
     book = 3
+    constants = book_constants(3)
 
     def __init__(self, x, y):
         super(B3Tile, self).__init__(x, y)
@@ -354,6 +384,16 @@ class B3Tile(B2Tile):
         # Book 3 specific vars
         self.cartography = 0
 
+    def record_size(self):
+        """ How many bytes we take up in the map file. """
+        return 7 + (8 if self.savegame else 0)
+
+    def record_fields(self):
+        fields = super(B3Tile, self).record_fields()
+        if self.savegame:
+            fields.append(('cartography', '<u4'))
+        return fields
+
     def read(self, df):
         """ Given a file descriptor, read in the tile. """
 
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+
+import numpy
+
+LOG = logging.getLogger(__name__)
+
+
+class TileArrays(object):
+    """
+    A column-oriented copy of the data in a map's tiles: one numpy array
+    (indexed [y, x], like Map.tiles) per tile attribute, so that questions
+    about the whole map can be answered without looping over 20,000 Tile
+    objects in Python.
+
+    The Tile objects remain the real data - this is just a snapshot, and
+    anything which edits tiles is responsible for calling update_tile()
+    (or rebuilding us) afterwards.
+    """
+
+    # Simple integer attributes which get copied straight over
+    FIELDS = ['wall', 'floorimg', 'decalimg',
+              'wallimg', 'walldecalimg', 'tilecontentid']
+
+    # Savegame-only attributes from Books 2 and 3.  These are full 32-bit
+    # flag fields, and are zero for tiles which don't have them.
+    EXTRA_FIELDS = ['tile_flag', 'cartography']
+
+    # Everything we hold, for anything which wants to treat us as columns
+    COLUMNS = FIELDS + EXTRA_FIELDS + ['num_tilecontents', 'entid', 'entity_friendly']
+
+    def __init__(self, tiles):
+        self.rows = len(tiles)
+        self.cols = len(tiles[0])
+        self.shape = (self.rows, self.cols)
+        self.load(tiles)
+
+    def load(self, tiles):
+        """ (Re)populates all our arrays from the given grid of tiles. """
+        for field in self.FIELDS:
+            setattr(self, field, numpy.array(
+                [[getattr(tile, field) for tile in row] for row in tiles], dtype=numpy.int32))
+        for field in self.EXTRA_FIELDS:
+            setattr(self, field, numpy.array(
+                [[getattr(tile, field, 0) for tile in row] for row in tiles], dtype=numpy.int64))
+        self.num_tilecontents = numpy.array(
+            [[len(tile.tilecontents) for tile in row] for row in tiles], dtype=numpy.int32)
+        # Entity ID is -1 where there's no entity
+        self.entid = numpy.array(
+            [[-1 if tile.entity is None else tile.entity.entid for tile in row] for row in tiles],
+            dtype=numpy.int32)
+        self.entity_friendly = numpy.array(
+            [[-1 if tile.entity is None else tile.entity.friendly for tile in row] for row in tiles],
+            dtype=numpy.int32)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Builds a TileArrays from a dict of arrays keyed by our COLUMNS,
+        such as one we saved off earlier.
+        """
+        arrays = cls.__new__(cls)
+        for column in cls.COLUMNS:
+            setattr(arrays, column, columns[column])
+        arrays.shape = arrays.wall.shape
+        (arrays.rows, arrays.cols) = arrays.shape
+        return arrays
+
+    def columns(self):
+        """ Returns a dict of all our arrays, keyed by column name. """
+        return dict([(column, getattr(self, column)) for column in self.COLUMNS])
+
+    @classmethod
+    def from_records(cls, records, tilecontents, entities):
+        """
+        Builds a TileArrays straight from a structured numpy array of raw
+        tile records (laid out as per Tile.record_fields()) along with the
+        map's tilecontents and entities, without needing any Tile objects.
+        """
+        arrays = cls.__new__(cls)
+        (arrays.rows, arrays.cols) = records.shape
+        arrays.shape = records.shape
+        for (fields, dtype) in [(cls.FIELDS, numpy.int32), (cls.EXTRA_FIELDS, numpy.int64)]:
+            for field in fields:
+                if field in records.dtype.names:
+                    setattr(arrays, field, records[field].astype(dtype))
+                else:
+                    setattr(arrays, field, numpy.zeros(records.shape, dtype=dtype))
+        arrays.num_tilecontents = numpy.zeros(records.shape, dtype=numpy.int32)
+        for tilecontent in tilecontents:
+            if 0 <= tilecontent.x < arrays.cols and 0 <= tilecontent.y < arrays.rows:
+                arrays.num_tilecontents[tilecontent.y, tilecontent.x] += 1
+        arrays.entid = numpy.full(records.shape, -1, dtype=numpy.int32)
+        arrays.entity_friendly = numpy.full(records.shape, -1, dtype=numpy.int32)
+        for entity in entities:
+            if 0 <= entity.x < arrays.cols and 0 <= entity.y < arrays.rows:
+                arrays.entid[entity.y, entity.x] = entity.entid
+                arrays.entity_friendly[entity.y, entity.x] = entity.friendly
+        return arrays
+
+    def update_tile(self, tile):
+        """ Re-syncs a single tile's data. """
+        x = tile.x
+        y = tile.y
+        for field in self.FIELDS:
+            getattr(self, field)[y, x] = getattr(tile, field)
+        for field in self.EXTRA_FIELDS:
+            getattr(self, field)[y, x] = getattr(tile, field, 0)
+        self.num_tilecontents[y, x] = len(tile.tilecontents)
+        if tile.entity is None:
+            self.entid[y, x] = -1
+            self.entity_friendly[y, x] = -1
+        else:
+            self.entid[y, x] = tile.entity.entid
+            self.entity_friendly[y, x] = tile.entity.friendly
+
+    def has_entity(self):
+        """ Boolean array of tiles which contain an entity. """
+        return self.entid >= 0
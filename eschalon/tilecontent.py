@@ -19,7 +19,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 import logging
 
-from eschalon.constants import constants as c
+from eschalon.constants import book_constants
 from eschalon.item import Item
 from eschalon.savefile import FirstItemLoadException
 
@@ -66,7 +66,7 @@ class Tilecontent(object):
 
         # Populate Items as well
         for num in range(8):
-            self.items.append(Item.new(c.book))
+            self.items.append(Item.new(self.book))
             self.items[num].tozero()
 
         # Call out to superclass zeroing
@@ -172,6 +172,7 @@ class B1Tilecontent(Tilecontent):
     """
 
     book = 1
+    constants = book_constants(1)
 
     def __init__(self, savegame):
         super(B1Tilecontent, self).__init__(savegame)
@@ -258,7 +259,7 @@ class B1Tilecontent(Tilecontent):
 
         # Items
         for num in range(8):
-            self.items.append(Item.new(c.book))
+            self.items.append(Item.new(self.book))
             if (self.savegame):
                 self.items[num].read(df)
             else:
@@ -303,18 +304,18 @@ class B1Tilecontent(Tilecontent):
             ret.append("\tSlider Lock Code: %d" % self.other)
         else:
             ret.append("\tOther (typically 0-3): %d" % self.other)
-        if (self.trap in c.traptable):
-            ret.append("\tTrapped: %s" % c.traptable[self.trap])
+        if (self.trap in self.constants.traptable):
+            ret.append("\tTrapped: %s" % self.constants.traptable[self.trap])
         else:
             ret.append("\tTrapped: %d (unknown)" % self.trap)
-        if (self.state in c.containertable):
-            ret.append("\tState: %s" % c.containertable[self.state])
+        if (self.state in self.constants.containertable):
+            ret.append("\tState: %s" % self.constants.containertable[self.state])
         else:
             ret.append("\tState: %d (unknown)" % self.state)
         ret.append("\tSturdiness: %d" % self.sturdiness)
         if (self.flags != 0):
             ret.append("\tFlags:")
-            for (flag, flagtext) in list(c.tilecontentflags.items()):
+            for (flag, flagtext) in list(self.constants.tilecontentflags.items()):
                 if (self.flags & flag == flag):
                     ret.append("\t\t* %s" % flagtext)
 
@@ -339,6 +340,7 @@ class B2Tilecontent(Tilecontent):
     """
 
     book = 2
+    constants = book_constants(2)
 
     def __init__(self, savegame):
         super(B2Tilecontent, self).__init__(savegame)
@@ -449,12 +451,12 @@ class B2Tilecontent(Tilecontent):
             ret.append("\tSlider Lock Code: %d" % self.slider_loot)
         else:
             ret.append("\tLoot Level: %d" % self.slider_loot)
-        if (self.trap in c.traptable):
-            ret.append("\tTrapped: %s" % c.traptable[self.trap])
+        if (self.trap in self.constants.traptable):
+            ret.append("\tTrapped: %s" % self.constants.traptable[self.trap])
         else:
             ret.append("\tTrapped: %d (unknown)" % self.trap)
-        if (self.state in c.containertable):
-            ret.append("\tState: %s" % c.containertable[self.state])
+        if (self.state in self.constants.containertable):
+            ret.append("\tState: %s" % self.constants.containertable[self.state])
         else:
             ret.append("\tState: %d (unknown)" % self.state)
 
@@ -473,3 +475,4 @@ class B3Tilecontent(B2Tilecontent):
 
     # The file format is identical, so we don't need to override anything
     book = 3
+    constants = book_constants(3)
@@ -0,0 +1,409 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import argparse
+import ast
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional, Sequence
+
+import numpy
+
+from eschalon.eschalondata import default_cache_dir
+from eschalon.map import Map
+from eschalon.maplint import find_maps
+from eschalon.savefile import LoadException
+from eschalon.tilearrays import TileArrays
+
+LOG = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Tiles are int64 columns, so constants have to fit in one
+INT_MIN = int(numpy.iinfo(numpy.int64).min)
+INT_MAX = int(numpy.iinfo(numpy.int64).max)
+
+# Growing a mask by more steps than the map is tall can't change anything
+MAX_NEAR_STEPS = 200
+
+
+def dilate(mask, steps=1):
+    """
+    Grows a boolean [y, x] mask by the given number of steps, following
+    the map's own idea of which tiles are adjacent (see Map.neighbor_tables).
+    """
+    (rows, cols) = mask.shape
+    result = mask.copy()
+    for step in range(steps):
+        grown = result.copy()
+        for parity in [0, 1]:
+            for (dx, dy) in Map.DIRECTIONS_TO_DELTA_PARITY[parity].values():
+                # Rows of this parity, and the rows they're adjacent to
+                src_y = numpy.arange(parity, rows, 2)
+                dst_y = src_y + dy
+                keep = (dst_y >= 0) & (dst_y < rows)
+                (src_y, dst_y) = (src_y[keep], dst_y[keep])
+                src_x = slice(max(0, -dx), cols - max(0, dx))
+                dst_x = slice(max(0, dx), cols - max(0, -dx))
+                grown[dst_y, dst_x] |= result[src_y, src_x]
+        result = grown
+    return result
+
+
+def isin(column, values):
+    return numpy.isin(column, values)
+
+
+def bit(column, bitnum):
+    return (column >> bitnum) & 1 == 1
+
+
+def near(mask, steps=1):
+    mask = numpy.asarray(mask, dtype=bool)
+    return dilate(mask, min(int(steps), max(mask.shape)))
+
+
+class Expression(object):
+    """
+    A filter expression over tile columns, like "floorimg == 126 and
+    near(wall == 3, 2)".  This is a small, safe subset of Python: column
+    names, integers, comparisons, arithmetic and bitwise operators,
+    and/or/not, and a few functions (isin, bit, near).  Everything gets
+    evaluated over whole numpy arrays at once.
+    """
+
+    FUNCTIONS = {'isin': isin, 'bit': bit, 'near': near}
+    BINOPS = {ast.Add: numpy.add, ast.Sub: numpy.subtract, ast.Mult: numpy.multiply,
+              ast.FloorDiv: numpy.floor_divide, ast.Mod: numpy.mod,
+              ast.BitAnd: numpy.bitwise_and, ast.BitOr: numpy.bitwise_or,
+              ast.BitXor: numpy.bitwise_xor, ast.LShift: numpy.left_shift,
+              ast.RShift: numpy.right_shift}
+    COMPARISONS = {ast.Eq: numpy.equal, ast.NotEq: numpy.not_equal, ast.Lt: numpy.less,
+                   ast.LtE: numpy.less_equal, ast.Gt: numpy.greater, ast.GtE: numpy.greater_equal}
+    COLUMNS = TileArrays.COLUMNS + ['x', 'y']
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            self.tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise LoadException('Invalid expression "%s": %s' % (source, e.msg))
+        self.check(self.tree.body)
+
+    def check(self, node):
+        """ Makes sure we only contain things we know how to evaluate. """
+        if isinstance(node, ast.Name):
+            if node.id not in self.COLUMNS:
+                raise LoadException('Unknown column "%s", expected one of: %s' % (
+                    node.id, ', '.join(self.COLUMNS)))
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, int) or isinstance(node.value, bool):
+                raise LoadException('Only integer constants are allowed, not %r' % (node.value))
+            if not INT_MIN <= node.value <= INT_MAX:
+                raise LoadException('Integer constant %d is out of range' % (node.value))
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in self.FUNCTIONS:
+                raise LoadException('Unknown function in "%s"' % (self.source))
+            if len(node.keywords) > 0:
+                raise LoadException('Keyword arguments are not supported')
+            if node.func.id == 'near' and len(node.args) > 1:
+                steps = node.args[1]
+                if (not isinstance(steps, ast.Constant) or not isinstance(steps.value, int) or
+                        not 0 <= steps.value <= MAX_NEAR_STEPS):
+                    raise LoadException('The steps for near() must be a number from 0 to %d' % (MAX_NEAR_STEPS))
+            for arg in node.args:
+                self.check(arg)
+        elif isinstance(node, (ast.List, ast.Tuple)):
+            for elt in node.elts:
+                self.check(elt)
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self.check(value)
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.Not, ast.Invert, ast.USub)):
+                raise LoadException('Unsupported operator in "%s"' % (self.source))
+            self.check(node.operand)
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in self.BINOPS:
+                raise LoadException('Unsupported operator in "%s"' % (self.source))
+            self.check(node.left)
+            self.check(node.right)
+        elif isinstance(node, ast.Compare):
+            for op in node.ops:
+                if type(op) not in self.COMPARISONS:
+                    raise LoadException('Unsupported comparison in "%s"' % (self.source))
+            self.check(node.left)
+            for comparator in node.comparators:
+                self.check(comparator)
+        else:
+            raise LoadException('Unsupported syntax in "%s"' % (self.source))
+
+    def evaluate(self, arrays):
+        """
+        Evaluates the expression against a TileArrays object, and returns
+        the resulting array (a boolean [y, x] mask, for filters).
+        """
+        (ys, xs) = numpy.indices(arrays.shape)
+        columns = {'x': xs, 'y': ys}
+        for column in TileArrays.COLUMNS:
+            columns[column] = getattr(arrays, column)
+        return numpy.broadcast_to(self.evaluate_node(self.tree.body, columns), arrays.shape)
+
+    def evaluate_node(self, node, columns):
+        if isinstance(node, ast.Name):
+            return columns[node.id]
+        elif isinstance(node, ast.Constant):
+            return node.value
+        elif isinstance(node, (ast.List, ast.Tuple)):
+            return [self.evaluate_node(elt, columns) for elt in node.elts]
+        elif isinstance(node, ast.Call):
+            return self.FUNCTIONS[node.func.id](*[self.evaluate_node(arg, columns) for arg in node.args])
+        elif isinstance(node, ast.BoolOp):
+            values = [numpy.asarray(self.evaluate_node(value, columns), dtype=bool) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return numpy.logical_and.reduce(values)
+            return numpy.logical_or.reduce(values)
+        elif isinstance(node, ast.UnaryOp):
+            operand = self.evaluate_node(node.operand, columns)
+            if isinstance(node.op, ast.Not):
+                return numpy.logical_not(operand)
+            elif isinstance(node.op, ast.Invert):
+                return numpy.invert(operand)
+            return numpy.negative(operand)
+        elif isinstance(node, ast.BinOp):
+            return self.BINOPS[type(node.op)](self.evaluate_node(node.left, columns),
+                                              self.evaluate_node(node.right, columns))
+        else:
+            # Chained comparisons (a < b < c) are and-ed together, as in Python
+            result = True
+            left = self.evaluate_node(node.left, columns)
+            for (op, comparator) in zip(node.ops, node.comparators):
+                right = self.evaluate_node(comparator, columns)
+                result = numpy.logical_and(result, self.COMPARISONS[type(op)](left, right))
+                left = right
+            return result
+
+
+def cache_filename(filename, cache_dir):
+    digest = hashlib.sha1(os.path.realpath(filename).encode('UTF-8')).hexdigest()
+    return os.path.join(cache_dir, 'tiles-%s.npz' % (digest))
+
+
+def extract_arrays(filename):
+    """
+    Reads the tile layers out of a map file.  The map header, tilecontents
+    and entities are parsed as usual, but the tile block is read straight
+    into a numpy record array rather than going through 20,000 Tile objects.
+    """
+    mapobj = Map.load(filename)
+    mapobj.read(tiles=False)
+    dtype = numpy.dtype(mapobj.tiles[0][0].record_fields())
+    rows = len(mapobj.tiles)
+    cols = len(mapobj.tiles[0])
+    with open(filename, 'rb') as df:
+        df.seek(mapobj.tiles_offset)
+        data = df.read(dtype.itemsize * rows * cols)
+    if len(data) != dtype.itemsize * rows * cols:
+        raise LoadException('Tile data in %s is truncated' % (filename))
+    records = numpy.frombuffer(data, dtype=dtype).reshape((rows, cols))
+    return TileArrays.from_records(records, mapobj.tilecontents, mapobj.entities)
+
+
+def load_arrays(filename, cache_dir=None):
+    """
+    Returns a (TileArrays, cached) tuple for the given map file, using our
+    columnar cache in cache_dir if it's still current (judged by the
+    map's size and mtime), and refreshing it otherwise.  Pass a cache_dir
+    of None to skip the cache entirely.
+    """
+    stat = os.stat(filename)
+    stamp = numpy.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=numpy.int64)
+    if cache_dir is not None:
+        cachefile = cache_filename(filename, cache_dir)
+        try:
+            with numpy.load(cachefile) as data:
+                if numpy.array_equal(data['stamp'], stamp):
+                    return (TileArrays.from_columns(data), True)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            LOG.exception('Could not read tile cache for %s, rebuilding' % (filename))
+
+    arrays = extract_arrays(filename)
+    if cache_dir is not None:
+        tmpname = '%s.%d' % (cachefile, os.getpid())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmpname, 'wb') as df:
+                numpy.savez(df, stamp=stamp, **arrays.columns())
+            os.replace(tmpname, cachefile)
+        except (IOError, OSError) as e:
+            LOG.warning('Could not write tile cache %s: %s' % (cachefile, e))
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+    return (arrays, False)
+
+
+def query_file(filename, where, count_by=None, coords=False, cache_dir=None):
+    """
+    Runs a query against a single map, and returns a dict report, suitable
+    for passing between processes.  "where" is the filter expression
+    source (every tile matches if it's None), "count_by" an optional
+    expression whose values get tallied across the matching tiles, and
+    "coords" whether to list the matching coordinates.
+    """
+    report = {'map': filename}
+    try:
+        (arrays, report['cached']) = load_arrays(filename, cache_dir)
+        if where is None:
+            mask = numpy.ones(arrays.shape, dtype=bool)
+        else:
+            mask = numpy.asarray(Expression(where).evaluate(arrays), dtype=bool)
+        report['count'] = int(numpy.count_nonzero(mask))
+        if count_by is not None:
+            values = Expression(count_by).evaluate(arrays)[mask]
+            (uniques, counts) = numpy.unique(values, return_counts=True)
+            report['values'] = dict([(str(int(value)), int(count)) for (value, count) in zip(uniques, counts)])
+        if coords:
+            report['coords'] = [[int(x), int(y)] for (y, x) in zip(*numpy.nonzero(mask))]
+    except (LoadException, IOError, ValueError, TypeError, ArithmeticError) as e:
+        report['error'] = str(e)
+    return report
+
+
+def query_files(filenames, where, count_by=None, coords=False, cache_dir=None, workers=None):
+    """
+    Runs a query across a list of maps in a pool of worker processes.
+    Yields the reports (see query_file()) in file order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filenames) <= 1:
+        for filename in filenames:
+            yield query_file(filename, where, count_by, coords, cache_dir)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as executor:
+        yield from executor.map(query_file, filenames, repeat(where), repeat(count_by),
+                                repeat(coords), repeat(cache_dir), chunksize=4)
+
+
+def summarize(reports):
+    """ Totals up the counts (and tallies) across a list of reports. """
+    summary = {'maps': 0, 'matching_maps': 0, 'count': 0}
+    for report in reports:
+        if 'error' in report:
+            continue
+        summary['maps'] += 1
+        summary['count'] += report['count']
+        if report['count'] > 0:
+            summary['matching_maps'] += 1
+        if 'values' in report:
+            values = summary.setdefault('values', {})
+            for (value, count) in report['values'].items():
+                values[value] = values.get(value, 0) + count
+    return summary
+
+
+def report_text(report):
+    if 'error' in report:
+        return ['%s: error: %s' % (report['map'], report['error'])]
+    lines = ['%s: %d tiles' % (report['map'], report['count'])]
+    for (value, count) in sorted(report.get('values', {}).items(), key=lambda item: int(item[0])):
+        lines.append('  %s: %d' % (value, count))
+    if 'coords' in report:
+        lines.append('  %s' % (' '.join(['(%d, %d)' % (x, y) for (x, y) in report['coords']])))
+    return lines
+
+
+def parse_args(input: Optional[Sequence[str]]):
+    parser = argparse.ArgumentParser(
+        description='Query the tile layers of many maps at once')
+    parser.add_argument("paths", type=str, nargs='+',
+                        help='Map files, or directories full of them')
+    parser.add_argument("-w", "--where", type=str,
+                        help='Filter expression, such as "floorimg == 126 and near(wall == 3, 2)"')
+    parser.add_argument("--count-by", type=str,
+                        help='Column (or expression) to tally across the matching tiles')
+    parser.add_argument("--coords", action="store_true",
+                        help='List the coordinates of the matching tiles')
+    parser.add_argument("--all", action="store_true",
+                        help='Report on maps with no matching tiles, too')
+    parser.add_argument("--cache-dir", type=str,
+                        help='Where to keep the columnar tile cache')
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--format", choices=['text', 'json', 'ndjson'], default='text')
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(input)
+
+    # Catch bad expressions before we fire up any workers
+    for source in [args.where, args.count_by]:
+        if source is not None:
+            try:
+                Expression(source)
+            except LoadException as e:
+                parser.error(str(e))
+    return args
+
+
+def main(input: Optional[Sequence[str]] = None) -> int:
+    """
+    Runs the query and prints the results.  Returns 0 if any tiles
+    matched, 1 if none did, and 2 if any maps couldn't be read.
+    """
+    args = parse_args(input)
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir is not None:
+        cache_dir = args.cache_dir
+    else:
+        cache_dir = os.path.join(default_cache_dir(), 'tiles')
+
+    reports = []
+    for report in query_files(find_maps(args.paths), args.where, args.count_by,
+                              args.coords, cache_dir, args.workers):
+        reports.append(report)
+        if not args.all and report.get('count') == 0:
+            continue
+        if args.format == 'ndjson':
+            print(json.dumps(report, sort_keys=True), flush=True)
+        elif args.format == 'text':
+            print("\n".join(report_text(report)))
+    summary = summarize(reports)
+    if args.format == 'json':
+        shown = [report for report in reports if args.all or report.get('count') != 0]
+        print(json.dumps({'maps': shown, 'summary': summary}, indent=2, sort_keys=True))
+    elif args.format == 'text':
+        print('%d tiles in %d of %d maps' % (summary['count'], summary['matching_maps'], summary['maps']))
+        for (value, count) in sorted(summary.get('values', {}).items(), key=lambda item: int(item[0])):
+            print('  %s: %d' % (value, count))
+
+    if any(['error' in report for report in reports]):
+        return 2
+    if summary['count'] == 0:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
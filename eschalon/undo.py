@@ -138,22 +138,24 @@ class UndoHistory(object):
 
     def grab_idx(self, map, tile):
         """
-        Given a map and a tile, return a tuple containing the index of
-        the tile's entity (if appropriate) and a list of indexes of the
-        tile's tilecontents (if appropriate)
+        Given a map and a tile, return a tuple containing the key of
+        the tile's entity (if appropriate) and a list of keys of the
+        tile's tilecontents (if appropriate).  These are the keys from
+        the map's MapObjectLists, which stay valid across other edits,
+        unlike list positions.
         """
         entidx = None
         tilecontentidxes = []
         if tile.entity:
-            if tile.entity in map.entities:
-                entidx = map.entities.index(tile.entity)
-            else:
+            entidx = map.entities.key_of(tile.entity)
+            if entidx is None:
                 raise Exception('Entity in tile not linked in master map list')
         tilecontentcount = 0
         for tilecontent in tile.tilecontents:
             tilecontentcount += 1
-            if tilecontent in map.tilecontents:
-                tilecontentidxes.append(map.tilecontents.index(tilecontent))
+            key = map.tilecontents.key_of(tilecontent)
+            if key is not None:
+                tilecontentidxes.append(key)
             else:
                 raise Exception(
                     'Script %d in tile not linked in master map list' % tilecontentcount)
@@ -171,6 +173,50 @@ class UndoHistory(object):
             self.additional.append(Additional(tile))
 
 
+class BulkUndoHistory(object):
+    """
+    Undo data for an edit which sets a single tile attribute across a
+    whole bunch of tiles at once (filling the map, for instance).  Rather
+    than keeping Additional objects for potentially every tile on the map,
+    we just keep arrays of the changed coordinates and their old and new
+    values.  These are built by Map.fill() and friends, and don't need any
+    store()/finish() dance since the change has already happened.
+    """
+
+    def __init__(self, attr, xs, ys, old, new, text='Fill'):
+        self.attr = attr
+        self.xs = xs
+        self.ys = ys
+        self.old = old
+        self.new = new
+        self.text = text
+        # Used for menu labels, and by the GUI's hugegfx checking
+        self.x = int(xs[0])
+        self.y = int(ys[0])
+
+    def __len__(self):
+        return len(self.xs)
+
+    def set_text(self, text):
+        self.text = text
+
+    def coords(self):
+        return list(zip(self.xs.tolist(), self.ys.tolist()))
+
+    def apply(self, mapobj, values):
+        """ Sets our attribute to the given values and returns the coords """
+        attr = self.attr
+        for (x, y, value) in zip(self.xs.tolist(), self.ys.tolist(), values.tolist()):
+            setattr(mapobj.tiles[y][x], attr, value)
+        return self.coords()
+
+    def undo(self, mapobj):
+        return self.apply(mapobj, self.old)
+
+    def redo(self, mapobj):
+        return self.apply(mapobj, self.new)
+
+
 class Undo(object):
     """
     A class to hold historical editing information, for undo purposes.
@@ -219,6 +265,20 @@ class Undo(object):
             raise Exception(
                 'Previous undo must be finished before storing a new one')
 
+    def store_bulk(self, history):
+        """
+        Adds an already-completed BulkUndoHistory to our stack.
+        """
+        if not self.finished:
+            raise Exception(
+                'Previous undo must be finished before storing a new one')
+        self.curidx += 1
+        self.history.insert(self.curidx, history)
+        del self.history[self.curidx + 1:]
+        if len(self.history) > self.maxstack:
+            del self.history[0]
+            self.curidx -= 1
+
     def finish(self):
         """
         Finishes off the undo level by setting the "new" tile in
@@ -290,6 +350,8 @@ class Undo(object):
         if self.have_undo():
             self.curidx -= 1
             obj = self.history[self.curidx + 1]
+            if isinstance(obj, BulkUndoHistory):
+                return obj.undo(self.mapobj)
             retval = []
             if obj.mainchanged:
                 self.process_changes(obj.x, obj.y, obj.oldtile,
@@ -311,6 +373,8 @@ class Undo(object):
         if self.have_redo():
             self.curidx += 1
             obj = self.history[self.curidx]
+            if isinstance(obj, BulkUndoHistory):
+                return obj.redo(self.mapobj)
             retval = []
             if obj.mainchanged:
                 self.process_changes(obj.x, obj.y, obj.newtile,
@@ -336,16 +400,14 @@ class Undo(object):
 
         # Entity first
         if from_entidx is not None and from_entidx >= 0:
-            del self.mapobj.entities[from_entidx]
+            self.mapobj.entities.pop_key(from_entidx)
         if to_entidx is not None and to_entidx >= 0:
             self.mapobj.entities.insert(
                 to_entidx, self.mapobj.tiles[y][x].entity)
 
         # ... and now Scripts
-        idxes = from_tilecontentidx[:]
-        idxes.reverse()
-        for idx in idxes:
-            del self.mapobj.tilecontents[idx]
+        for idx in from_tilecontentidx:
+            self.mapobj.tilecontents.pop_key(idx)
         for (i, idx) in enumerate(to_tilecontentidx):
             self.mapobj.tilecontents.insert(
                 idx, self.mapobj.tiles[y][x].tilecontents[i])
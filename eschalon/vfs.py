@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# Eschalon Savefile Editor
+# Copyright (C) 2008-2017 CJ Kucera, Elliot Kendall, Eitan Adler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+import logging
+import os
+from abc import ABC, abstractmethod
+
+from eschalon.savefile import LoadException
+
+LOG = logging.getLogger(__name__)
+
+
+def stat_key(path):
+    """
+    Returns a tuple identifying the current state of the given file, for
+    use in cache keys.  Missing files are fine, they just get a key of
+    their own.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+class VFSLayer(ABC):
+    """
+    One source of game files for our VFS.  Files are addressed by a
+    directory (one of the game's 'data', 'gfx', 'maps', etc) and a
+    filename, same as EschalonData.readfile().  Implementing classes
+    provide an index of what they've got, and the means to read it.
+    """
+
+    @abstractmethod
+    def fingerprint(self):
+        """
+        Returns something which will change if our list of files changes.
+        """
+
+    @abstractmethod
+    def index(self):
+        """
+        Returns a dict mapping each directory to a list of its filenames.
+        """
+
+    @abstractmethod
+    def identity(self, directory, filename):
+        """
+        Returns a key identifying the current contents of the given file,
+        for caching purposes.
+        """
+
+    @abstractmethod
+    def open(self, directory, filename):
+        """ Returns a binary file-like object for the given file. """
+
+    def readfile(self, directory, filename):
+        """ Returns the contents of the given file, as bytes. """
+        with self.open(directory, filename) as df:
+            return df.read()
+
+
+class DatapakLayer(VFSLayer):
+    """
+    A layer reading from the encrypted datapak in Books 2 and 3.  The
+    datapak can't change out from under us without its size or mtime
+    changing, so that's our fingerprint.
+    """
+
+    def __init__(self, datapak):
+        self.datapak = datapak
+
+    def __repr__(self):
+        return 'datapak %s' % (self.datapak.filename)
+
+    def fingerprint(self):
+        return self.datapak.identity()
+
+    def index(self):
+        index = {}
+        for name in self.datapak.filelist():
+            (directory, sep, filename) = name.rpartition('/')
+            if filename != '':
+                index.setdefault(directory, []).append(filename)
+        return index
+
+    def identity(self, directory, filename):
+        return (self.datapak.identity(), '%s/%s' % (directory, filename))
+
+    def open(self, directory, filename):
+        return self.datapak.open(filename, directory)
+
+    def readfile(self, directory, filename):
+        return self.datapak.readfile(filename, directory)
+
+
+class DirectoryLayer(VFSLayer):
+    """
+    A layer reading from a directory on the filesystem.  "dirs" maps each
+    of our directories to the real subdirectory it lives in, relative to
+    "path" - an empty string means "path" itself.  Adding or removing
+    files updates a directory's mtime, so the directory mtimes are our
+    fingerprint.
+    """
+
+    def __init__(self, path, dirs):
+        self.path = path
+        self.dirs = dirs
+
+    def __repr__(self):
+        return 'directory %s' % (self.path)
+
+    def realpath(self, directory, filename=''):
+        if directory not in self.dirs:
+            raise LoadException('Directory %s is not in %s' % (directory, self.path))
+        return os.path.join(self.path, self.dirs[directory], filename)
+
+    def fingerprint(self):
+        return tuple([stat_key(self.realpath(directory)) for directory in sorted(self.dirs)])
+
+    def index(self):
+        index = {}
+        for directory in self.dirs:
+            try:
+                with os.scandir(self.realpath(directory)) as it:
+                    index[directory] = [entry.name for entry in it if entry.is_file()]
+            except OSError:
+                pass
+        return index
+
+    def identity(self, directory, filename):
+        return stat_key(self.realpath(directory, filename))
+
+    def open(self, directory, filename):
+        to_open = self.realpath(directory, filename)
+        try:
+            return open(to_open, 'rb')
+        except IOError as e:
+            raise LoadException('Filename %s could not be opened: %s' % (to_open, e))
+
+
+class VFS(object):
+    """
+    A layered, indexed view over all the places game files can come from.
+    Layers are given highest-priority first (mod, then data directories,
+    then datapak), and a file found in a higher layer hides the same file
+    in the layers below it.  The index of every layer is built up front,
+    so listings and lookups don't have to touch the disk, and refresh()
+    only re-indexes layers whose fingerprint has changed.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+        self.fingerprints = [None] * len(layers)
+        self.layer_indexes = [{}] * len(layers)
+        self.files = {}
+        self.listings = {}
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-indexes any layers whose contents have changed since we last
+        looked.  Returns True if anything changed.
+        """
+        changed = False
+        for (idx, layer) in enumerate(self.layers):
+            fingerprint = layer.fingerprint()
+            if fingerprint != self.fingerprints[idx]:
+                LOG.debug('Indexing %r' % (layer))
+                self.layer_indexes[idx] = dict([(directory, set(filenames))
+                                                for (directory, filenames) in layer.index().items()])
+                self.fingerprints[idx] = fingerprint
+                changed = True
+        if changed:
+            # Lowest-priority layers go first, so higher layers overwrite them
+            self.files = {}
+            for (layer, index) in reversed(list(zip(self.layers, self.layer_indexes))):
+                for (directory, filenames) in index.items():
+                    files = self.files.setdefault(directory, {})
+                    for filename in filenames:
+                        files[filename] = layer
+            self.listings = {}
+        return changed
+
+    def find(self, filename, directory):
+        """
+        Returns the layer which provides the given file, or None.
+        """
+        return self.files.get(directory, {}).get(filename)
+
+    def find_all(self, filename, directory):
+        """
+        Returns every layer which has the given file, highest-priority
+        first.  Useful for files like entities.csv, which get merged
+        rather than overridden.
+        """
+        return [layer for (layer, index) in zip(self.layers, self.layer_indexes)
+                if filename in index.get(directory, ())]
+
+    def exists(self, filename, directory):
+        return self.find(filename, directory) is not None
+
+    def listdir(self, directory, ext=None):
+        """
+        Returns a sorted list of the files in the given directory, across
+        all layers, optionally limited to the given extension (without the
+        dot).
+        """
+        key = (directory, ext)
+        if key not in self.listings:
+            files = self.files.get(directory, {})
+            if ext is None:
+                self.listings[key] = sorted(files)
+            else:
+                suffix = '.%s' % (ext)
+                self.listings[key] = sorted([filename for filename in files
+                                             if filename.endswith(suffix)])
+        return self.listings[key]
+
+    def filelist(self):
+        """
+        Returns a list of all our files, as "directory/filename" paths.
+        """
+        namelist = []
+        for directory in sorted(self.files):
+            for filename in self.listdir(directory):
+                namelist.append('%s/%s' % (directory, filename))
+        return namelist
+
+    def get_layer(self, filename, directory):
+        layer = self.find(filename, directory)
+        if layer is None:
+            raise LoadException('Filename %s/%s could not be found' % (directory, filename))
+        return layer
+
+    def identity(self, filename, directory):
+        return self.get_layer(filename, directory).identity(directory, filename)
+
+    def open(self, filename, directory):
+        return self.get_layer(filename, directory).open(directory, filename)
+
+    def readfile(self, filename, directory):
+        return self.get_layer(filename, directory).readfile(directory, filename)
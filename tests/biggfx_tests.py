@@ -0,0 +1,80 @@
+import unittest
+
+from eschalon.map import Map
+from eschalon.tilecontent import Tilecontent
+
+
+class BigGraphicMappingsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mapobj = Map.new('test.map', 2)
+        self.mappings = self.mapobj.big_gfx_mappings
+
+    def place(self, x, y, wallid, gfx):
+        tile = self.mapobj.tiles[y][x]
+        tile.wallimg = wallid
+        tile.tilecontentid = 21
+        tilecontent = Tilecontent.new(2, False)
+        tilecontent.tozero(x, y)
+        tilecontent.extratext = gfx
+        self.mapobj.tilecontents.append(tilecontent)
+        tile.addtilecontent(tilecontent)
+        return tile
+
+    def clear(self, x, y):
+        tile = self.mapobj.tiles[y][x]
+        for i in range(len(tile.tilecontents)):
+            self.mapobj.deltilecontent(x, y, 0)
+        tile.tilecontentid = 0
+        tile.wallimg = 0
+        return tile
+
+    def test_load(self):
+        self.place(1, 1, 1000, 'tree.png')
+        self.place(2, 1, 1000, 'rock.png')
+        self.place(3, 1, 1004, 'bush.png')
+        self.mapobj.tiles[5][5].wallimg = 1001
+        messages = self.mappings.load()
+        self.assertEqual(len(messages), 3)
+        self.assertIn('more than one graphic', messages[0])
+        self.assertIn('maximum is 1003', messages[1])
+        self.assertIn('without a proper Big Graphic object', messages[2])
+        self.assertEqual(self.mappings.mappings[1000].gfx, 'tree.png')
+        self.assertEqual(self.mappings.mappings[1000].refcount, 2)
+
+    def test_incremental(self):
+        self.mappings.load()
+        self.mappings.update_tile(self.place(1, 1, 1000, 'tree.png'))
+        self.mappings.update_tile(self.place(2, 1, 1000, 'rock.png'))
+        self.assertEqual(len(self.mappings.get_messages()), 1)
+        self.assertEqual(self.mappings.get_gfx_mappings()['tree.png'].wallid, 1000)
+
+        # Removing the first tile hands the ID over to the remaining one
+        self.mappings.update_tile(self.clear(1, 1))
+        self.assertEqual(self.mappings.get_messages(), [])
+        self.assertEqual(self.mappings.mappings[1000].gfx, 'rock.png')
+        self.assertNotIn('tree.png', self.mappings.get_gfx_mappings())
+
+        # ... and should match what a full scan finds
+        self.assertEqual(self.mappings.load(), [])
+        self.assertEqual(self.mappings.mappings[1000].gfx, 'rock.png')
+
+        self.mappings.update_tile(self.clear(2, 1))
+        self.assertEqual(self.mappings.mappings, {})
+        self.assertEqual(self.mappings.get_gfx_mappings(), {})
+
+    def test_fix(self):
+        self.place(1, 1, 1000, 'tree.png')
+        self.place(2, 1, 1000, 'rock.png')
+        self.place(3, 1, 1002, 'tree.png')
+        self.mappings.load()
+        self.mappings.fix()
+        self.assertEqual(self.mappings.get_messages(), [])
+        self.assertEqual(self.mapobj.tiles[1][1].wallimg, 1000)
+        self.assertEqual(self.mapobj.tiles[1][2].wallimg, 1001)
+        self.assertEqual(self.mapobj.tiles[1][3].wallimg, 1000)
+        self.assertEqual(self.mappings.mappings[1000].refcount, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
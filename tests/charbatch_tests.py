@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from eschalon.character import Character
+from eschalon.charbatch import find_chars, main, process_files
+from eschalon.maincli import apply_changes
+
+
+class CharBatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.savedir = os.path.join(self.tmpdir, 'save')
+        for idx in [1, 2, 3]:
+            os.makedirs(os.path.join(self.savedir, 'slot%d' % (idx)))
+            shutil.copyfile('test_data/book2_atend.char',
+                            os.path.join(self.savedir, 'slot%d' % (idx), 'char'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def load(self, filename, book=2):
+        char = Character.load(filename, book)
+        char.read()
+        return char
+
+    def test_apply_changes(self):
+        char = self.load('test_data/book2_atend.char')
+        old_gold = char.gold
+        changes = apply_changes(char, {'set_gold': 1234, 'reset_hunger': True})
+        self.assertEqual(changes[0], {'field': 'gold', 'old': old_gold, 'new': 1234})
+        self.assertEqual([change['field'] for change in changes], ['gold', 'hunger', 'thirst'])
+        self.assertEqual([change['new'] for change in changes[1:]], [1000, 1000])
+
+        char = self.load('test_data/book1_atend.char', 1)
+        self.assertEqual(apply_changes(char, {'reset_hunger': True}), [])
+
+    def test_find_chars(self):
+        slot1 = os.path.join(self.savedir, 'slot1')
+        self.assertEqual(find_chars([self.savedir]),
+                         [os.path.join(self.savedir, 'slot%d' % (idx), 'char') for idx in [1, 2, 3]])
+        self.assertEqual(find_chars([slot1]), [os.path.join(slot1, 'char')])
+        self.assertEqual(find_chars([os.path.join(self.savedir, 'slot[12]', 'char')]),
+                         [os.path.join(self.savedir, 'slot%d' % (idx), 'char') for idx in [1, 2]])
+
+    def test_process_files(self):
+        filenames = find_chars([self.savedir])
+        filenames.append(os.path.join(self.tmpdir, 'missing'))
+        reports = list(process_files(filenames, 2, {'set_gold': 4242}, ['inv'], workers=2))
+        self.assertEqual([report['char'] for report in reports], filenames)
+        self.assertIn('error', reports[-1])
+        for (filename, report) in zip(filenames[:-1], reports[:-1]):
+            self.assertEqual(report['changes'][0]['new'], 4242)
+            self.assertEqual(report['inv']['gold'], 4242)
+            self.assertEqual(report['name'], 'Veera')
+            self.assertEqual(self.load(filename).gold, 4242)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.savedir, 'slot1'))), ['char'])
+
+    def test_wrong_book(self):
+        filenames = find_chars([self.savedir])
+        shutil.copyfile('test_data/book1_atend.char', filenames[1])
+        for workers in [1, 2]:
+            reports = list(process_files(filenames, 2, {}, ['stats'], workers=workers))
+            self.assertEqual([report['char'] for report in reports], filenames)
+            self.assertEqual(['error' in report for report in reports], [False, True, False])
+            self.assertEqual(reports[2]['name'], 'Veera')
+
+    def test_main(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.savedir, '--book', '2', '--set-hp-cur', '1',
+                                   '--list', 'stats', '--format', 'ndjson', '--workers', '1']), 0)
+        reports = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(reports), 3)
+        for report in reports:
+            self.assertEqual(report['stats']['curhp'], 1)
+            self.assertNotIn('inv', report)
+
+        # Listing on its own shouldn't touch the files
+        filename = os.path.join(self.savedir, 'slot1', 'char')
+        mtime = os.stat(filename).st_mtime_ns
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([filename, '--book', '2', '--list', 'all', '--format', 'json']), 0)
+        self.assertEqual(sorted(json.loads(output.getvalue())[0]),
+                         ['alchemy', 'avatar', 'axiom', 'book', 'changes', 'char', 'class', 'equip',
+                          'gender', 'inv', 'level', 'magic', 'name', 'origin', 'stats'])
+        self.assertEqual(os.stat(filename).st_mtime_ns, mtime)
+
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([os.path.join(self.tmpdir, 'missing'), '--book', '2']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from eschalon.character import Character
+from eschalon.constants import book_constants
+from eschalon.constants import constants as c
+from eschalon.item import Item
+from eschalon.map import Map
+from eschalon.merchant import Merchant
+
+from maphelpers import add_tilecontent
+
+
+class ConstantsTests(unittest.TestCase):
+
+    def setUp(self):
+        c.switch_to_book(1)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        c.switch_to_book(1)
+        shutil.rmtree(self.tmpdir)
+
+    def test_book_constants(self):
+        b2 = book_constants(2)
+        self.assertIs(book_constants(2), b2)
+        self.assertEqual(b2.book, 2)
+        self.assertIs(pickle.loads(pickle.dumps(b2)), b2)
+        with self.assertRaises(AttributeError):
+            b2.book = 3
+        with self.assertRaises(AttributeError):
+            b2.no_such_constant
+        with self.assertRaises(ValueError):
+            book_constants(4)
+        self.assertIn('skilltable', dir(b2))
+        self.assertIs(Item.new(3).constants, book_constants(3))
+        self.assertIs(Map.new('test.map', 2).constants, b2)
+
+    def test_compat(self):
+        self.assertEqual(c.book, 1)
+        c.switch_to_book(3)
+        self.assertEqual(c.book, 3)
+        self.assertIs(c.current(), book_constants(3))
+        self.assertEqual(c.skilltable, book_constants(3).skilltable)
+        self.assertEqual(c.groups[2].book, 2)
+        self.assertEqual(Merchant().book, 3)
+        # Loading things doesn't switch books behind our back any more
+        Map.new('test.map', 2)
+        Character.load('test_data/book1_atend.char')
+        self.assertEqual(c.book, 3)
+
+    def test_threads(self):
+        c.switch_to_book(2)
+        seen = {}
+        started = threading.Barrier(2)
+
+        def worker(book):
+            # Threads see the main thread's book until they pick their own
+            seen[('before', book)] = c.book
+            started.wait()
+            c.switch_to_book(book)
+            started.wait()
+            seen[('after', book)] = c.book
+
+        threads = [threading.Thread(target=worker, args=(book,)) for book in [1, 3]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(seen, {('before', 1): 2, ('before', 3): 2,
+                                ('after', 1): 1, ('after', 3): 3})
+        self.assertEqual(c.book, 2)
+
+    def test_eschalondata(self):
+        class FakeData(object):
+            book = 3
+        data = FakeData()
+        c.set_eschalondata(data)
+        try:
+            self.assertIs(c.get_eschalondata(3), data)
+            self.assertIsNone(c.eschalondata)
+            c.switch_to_book(3)
+            self.assertIs(c.eschalondata, data)
+        finally:
+            c._eschalondata.pop(3, None)
+
+    def write_map(self, book):
+        filename = os.path.join(self.tmpdir, 'book%d.map' % (book))
+        mapobj = Map.new(filename, book)
+        mapobj.mapid = 'book%d' % (book)
+        mapobj.mapname = 'Book %d' % (book)
+        mapobj.set_savegame(True)
+        add_tilecontent(mapobj, 2, 3, item_name='Thing %d' % (book))
+        mapobj.write()
+        return filename
+
+    def test_concurrent_loads(self):
+        jobs = [(self.write_map(book), 'map', book) for book in [1, 2, 3]]
+        jobs.extend([('test_data/book1_atend.char', 'char', 1),
+                     ('test_data/book2_atend.char', 'char', 2),
+                     ('test_data/book3_f4_example.char', 'char', 3)])
+        c.switch_to_book(2)
+
+        def load(job):
+            (filename, kind, book) = job
+            if kind == 'map':
+                obj = Map.load(filename)
+                obj.read()
+                item = obj.tiles[3][2].tilecontents[0].items[0]
+                return (obj.book, obj.constants.book, item.book, item.item_name)
+            else:
+                obj = Character.load(filename, book)
+                obj.read()
+                return (obj.book, obj.constants.book, obj.inventory[0][0].book, None)
+
+        expected = [(book, book, book, 'Thing %d' % (book) if kind == 'map' else None)
+                    for (filename, kind, book) in jobs]
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            for _ in range(5):
+                self.assertEqual(list(executor.map(load, jobs * 3)), expected * 3)
+        # None of that should have touched the main thread's book
+        self.assertEqual(c.book, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from eschalon.dirtyregion import DirtyRegion, DirtyRegions
+
+
+class DirtyRegionsTest(unittest.TestCase):
+    def test_empty(self):
+        regions = DirtyRegions()
+        self.assertEqual(len(regions), 0)
+        self.assertEqual(regions.regions(), [])
+
+    def test_single_tile(self):
+        regions = DirtyRegions()
+        regions.add(5, 10)
+        self.assertEqual(regions.regions(), [DirtyRegion(5, 10, 5, 10)])
+
+    def test_duplicates_collapse(self):
+        regions = DirtyRegions()
+        regions.add_tiles([(5, 10), (5, 10), (5, 10)])
+        self.assertEqual(len(regions), 1)
+
+    def test_neighbors_merge(self):
+        regions = DirtyRegions()
+        regions.add_tiles([(5, 10), (6, 10), (5, 11), (4, 12)])
+        self.assertEqual(regions.regions(), [DirtyRegion(4, 10, 6, 12)])
+
+    def test_distant_tiles_stay_separate(self):
+        regions = DirtyRegions()
+        regions.add_tiles([(90, 190), (2, 3)])
+        self.assertEqual(regions.regions(),
+                         [DirtyRegion(2, 3, 2, 3), DirtyRegion(90, 190, 90, 190)])
+
+    def test_pop_clears(self):
+        regions = DirtyRegions()
+        regions.add(1, 1)
+        self.assertEqual(len(regions.pop_regions()), 1)
+        self.assertEqual(len(regions), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from eschalon import eschalondata
+from eschalon.constants import constants as c
+from eschalon.eschalondata import Datapak, EschalonData, SubstringMatcher
+from eschalon.map import Map
+from eschalon.savefile import LoadException
+
+
+class SubstringMatcherTests(unittest.TestCase):
+
+    def test_find(self):
+        matcher = SubstringMatcher()
+        matcher.add('Oak Bow', 'Bow')
+        matcher.add('Oak Bowstring', 'Bowstring')
+        matcher.add('Iron Mace', 'Mace')
+        self.assertEqual(len(matcher), 3)
+        self.assertEqual(matcher.find('Iron Mace of Power'), 'Mace')
+        # Earliest-added key wins, like looping over a dict
+        self.assertEqual(matcher.find('Oak Bowstring'), 'Bow')
+        self.assertIsNone(matcher.find('Iron Bow'))
+        self.assertIsNone(matcher.find(''))
+
+    def test_overlapping_keys(self):
+        matcher = SubstringMatcher()
+        matcher.add('abcd', 1)
+        matcher.add('bc', 2)
+        matcher.add('abcd', 3)
+        self.assertEqual(matcher.find('xabcx'), 2)
+        self.assertEqual(matcher.find('abcd'), 3)
+
+    def test_add_after_find(self):
+        matcher = SubstringMatcher()
+        matcher.add('Pine Staff', 'Staff')
+        self.assertIsNone(matcher.find('Oak Club'))
+        matcher.add('Oak Club', 'Club')
+        self.assertEqual(matcher.find('Oak Club'), 'Club')
+        self.assertEqual(matcher.find('Pine Staff'), 'Staff')
+
+
+class EschalonDataTests(unittest.TestCase):
+
+    def setUp(self):
+        c.switch_to_book(2)
+        self.gamedir = tempfile.mkdtemp()
+        for directory in EschalonData.DATA_DIRS:
+            os.makedirs(os.path.join(self.gamedir, directory))
+        with open(os.path.join(self.gamedir, 'data', 'general_items.csv'), 'w') as df:
+            df.write('DESCRIPTION,Item Category,Material\n')
+            df.write('Longbow,IC_WEAPON,1\n')
+            df.write('Dagger,IC_WEAPON,2\n')
+            df.write('Cloak,IC_ARMOR,3\n')
+            df.write('Small Gold,IC_GOLD,0\n')
+            df.write('Large Gold,IC_GOLD,0\n')
+            df.write('Healing,IC_SCROLL,0\n')
+        self.data = EschalonData.new(2, self.gamedir)
+        self.data.cache_dir = os.path.join(self.gamedir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.gamedir)
+
+    def test_get_global_name(self):
+        wood = c.materials_wood[0]
+        metal = c.materials_metal[-1]
+        fabric = c.materials_fabric[1]
+        self.assertEqual(self.data.get_global_name('%s Longbow' % (wood)), 'Longbow')
+        self.assertEqual(self.data.get_global_name('%s Dagger of Speed' % (metal)), 'Dagger')
+        self.assertEqual(self.data.get_global_name('%s Cloak' % (fabric)), 'Cloak')
+        self.assertEqual(self.data.get_global_name('Rusty Spoon'), 'Rusty Spoon')
+        self.assertEqual(self.data.get_global_name('Scroll of Healing'), 'Healing')
+        self.assertEqual(self.data.get_global_name('20 Gold Pieces'), 'Small Gold')
+
+    def test_matches_material_items(self):
+        # The index should give the same answers as looping over every
+        # material/item combination
+        self.data.populate_datapak_info()
+        self.assertEqual(len(self.data.material_matcher), len(self.data.material_items))
+        for name in list(self.data.material_items.keys()) + ['Plain Dagger']:
+            expected = name
+            for (key, val) in self.data.material_items.items():
+                if key in name:
+                    expected = val
+                    break
+            self.assertEqual(self.data.get_global_name(name), expected)
+
+    def test_cache(self):
+        with open(os.path.join(self.gamedir, 'data', 'entities.csv'), 'w') as df:
+            df.write('ID,Name,HP,file,Align,Move,Dirs,Xoff,Yoff,Frame,Script\n')
+            df.write('3,Rat,10,rat,1,2,8,0,0,4,*\n')
+        self.data.populate_datapak_info()
+        self.assertEqual(len(os.listdir(self.data.cache_dir)), 1)
+        self.assertEqual(self.data.get_entity(3).name, 'Rat')
+
+        data = EschalonData.new(2, self.gamedir)
+        data.cache_dir = self.data.cache_dir
+        self.assertTrue(data.load_cache())
+        self.assertEqual(data.get_itemlist(), self.data.get_itemlist())
+        self.assertEqual(data.get_entity(3).gfxfile, 'rat.png')
+        self.assertEqual(data.get_global_name('20 Gold Pieces'), 'Small Gold')
+        self.assertEqual(data.get_global_name('%s Longbow' % (c.materials_wood[0])), 'Longbow')
+
+        # Changing the game data means a new cache
+        with open(os.path.join(self.gamedir, 'data', 'general_items.csv'), 'a') as df:
+            df.write('Shortbow,IC_WEAPON,1\n')
+        data = EschalonData.new(2, self.gamedir)
+        data.cache_dir = self.data.cache_dir
+        self.assertFalse(data.load_cache())
+        self.assertIn('Shortbow', data.get_itemdict())
+        self.assertEqual(len(os.listdir(self.data.cache_dir)), 2)
+
+    def test_broken_cache(self):
+        os.makedirs(self.data.cache_dir)
+        with open(self.data.get_cache_filename(), 'wb') as df:
+            df.write(b'garbage')
+        self.assertIn('Longbow', self.data.get_itemdict())
+        data = EschalonData.new(2, self.gamedir)
+        data.cache_dir = self.data.cache_dir
+        self.assertTrue(data.load_cache())
+
+
+class MapInfoTests(unittest.TestCase):
+
+    def setUp(self):
+        eschalondata._mapinfo_cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        eschalondata._mapinfo_cache.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def map_data(self, mapname, book=2):
+        mapobj = Map.new(os.path.join(self.tmpdir, 'scratch.map'), book)
+        mapobj.mapid = mapname
+        mapobj.mapname = mapname
+        # Long enough to span a few reads
+        mapobj.entrancescript = 'x' * 1000
+        mapobj.write()
+        with open(mapobj.df.filename, 'rb') as df:
+            return df.read()
+
+    def test_read_header(self):
+        data = self.map_data('Header Test')
+        fh = BytesIO(data)
+        header = Map.read_header(fh, 100)
+        self.assertLess(fh.tell(), 2000)
+        self.assertTrue(data.startswith(header))
+        self.assertEqual(header.count(b"\r\n"), 9)
+        self.assertEqual(header[-1], 1)
+        self.assertEqual(Map.read_header(BytesIO(b"short\r\n")), b"short\r\n")
+
+    def test_filesystem(self):
+        c.switch_to_book(2)
+        for directory in EschalonData.DATA_DIRS:
+            os.makedirs(os.path.join(self.tmpdir, directory))
+        with open(os.path.join(self.tmpdir, 'maps', 'one.map'), 'wb') as df:
+            df.write(self.map_data('First Map'))
+        data = EschalonData.new(2, self.tmpdir)
+        self.assertEqual(data.get_mapinfo('one.map'), (2, 'First Map'))
+        self.assertEqual(len(eschalondata._mapinfo_cache), 1)
+        with self.assertRaises(LoadException):
+            data.get_mapinfo('missing.map')
+
+    def test_datapak(self):
+        c.switch_to_book(3)
+        gamedir = os.path.join(self.tmpdir, 'game')
+        os.makedirs(gamedir)
+        datapak = os.path.join(gamedir, 'datapak')
+        with zipfile.ZipFile(datapak, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('maps/one.map', self.map_data('First Map', 3))
+            zf.writestr('maps/broken.map', b'nope')
+        data = EschalonData.new(3, gamedir)
+        self.assertEqual(data.get_mapinfo('one.map'), (3, 'First Map'))
+        with self.assertRaises(LoadException):
+            data.get_mapinfo('broken.map')
+        with self.assertRaises(LoadException):
+            data.get_mapinfo('missing.map')
+
+        # A second EschalonData on the same datapak gets the cached info
+        key = data.file_identity('one.map', 'maps')
+        eschalondata._mapinfo_cache[key] = (3, 'Cached')
+        self.assertEqual(EschalonData.new(3, gamedir).get_mapinfo('one.map'), (3, 'Cached'))
+
+
+class DatapakTests(unittest.TestCase):
+
+    def setUp(self):
+        c.switch_to_book(3)
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'datapak')
+        self.members = {}
+        with zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for idx in range(40):
+                data = (('%d ' % (idx)) * (1000 + idx * 100)).encode('ascii')
+                zf.writestr('gfx/%d.png' % (idx), data)
+                self.members['%d.png' % (idx)] = data
+        self.datapak = Datapak(self.filename, pool_size=3)
+
+    def tearDown(self):
+        self.datapak.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_concurrent_reads(self):
+        names = sorted(self.members) * 5
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.datapak.readfile, names))
+        self.assertEqual(results, [self.members[name] for name in names])
+        self.assertLessEqual(self.datapak.handles_opened, 3)
+        with self.assertRaises(LoadException):
+            self.datapak.readfile('missing.png')
+
+    def test_pool_limit(self):
+        held = [self.datapak.open('%d.png' % (idx)) for idx in range(3)]
+        done = threading.Event()
+
+        def reader():
+            self.datapak.readfile('5.png')
+            done.set()
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        # Every handle is in use, so the reader has to wait
+        self.assertFalse(done.wait(0.2))
+        self.assertEqual(held[0].read(5), b'0 0 0')
+        held[0].close()
+        self.assertTrue(done.wait(5))
+        thread.join()
+        for member in held[1:]:
+            member.close()
+        self.assertEqual(self.datapak.handles_opened, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
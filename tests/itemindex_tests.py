@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from eschalon.constants import constants as c
+from eschalon.item import Item
+from eschalon.itemindex import ItemIndex, find_files, main
+from eschalon.map import Map
+from eschalon.merchant import Merchant
+from eschalon.savefile import Savefile
+
+from maphelpers import add_entity, add_tilecontent, mangle_string
+
+
+class ItemIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'root')
+        self.index_file = os.path.join(self.tmpdir, 'test.index')
+        os.makedirs(os.path.join(self.root, 'slot1'))
+        shutil.copyfile('test_data/book2_atend.char', os.path.join(self.root, 'slot1', 'char'))
+        self.write_map('cave.map', 'Ruby Ring', 57)
+        self.write_map('slot1/town.map', 'Longbow', 12, description='Barrel')
+        c.switch_to_book(2)
+        merchant = Merchant()
+        item = Item.new(2, True)
+        item.item_name = 'Ruby Ring'
+        merchant.items.append(item)
+        merchant.write(Savefile(os.path.join(self.root, 'slot1', 'smith.mer')))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, filename, item_name, entid, description='Chest', book=2):
+        mapobj = Map.new(os.path.join(self.root, filename), book)
+        if book == 1:
+            # A blank map ID would look like Book 3
+            mapobj.mapid = filename
+        mapobj.set_savegame(True)
+        mapobj.entrancescript = 'sound door_open'
+        tilecontent = add_tilecontent(mapobj, 4, 5, description, item_name,
+                                      script='cond quest 3; give ruby', slot=2)
+        tilecontent.items[2].category = 1
+        add_entity(mapobj, 6, 7, entid)
+        mapobj.write()
+
+    def make_index(self):
+        return ItemIndex(self.root, self.index_file, book=2)
+
+    def test_read_without_tiles(self):
+        for book in [1, 2, 3]:
+            self.write_map('b%d.map' % (book), 'Ruby Ring', 3, book=book)
+            filename = os.path.join(self.root, 'b%d.map' % (book))
+            full = Map.load(filename)
+            full.read()
+            partial = Map.load(filename)
+            partial.read(tiles=False)
+            self.assertEqual(partial.get_item_names(), full.get_item_names())
+            self.assertEqual([entity.entid for entity in partial.entities], [3])
+
+    def test_queries(self):
+        self.assertEqual(find_files(self.root), ['cave.map', 'slot1/char', 'slot1/smith.mer', 'slot1/town.map'])
+        index = self.make_index()
+        index.refresh(workers=2)
+        self.assertEqual(index.errors, {})
+
+        hits = index.query('entity', 57)
+        self.assertEqual(hits, [{'file': os.path.join(self.root, 'cave.map'), 'entity': '57',
+                                 'x': 6, 'y': 7, 'what': 'entity'}])
+        self.assertEqual(index.files_matching('item', 'ruby ring'),
+                         [os.path.join(self.root, 'cave.map'), os.path.join(self.root, 'slot1', 'smith.mer')])
+        hits = index.query('item', 'Ruby Ring', container='chest')
+        self.assertEqual([(hit['x'], hit['y'], hit['index']) for hit in hits], [(4, 5, 2)])
+        self.assertEqual(index.query('item', 'Longbow', container='chest'), [])
+        self.assertEqual([hit['what'] for hit in index.query('item', 'helm', contains=True)], ['helm'])
+        self.assertEqual(len(index.files_matching('script', 'QUEST')), 2)
+        self.assertEqual(index.files_matching('script', 'door_open'),
+                         [os.path.join(self.root, 'cave.map'), os.path.join(self.root, 'slot1', 'town.map')])
+
+    def test_refresh(self):
+        index = self.make_index()
+        self.assertEqual(index.refresh(workers=1)[0], find_files(self.root))
+        self.assertEqual(index.refresh(workers=1), ([], []))
+
+        # A fresh object picks up the saved index without reading anything
+        index = self.make_index()
+        self.assertTrue(index.load())
+        self.assertEqual(index.refresh(workers=1), ([], []))
+        self.assertEqual(len(index.query('entity', 12)), 1)
+
+        # Make sure the mtime moves, however coarse the filesystem
+        time.sleep(0.01)
+        self.write_map('slot1/town.map', 'Longbow', 13, description='Barrel')
+        stat = os.stat(os.path.join(self.root, 'slot1', 'town.map'))
+        os.utime(os.path.join(self.root, 'slot1', 'town.map'),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        os.remove(os.path.join(self.root, 'cave.map'))
+        self.assertEqual(index.refresh(workers=1), (['slot1/town.map'], ['cave.map']))
+        self.assertEqual(index.query('entity', 12), [])
+        self.assertEqual(len(index.query('entity', 13)), 1)
+        self.assertEqual(index.files_matching('entity', 57), [])
+
+    def test_errors(self):
+        with open(os.path.join(self.root, 'broken.map'), 'wb') as df:
+            df.write(b'nonsense')
+        self.write_map('mangled.map', 'Longbow', 3)
+        mangle_string(os.path.join(self.root, 'mangled.map'), 'sound door_open')
+        index = ItemIndex(self.root, self.index_file)
+        index.refresh(workers=1)
+        self.assertEqual(sorted(index.errors), ['broken.map', 'mangled.map', 'slot1/smith.mer'])
+        self.assertEqual(len(index.query('item', 'longbow')), 1)
+
+    def test_main(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.root, '--index', self.index_file, '--book', '2',
+                                   '--item', 'ruby ring', '--in', 'chest', '--format', 'json']), 0)
+        hits = json.loads(output.getvalue())
+        self.assertEqual([hit['file'] for hit in hits], [os.path.join(self.root, 'cave.map')])
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.root, '--index', self.index_file, '--entity', '57', '--files']), 0)
+        self.assertEqual(output.getvalue(), '%s\n' % (os.path.join(self.root, 'cave.map')))
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([self.root, '--index', self.index_file, '--entity', '99']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from eschalon import maplint
+from eschalon.constants import constants as c
+from eschalon.eschalondata import EschalonData
+from eschalon.map import Map
+from eschalon.mapconvert import convert_files, main, write_atomic
+from eschalon.mapdiff import MapDiff
+
+from maphelpers import add_entity, add_tilecontent
+
+
+class MapConvertTests(unittest.TestCase):
+
+    def setUp(self):
+        maplint._gamedata.clear()
+        c.switch_to_book(2)
+        self.tmpdir = tempfile.mkdtemp()
+        # Keep the game data cache out of the user's home
+        self.old_cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.tmpdir, 'cache')
+        self.gamedir = os.path.join(self.tmpdir, 'game')
+        for directory in EschalonData.DATA_DIRS:
+            os.makedirs(os.path.join(self.gamedir, directory))
+        with open(os.path.join(self.gamedir, 'data', 'general_items.csv'), 'w') as df:
+            df.write('DESCRIPTION,Item Category,Material\n')
+            df.write('Longbow,IC_WEAPON,1\n')
+        self.wood = c.materials_wood[0]
+        self.mapdir = os.path.join(self.tmpdir, 'maps')
+        os.makedirs(self.mapdir)
+
+    def tearDown(self):
+        # Don't leave our fake game data registered for other tests
+        for book in maplint._gamedata:
+            c._eschalondata.pop(book, None)
+        maplint._gamedata.clear()
+        if self.old_cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.old_cache_home
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, filename, book=2, savegame=True):
+        mapobj = Map.new(os.path.join(self.mapdir, filename), book)
+        mapobj.mapid = filename
+        mapobj.mapname = filename
+        mapobj.set_savegame(savegame)
+        tilecontent = add_tilecontent(mapobj, 4, 5, item_name='%s Longbow' % (self.wood))
+        tilecontent.items[1].item_name = 'Mystery Box'
+        add_entity(mapobj, 6, 7, 3)
+        mapobj.write()
+        return mapobj.df.filename
+
+    def test_convert_to_global(self):
+        jobs = []
+        for filename in ['one.map', 'two.map']:
+            jobs.append((self.write_map(filename), os.path.join(self.tmpdir, filename)))
+        reports = convert_files(jobs, False, gamedir=self.gamedir, workers=2)
+        for (report, (_, output)) in zip(reports, jobs):
+            self.assertNotIn('error', report)
+            self.assertEqual((report['from'], report['to'], report['output']),
+                             ('savegame', 'global', output))
+            self.assertEqual(report['renamed'], [{'x': 4, 'y': 5, 'old': '%s Longbow' % (self.wood),
+                                                  'new': 'Longbow'}])
+            self.assertEqual(report['invalid'], [{'x': 4, 'y': 5, 'name': 'Mystery Box'}])
+            converted = MapDiff.load_map(output)
+            self.assertTrue(converted.is_global())
+            self.assertEqual(converted.tiles[5][4].tilecontents[0].items[0].item_name, 'Longbow')
+            self.assertEqual(converted.tiles[7][6].entity.entid, 3)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['cache', 'game', 'maps', 'one.ent', 'one.map', 'two.ent', 'two.map'])
+
+    def test_skip_and_errors(self):
+        filename = self.write_map('global.map', savegame=False)
+        missing = os.path.join(self.mapdir, 'missing.map')
+        reports = convert_files([(filename, filename), (missing, missing)], False, workers=1)
+        self.assertTrue(reports[0]['skipped'])
+        self.assertIn('error', reports[1])
+        # Either way, we need the game data
+        reports = convert_files([(filename, filename)], True, workers=1)
+        self.assertIn('error', reports[0])
+        filename = self.write_map('savegame.map')
+        reports = convert_files([(filename, filename)], False, workers=1)
+        self.assertIn('error', reports[0])
+        self.assertTrue(MapDiff.load_map(filename).is_savegame())
+
+    def test_in_place_book1(self):
+        filename = self.write_map('book1.map', book=1)
+        # Book 1 doesn't have material names to strip, so they're just invalid
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([self.mapdir, '--to-global', '--in-place', '--gamedir', self.gamedir]), 1)
+        self.assertEqual(sorted(os.listdir(self.mapdir)), ['book1.ent', 'book1.map'])
+        converted = MapDiff.load_map(filename)
+        self.assertTrue(converted.is_global())
+        self.assertEqual(converted.tiles[7][6].entity.entid, 3)
+
+    def test_main(self):
+        self.write_map('one.map')
+        output_dir = os.path.join(self.tmpdir, 'out')
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.mapdir, '--to-global', '-o', output_dir,
+                                   '--gamedir', self.gamedir, '--format', 'json']), 1)
+        reports = json.loads(output.getvalue())
+        self.assertEqual([report['output'] for report in reports], [os.path.join(output_dir, 'one.map')])
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([os.path.join(output_dir, 'one.map'), '--to-savegame',
+                                   '--in-place', '--gamedir', self.gamedir]), 0)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'one.opq')))
+
+    def test_write_atomic_failure(self):
+        filename = self.write_map('one.map')
+        mapobj = MapDiff.load_map(filename)
+        mapobj.tiles[0][0].wall = 'broken'
+        with self.assertRaises(Exception):
+            write_atomic(mapobj, filename)
+        self.assertEqual(sorted(os.listdir(self.mapdir)), ['one.ent', 'one.map'])
+        self.assertEqual(MapDiff.load_map(filename).tiles[0][0].wall, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
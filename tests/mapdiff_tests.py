@@ -0,0 +1,103 @@
+import json
+import unittest
+
+from eschalon.map import Map
+from eschalon.mapdiff import MapDiff, ObjectDiff, main, parse_args
+from eschalon.savefile import LoadException
+
+from maphelpers import add_entity, add_tilecontent
+
+
+class MapDiffTests(unittest.TestCase):
+
+    def setUp(self):
+        self.old = Map.new('test.map', 2)
+        add_tilecontent(self.old, 10, 20, 'Chest')
+        add_entity(self.old, 30, 40, 5)
+
+    def test_identical(self):
+        mapdiff = MapDiff(self.old, self.old.replicate())
+        self.assertEqual(len(mapdiff), 0)
+        self.assertEqual(mapdiff.to_text(), '')
+
+    def test_tile_fields(self):
+        new = self.old.replicate()
+        new.tiles[3][4].floorimg = 7
+        new.tiles[3][4].wall = 1
+        new.mapname = 'Renamed'
+        mapdiff = MapDiff(self.old, new)
+        self.assertEqual(mapdiff.header, {'mapname': ('', 'Renamed')})
+        self.assertEqual(len(mapdiff.tiles), 1)
+        tilediff = mapdiff.tiles[0]
+        self.assertEqual((tilediff.x, tilediff.y), (4, 3))
+        self.assertEqual(tilediff.fields, {'floorimg': (0, 7), 'wall': (0, 1)})
+
+    def test_objects(self):
+        new = self.old.replicate()
+        tilecontent = new.tiles[20][10].tilecontents[0]
+        tilecontent.lock = 3
+        tilecontent.items[2].item_name = 'Sword'
+        add_tilecontent(new, 10, 20, 'Barrel')
+        new.delentity(30, 40)
+        add_entity(new, 50, 60, 7)
+
+        mapdiff = MapDiff(self.old, new)
+        self.assertEqual([(t.x, t.y) for t in mapdiff.tiles], [(10, 20), (30, 40), (50, 60)])
+
+        (changed, added) = mapdiff.tiles[0].tilecontents
+        self.assertEqual(changed.status, ObjectDiff.CHANGED)
+        self.assertEqual(changed.fields, {'lock': (0, 3)})
+        self.assertEqual(changed.items, {2: {'item_name': ('', 'Sword')}})
+        self.assertEqual(added.status, ObjectDiff.ADDED)
+        self.assertEqual(added.values['description'], 'Barrel')
+
+        self.assertEqual(mapdiff.tiles[1].entity.status, ObjectDiff.REMOVED)
+        self.assertEqual(mapdiff.tiles[2].entity.status, ObjectDiff.ADDED)
+        self.assertEqual(mapdiff.tiles[2].entity.values['entid'], 7)
+
+        data = json.loads(mapdiff.to_json())
+        self.assertEqual(data['tiles'][0]['tilecontents'][0]['items']['2']['item_name'], ['', 'Sword'])
+        self.assertIn('item 2 item_name', mapdiff.to_text())
+
+    def test_offmap(self):
+        add_entity(self.old, 120, 5, 2)
+        new = self.old.replicate()
+        add_entity(new, 150, 5, 9)
+        add_tilecontent(new, 150, 5, 'Stash')
+        new.entities.at(120, 5)[0].entscript = 'moved'
+        mapdiff = MapDiff(self.old, new)
+        self.assertEqual(len(mapdiff), 2)
+        self.assertEqual(mapdiff.tiles, [])
+        self.assertEqual([(o.x, o.y) for o in mapdiff.offmap], [(120, 5), (150, 5)])
+        self.assertEqual(mapdiff.offmap[0].entities[0].fields, {'entscript': ('', 'moved')})
+        self.assertEqual(mapdiff.offmap[1].entities[0].status, ObjectDiff.ADDED)
+        self.assertEqual(mapdiff.offmap[1].tilecontents[0].values['description'], 'Stash')
+        data = json.loads(mapdiff.to_json())
+        self.assertEqual(data['offmap'][1]['entities'][0]['values']['entid'], 9)
+        self.assertIn('(150, 5) (off map):', mapdiff.to_text())
+
+    def test_savegame_against_global(self):
+        new = self.old.replicate()
+        new.set_savegame(True)
+        new.set_tile_savegame()
+        new.tiles[3][4].tile_flag = 1
+        entity = new.tiles[40][30].entity
+        entity.savegame = True
+        entity.health = 20
+        mapdiff = MapDiff(self.old, new)
+        self.assertFalse(mapdiff.savegame)
+        self.assertEqual(mapdiff.tiles, [])
+        self.assertNotEqual(mapdiff.header, {})
+
+    def test_different_books(self):
+        self.assertRaises(LoadException, MapDiff, self.old, Map.new('test.map', 3))
+
+    def test_cli_args(self):
+        args = parse_args(['old.map', 'new.map', '--format', 'json'])
+        self.assertEqual(args.format, 'json')
+        self.assertRaises(SystemExit, parse_args, ['old.map'])
+        self.assertEqual(main(['/nonexistent/old.map', '/nonexistent/new.map']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from eschalon.map import Map
+
+
+class MapDirectionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mapobj = Map.new('test.map', 2)
+
+    def test_coords_relative(self):
+        self.assertEqual(self.mapobj.coords_relative(5, 10, Map.DIR_NE), (5, 9))
+        self.assertEqual(self.mapobj.coords_relative(5, 11, Map.DIR_NE), (6, 10))
+        self.assertEqual(self.mapobj.coords_relative(5, 10, Map.DIR_S), (5, 12))
+        self.assertIsNone(self.mapobj.coords_relative(0, 10, Map.DIR_SW))
+        self.assertIsNone(self.mapobj.coords_relative(99, 11, Map.DIR_E))
+        self.assertIsNone(self.mapobj.coords_relative(5, 1, Map.DIR_N))
+        self.assertIsNone(self.mapobj.coords_relative(5, 10, Map.DIR_NO_CHANGE))
+        self.assertIs(self.mapobj.tile_relative(5, 10, Map.DIR_W),
+                      self.mapobj.tiles[10][4])
+
+    def test_directions(self):
+        self.assertEqual(Map.directions_between_coords(5, 10, 5, 10), [])
+        self.assertEqual(Map.directions_between_coords(5, 10, 6, 10), [Map.DIR_E])
+        self.assertEqual(Map.directions_between_coords(10, 10, 5, 9),
+                         [Map.DIR_W] * 4 + [Map.DIR_NW])
+        for (x1, y1, x2, y2) in [(0, 0, 99, 199), (50, 101, 3, 7), (10, 10, 5, 9)]:
+            directions = Map.directions_between_coords(x1, y1, x2, y2)
+            self.assertEqual(Map.follow_directions_from_coord(x1, y1, directions), (x2, y2))
+
+    def test_directions_one_row_away(self):
+        # Just taking directions which don't get us further away can bounce
+        # between N and S forever here.
+        directions = Map.directions_between_coords(20, 10, 15, 9)
+        self.assertEqual(Map.follow_directions_from_coord(20, 10, directions), (15, 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy
+
+from eschalon.map import Map
+from eschalon.undo import Undo
+
+
+class MapFillTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mapobj = Map.new('test.map', 2)
+
+    def test_fill_whole_map(self):
+        self.mapobj.tiles[3][4].floorimg = 7
+        history = self.mapobj.fill('floorimg', 5)
+        self.assertEqual(len(history), 20000)
+        self.assertEqual(self.mapobj.tiles[3][4].floorimg, 5)
+        self.assertEqual(self.mapobj.tiles[199][99].floorimg, 5)
+
+    def test_fill_no_overwrite(self):
+        self.mapobj.tiles[3][4].floorimg = 7
+        history = self.mapobj.fill('floorimg', 5, overwrite=False)
+        self.assertEqual(len(history), 19999)
+        self.assertEqual(self.mapobj.tiles[3][4].floorimg, 7)
+
+    def test_fill_no_change(self):
+        self.assertIsNone(self.mapobj.fill('floorimg', 0))
+
+    def test_fill_pool(self):
+        rng = numpy.random.default_rng(0)
+        self.mapobj.fill('floorimg', 1, pool=(1, 2, 3), rng=rng)
+        values = set(self.mapobj.get_tile_array('floorimg').flatten().tolist())
+        self.assertEqual(values, set([1, 2, 3]))
+
+    def test_undo_redo(self):
+        undo = Undo(self.mapobj)
+        self.mapobj.tiles[3][4].floorimg = 7
+        undo.store_bulk(self.mapobj.fill('floorimg', 5))
+        self.assertTrue(undo.have_undo())
+        self.assertEqual(len(undo.undo()), 20000)
+        self.assertEqual(self.mapobj.tiles[3][4].floorimg, 7)
+        self.assertEqual(self.mapobj.tiles[0][0].floorimg, 0)
+        self.assertTrue(undo.have_redo())
+        undo.redo()
+        self.assertEqual(self.mapobj.tiles[3][4].floorimg, 5)
+        self.assertEqual(self.mapobj.tiles[0][0].floorimg, 5)
+
+    def test_region_rect(self):
+        mask = self.mapobj.region_rect(10, 20, 5, 22)
+        self.assertEqual(int(mask.sum()), 18)
+        self.assertTrue(mask[21, 7])
+        self.assertFalse(mask[23, 7])
+
+    def test_region_polygon(self):
+        mask = self.mapobj.region_polygon([(10, 10), (20, 10), (20, 30), (10, 30)])
+        self.assertTrue(mask[20, 15])
+        self.assertTrue(mask[10, 10])
+        self.assertFalse(mask[40, 15])
+        self.assertFalse(mask[20, 25])
+
+    def test_region_flood(self):
+        # A diagonal line of tiles is connected on the isometric grid...
+        for (x, y) in [(5, 10), (5, 11), (6, 12), (6, 13)]:
+            self.mapobj.tiles[y][x].floorimg = 3
+        mask = self.mapobj.region_flood(5, 10)
+        self.assertEqual(int(mask.sum()), 4)
+
+        # ... but tiles a couple columns over aren't
+        self.mapobj.tiles[10][8].floorimg = 3
+        mask = self.mapobj.region_flood(8, 10)
+        self.assertEqual(int(mask.sum()), 1)
+
+        # And the zero-floor area is everything else
+        mask = self.mapobj.region_flood(0, 0)
+        self.assertEqual(int(mask.sum()), 19995)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+"""
+Fixture helpers shared by the map tests, for putting tilecontents and
+entities onto a map the same way Map.read() does.
+"""
+from eschalon.entity import Entity
+from eschalon.tilecontent import Tilecontent
+
+
+def on_map(x, y):
+    return 0 <= x < 100 and 0 <= y < 200
+
+
+def add_tilecontent(mapobj, x, y, description='', item_name='', script='', slot=0):
+    tilecontent = Tilecontent.new(mapobj.book, mapobj.is_savegame())
+    tilecontent.tozero(x, y)
+    tilecontent.description = description
+    tilecontent.script = script
+    tilecontent.items[slot].item_name = item_name
+    mapobj.tilecontents.append(tilecontent)
+    if on_map(x, y):
+        mapobj.tiles[y][x].addtilecontent(tilecontent)
+    return tilecontent
+
+
+def add_entity(mapobj, x, y, entid=1):
+    entity = Entity.new(mapobj.book, mapobj.is_savegame())
+    entity.tozero(x, y)
+    entity.entid = entid
+    mapobj.entities.append(entity)
+    if on_map(x, y):
+        mapobj.tiles[y][x].addentity(entity)
+    return entity
+
+
+def mangle_string(filename, text):
+    """ Makes the first copy of text in a written-out file invalid UTF-8 """
+    with open(filename, 'rb') as df:
+        data = df.read()
+    with open(filename, 'wb') as df:
+        df.write(data.replace(text.encode('UTF-8'), b'\xff' + text[1:].encode('UTF-8'), 1))
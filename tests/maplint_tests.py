@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from eschalon.entity import Entity
+from eschalon.map import Map
+from eschalon.maplint import MapLinter, lint_files, main
+
+from maphelpers import add_entity, add_tilecontent, mangle_string
+
+
+class GameData(object):
+    """ Just enough of EschalonData for the lint rules which need it """
+
+    def get_entitytable(self):
+        return {1: 'Rat', 2: 'Bat'}
+
+    def get_itemdict(self):
+        return {'Sword': True}
+
+
+class MapLintTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mapobj = Map.new('test.map', 2)
+
+    def rules_found(self, findings):
+        return sorted([(f.rule, f.x, f.y) for f in findings])
+
+    def test_clean_map(self):
+        tilecontent = add_tilecontent(self.mapobj, 1, 2, item_name='Sword')
+        self.mapobj.tiles[2][1].tilecontentid = 1
+        add_entity(self.mapobj, 3, 4)
+        self.assertEqual(MapLinter(eschalondata=GameData()).lint(self.mapobj), [])
+        self.assertEqual(tilecontent.items[0].item_name, 'Sword')
+
+    def test_tilecontents(self):
+        self.mapobj.tiles[0][0].tilecontentid = 250
+        self.mapobj.tiles[0][1].tilecontentid = 5
+        self.mapobj.tiles[0][2].tilecontentid = 30
+        add_tilecontent(self.mapobj, 3, 0)
+        findings = MapLinter().lint(self.mapobj)
+        self.assertEqual(self.rules_found(findings),
+                         [('tilecontent-mismatch', 0, 0),
+                          ('tilecontent-mismatch', 1, 0),
+                          ('tilecontent-mismatch', 3, 0),
+                          ('tilecontent-type', 0, 0)])
+
+    def test_big_graphic(self):
+        self.mapobj.tiles[5][5].wallimg = 1000
+        findings = MapLinter(rules=['big-graphic']).lint(self.mapobj)
+        self.assertEqual(self.rules_found(findings), [('big-graphic', 5, 5)])
+
+    def test_entities(self):
+        entity = add_entity(self.mapobj, 3, 4, 9)
+        entity.x = 7
+        findings = MapLinter(eschalondata=GameData()).lint(self.mapobj)
+        self.assertEqual(self.rules_found(findings),
+                         [('entity-location', 3, 4), ('unknown-entity', 3, 4)])
+
+    def test_gamedata_rules_skipped(self):
+        add_entity(self.mapobj, 3, 4, 9)
+        add_tilecontent(self.mapobj, 1, 2, item_name='Nonexistent')
+        self.mapobj.tiles[2][1].tilecontentid = 1
+        self.assertEqual(MapLinter().lint(self.mapobj), [])
+        findings = MapLinter(eschalondata=GameData()).lint(self.mapobj)
+        self.assertEqual(self.rules_found(findings),
+                         [('invalid-item', 1, 2), ('unknown-entity', 3, 4)])
+
+
+class MapLintFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, filename, broken=False, unreadable=False):
+        mapobj = Map.new(os.path.join(self.tmpdir, filename), 2)
+        mapobj.mapname = filename
+        if broken:
+            mapobj.tiles[1][1].tilecontentid = 250
+            add_entity(mapobj, 3, 3)
+            # Entities on the same tile only get noticed at load time
+            entity = Entity.new(2, False)
+            entity.tozero(3, 3)
+            mapobj.entities.append(entity)
+        mapobj.write()
+        if unreadable:
+            mangle_string(mapobj.df.filename, filename)
+        return mapobj.df.filename
+
+    def test_lint_files(self):
+        clean = self.write_map('clean.map')
+        broken = self.write_map('broken.map', True)
+        findings = lint_files([clean, broken], workers=2)
+        self.assertEqual(sorted([(f['file'], f['rule']) for f in findings]),
+                         [(broken, 'duplicate-entity'),
+                          (broken, 'tilecontent-mismatch'),
+                          (broken, 'tilecontent-type')])
+
+    def test_unreadable_map(self):
+        clean = self.write_map('clean.map')
+        unreadable = self.write_map('unreadable.map', unreadable=True)
+        broken = self.write_map('broken.map', True)
+        findings = lint_files([clean, unreadable, broken], workers=2)
+        self.assertEqual(sorted([(f['file'], f['rule']) for f in findings]),
+                         [(broken, 'duplicate-entity'),
+                          (broken, 'tilecontent-mismatch'),
+                          (broken, 'tilecontent-type'),
+                          (unreadable, 'load')])
+
+    def test_main(self):
+        self.write_map('clean.map')
+        self.write_map('broken.map', True)
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.tmpdir, '--format', 'ndjson', '--workers', '1']), 1)
+        findings = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(findings), 3)
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([self.tmpdir, '--rule', 'duplicate-entity']), 0)
+            self.assertEqual(main([os.path.join(self.tmpdir, 'missing.map')]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
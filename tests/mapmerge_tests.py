@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from eschalon.map import Map
+from eschalon.mapdiff import MapDiff
+from eschalon.mapmerge import MapMerge, main, merge_directories
+
+from maphelpers import add_entity, add_tilecontent, mangle_string
+
+
+class MapMergeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base = Map.new('test.map', 2)
+        add_tilecontent(self.base, 10, 20, 'Chest')
+        add_entity(self.base, 30, 40, 5)
+        self.ours = self.base.replicate()
+        self.theirs = self.base.replicate()
+
+    def test_clean_tile_merge(self):
+        self.ours.tiles[1][1].floorimg = 3
+        self.theirs.tiles[1][1].wall = 1
+        self.theirs.tiles[2][2].floorimg = 4
+        self.theirs.mapname = 'Updated'
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(merge.conflicts, [])
+        self.assertEqual(merge.applied, 3)
+        result = merge.result
+        self.assertEqual(result.tiles[1][1].floorimg, 3)
+        self.assertEqual(result.tiles[1][1].wall, 1)
+        self.assertEqual(result.tiles[2][2].floorimg, 4)
+        self.assertEqual(result.mapname, 'Updated')
+        # The inputs are left alone
+        self.assertEqual(self.ours.tiles[1][1].wall, 0)
+
+    def test_tile_conflict(self):
+        self.ours.tiles[1][1].floorimg = 3
+        self.theirs.tiles[1][1].floorimg = 4
+        self.theirs.tiles[1][2].floorimg = 4
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(len(merge.conflicts), 1)
+        conflict = merge.conflicts[0]
+        self.assertEqual((conflict.x, conflict.y, conflict.what), (1, 1, 'floorimg'))
+        self.assertEqual((conflict.base, conflict.ours, conflict.theirs), (0, 3, 4))
+        self.assertEqual(merge.result.tiles[1][1].floorimg, 3)
+        self.assertEqual(merge.result.tiles[1][2].floorimg, 4)
+        self.assertIn('(1, 1) floorimg', merge.to_text())
+
+    def test_same_change_on_both_sides(self):
+        self.ours.tiles[1][1].floorimg = 3
+        self.theirs.tiles[1][1].floorimg = 3
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(merge.conflicts, [])
+        self.assertEqual(merge.applied, 0)
+
+    def test_tilecontents(self):
+        self.ours.tiles[20][10].tilecontents[0].lock = 2
+        self.theirs.tiles[20][10].tilecontents[0].items[0].item_name = 'Sword'
+        add_tilecontent(self.theirs, 5, 5, 'Barrel')
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(merge.conflicts, [])
+        result = merge.result
+        self.assertEqual(result.tiles[20][10].tilecontents[0].lock, 2)
+        self.assertEqual(result.tiles[20][10].tilecontents[0].items[0].item_name, 'Sword')
+        self.assertEqual([tc.description for tc in result.tiles[5][5].tilecontents], ['Barrel'])
+        self.assertEqual(len(result.tilecontents), 2)
+
+    def test_tilecontent_conflict(self):
+        self.ours.deltilecontent(10, 20, 0)
+        self.theirs.tiles[20][10].tilecontents[0].lock = 2
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual([(c.x, c.y, c.what) for c in merge.conflicts], [(10, 20, 'tilecontents')])
+        self.assertEqual(merge.result.tiles[20][10].tilecontents, [])
+
+    def test_entities(self):
+        self.theirs.delentity(30, 40)
+        add_entity(self.theirs, 50, 60, 7)
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(merge.conflicts, [])
+        result = merge.result
+        self.assertIsNone(result.tiles[40][30].entity)
+        self.assertEqual(result.tiles[60][50].entity.entid, 7)
+        self.assertEqual(len(result.entities), 1)
+
+    def test_offmap(self):
+        add_entity(self.base, 120, 5, 2)
+        self.ours = self.base.replicate()
+        self.theirs = self.base.replicate()
+        add_entity(self.theirs, 150, 5, 9)
+        add_tilecontent(self.theirs, 150, 6, 'Stash')
+        self.theirs.entities.at(120, 5)[0].entscript = 'theirs'
+        self.ours.entities.at(120, 5)[0].direction = 2
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual(merge.conflicts, [])
+        self.assertEqual(merge.applied, 3)
+        result = merge.result
+        self.assertEqual([e.entid for e in result.entities.at(150, 5)], [9])
+        self.assertEqual([tc.description for tc in result.tilecontents.at(150, 6)], ['Stash'])
+        entity = result.entities.at(120, 5)[0]
+        self.assertEqual((entity.entscript, entity.direction), ('theirs', 2))
+        self.assertEqual(len(MapDiff(self.theirs, result).offmap), 1)
+
+        # Both sides putting different things in the same spot conflicts
+        add_entity(self.ours, 150, 5, 4)
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual([c.what for c in merge.conflicts], ['entities'])
+
+    def test_entity_conflict(self):
+        self.ours.tiles[40][30].entity.direction = 3
+        self.theirs.tiles[40][30].entity.direction = 4
+        self.theirs.tiles[40][30].entity.entscript = 'script'
+        merge = MapMerge(self.base, self.ours, self.theirs)
+        self.assertEqual([c.what for c in merge.conflicts], ['entity direction'])
+        entity = merge.result.tiles[40][30].entity
+        self.assertEqual((entity.direction, entity.entscript), (3, 'script'))
+
+
+class MapMergeDirectoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, dirname, filename, floorimg):
+        path = os.path.join(self.tmpdir, dirname)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        mapobj = Map.new(os.path.join(path, filename), 2)
+        mapobj.mapname = filename
+        mapobj.tiles[0][0].floorimg = floorimg
+        add_entity(mapobj, 3, 3, 2)
+        mapobj.write()
+
+    def test_merge_directories(self):
+        for filename in ['one.map', 'two.map']:
+            self.write_map('base', filename, 0)
+            self.write_map('ours', filename, 0)
+            self.write_map('theirs', filename, 5)
+        self.write_map('ours', 'extra.map', 0)
+        dirs = [os.path.join(self.tmpdir, d) for d in ['base', 'ours', 'theirs', 'merged']]
+        os.makedirs(dirs[3])
+
+        reports = merge_directories(*dirs, workers=2)
+        self.assertEqual([report['map'] for report in reports], ['one.map', 'two.map'])
+        for report in reports:
+            self.assertEqual(report['conflicts'], [])
+            merged = MapDiff.load_map(report['output'])
+            self.assertEqual(merged.tiles[0][0].floorimg, 5)
+            self.assertEqual(merged.tiles[3][3].entity.entid, 2)
+
+    def test_unreadable_map(self):
+        for filename in ['one.map', 'two.map']:
+            self.write_map('base', filename, 0)
+            self.write_map('ours', filename, 0)
+            self.write_map('theirs', filename, 5)
+        mangle_string(os.path.join(self.tmpdir, 'theirs', 'one.map'), 'one.map')
+        dirs = [os.path.join(self.tmpdir, d) for d in ['base', 'ours', 'theirs']]
+        reports = merge_directories(*dirs, workers=2)
+        self.assertEqual([report['map'] for report in reports], ['one.map', 'two.map'])
+        self.assertIn('error', reports[0])
+        self.assertNotIn('error', reports[1])
+        self.assertEqual(reports[1]['conflicts'], [])
+
+    def test_main(self):
+        self.write_map('base', 'one.map', 0)
+        self.write_map('ours', 'one.map', 3)
+        self.write_map('theirs', 'one.map', 5)
+        dirs = [os.path.join(self.tmpdir, d) for d in ['base', 'ours', 'theirs']]
+        self.assertEqual(main(dirs + ['--workers', '1']), 1)
+        self.assertEqual(main([os.path.join(d, 'one.map') for d in dirs[:2]] +
+                              [os.path.join(dirs[0], 'one.map'), '--format', 'json']), 0)
+        self.assertEqual(main([os.path.join(self.tmpdir, 'missing.map')] * 3), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
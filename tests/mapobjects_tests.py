@@ -0,0 +1,72 @@
+import unittest
+
+from eschalon.entity import Entity
+from eschalon.map import Map
+from eschalon.mapobjects import MapObjectList
+from eschalon.undo import Undo
+
+
+class Thing(object):
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class MapObjectListTests(unittest.TestCase):
+
+    def test_order(self):
+        things = [Thing(i, i) for i in range(5)]
+        objlist = MapObjectList(things)
+        self.assertEqual(len(objlist), 5)
+        self.assertEqual(list(objlist), things)
+        self.assertIs(objlist[2], things[2])
+
+    def test_remove_and_reinsert(self):
+        things = [Thing(i, i) for i in range(5)]
+        objlist = MapObjectList(things)
+        key = objlist.key_of(things[2])
+        objlist.remove(things[2])
+        self.assertNotIn(things[2], objlist)
+        self.assertEqual(list(objlist), things[:2] + things[3:])
+        objlist.insert(key, things[2])
+        self.assertEqual(list(objlist), things)
+        self.assertRaises(ValueError, objlist.remove, Thing(0, 0))
+
+    def test_at(self):
+        things = [Thing(1, 2), Thing(3, 4), Thing(1, 2)]
+        objlist = MapObjectList(things)
+        self.assertEqual(objlist.at(1, 2), [things[0], things[2]])
+        self.assertEqual(objlist.at(5, 5), [])
+        objlist.remove(things[0])
+        self.assertEqual(objlist.at(1, 2), [things[2]])
+        things[1].x = 5
+        objlist.relocate(things[1])
+        self.assertEqual(objlist.at(3, 4), [])
+        self.assertEqual(objlist.at(5, 4), [things[1]])
+
+    def test_undo_keeps_order(self):
+        mapobj = Map.new('test.map', 2)
+        for x in range(3):
+            ent = Entity.new(2, False)
+            ent.tozero(x, 0)
+            mapobj.entities.append(ent)
+            mapobj.tiles[0][x].addentity(ent)
+        before = [(ent.x, ent.y) for ent in mapobj.entities]
+
+        undo = Undo(mapobj)
+        undo.store(1, 0)
+        mapobj.delentity(1, 0)
+        self.assertTrue(undo.finish())
+        self.assertEqual(len(mapobj.entities), 2)
+
+        undo.undo()
+        self.assertEqual([(ent.x, ent.y) for ent in mapobj.entities], before)
+        self.assertIs(mapobj.entities[1], mapobj.tiles[0][1].entity)
+        undo.redo()
+        self.assertEqual(len(mapobj.entities), 2)
+        self.assertIsNone(mapobj.tiles[0][1].entity)
+
+
+if __name__ == '__main__':
+    unittest.main()
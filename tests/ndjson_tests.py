@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+from eschalon.character import Character
+from eschalon.constants import constants as c
+from eschalon.item import Item
+from eschalon.map import Map
+from eschalon.merchant import Merchant
+from eschalon.ndjson import (decode_value, encode_value, export_ndjson, export_records,
+                             import_ndjson, import_records, main)
+from eschalon.savefile import LoadException
+
+from maphelpers import add_entity, add_tilecontent
+
+
+class NDJSONTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_bytes(self, filename):
+        with open(filename, 'rb') as df:
+            return df.read()
+
+    def make_map(self, book, savegame):
+        mapobj = Map.new(os.path.join(self.tmpdir, 'orig.map'), book)
+        mapobj.mapname = 'Test Map'
+        mapobj.set_savegame(savegame)
+        mapobj.tiles[3][2].floorimg = 12
+        mapobj.tiles[3][2].wall = 1
+        add_tilecontent(mapobj, 2, 3, 'Chest', 'Longbow')
+        add_entity(mapobj, 5, 6, 7)
+        mapobj.write()
+        return mapobj
+
+    def test_encode(self):
+        for value in [1, 'text', b'\x00\xff', [1, [b'a', 'b']], {1: 2, 'three': [4]}, None]:
+            self.assertEqual(decode_value(json.loads(json.dumps(encode_value(value)))), value)
+
+    def test_map_round_trip(self):
+        for book in [1, 2, 3]:
+            for savegame in [False, True]:
+                mapobj = self.make_map(book, savegame)
+                records = list(export_records(mapobj))
+                self.assertEqual([record['type'] for record in records],
+                                 ['map', 'tile', 'tilecontent'] + ['item'] * 8 + ['entity'])
+                self.assertEqual(records[0]['book'], book)
+                self.assertEqual(records[3]['item_name'], 'Longbow')
+
+                filename = os.path.join(self.tmpdir, 'new.map')
+                newmap = import_records(iter(records), filename)
+                self.assertEqual(newmap.is_savegame(), savegame)
+                self.assertEqual(newmap.tiles[3][2].tilecontents[0].items[0].item_name, 'Longbow')
+                self.assertEqual(newmap.tiles[6][5].entity.entid, 7)
+                newmap.write()
+                self.assertEqual(self.read_bytes(filename), self.read_bytes(mapobj.df.filename))
+                self.assertEqual(self.read_bytes(os.path.join(self.tmpdir, 'new.ent')),
+                                 self.read_bytes(os.path.join(self.tmpdir, 'orig.ent')))
+
+    def test_character_round_trip(self):
+        for (book, filename) in [(1, 'test_data/book1_atend.char'),
+                                 (2, 'test_data/book2_atend.char'),
+                                 (3, 'test_data/book3_f4_example.char')]:
+            char = Character.load(filename, book)
+            char.read()
+            output = StringIO()
+            export_ndjson(char, output)
+            self.assertEqual(output.getvalue().count("\n"),
+                             1 + 13 + (book == 1) + char.inv_rows * char.inv_cols + len(char.readyitems))
+
+            newchar = import_ndjson(StringIO(output.getvalue()), os.path.join(self.tmpdir, 'new.char'))
+            self.assertEqual(newchar.book, book)
+            self.assertEqual(newchar.name, char.name)
+            self.assertEqual(newchar.skills, char.skills)
+            newchar.write()
+            char.df.set_filename(os.path.join(self.tmpdir, 'orig.char'))
+            char.write()
+            self.assertEqual(self.read_bytes(os.path.join(self.tmpdir, 'new.char')),
+                             self.read_bytes(os.path.join(self.tmpdir, 'orig.char')))
+
+    def test_merchant(self):
+        c.switch_to_book(3)
+        merchant = Merchant()
+        merchant.gold = 500
+        for name in ['Apple', 'Pear']:
+            item = Item.new(3, True)
+            item.item_name = name
+            merchant.items.append(item)
+        output = StringIO()
+        self.assertEqual(export_ndjson(merchant, output), 3)
+        newmerchant = import_ndjson(StringIO(output.getvalue()))
+        self.assertEqual(newmerchant.gold, 500)
+        self.assertEqual([item.item_name for item in newmerchant.items], ['Apple', 'Pear'])
+
+    def test_errors(self):
+        with self.assertRaises(LoadException):
+            import_records([])
+        with self.assertRaises(LoadException):
+            import_records([{'type': 'tile', 'book': 2}])
+        with self.assertRaises(LoadException):
+            import_records([{'type': 'merchant', 'book': 2}, {'type': 'entity'}])
+        with self.assertRaises(LoadException):
+            import_ndjson(StringIO('{"type": "merchant", "book": 2}\nnot json\n'))
+
+    def test_main(self):
+        mapobj = self.make_map(2, True)
+        ndjson = os.path.join(self.tmpdir, 'map.ndjson')
+        self.assertEqual(main(['export', mapobj.df.filename, '-o', ndjson]), 0)
+        filename = os.path.join(self.tmpdir, 'copy.map')
+        self.assertEqual(main(['import', ndjson, filename]), 0)
+        self.assertEqual(self.read_bytes(filename), self.read_bytes(mapobj.df.filename))
+        with redirect_stderr(StringIO()):
+            self.assertEqual(main(['export', os.path.join(self.tmpdir, 'missing.map')]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from eschalon.eschalondata import EntHelper
+from eschalon.entity import Entity
+from eschalon.overlaymask import OverlayMasks
+from eschalon.tile import Tile
+from eschalon.tilearrays import TileArrays
+from eschalon.tilecontent import Tilecontent
+
+
+def make_tiles(book):
+    return [[Tile.new(book, x, y) for x in range(100)] for y in range(200)]
+
+
+class OverlayMaskTests(unittest.TestCase):
+
+    def test_empty_map(self):
+        masks = OverlayMasks.new(2, TileArrays(make_tiles(2)))
+        self.assertEqual(masks.counts(),
+                         {'barrier': 0, 'tilecontent': 0, 'entity': 0})
+        self.assertEqual(masks.colors(5, 5),
+                         {'barrier': False, 'tilecontent': False, 'entity': False})
+
+    def test_barriers(self):
+        tiles = make_tiles(2)
+        tiles[0][0].wall = 1
+        tiles[0][1].wall = 2
+        tiles[0][2].wall = 5
+        tiles[0][3].floorimg = 126
+        masks = OverlayMasks.new(2, TileArrays(tiles))
+        self.assertEqual(list(masks.barrier[0, :4]), [1, 2, 3, 0])
+        masks = OverlayMasks.new(2, TileArrays(tiles), show_floor=False)
+        self.assertEqual(list(masks.barrier[0, :4]), [1, 2, 3, 4])
+
+    def test_b1_tilecontents(self):
+        tiles = make_tiles(1)
+        tiles[0][0].tilecontentid = 1
+        tiles[0][0].tilecontents.append(Tilecontent.new(1, False))
+        tiles[0][1].tilecontentid = 1
+        tiles[0][2].tilecontents.append(Tilecontent.new(1, False))
+        masks = OverlayMasks.new(1, TileArrays(tiles))
+        self.assertEqual(list(masks.tilecontent[0, :4]), [
+            OverlayMasks.TILECONTENT_OK,
+            OverlayMasks.TILECONTENT_NOCONTENTS,
+            OverlayMasks.TILECONTENT_ERROR,
+            OverlayMasks.NONE])
+
+    def test_b2_big_graphics(self):
+        tiles = make_tiles(2)
+        tiles[0][0].wallimg = 1001
+        tiles[0][1].wallimg = 1004
+        tiles[0][1].tilecontentid = 21
+        tiles[0][1].tilecontents.append(Tilecontent.new(2, False))
+        tiles[0][2].wallimg = 1001
+        tiles[0][2].tilecontentid = 21
+        tiles[0][2].tilecontents.append(Tilecontent.new(2, False))
+        tiles[0][3].tilecontentid = 30
+        masks = OverlayMasks.new(2, TileArrays(tiles))
+        self.assertEqual(list(masks.tilecontent[0, :4]), [
+            OverlayMasks.TILECONTENT_ERROR,
+            OverlayMasks.TILECONTENT_ERROR,
+            OverlayMasks.TILECONTENT_OK,
+            OverlayMasks.TILECONTENT_NOCONTENTS])
+
+    def test_entities(self):
+        tiles = make_tiles(2)
+        for (x, entid) in [(0, 1), (1, 2), (2, 99)]:
+            tiles[0][x].entity = Entity.new(2, False)
+            tiles[0][x].entity.entid = entid
+        entitytable = {1: EntHelper('Friend', 10, 'friend.png', 1, 1),
+                       2: EntHelper('Foe', 10, 'foe.png', 0, 1)}
+        masks = OverlayMasks.new(2, TileArrays(tiles), entitytable=entitytable)
+        self.assertEqual(list(masks.entity[0, :4]), [
+            OverlayMasks.ENTITY_FRIENDLY,
+            OverlayMasks.ENTITY_HOSTILE,
+            OverlayMasks.ENTITY_HOSTILE,
+            OverlayMasks.NONE])
+
+    def test_update_tile(self):
+        tiles = make_tiles(3)
+        masks = OverlayMasks.new(3, TileArrays(tiles))
+        tiles[10][20].wall = 1
+        masks.update_tile(tiles[10][20])
+        self.assertTrue(masks.mask('barrier')[10, 20])
+        self.assertEqual(masks.counts()['barrier'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import threading
+import unittest
+
+from eschalon.renderjob import CancelToken, RenderCancelled, RenderJob
+
+
+class RenderJobTest(unittest.TestCase):
+    def test_chunks_cover_all_rows(self):
+        job = RenderJob(lambda chunk, token: None, rows=200, chunk_rows=30)
+        rows = [y for chunk in job.chunks for y in chunk.rows()]
+        self.assertEqual(rows, list(range(200)))
+
+    def test_results_come_back_in_order(self):
+        job = RenderJob(lambda chunk, token: list(chunk.rows()),
+                        rows=50, chunk_rows=7, workers=4)
+        job.start()
+        chunks = job.wait()
+        self.assertTrue(job.done())
+        self.assertEqual(job.progress(), 1.0)
+        self.assertEqual([chunk.idx for chunk in chunks],
+                         list(range(len(job.chunks))))
+        self.assertEqual([y for chunk in chunks for y in chunk.result],
+                         list(range(50)))
+
+    def test_cancel(self):
+        started = threading.Event()
+
+        def render(chunk, token):
+            started.set()
+            while True:
+                token.check()
+
+        job = RenderJob(render, rows=20, chunk_rows=10, workers=1)
+        job.start()
+        started.wait(5)
+        futures = list(job.futures)
+        job.cancel()
+        # The second chunk never got a worker, so it shouldn't run at all
+        self.assertTrue(futures[1].cancelled())
+        self.assertTrue(job.is_cancelled())
+        self.assertEqual(job.poll(), [])
+        self.assertFalse(job.done())
+
+    def test_errors_are_reraised(self):
+        def render(chunk, token):
+            raise ValueError('broken')
+
+        job = RenderJob(render, rows=10, chunk_rows=10, workers=1)
+        job.start()
+        with self.assertRaises(ValueError):
+            job.wait()
+
+    def test_token(self):
+        token = CancelToken()
+        token.check()
+        token.cancel()
+        with self.assertRaises(RenderCancelled):
+            token.check()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -33,6 +33,12 @@ class TestSavefile(unittest.TestCase):
         s.set_filename("-")
         self.assertFalse(s.is_stringdata())
 
+    def test_write_text_str(self):
+        s = eschalon.savefile.Savefile(stringdata=b"")
+        s.open_w()
+        s.writestr("yellow")
+        self.assertEqual(s.df.getvalue(), b"yellow\r\n")
+
     @unittest.skip("this test can cause testfile corruption - rewrite")
     def _test_write_and_read(self,
                              value_to_write,
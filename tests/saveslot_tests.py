@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from eschalon import saveslot
+from eschalon.constants import constants as c
+from eschalon.map import Map
+from eschalon.saveslot import Saveslot, scan_slots
+
+
+class SaveslotTests(unittest.TestCase):
+
+    def setUp(self):
+        saveslot._slot_cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        saveslot._slot_cache.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def make_slot(self, slotname, savename, charname='Hero', maps=()):
+        directory = os.path.join(self.tmpdir, slotname)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'savename'), 'wb') as df:
+            df.write(('%s\r\ndate\r\ntime\r\nmap\r\n' % (savename)).encode('UTF-8'))
+            df.write(b'\x00' * 4096)
+        with open(os.path.join(directory, 'char'), 'wb') as df:
+            df.write(b'\x02' + charname.encode('UTF-8') + b'\r\n')
+        for mapname in maps:
+            mapobj = Map.new(os.path.join(directory, '%s.map' % (mapname.lower())), 2)
+            mapobj.mapname = mapname
+            mapobj.write()
+        return directory
+
+    def test_cache(self):
+        directory = self.make_slot('slot1', 'First Save', maps=['Cave'])
+        slot = Saveslot(directory, load_all=True)
+        self.assertEqual(slot.savename, 'First Save')
+        self.assertEqual(slot.charname, 'Hero')
+        self.assertEqual([m.mapname for m in slot.maps], ['Cave'])
+
+        # Another look at the same slot shouldn't need to read anything
+        cache = saveslot._slot_cache[directory]
+        slot = Saveslot(directory)
+        self.assertIs(slot.cache, cache)
+        slot.load_maps()
+        slot.load_charname(2)
+        self.assertEqual([m.mapname for m in slot.maps], ['Cave'])
+        self.assertEqual(slot.charname, 'Hero')
+
+        # ... but changing the slot should
+        mapobj = Map.new(os.path.join(directory, 'town.map'), 2)
+        mapobj.mapname = 'Town'
+        mapobj.write()
+        slot = Saveslot(directory, load_all=True)
+        self.assertIsNot(slot.cache, cache)
+        self.assertEqual([m.mapname for m in slot.maps], ['Cave', 'Town'])
+
+    def test_scan_slots(self):
+        for idx in [1, 2, 11]:
+            self.make_slot('slot%d' % (idx), 'Save %d' % (idx), 'Hero %d' % (idx), ['Map %d' % (idx)])
+        os.makedirs(os.path.join(self.tmpdir, 'slot5'))
+        seen = []
+        lock = threading.Lock()
+
+        def callback(slot):
+            with lock:
+                seen.append(slot.slotname_short())
+
+        c.switch_to_book(3)
+        try:
+            slots = scan_slots(self.tmpdir, book=2, maps=True, charname=True,
+                               workers=4, callback=callback)
+            # Scanning Book 2 slots mustn't change the book out from under the GUI
+            self.assertEqual(c.book, 3)
+        finally:
+            c.switch_to_book(1)
+        self.assertEqual([slot.slotname_short() for slot in slots], ['slot1', 'slot2', 'slot11'])
+        self.assertEqual(sorted(seen), ['slot1', 'slot11', 'slot2'])
+        self.assertEqual([slot.charname for slot in slots], ['Hero 1', 'Hero 2', 'Hero 11'])
+        self.assertEqual([slot.maps[0].mapname for slot in slots], ['Map 1', 'Map 2', 'Map 11'])
+        self.assertEqual(scan_slots(os.path.join(self.tmpdir, 'nothing')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+
+from eschalon.map import Map
+from eschalon.smartdraw import PremadeObject, SmartDraw
+
+
+class FakeToggle(object):
+
+    def __init__(self, active):
+        self.active = active
+
+    def get_active(self):
+        return self.active
+
+
+class FakeGUI(object):
+
+    def __init__(self, idxtype):
+        self.smart_randomize = FakeToggle(False)
+        self.decal_edge_pref_map = {FakeToggle(True): idxtype}
+
+
+class BatchSmartDrawTests(unittest.TestCase):
+
+    # An L-shaped path, with a bit of a diagonal
+    PATH = [(10, 20), (10, 21), (11, 22), (11, 23), (12, 24),
+            (11, 25), (11, 26), (10, 27), (10, 28)]
+
+    def setUp(self):
+        self.maps = []
+        self.smartdraws = []
+        for i in range(2):
+            mapobj = Map.new('test.map', 2)
+            smartdraw = SmartDraw.new(2)
+            smartdraw.set_map(mapobj)
+            smartdraw.set_gui(FakeGUI(SmartDraw.IDX_GRASS))
+            self.maps.append(mapobj)
+            self.smartdraws.append(smartdraw)
+
+    def values(self, mapobj, attr):
+        return [[getattr(tile, attr) for tile in row] for row in mapobj.tiles]
+
+    def test_wall_groups(self):
+        smartdraw = self.smartdraws[0]
+        tile = self.maps[0].tiles[0][0]
+        tile.wallimg = smartdraw.wallstarts[0] + 3
+        self.assertEqual(smartdraw.get_wall_group(tile), smartdraw.wallstarts[0])
+        tile.wallimg = smartdraw.fenceids[2]
+        self.assertEqual(smartdraw.get_wall_group(tile), smartdraw.fenceids[0])
+        tile.wallimg = smartdraw.special
+        self.assertIsNone(smartdraw.get_wall_group(tile))
+        self.assertEqual(smartdraw.get_wall_group(tile, 5), 5)
+
+    def test_draw_walls(self):
+        group = self.smartdraws[0].wallstarts[0]
+        for mapobj in self.maps:
+            mapobj.tiles[19][9].wallimg = group
+
+        # One at a time...
+        (mapobj, smartdraw) = (self.maps[0], self.smartdraws[0])
+        for (x, y) in self.PATH:
+            mapobj.tiles[y][x].wallimg = group
+            smartdraw.draw_wall(mapobj.tiles[y][x])
+
+        # ... versus all at once
+        (mapobj, smartdraw) = (self.maps[1], self.smartdraws[1])
+        tiles = [mapobj.tiles[y][x] for (x, y) in self.PATH]
+        for tile in tiles:
+            tile.wallimg = group
+        affected = smartdraw.draw_walls(tiles)
+        self.assertEqual([(tile.x, tile.y) for tile in affected], [(9, 19)])
+
+        self.assertEqual(self.values(self.maps[0], 'wallimg'),
+                         self.values(self.maps[1], 'wallimg'))
+        self.assertEqual(self.values(self.maps[0], 'wall'),
+                         self.values(self.maps[1], 'wall'))
+
+    def test_draw_floors(self):
+        grass = self.smartdraws[0].tilesets[SmartDraw.IDX_GRASS][0]
+
+        random.seed(0)
+        (mapobj, smartdraw) = (self.maps[0], self.smartdraws[0])
+        for (x, y) in self.PATH:
+            mapobj.tiles[y][x].floorimg = grass
+            smartdraw.draw_floor(mapobj.tiles[y][x])
+
+        random.seed(0)
+        (mapobj, smartdraw) = (self.maps[1], self.smartdraws[1])
+        tiles = [mapobj.tiles[y][x] for (x, y) in self.PATH]
+        for tile in tiles:
+            tile.floorimg = grass
+        affected = smartdraw.draw_floors(tiles)
+        self.assertGreater(len(affected), 0)
+        self.assertEqual(len(affected), len(set([(tile.x, tile.y) for tile in affected])))
+
+        self.assertEqual(self.values(self.maps[0], 'decalimg'),
+                         self.values(self.maps[1], 'decalimg'))
+
+
+class PremadeObjectTests(unittest.TestCase):
+
+    def test_apply_to_indexes_new_objects(self):
+        mapobj = Map.new('test.map', 1)
+        obj = PremadeObject('chest')
+        obj.set_tilecontent(5)
+        obj.create_tilecontentobj('Thing')
+        obj.create_entity()
+        obj.apply_to(None, mapobj, mapobj.tiles[3][2])
+        self.assertEqual(mapobj.tilecontents.at(2, 3), mapobj.tiles[3][2].tilecontents)
+        self.assertEqual(mapobj.tilecontents.at(-1, -1), [])
+        self.assertEqual(mapobj.entities.at(2, 3), [mapobj.tiles[3][2].entity])
+        self.assertEqual(mapobj.entities.at(-1, -1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy
+
+from eschalon.map import Map
+from eschalon.savefile import LoadException
+from eschalon.tilearrays import TileArrays
+from eschalon.tilequery import Expression, dilate, extract_arrays, main, query_files
+
+from maphelpers import add_entity, add_tilecontent
+
+
+class TileQueryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.mapdir = os.path.join(self.tmpdir, 'maps')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        os.makedirs(self.mapdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, filename, book=2, savegame=True, floor=126):
+        mapobj = Map.new(os.path.join(self.mapdir, filename), book)
+        if book == 1:
+            mapobj.mapid = filename
+        mapobj.set_savegame(savegame)
+        for x in range(10, 15):
+            mapobj.tiles[20][x].floorimg = floor
+            mapobj.tiles[20][x].wallimg = 300 if book > 1 else 30
+        mapobj.tiles[21][12].wall = 3
+        if book > 1:
+            mapobj.tiles[20][10].tile_flag = 0x80000005
+        if book > 2:
+            mapobj.tiles[20][11].cartography = 2
+        add_tilecontent(mapobj, 12, 20)
+        add_entity(mapobj, 13, 20, 57)
+        mapobj.write()
+        return mapobj.df.filename
+
+    def test_extract_arrays(self):
+        for book in [1, 2, 3]:
+            for savegame in [False, True]:
+                filename = self.write_map('b%d.map' % (book), book, savegame)
+                mapobj = Map.load(filename)
+                mapobj.read()
+                expected = TileArrays(mapobj.tiles)
+                arrays = extract_arrays(filename)
+                for column in TileArrays.COLUMNS:
+                    self.assertTrue(numpy.array_equal(getattr(arrays, column), getattr(expected, column)),
+                                    'Book %d %s' % (book, column))
+                self.assertEqual(int(arrays.entid[20, 13]), 57)
+                self.assertEqual(int(arrays.tile_flag[20, 10]), 0x80000005 if book > 1 and savegame else 0)
+
+    def test_dilate(self):
+        mask = numpy.zeros((200, 100), dtype=bool)
+        mask[51, 40] = True
+        (ys, xs) = numpy.nonzero(dilate(mask))
+        expected = set([(40, 51)])
+        for table in Map.neighbor_tables().values():
+            if table[51 * 100 + 40] is not None:
+                expected.add(table[51 * 100 + 40])
+        self.assertEqual(set(zip(xs.tolist(), ys.tolist())), expected)
+        self.assertEqual(int(numpy.count_nonzero(dilate(mask, 0))), 1)
+        self.assertTrue(dilate(mask, 2).sum() > len(expected))
+
+    def test_expression(self):
+        arrays = extract_arrays(self.write_map('one.map'))
+        self.assertEqual(int(Expression('floorimg == 126').evaluate(arrays).sum()), 5)
+        self.assertEqual(int(Expression('floorimg == 126 and near(wall == 3)').evaluate(arrays).sum()), 2)
+        self.assertEqual(int(Expression('bit(tile_flag, 31) & (x < 11)').evaluate(arrays).sum()), 1)
+        self.assertEqual(int(Expression('isin(entid, [56, 57]) or num_tilecontents > 0').evaluate(arrays).sum()), 2)
+        self.assertEqual(int(Expression('10 < x <= 12 and not wall').evaluate(arrays).sum()), 2 * 200 - 1)
+        self.assertEqual(int(Expression('near(wall == 3, 200)').evaluate(arrays).sum()), 200 * 100)
+        for source in ['floor == 1', '__import__("os")', 'wall.real', 'wall == "x"', 'near(wall, steps=2)', 'wall ==',
+                       'wall + 99999999999999999999999', 'near(wall, 201)', 'near(wall, x)']:
+            with self.assertRaises(LoadException):
+                Expression(source)
+        report = next(query_files([self.write_map('two.map')], 'wall + 99999999999999999999999', workers=1))
+        self.assertIn('out of range', report['error'])
+
+    def test_query_cache(self):
+        filenames = [self.write_map('one.map'), self.write_map('two.map', floor=5)]
+        reports = list(query_files(filenames, 'floorimg == 126', 'wallimg', True, self.cache_dir, workers=2))
+        self.assertEqual([(report['count'], report['cached']) for report in reports], [(5, False), (0, False)])
+        self.assertEqual(reports[0]['values'], {'300': 5})
+        self.assertEqual(reports[0]['coords'][0], [10, 20])
+        reports = list(query_files(filenames, 'floorimg == 126', cache_dir=self.cache_dir, workers=1))
+        self.assertEqual([(report['count'], report['cached']) for report in reports], [(5, True), (0, True)])
+
+        # Changing a map invalidates its cache entry
+        self.write_map('two.map', floor=126)
+        stat = os.stat(filenames[1])
+        os.utime(filenames[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        reports = list(query_files(filenames, 'floorimg == 126', cache_dir=self.cache_dir, workers=1))
+        self.assertEqual([(report['count'], report['cached']) for report in reports], [(5, True), (5, False)])
+
+    def test_main(self):
+        self.write_map('one.map')
+        self.write_map('two.map', floor=5)
+        output = StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.mapdir, '--where', 'floorimg == 126', '--count-by', 'wall',
+                                   '--cache-dir', self.cache_dir, '--format', 'json']), 0)
+        result = json.loads(output.getvalue())
+        self.assertEqual([report['map'] for report in result['maps']], [os.path.join(self.mapdir, 'one.map')])
+        self.assertEqual(result['summary'], {'maps': 2, 'matching_maps': 1, 'count': 5, 'values': {'0': 5}})
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main([self.mapdir, '--where', 'floorimg == 1', '--no-cache']), 1)
+            self.assertEqual(main([os.path.join(self.mapdir, 'missing.map'), '--no-cache']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
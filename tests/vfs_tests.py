@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from eschalon.constants import constants as c
+from eschalon.eschalondata import Datapak, EschalonData
+from eschalon.savefile import LoadException
+from eschalon.vfs import VFS, DatapakLayer, DirectoryLayer
+
+
+class VFSTests(unittest.TestCase):
+
+    def setUp(self):
+        c.switch_to_book(3)
+        self.tmpdir = tempfile.mkdtemp()
+        self.gamedir = os.path.join(self.tmpdir, 'game')
+        os.makedirs(os.path.join(self.gamedir, 'music'))
+        with zipfile.ZipFile(os.path.join(self.gamedir, 'datapak'), 'w') as zf:
+            zf.writestr('data/entities.csv', 'from datapak')
+            zf.writestr('music/one.ogg', 'datapak one')
+            zf.writestr('music/two.ogg', 'datapak two')
+            zf.writestr('sound/atmos_wind.wav', '')
+            zf.writestr('sound/rand_owl.wav', '')
+        self.write('music', 'two.ogg', 'loose two')
+        self.moddir = os.path.join(self.tmpdir, 'mod')
+        os.makedirs(self.moddir)
+        self.write_mod('entities.csv', 'from mod')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, directory, filename, data):
+        with open(os.path.join(self.gamedir, directory, filename), 'w') as df:
+            df.write(data)
+
+    def write_mod(self, filename, data):
+        with open(os.path.join(self.moddir, filename), 'w') as df:
+            df.write(data)
+
+    def make_vfs(self):
+        return VFS([DirectoryLayer(self.moddir, {'data': ''}),
+                    DirectoryLayer(self.gamedir, {'music': 'music'}),
+                    DatapakLayer(Datapak(os.path.join(self.gamedir, 'datapak')))])
+
+    def test_layers(self):
+        vfs = self.make_vfs()
+        self.assertEqual(vfs.readfile('one.ogg', 'music'), b'datapak one')
+        self.assertEqual(vfs.readfile('two.ogg', 'music'), b'loose two')
+        self.assertEqual(vfs.readfile('entities.csv', 'data'), b'from mod')
+        self.assertEqual([repr(layer) for layer in vfs.find_all('entities.csv', 'data')],
+                         ['directory %s' % (self.moddir),
+                          'datapak %s' % (os.path.join(self.gamedir, 'datapak'))])
+        self.assertTrue(vfs.exists('rand_owl.wav', 'sound'))
+        self.assertFalse(vfs.exists('rand_owl.wav', 'music'))
+        with self.assertRaises(LoadException):
+            vfs.readfile('three.ogg', 'music')
+
+    def test_listdir(self):
+        vfs = self.make_vfs()
+        self.assertEqual(vfs.listdir('music', 'ogg'), ['one.ogg', 'two.ogg'])
+        self.assertEqual(vfs.listdir('sound'), ['atmos_wind.wav', 'rand_owl.wav'])
+        self.assertEqual(vfs.listdir('sound', 'ogg'), [])
+        self.assertEqual(vfs.listdir('nothing'), [])
+        self.assertIn('music/one.ogg', vfs.filelist())
+
+    def test_refresh(self):
+        vfs = self.make_vfs()
+        self.assertFalse(vfs.refresh())
+        self.write('music', 'three.ogg', 'loose three')
+        # Make sure the mtime change registers, however coarse the filesystem
+        stat = os.stat(os.path.join(self.gamedir, 'music'))
+        os.utime(os.path.join(self.gamedir, 'music'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertTrue(vfs.refresh())
+        self.assertEqual(vfs.listdir('music', 'ogg'), ['one.ogg', 'three.ogg', 'two.ogg'])
+
+    def test_eschalondata(self):
+        data = EschalonData.new(3, self.gamedir, self.moddir)
+        self.assertEqual(data.readfile('two.ogg', 'music'), b'loose two')
+        self.assertEqual(data.listdir('sound', 'wav'), ['atmos_wind.wav', 'rand_owl.wav'])
+        self.assertEqual(data.filelist(), ['data/entities.csv', 'music/one.ogg', 'music/two.ogg',
+                                           'sound/atmos_wind.wav', 'sound/rand_owl.wav'])
+
+
+if __name__ == '__main__':
+    unittest.main()